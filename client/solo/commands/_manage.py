@@ -15,6 +15,7 @@ import os
 import shlex
 import subprocess
 import sys
+import threading
 
 from entropy.const import const_convert_to_unicode, etpConst, \
     const_debug_write, const_mkstemp
@@ -23,6 +24,7 @@ from entropy.output import darkgreen, blue, purple, teal, brown, bold, \
     darkred, green, readtext, is_interactive
 from entropy.exceptions import EntropyPackageException, \
     DependenciesCollision, DependenciesNotFound
+from entropy.misc import ParallelTask
 from entropy.services.client import WebService
 from entropy.client.interfaces.repository import Repository
 from entropy.client.interfaces.package.preservedlibs import PreservedLibraries
@@ -33,6 +35,123 @@ import entropy.dep
 from _entropy.solo.utils import enlightenatom, get_entropy_webservice
 from _entropy.solo.commands.command import SoloCommand
 
+class FetchPipeline(object):
+    """
+    Run a package download iterator (see
+    SoloManage._download_packages_iter()) in a background thread, staying
+    at most "window" packages ahead of the consumer, which is expected to
+    call wait() for every package, in the same order of the download
+    queue, before making use of it.
+    Since the download iterator works in multifetch chunks, the amount
+    of packages fetched in advance can exceed the window by at most one
+    chunk.
+    """
+
+    # wake up periodically, Python 2 Condition.wait() without timeout
+    # cannot be interrupted by signals.
+    _WAIT_TIMEOUT = 0.5
+
+    def __init__(self, fetch_iter, window):
+        self._fetch_iter = fetch_iter
+        self._window = max(1, window)
+        self._cond = threading.Condition()
+        self._fetched = set()
+        self._consumed = 0
+        self._failed = False
+        self._aborted = False
+        self._done = False
+        self._thread = None
+
+    def start(self):
+        """
+        Start downloading packages in the background.
+        """
+        self._thread = ParallelTask(self._run)
+        self._thread.name = "FetchPipelineThread"
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        """
+        Background thread body.
+        """
+        try:
+            while True:
+                with self._cond:
+                    while not self._aborted and \
+                            len(self._fetched) - self._consumed \
+                            >= self._window:
+                        self._cond.wait(self._WAIT_TIMEOUT)
+                    if self._aborted:
+                        break
+
+                try:
+                    exit_st, matches = next(self._fetch_iter)
+                except StopIteration:
+                    break
+
+                with self._cond:
+                    if exit_st != 0:
+                        self._failed = True
+                        break
+                    self._fetched.update(matches)
+                    self._cond.notify_all()
+
+        except Exception:
+            with self._cond:
+                self._failed = True
+            raise
+
+        finally:
+            self._fetch_iter.close()
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+
+    def wait(self, package_match):
+        """
+        Block until the given package has been downloaded and verified.
+
+        @param package_match: the package match
+        @type package_match: tuple
+        @return: True, if the package is available, False if the
+            download failed or the pipeline has been aborted
+        @rtype: bool
+        """
+        with self._cond:
+            while package_match not in self._fetched and \
+                    not self._done:
+                self._cond.wait(self._WAIT_TIMEOUT)
+
+            if package_match not in self._fetched:
+                return False
+            self._consumed += 1
+            self._cond.notify_all()
+            return True
+
+    def abort(self):
+        """
+        Stop downloading packages as soon as the current download step
+        is complete and wait for the background thread to terminate.
+        """
+        with self._cond:
+            self._aborted = True
+            self._cond.notify_all()
+        self.join()
+
+    def join(self):
+        """
+        Wait for the background thread to terminate.
+
+        @return: True, if all the packages have been downloaded
+        @rtype: bool
+        """
+        if self._thread is not None:
+            self._thread.join()
+        with self._cond:
+            return self._done and not (self._failed or self._aborted)
+
+
 class SoloManage(SoloCommand):
     """
     Abstract class used by Solo Package management
@@ -561,6 +680,25 @@ class SoloManage(SoloCommand):
         """
         Download packages from mirrors, essentially.
         """
+        for exit_st, _matches in self._download_packages_iter(
+                entropy_client, package_matches, downdata,
+                multifetch=multifetch):
+            if exit_st != 0:
+                return exit_st
+        return 0
+
+    def _download_packages_iter(self, entropy_client, package_matches,
+                                downdata, multifetch=1):
+        """
+        Download packages from mirrors, one multifetch chunk (or one
+        package, if multifetch is disabled) at a time, following the
+        order of package_matches.
+
+        After every chunk, yield a (exit_status, matches) tuple, where
+        matches is the list of package matches that have been fetched
+        (and verified) by that step. The iteration stops at the first
+        failure.
+        """
         # read multifetch parameter from config if needed.
         client_settings = entropy_client.ClientSettings()
         misc_settings = client_settings['misc']
@@ -613,14 +751,17 @@ class SoloManage(SoloCommand):
                         header=darkred(" ::: ") + ">>> ")
 
                     exit_st = pkg.start()
-                    if exit_st != 0:
-                        return 1
 
                 finally:
                     if pkg is not None:
                         pkg.finalize()
 
-            return 0
+                if exit_st != 0:
+                    yield 1, matches
+                    return
+                yield 0, matches
+
+            return
 
         total = len(package_matches)
         count = 0
@@ -652,14 +793,31 @@ class SoloManage(SoloCommand):
                     header=darkred(" ::: ") + ">>> ")
 
                 exit_st = pkg.start()
-                if exit_st != 0:
-                    return 1
 
             finally:
                 if pkg is not None:
                     pkg.finalize()
 
-        return 0
+            if exit_st != 0:
+                yield 1, [match]
+                return
+            yield 0, [match]
+
+    def _pipeline_download_packages(self, entropy_client, package_matches,
+                                    downdata, window, multifetch=1):
+        """
+        Start downloading packages in the background, in the order given
+        by package_matches, without getting more than window packages
+        ahead of the consumer. Use the returned FetchPipeline object
+        to wait for each package before installing it.
+        """
+        pipeline = FetchPipeline(
+            self._download_packages_iter(
+                entropy_client, package_matches, downdata,
+                multifetch=multifetch),
+            window)
+        pipeline.start()
+        return pipeline
 
     def _advise_repository_update(self, entropy_client):
         """
@@ -621,16 +621,27 @@ Install or update packages or package files.
 
         ugc_thread = None
         down_data = {}
-        exit_st = self._download_packages(
-            entropy_client, run_queue, down_data, multifetch)
-        if exit_st == 0:
-            ugc_thread = ParallelTask(
-                self._signal_ugc, entropy_client, down_data)
-            ugc_thread.name = "UgcThread"
-            ugc_thread.start()
+        pipeline = None
 
-        elif exit_st != 0:
-            return 1, False
+        client_settings = entropy_client.ClientSettings()
+        fetch_window = client_settings['misc'].get('fetch_pipeline', 0)
+        if fetch_window > 0 and not fetch:
+            # install packages while the following ones are
+            # being downloaded.
+            pipeline = self._pipeline_download_packages(
+                entropy_client, run_queue, down_data, fetch_window,
+                multifetch=multifetch)
+        else:
+            exit_st = self._download_packages(
+                entropy_client, run_queue, down_data, multifetch)
+            if exit_st == 0:
+                ugc_thread = ParallelTask(
+                    self._signal_ugc, entropy_client, down_data)
+                ugc_thread.name = "UgcThread"
+                ugc_thread.start()
+
+            elif exit_st != 0:
+                return 1, False
 
         # is --fetch on? then quit.
         if fetch:
@@ -688,6 +699,16 @@ Install or update packages or package files.
                 atom = entropy_client.open_repository(
                     repository_id).retrieveAtom(package_id)
 
+                if pipeline is not None and not pipeline.wait(pkg_match):
+                    pipeline.join()
+                    entropy_client.output(
+                        "%s: %s" % (
+                            darkred(_("Download failed, aborting")),
+                            purple(atom),),
+                        header=darkred(" @@ "),
+                        level="error", importance=1)
+                    return 1, count > 1
+
                 pkg = None
                 try:
                     pkg = action_factory.get(
@@ -715,9 +736,18 @@ Install or update packages or package files.
                         pkg.finalize()
 
         finally:
+            if pipeline is not None:
+                # no-op if all the packages have been downloaded
+                pipeline.abort()
             if notif_acquired:
                 notification_lock.release()
 
+        if pipeline is not None:
+            ugc_thread = ParallelTask(
+                self._signal_ugc, entropy_client, down_data)
+            ugc_thread.name = "UgcThread"
+            ugc_thread.start()
+
         if ugc_thread is not None:
             ugc_thread.join()
 
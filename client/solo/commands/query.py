@@ -363,14 +363,17 @@ Repository query tools.
         reverse_symlink_map = entropy_client.Settings(
             )['system_rev_symlinks']
 
+        owners = inst_repo.searchBelongsMany(files)
+        # try real path if possible
+        real_owners = inst_repo.searchBelongsMany(
+            set(os.path.realpath(x) for x, y in owners.items() if not y))
+
         for xfile in files:
             outcome = results.setdefault(xfile, set())
 
-            pkg_ids = inst_repo.searchBelongs(xfile)
+            pkg_ids = owners[xfile]
             if not pkg_ids:
-                # try real path if possible
-                pkg_ids = inst_repo.searchBelongs(
-                    os.path.realpath(xfile))
+                pkg_ids = real_owners[os.path.realpath(xfile)]
 
             if not pkg_ids:
                 # try using reverse symlink mapping
@@ -20,6 +20,7 @@ import errno
 import hashlib
 import sys
 import tempfile
+import collections
 
 from entropy.const import etpConst, const_debug_write, \
     const_debug_enabled, const_pid_exists, const_setup_perms, \
@@ -33,6 +34,183 @@ import copy
 import entropy.dump
 import entropy.tools
 
+
+def _env_int(name, default):
+    """
+    Read a non-negative integer from the environment, returning default
+    if unset or invalid.
+    """
+    value = entropy.tools.setting_to_int(os.getenv(name, ""), 0, None)
+    if value is None:
+        return default
+    return value
+
+
+class EntropyCacheLRU(object):
+
+    """
+    Bounded, thread-safe, in-memory LRU cache of Python objects,
+    keyed by (cache key, cache directory). Hits, misses and evictions
+    are counted per namespace (the directory part of the cache key).
+
+    Objects are stored serialized (as entropy.dump.DumpBlob) and every
+    get() returns a new copy, so that callers are free to modify it.
+    Memory usage is accounted using the serialized size.
+    """
+
+    def __init__(self, max_bytes, max_entries):
+        """
+        EntropyCacheLRU constructor.
+
+        @param max_bytes: maximum amount of (serialized) bytes kept
+        @type max_bytes: int
+        @param max_entries: maximum number of objects kept
+        @type max_entries: int
+        """
+        self._max_bytes = max_bytes
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data = collections.OrderedDict()
+        self._bytes = 0
+        self._stats = {}
+
+    def enabled(self):
+        """
+        Return whether the LRU cache can store anything.
+        """
+        return self._max_bytes > 0 and self._max_entries > 0
+
+    def _namespace_stats(self, key):
+        namespace = os.path.dirname(key)
+        stats = self._stats.get(namespace)
+        if stats is None:
+            stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+            self._stats[namespace] = stats
+        return stats
+
+    def get(self, key, cache_dir):
+        """
+        Return a new copy of the object bound to (key, cache_dir), or
+        None. The entry becomes the most recently used one.
+        """
+        with self._lock:
+            entry = self._data.pop((key, cache_dir), None)
+            stats = self._namespace_stats(key)
+            if entry is None:
+                stats['misses'] += 1
+                return None
+            self._data[(key, cache_dir)] = entry
+            stats['hits'] += 1
+
+        try:
+            return entry[0].load()
+        except (ValueError, EOFError, TypeError, AttributeError,
+                ImportError, entropy.dump.pickle.UnpicklingError):
+            self.invalidate(key, cache_dir)
+            return None
+
+    def set(self, key, cache_dir, obj):
+        """
+        Store obj at (key, cache_dir), evicting the least recently used
+        entries if limits are exceeded. Objects bigger than the whole
+        LRU, or that cannot be serialized, are not stored.
+
+        @param obj: object to store, or its entropy.dump.DumpBlob
+        @type obj: any picklable object
+        """
+        if not self.enabled():
+            return
+        blob = obj
+        if not isinstance(blob, entropy.dump.DumpBlob):
+            try:
+                blob = entropy.dump.DumpBlob.from_object(obj)
+            except (entropy.dump.pickle.PicklingError, TypeError,
+                    AttributeError, RuntimeError):
+                blob = None
+        with self._lock:
+            old = self._data.pop((key, cache_dir), None)
+            if old is not None:
+                self._bytes -= old[1]
+            if blob is None:
+                return
+            size = len(blob)
+            if size > self._max_bytes:
+                return
+            self._data[(key, cache_dir)] = (blob, size)
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        """
+        Drop the least recently used entries until the limits are
+        respected. Must be called with the lock held.
+        """
+        while self._data and (self._bytes > self._max_bytes or
+                              len(self._data) > self._max_entries):
+            (key, cache_dir), (obj, size) = self._data.popitem(last = False)
+            self._bytes -= size
+            self._namespace_stats(key)['evictions'] += 1
+
+    def invalidate(self, key, cache_dir):
+        """
+        Drop the object at (key, cache_dir), if any.
+        """
+        with self._lock:
+            entry = self._data.pop((key, cache_dir), None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def invalidate_namespace(self, key, cache_dir):
+        """
+        Drop all the objects stored in cache_dir living in the same
+        namespace of key, including sub-namespaces. This mirrors
+        EntropyCacher.clear_cache_item().
+        """
+        prefix = os.path.dirname(key)
+        if prefix:
+            prefix = os.path.join(prefix, "")
+        with self._lock:
+            for data_key in list(self._data.keys()):
+                if data_key[1] == cache_dir and data_key[0].startswith(prefix):
+                    entry = self._data.pop(data_key)
+                    self._bytes -= entry[1]
+
+    def clear(self):
+        """
+        Drop all the stored objects.
+        """
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def resize(self, max_bytes, max_entries):
+        """
+        Change the LRU limits, evicting entries if needed.
+        """
+        with self._lock:
+            self._max_bytes = max_bytes
+            self._max_entries = max_entries
+            self._evict()
+
+    def stats(self):
+        """
+        Return the LRU statistics: current amount of bytes and entries,
+        limits and per-namespace hits, misses and evictions.
+
+        @return: statistics metadata
+        @rtype: dict
+        """
+        with self._lock:
+            return {
+                'bytes': self._bytes,
+                'entries': len(self._data),
+                'max_bytes': self._max_bytes,
+                'max_entries': self._max_entries,
+                'namespaces': dict((k, v.copy()) for k, v in \
+                                       self._stats.items()),
+            }
+
+
 class EntropyCacher(Singleton):
 
     # Max number of cache objects written at once
@@ -46,6 +224,24 @@ class EntropyCacher(Singleton):
     # yet able to write data to disk.
     STASHING_CACHE = True
 
+    # If True, objects pushed asynchronously are serialized right away
+    # into immutable entropy.dump.DumpBlob snapshots, instead of being
+    # deep-copied and pickled later by the writer thread.
+    SNAPSHOT_PUSH = os.getenv("ETP_CACHE_DEEPCOPY_PUSH") is None
+
+    # Cache store backend identifier, see entropy.dump.DUMP_STORES.
+    # "file" writes one pickle file per cache key, "indexed" keeps
+    # one indexed append-only log per cache namespace.
+    BACKEND = os.getenv("ETP_CACHE_BACKEND", entropy.dump.FileDumpStore.ID)
+
+    # In-memory LRU tier limits, in serialized bytes and number of
+    # objects. Setting either to 0 disables the LRU tier.
+    LRU_MAX_BYTES = _env_int("ETP_CACHE_LRU_MAX_BYTES", 16 * 1024 * 1024)
+    LRU_MAX_ENTRIES = _env_int("ETP_CACHE_LRU_MAX_ENTRIES", 8192)
+
+    _LRU = None
+    _LRU_LOCK = threading.Lock()
+
     """
     Entropy asynchronous and synchronous cache writer
     and reader. This class is a Singleton and contains
@@ -104,6 +300,8 @@ class EntropyCacher(Singleton):
         self.__cache_writer = None
         self.__cache_buffer = Lifo()
         self.__stashing_cache = {}
+        # serializes stashing cache updates and their LRU handover
+        self.__stashing_lock = threading.Lock()
         self.__inside_with_stmt = 0
         self.__dump_data_lock = threading.Lock()
         self.__worker_sem = threading.Semaphore(0)
@@ -127,13 +325,16 @@ class EntropyCacher(Singleton):
     def __copy_obj(self, obj):
         """
         Return a copy of an object done by the standard
-        library "copy" module.
+        library "copy" module, or its DumpBlob snapshot if
+        SNAPSHOT_PUSH is enabled.
 
         @param obj: object to copy
         @type obj: any Python object
-        @rtype: copied object
+        @rtype: copied object or entropy.dump.DumpBlob
         @return: copied object
         """
+        if EntropyCacher.SNAPSHOT_PUSH:
+            return entropy.dump.DumpBlob.from_object(obj)
         return self.__copy.deepcopy(obj)
 
     def __cacher(self, run_until_empty = False, sync = False, _loop=False):
@@ -171,10 +372,22 @@ class EntropyCacher(Singleton):
                 pass
 
         def _commit_data(_massive_data):
+            try:
+                store = self._store()
+            except AttributeError:
+                # interpreter shutdown
+                return
+            by_dir = {}
             for (key, cache_dir), data in _massive_data:
-                d_o = entropy.dump.dumpobj
-                if d_o is not None:
-                    d_o(key, data, dump_dir = cache_dir)
+                by_dir.setdefault(cache_dir, []).append((key, data))
+            for cache_dir, objects in by_dir.items():
+                store.store_many(objects, dump_dir = cache_dir)
+                if not EntropyCacher.STASHING_CACHE:
+                    # pop() may have loaded the old objects from
+                    # disk after push() invalidated them.
+                    lru = self._lru()
+                    for key, data in objects:
+                        lru.invalidate(key, cache_dir)
 
         while self.__alive or run_until_empty:
 
@@ -223,14 +436,60 @@ class EntropyCacher(Singleton):
                             task, len(massive_data),))
 
                 if EntropyCacher.STASHING_CACHE:
+                    lru = self._lru()
                     for (key, cache_dir), data in massive_data:
-                        try:
-                            del self.__stashing_cache[(key, cache_dir)]
-                        except (AttributeError, KeyError,):
-                            continue
+                        stash_key = (key, cache_dir)
+                        with self.__stashing_lock:
+                            if self.__stashing_cache.get(stash_key) is data:
+                                del self.__stashing_cache[stash_key]
+                                # keep serving it from RAM
+                                lru.set(key, cache_dir, data)
+                            else:
+                                # pushed again in the meantime, the
+                                # newer object is still in the
+                                # stashing cache
+                                lru.invalidate(key, cache_dir)
                 del massive_data[:]
                 del massive_data
 
+    @classmethod
+    def _store(cls):
+        """
+        Return the cache store backend in use.
+
+        @return: the cache store backend
+        @rtype: entropy.dump.FileDumpStore
+        """
+        return entropy.dump.get_dump_store(cls.BACKEND)
+
+    @classmethod
+    def _lru(cls):
+        """
+        Return the in-memory LRU tier.
+
+        @return: the LRU cache
+        @rtype: EntropyCacheLRU
+        """
+        lru = cls._LRU
+        if lru is None:
+            with cls._LRU_LOCK:
+                lru = EntropyCacher._LRU
+                if lru is None:
+                    lru = EntropyCacheLRU(
+                        cls.LRU_MAX_BYTES, cls.LRU_MAX_ENTRIES)
+                    EntropyCacher._LRU = lru
+        return lru
+
+    def lru_stats(self):
+        """
+        Return the in-memory LRU tier statistics, see
+        EntropyCacheLRU.stats().
+
+        @return: statistics metadata
+        @rtype: dict
+        """
+        return self._lru().stats()
+
     @classmethod
     def current_directory(cls):
         """
@@ -305,6 +564,7 @@ class EntropyCacher(Singleton):
         """
         self.__cache_buffer.clear()
         self.__stashing_cache.clear()
+        self._lru().clear()
 
     def save(self, key, data, cache_dir = None):
         """
@@ -321,9 +581,10 @@ class EntropyCacher(Singleton):
         """
         if cache_dir is None:
             cache_dir = self.current_directory()
+        self._lru().invalidate(key, cache_dir)
         try:
             with self.__dump_data_lock:
-                entropy.dump.dumpobj(key, data, dump_dir = cache_dir,
+                self._store().store(key, data, dump_dir = cache_dir,
                     ignore_exceptions = False)
         except (EOFError, IOError, OSError) as err:
             raise IOError("cannot store %s to %s. err: %s" % (
@@ -351,13 +612,19 @@ class EntropyCacher(Singleton):
             cache_dir = self.current_directory()
 
         if async_mode:
+            # the LRU tier must not serve the old object anymore,
+            # even when the stashing cache is disabled
+            self._lru().invalidate(key, cache_dir)
             try:
                 obj_copy = self.__copy_obj(data)
+                if EntropyCacher.STASHING_CACHE:
+                    # before the writer can get to it
+                    with self.__stashing_lock:
+                        self.__stashing_cache[(key, cache_dir)] = obj_copy
                 self.__cache_buffer.push(((key, cache_dir,), obj_copy,))
                 self.__worker_sem.release()
-                if EntropyCacher.STASHING_CACHE:
-                    self.__stashing_cache[(key, cache_dir)] = obj_copy
-            except TypeError:
+            except (TypeError, AttributeError,
+                    entropy.dump.pickle.PicklingError):
                 # sometimes, very rarely, copy.deepcopy() is unable
                 # to properly copy an object (blame Python bug)
                 sys.stdout.write("!!! cannot cache object with key %s\n" % (
@@ -372,8 +639,9 @@ class EntropyCacher(Singleton):
             #    const_debug_write(__name__,
             #        "EntropyCacher.push, sync push %s, into %s" % (
             #            key, cache_dir,))
+            self._lru().invalidate(key, cache_dir)
             with self.__dump_data_lock:
-                entropy.dump.dumpobj(key, data, dump_dir = cache_dir)
+                self._store().store(key, data, dump_dir = cache_dir)
 
     def pop(self, key, cache_dir = None, aging_days = None):
         """
@@ -394,13 +662,33 @@ class EntropyCacher(Singleton):
         if EntropyCacher.STASHING_CACHE:
             # object is being saved on disk, it's in RAM atm
             ram_obj = self.__stashing_cache.get((key, cache_dir))
+            if isinstance(ram_obj, entropy.dump.DumpBlob):
+                try:
+                    return ram_obj.load()
+                except (ValueError, EOFError, TypeError, AttributeError,
+                        ImportError, entropy.dump.pickle.UnpicklingError):
+                    ram_obj = None
             if ram_obj is not None:
                 return ram_obj
 
-        l_o = entropy.dump.loadobj
-        if not l_o:
+        try:
+            store = self._store()
+            lru = self._lru()
+        except AttributeError:
+            # interpreter shutdown
             return
-        return l_o(key, dump_dir = cache_dir, aging_days = aging_days)
+
+        # the LRU does not know the on-disk age of objects
+        use_lru = aging_days is None and lru.enabled()
+        if use_lru:
+            obj = lru.get(key, cache_dir)
+            if obj is not None:
+                return obj
+
+        obj = store.load(key, dump_dir = cache_dir, aging_days = aging_days)
+        if use_lru and obj is not None:
+            lru.set(key, cache_dir, obj)
+        return obj
 
     @classmethod
     def clear_cache_item(cls, cache_item, cache_dir = None):
@@ -414,23 +702,8 @@ class EntropyCacher(Singleton):
         """
         if cache_dir is None:
             cache_dir = cls.current_directory()
-        dump_path = os.path.join(cache_dir, cache_item)
-
-        dump_dir = os.path.dirname(dump_path)
-        for currentdir, subdirs, files in os.walk(dump_dir):
-            path = os.path.join(dump_dir, currentdir)
-            for item in files:
-                if item.endswith(entropy.dump.D_EXT):
-                    item = os.path.join(path, item)
-                    try:
-                        os.remove(item)
-                    except (OSError, IOError,):
-                        pass
-            try:
-                if not os.listdir(path):
-                    os.rmdir(path)
-            except (OSError, IOError,):
-                pass
+        cls._lru().invalidate_namespace(cache_item, cache_dir)
+        cls._store().clear(cache_item, dump_dir = cache_dir)
 
 
 class MtimePingus(object):
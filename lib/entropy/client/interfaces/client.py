@@ -114,6 +114,11 @@ class Client(Singleton, TextInterface, CalculatorsMixin,
         self._real_enabled_repos = None
         self._real_enabled_repos_lock = threading.RLock()
 
+        # incremental solver cache, see CalculatorsMixin
+        self._solver_cache = {}
+        self._solver_cache_dirty = set()
+        self._solver_cache_lock = threading.RLock()
+
         self._multiple_url_fetcher = multiple_url_fetcher
         self._url_fetcher = url_fetcher
         if url_fetcher is None:
@@ -414,6 +419,9 @@ class Client(Singleton, TextInterface, CalculatorsMixin,
             # no data is written while holding self._cacher by the balls
             # drop all the buffers then remove on-disk data
             self._cacher.discard()
+            with self._solver_cache_lock:
+                self._solver_cache.clear()
+                self._solver_cache_dirty.clear()
             # clear repositories live cache
             inst_repo = self.installed_repository()
             if inst_repo is not None:
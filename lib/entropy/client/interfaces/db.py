@@ -13,7 +13,6 @@ import codecs
 import errno
 import os
 import shutil
-import subprocess
 import sys
 import threading
 import time
@@ -24,7 +23,6 @@ from entropy.const import const_debug_write, const_setup_perms, etpConst, \
     const_file_writable
 from entropy.output import blue, darkred, red, darkgreen, purple, teal, brown, \
     bold, TextInterface
-from entropy.dump import dumpobj, loadobj
 from entropy.cache import EntropyCacher
 from entropy.db import EntropyRepository
 from entropy.exceptions import RepositoryError, SystemDatabaseError, \
@@ -122,6 +120,9 @@ class InstalledPackagesRepository(CachedRepository):
     # Name of the repository
     NAME = "__system__"
 
+    # WAL journaling, see EntropySQLiteRepository.PERFORMANCE_PROFILES
+    PERFORMANCE_PROFILE = "installed"
+
     def __init__(self, *args, **kwargs):
         # force our own name, always.
         kwargs = kwargs.copy()
@@ -174,7 +175,7 @@ class AvailablePackagesRepositoryUpdater(object):
         self._supported_download_items = (
             "db", "dbck", "dblight", "ck", "cklight", "compck",
             "lock", "dbdump", "dbdumplight", "dbdumplightck", "dbdumpck",
-            "meta_file", "meta_file_gpg", "notice_board"
+            "meta_file", "meta_file_gpg", "notice_board", "changesets"
         )
         self._developer_repo = \
             self._settings['repositories']['developer_repo']
@@ -302,12 +303,14 @@ class AvailablePackagesRepositoryUpdater(object):
             os.rename(dbfile_old, dbfile)
         return upd_rc
 
-    def __eapi2_inject_downloaded_dump(self, dumpfile, dbfile, cmethod):
+    def __eapi2_inject_downloaded_dump(self, uri, dbfile, cmethod):
 
-        # load the dump into database
+        # load the dump into database, decompressing it on the fly
+        dump_url, dump_path = self._construct_paths(
+            uri, "dbdumplight", cmethod)
         mytxt = "%s %s, %s %s" % (
             red(_("Injecting downloaded dump")),
-            darkgreen(etpConst['etpdatabasedumplight']),
+            darkgreen(os.path.basename(dump_path)),
             red(_("please wait")),
             red("..."),
         )
@@ -319,32 +322,37 @@ class AvailablePackagesRepositoryUpdater(object):
         )
         dbconn = self._entropy.open_generic_repository(dbfile,
             xcache = False, indexing_override = False)
-        rc = dbconn.importRepository(dumpfile, dbfile)
-        dbconn.close()
+        try:
+            dump_f = cmethod[0](dump_path, "rb")
+        except (OSError, IOError):
+            dbconn.close()
+            return 1
+        try:
+            rc = dbconn.importRepository(dump_f, dbfile)
+        finally:
+            dump_f.close()
+            dbconn.close()
         return rc
 
-    def __get_repo_eapi(self):
+    def __get_repo_eapi(self, changesets = True):
 
         eapi_env = os.getenv("FORCE_EAPI")
-        sqlite3_access = os.path.lexists("/usr/bin/sqlite3")
-        sqlite3_rc = subprocess.call("/usr/bin/sqlite3 -version > /dev/null",
-            shell = True)
         try:
             eapi_env_clear = int(eapi_env)
             if eapi_env_clear not in self._supported_apis:
                 raise ValueError()
         except (ValueError, TypeError,):
             eapi_env_clear = None
+        if eapi_env_clear == 4 and not changesets:
+            # falling back from EAPI4
+            eapi_env_clear = None
 
         repo_eapi = 2
         eapi_avail = self.__check_webserv_availability()
         if eapi_avail:
             repo_eapi = 3
-        else:
-            if not sqlite3_access or entropy.tools.islive():
-                repo_eapi = 1
-            elif sqlite3_rc != 0:
-                repo_eapi = 1
+        elif entropy.tools.islive():
+            repo_eapi = 1
 
         # if differential update is disabled and FORCE_EAPI is not overriding
         # we cannot use EAPI=3
@@ -354,6 +362,13 @@ class AvailablePackagesRepositoryUpdater(object):
                 "__get_repo_eapi: differential update is disabled !")
             repo_eapi -= 1
 
+        # changesets are lighter than any other EAPI, when the local
+        # repository is not too old.
+        max_chain = self._settings['repositories']['changesets_max_chain']
+        if changesets and self._differential_update and (max_chain > 0) \
+                and not entropy.tools.islive():
+            repo_eapi = 4
+
         # check EAPI
         if eapi_env_clear is not None:
             repo_eapi = eapi_env_clear
@@ -756,23 +771,22 @@ class AvailablePackagesRepositoryUpdater(object):
 
         garbage, myfile = self._construct_paths(uri, down_item, cmethod)
 
-        if self._repo_eapi in (1, 2,):
+        if self._repo_eapi == 1:
             try:
 
                 myfunc = getattr(entropy.tools, cmethod[1])
                 path = myfunc(myfile)
                 # rename path correctly
-                if self._repo_eapi == 1:
-                    new_path = os.path.join(os.path.dirname(path),
-                        etpConst['etpdatabasefile'])
-                    os.rename(path, new_path)
-                    path = new_path
+                new_path = os.path.join(os.path.dirname(path),
+                    etpConst['etpdatabasefile'])
+                os.rename(path, new_path)
+                path = new_path
 
             except (OSError, EOFError):
                 rc = 1
 
         else:
-            mytxt = "invalid EAPI must be = 1 or 2"
+            mytxt = "invalid EAPI must be = 1"
             raise AttributeError(mytxt)
 
         if rc == 0:
@@ -783,16 +797,11 @@ class AvailablePackagesRepositoryUpdater(object):
 
     def _downloaded_database_unpack(self, uri, cmethod):
         """
-        Unpack the downloaded database.
+        Unpack the downloaded database (EAPI1, EAPI2 dumps are imported
+        while being decompressed).
         """
-        file_to_unpack = etpConst['etpdatabasedump']
-        if self._repo_eapi == 1:
-            file_to_unpack = etpConst['etpdatabasefile']
-        elif self._repo_eapi == 2:
-            file_to_unpack = etpConst['etpdatabasedumplight']
-
         mytxt = "%s %s %s" % (red(_("Unpacking database to")),
-            darkgreen(file_to_unpack), red("..."),)
+            darkgreen(etpConst['etpdatabasefile']), red("..."),)
         self._entropy.output(
             mytxt,
             importance = 0,
@@ -801,9 +810,7 @@ class AvailablePackagesRepositoryUpdater(object):
         )
 
         myitem = 'dblight'
-        if self._repo_eapi == 2:
-            myitem = 'dbdumplight'
-        elif self._developer_repo:
+        if self._developer_repo:
             myitem = 'db'
 
         myrc = self.__unpack_downloaded_database(uri, myitem, cmethod)
@@ -906,6 +913,7 @@ class AvailablePackagesRepositoryUpdater(object):
         meta_file = etpConst['etpdatabasemetafilesfile']
         meta_file_gpg = etpConst['etpdatabasemetafilesfile'] + \
             etpConst['etpgpgextension']
+        changesets_file = etpConst['etpdatabasechangesetsfile']
         md5_ext = etpConst['packagesmd5fileext']
         ec_cm2 = None
         ec_cm3 = None
@@ -982,6 +990,10 @@ class AvailablePackagesRepositoryUpdater(object):
                 "%s/%s" % (uri, meta_file_gpg,),
                 "%s/%s" % (repo_dbpath, meta_file_gpg,),
             ),
+            'changesets': (
+                "%s/%s" % (uri, changesets_file,),
+                "%s/%s" % (repo_dbpath, changesets_file,),
+            ),
         }
 
         url, path = mymap.get(item)
@@ -994,6 +1006,16 @@ class AvailablePackagesRepositoryUpdater(object):
     def _download_item(self, uri, item, cmethod = None,
                        disallow_redirect = True, get_signature = False):
 
+        url, filepath = self._construct_paths(
+            uri, item, cmethod, get_signature = get_signature)
+        return self._download_file(url, filepath,
+            disallow_redirect = disallow_redirect)
+
+    def _download_file(self, url, filepath, disallow_redirect = True):
+        """
+        Download a repository file from url to filepath, return
+        whether it has been successfully downloaded.
+        """
         my_repos = self._settings['repositories']
         avail_data = my_repos['available']
         repo_data = avail_data[self._repository_id]
@@ -1002,9 +1024,6 @@ class AvailablePackagesRepositoryUpdater(object):
         basic_pwd = repo_data.get('password')
         https_validate_cert = not repo_data.get('https_validate_cert') == "false"
 
-        url, filepath = self._construct_paths(
-            uri, item, cmethod, get_signature = get_signature)
-
         # See bug #3495, download the file to
         # a temporary location and then move it
         # if we are successful
@@ -1711,10 +1730,9 @@ class AvailablePackagesRepositoryUpdater(object):
 
                 try:
                     for package_id, pkg_data in pkg_meta.items():
-                        dumpobj(
+                        self._cacher.save(
                             "%s%s" % (self.WEBSERV_CACHE_ID, package_id,),
-                            pkg_data,
-                            ignore_exceptions = False
+                            pkg_data
                         )
                 except (IOError, EOFError, OSError,) as e:
                     mytxt = "%s: %s: %s." % (
@@ -1920,6 +1938,240 @@ class AvailablePackagesRepositoryUpdater(object):
 
         return result
 
+    def __get_changesets_chain(self, index_path, local_revision, revision):
+        """
+        Return the list of changesets (from revision, to revision, file name,
+        size, sha256) listed in the changesets index file that bring the
+        local repository from local_revision to revision, None if the
+        index does not contain such chain.
+        """
+        changesets = {}
+        prefix = etpConst['etpdatabasechangesetfile'].split("%")[0]
+        enc = etpConst['conf_encoding']
+        try:
+            with codecs.open(index_path, "r", encoding=enc) as index_f:
+                for line in index_f.readlines():
+                    try:
+                        from_rev, to_rev, name, size, digest = line.split()
+                        from_rev, to_rev = int(from_rev), int(to_rev)
+                        size = int(size)
+                    except ValueError:
+                        continue
+                    # do not trust what comes from mirrors
+                    if os.path.basename(name) != name:
+                        continue
+                    if not name.startswith(prefix):
+                        continue
+                    if to_rev <= from_rev:
+                        continue
+                    changesets[from_rev] = (from_rev, to_rev, name, size,
+                                            digest)
+        except (OSError, IOError) as err:
+            if err.errno != errno.ENOENT:
+                raise
+            return None
+
+        chain = []
+        current = local_revision
+        while current != revision:
+            changeset = changesets.get(current)
+            if changeset is None:
+                return None
+            chain.append(changeset)
+            current = changeset[1]
+        return chain
+
+    def __changesets_index_verify(self, uri, index_path, paths):
+        """
+        Verify the GPG signature of the downloaded changesets index,
+        which carries the digests of the changesets. The signature is
+        required only if the repository key has already been installed.
+
+        @param uri: repository mirror URI
+        @type uri: string
+        @param index_path: path to the downloaded changesets index
+        @type index_path: string
+        @param paths: list of paths to remove once done, the signature
+            path is appended to it
+        @type paths: list
+        @return: True if the index can be trusted
+        @rtype: bool
+        """
+        if not self._gpg_feature:
+            return True
+        try:
+            repo_sec = self._entropy.RepositorySecurity()
+            if not repo_sec.is_pubkey_available(self._repository_id):
+                return True
+        except RepositorySecurity.GPGError:
+            return True
+
+        sig_path = self.__append_gpg_signature_to_path(index_path)
+        paths.append(sig_path)
+        if self._download_item(uri, "changesets", get_signature = True):
+            gpg_rc = self._gpg_verify_downloaded_files(
+                [index_path, sig_path])
+            if gpg_rc == 0:
+                return True
+
+        mytxt = "%s: %s" % (
+            blue(_("Changesets")),
+            darkred(_("cannot verify the index signature")),
+        )
+        self._entropy.output(
+            mytxt,
+            importance = 0,
+            level = "info",
+            header = blue("  # "),
+        )
+        return False
+
+    def _changesets_database_sync(self, uri, revision):
+        """
+        Update the local repository database by applying the chain of
+        changesets published on the mirror, from the local repository
+        revision to the remote one, in a single transaction (EAPI4).
+
+        @param uri: repository mirror URI
+        @type uri: string
+        @param revision: remote repository revision
+        @type revision: int
+        @return: True if the repository has been updated, False if the
+            whole repository must be downloaded instead
+        @rtype: bool
+        """
+        if self.__force:
+            return False
+        local_revision = AvailablePackagesRepository.revision(
+            self._repository_id)
+        if local_revision == -1:
+            return False
+
+        avail_data = self._settings['repositories']['available']
+        repo_data = avail_data[self._repository_id]
+        max_chain = self._settings['repositories']['changesets_max_chain']
+
+        mytxt = "%s ..." % (red(_("Downloading repository changesets")),)
+        self._entropy.output(
+            mytxt,
+            importance = 1,
+            level = "info",
+            header = "\t"
+        )
+        if not self._download_item(uri, "changesets"):
+            return False
+        _url, index_path = self._construct_paths(uri, "changesets", None)
+
+        paths = [index_path]
+        repo_db = None
+        try:
+            if not self.__changesets_index_verify(uri, index_path, paths):
+                return False
+
+            chain = self.__get_changesets_chain(
+                index_path, local_revision, revision)
+            if chain is None or len(chain) > max_chain:
+                chain_length = "?"
+                if chain is not None:
+                    chain_length = str(len(chain))
+                mytxt = "%s: %s (%s: %s/%s)" % (
+                    blue(_("Changesets")),
+                    darkred(_("skipping differential sync")),
+                    brown(_("chain length")),
+                    blue(chain_length),
+                    darkred(str(max_chain)),
+                )
+                self._entropy.output(
+                    mytxt,
+                    importance = 0,
+                    level = "info",
+                    header = blue("  # "),
+                )
+                return False
+
+            changesets = []
+            for _from_rev, _to_rev, name, size, digest in chain:
+                path = os.path.join(repo_data['dbpath'], name)
+                paths.append(path)
+                if not self._download_file("%s/%s" % (uri, name,), path):
+                    return False
+                if entropy.tools.sha256(path) != digest:
+                    mytxt = "%s: %s" % (
+                        blue(_("Changesets")),
+                        darkred(_("checksum mismatch")),
+                    )
+                    self._entropy.output(
+                        mytxt,
+                        importance = 0,
+                        level = "info",
+                        header = blue("  # "),
+                    )
+                    return False
+
+                cmethod = etpConst['etpdatabasecompressclasses'].get(
+                    name.rsplit(".", 1)[-1])
+                if cmethod is None:
+                    return False
+                f_in = cmethod[0](path, "rb")
+                try:
+                    changesets.append(
+                        EntropyRepositoryBase.loadChangeset(f_in))
+                except (ValueError, KeyError, TypeError, IOError,):
+                    return False
+                finally:
+                    f_in.close()
+
+            mytxt = "%s: %s, %s" % (
+                blue(_("Changesets")),
+                darkgreen(str(len(chain))),
+                entropy.tools.bytes_into_human(sum(x[3] for x in chain)),
+            )
+            self._entropy.output(
+                mytxt,
+                importance = 0,
+                level = "info",
+                header = blue("  # "),
+            )
+
+            repo_db = self.__get_webserv_local_database()
+            if repo_db is None:
+                return False
+            try:
+                repo_db.importChangesets(changesets, output_header = "\t")
+                checksum = repo_db.checksum(do_order = True,
+                    strict = False, include_signatures = True)
+            except (Error, KeyError, TypeError, ValueError,) as err:
+                if const_debug_enabled():
+                    entropy.tools.print_traceback()
+                repo_db.rollback()
+                self._entropy.output("%s: %s" % (
+                    blue(_("repository error while applying changesets")),
+                    err,),
+                    importance = 1, level = "warning",
+                    header = "  "
+                )
+                return False
+
+            if checksum != changesets[-1]['checksum']:
+                repo_db.rollback()
+                self._entropy.output(
+                    blue(_("Repository checksum doesn't match remote.")),
+                    importance = 0, level = "info", header = "\t",
+                )
+                return False
+
+            repo_db.commit()
+            return True
+
+        finally:
+            if repo_db is not None:
+                repo_db.close()
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+
     def remote_revision(self):
         rev = self._remote_webservice_revision()
         if rev is not None:
@@ -1966,8 +2218,10 @@ class AvailablePackagesRepositoryUpdater(object):
         if revision is not None:
             return revision
 
-        # otherwise, fallback to previous EAPI
-        self._repo_eapi -= 1
+        # otherwise, fallback to previous EAPI. Changesets (EAPI4)
+        # are fetched from the mirrors and do not need the webservice.
+        if self._repo_eapi == 3:
+            self._repo_eapi -= 1
 
     def _remote_revision(self, uri, http_basic_user = None,
                          http_basic_pwd = None,
@@ -2073,8 +2327,6 @@ class AvailablePackagesRepositoryUpdater(object):
         repo_data = avail_data[self._repository_id]
 
         # some variables
-        dumpfile = os.path.join(repo_data['dbpath'],
-            etpConst['etpdatabasedumplight'])
         dbfile = os.path.join(repo_data['dbpath'],
             etpConst['etpdatabasefile'])
         dbfile_old = dbfile+".sync"
@@ -2096,6 +2348,30 @@ class AvailablePackagesRepositoryUpdater(object):
                     self.__database_checksum_download(uri, cmethod)
                 break
 
+            elif self._repo_eapi == 4 and not const_file_writable(dbfile):
+                do_db_update_transfer = None
+                self._repo_eapi = self.__get_repo_eapi(changesets = False)
+                continue
+
+            elif self._repo_eapi == 4:
+
+                status = False
+                try:
+                    status = self._changesets_database_sync(uri, revision)
+                except:
+                    # avoid broken entries, deal with every exception
+                    entropy.tools.print_traceback()
+                    self.__remove_repository_files()
+                    raise
+
+                if not status:
+                    # set to none and completely skip database alignment
+                    do_db_update_transfer = None
+                    self._repo_eapi = self.__get_repo_eapi(changesets = False)
+                    continue
+
+                break
+
             elif self._repo_eapi == 3 and not const_file_writable(dbfile):
                 do_db_update_transfer = None
                 self._repo_eapi -= 1
@@ -2168,13 +2444,17 @@ class AvailablePackagesRepositoryUpdater(object):
                         __name__, "rename failed: %s" % (err,))
                     do_db_update_transfer = False
 
-            unpack_status, unpacked_item = \
-                self._downloaded_database_unpack(uri, cmethod)
+            if self._repo_eapi == 1:
+                unpack_status, unpacked_item = \
+                    self._downloaded_database_unpack(uri, cmethod)
 
-            if not unpack_status:
-                # delete all
-                self.__remove_repository_files()
-                return EntropyRepositoryBase.REPOSITORY_GENERIC_ERROR
+                if not unpack_status:
+                    # delete all
+                    self.__remove_repository_files()
+                    return EntropyRepositoryBase.REPOSITORY_GENERIC_ERROR
+            else:
+                # the dump is imported while being decompressed
+                unpacked_item = "dbdumplight"
 
             unpack_url, unpack_path = self._construct_paths(
                 uri, unpacked_item, cmethod)
@@ -2189,16 +2469,12 @@ class AvailablePackagesRepositoryUpdater(object):
                 os.remove(dbfile)
 
             if self._repo_eapi == 2:
-                rc = self.__eapi2_inject_downloaded_dump(dumpfile,
+                rc = self.__eapi2_inject_downloaded_dump(uri,
                     dbfile, cmethod)
 
             if do_db_update_transfer:
                 self.__eapi1_eapi2_databases_alignment(dbfile, dbfile_old)
 
-            if self._repo_eapi == 2:
-                # remove the dump
-                files_to_remove.append(dumpfile)
-
         if rc != 0:
             # delete all
             self.__remove_repository_files()
@@ -2300,7 +2576,7 @@ class MaskableRepository(EntropyRepositoryBase):
 
     def _mask_filter_fetch_cache(self, package_id):
         if self._caching:
-            return loadobj(
+            return self._cacher.pop(
                 "MaskableRepositoryFilter/%s_%s/%s" % (
                     self.name,
                     self.atomMatchCacheKey(),
@@ -2310,13 +2586,17 @@ class MaskableRepository(EntropyRepositoryBase):
 
     def _mask_filter_store_cache(self, package_id, value):
         if self._caching:
-            dumpobj(
-                "MaskableRepositoryFilter/%s_%s/%s" % (
-                    self.name,
-                    self.atomMatchCacheKey(),
-                    package_id,
-                    ),
-                value)
+            try:
+                self._cacher.save(
+                    "MaskableRepositoryFilter/%s_%s/%s" % (
+                        self.name,
+                        self.atomMatchCacheKey(),
+                        package_id,
+                        ),
+                    value)
+            except IOError:
+                # cache write failures are not fatal
+                pass
 
     def _maskFilter_live(self, package_id):
 
@@ -2741,6 +3021,10 @@ class AvailablePackagesRepository(CachedRepository, MaskableRepository):
     subclass of EntropyRepository. It implements the update() method in order
     to make possible to update the repository.
     """
+
+    # memory mapped I/O, see EntropySQLiteRepository.PERFORMANCE_PROFILES
+    PERFORMANCE_PROFILE = "available"
+
     def __init__(self, *args, **kwargs):
         super(AvailablePackagesRepository, self).__init__(*args, **kwargs)
 
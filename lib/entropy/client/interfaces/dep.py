@@ -65,8 +65,8 @@ class CalculatorsMixin:
             xdeps = [x for x in xdeps if x not in deps_cache]
             deps_cache.update(xdeps)
 
-            needed_deps = [(x, self.installed_repository().atomMatch(x),) for \
-                x in xdeps]
+            needed_deps = zip(
+                xdeps, self.installed_repository().atomMatchMany(xdeps))
             deps_not_matched |= set(
                 [x for x, (y, z,) in needed_deps if y == -1])
 
@@ -183,12 +183,13 @@ class CalculatorsMixin:
             match_repo = tuple()
 
         cache_key = None
+        inc_cache = None
         if self.xcache and use_cache:
             sha = hashlib.sha1()
 
             cache_fmt = "a{%s}mr{%s}ms{%s}rh{%s}mf{%s}"
             cache_fmt += "ar{%s}m{%s}cm{%s}s{%s;%s;%s}"
-            cache_s = cache_fmt % (
+            cache_args = [
                 atom,
                 ";".join(match_repo),
                 match_slot,
@@ -199,7 +200,8 @@ class CalculatorsMixin:
                 self._settings_client_plugin.packages_configuration_hash(),
                 multi_match,
                 multi_repo,
-                extended_results)
+                extended_results]
+            cache_s = cache_fmt % tuple(cache_args)
             sha.update(const_convert_to_rawstring(cache_s))
 
             cache_key = "atom_match/atom_match_%s" % (sha.hexdigest(),)
@@ -208,6 +210,22 @@ class CalculatorsMixin:
             if cached is not None:
                 return cached
 
+            # the result only depends on the candidates of the atom
+            # key, look it up in the incremental solver cache, which
+            # survives repository updates not touching them
+            pkg_key = self._solver_match_key(atom)
+            if pkg_key is not None and self._solver_cache_enabled():
+                cache_args[0] = ""
+                cache_args[3] = ";".join(
+                    self._settings['repositories']['order'])
+                inc_cache_key, inc_cache = self._solver_cache_get(
+                    "match", cache_fmt % tuple(cache_args))
+                key_digest = self._solver_key_digests().get(pkg_key)
+                entry = inc_cache.get(atom)
+                if entry is not None and entry[1] == key_digest:
+                    self._cacher.push(cache_key, entry[2])
+                    return entry[2]
+
         valid_repos = self._enabled_repos
         if match_repo and (type(match_repo) in (list, tuple, set)):
             valid_repos = list(match_repo)
@@ -338,6 +356,10 @@ class CalculatorsMixin:
 
         if cache_key is not None:
             self._cacher.push(cache_key, dbpkginfo)
+        if inc_cache is not None:
+            with self._solver_cache_lock:
+                inc_cache[atom] = (pkg_key, key_digest, dbpkginfo)
+                self._solver_cache_dirty.add(inc_cache_key)
 
         return dbpkginfo
 
@@ -435,6 +457,49 @@ class CalculatorsMixin:
 
         return matches
 
+    def atom_search_ranked(self, keyword, repositories = None, limit = None):
+        """
+        Search packages by name, category and description inside all the
+        available repositories, including the installed packages one,
+        using their full-text search index (when available, see
+        EntropyRepositoryBase.searchPackagesRanked()). Unlike atom_search(),
+        results are ordered by decreasing relevance, which makes this
+        method suitable for search-as-you-type frontends. Results of equal
+        relevance follow the repositories order.
+
+        @param keyword: free text to search, every word must match
+        @type keyword: string
+        @keyword repositories: list of repository identifiers to search
+            packages into
+        @type repositories: list
+        @keyword limit: maximum number of package matches to return
+        @type limit: int
+        @return: list of package matches (pkg_id_int, repo_string)
+        @rtype: list
+        """
+        if repositories is None:
+            repositories = self.repositories()[:]
+            repositories.insert(0, InstalledPackagesRepository.NAME)
+
+        ranked = []
+        for repo_idx, repository in enumerate(repositories):
+
+            try:
+                repo = self.open_repository(repository)
+            except (RepositoryError, SystemDatabaseError):
+                # ouch, repository not available or corrupted !
+                continue
+
+            for pkg_id, relevance in repo.searchPackagesRanked(
+                    keyword, limit = limit):
+                ranked.append((-relevance, repo_idx, pkg_id, repository))
+
+        ranked.sort()
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [(pkg_id, repository) for _rel, _idx, pkg_id, repository
+                in ranked]
+
     def _resolve_or_dependencies(self, dependencies, selected_matches,
                                  _selected_matches_cache = None):
         """
@@ -631,6 +696,146 @@ class CalculatorsMixin:
         return dependency
 
     DISABLE_SLOT_INTERSECTION = os.getenv("ETP_DISABLE_SLOT_INTERSECTION")
+    DISABLE_INCREMENTAL_SOLVER_CACHE = os.getenv(
+        "ETP_DISABLE_INCREMENTAL_SOLVER_CACHE")
+
+    def _solver_cache_enabled(self):
+        """
+        Return whether the incremental solver cache can be used.
+        """
+        return self.xcache and self.DISABLE_INCREMENTAL_SOLVER_CACHE is None
+
+    def _solver_key_digests(self):
+        """
+        Return a dict mapping package keys to the digest of their matching
+        candidates: the packages with that key in the installed packages
+        repository and in every enabled repository, in repository order.
+        Keys without packages are not in the dict.
+
+        This is what the incremental solver cache is validated against.
+        A repository update only invalidates the entries of the package
+        keys it touched, while inst_repo.generation() and
+        repositories_checksum() change as a whole. The digests of every
+        repository are cached by repository generation.
+        """
+        repos = [(InstalledPackagesRepository.NAME,
+                  self.installed_repository())]
+        for repository_id in self._settings['repositories']['order']:
+            if repository_id not in self._enabled_repos:
+                continue
+            try:
+                repos.append((repository_id,
+                              self.open_repository(repository_id)))
+            except RepositoryError:
+                continue
+
+        repo_keys = []
+        for repository_id, repo in repos:
+            sha = hashlib.sha1()
+            sha.update(const_convert_to_rawstring("%s|%s|v1" % (
+                        repository_id, repo.generation())))
+            repo_keys.append("solver/keys_%s" % (sha.hexdigest(),))
+        state = tuple(repo_keys)
+
+        with self._solver_cache_lock:
+            cached = self._solver_cache.get("digests")
+            if cached is not None and cached[0] == state:
+                return cached[1]
+
+            candidates = {}
+            for (repository_id, repo), cache_key in zip(repos, repo_keys):
+                repo_digests = self._solver_cache.get(cache_key)
+                if repo_digests is None:
+                    repo_digests = self._cacher.pop(cache_key)
+                if repo_digests is None:
+                    repo_digests = repo.packageKeyDigests()
+                    self._cacher.push(cache_key, repo_digests)
+                self._solver_cache[cache_key] = repo_digests
+
+                for key, digest in repo_digests.items():
+                    obj = candidates.setdefault(key, [])
+                    obj.append("%s:%s" % (repository_id, digest))
+
+            # drop the digests of older repository generations
+            for cache_key in list(self._solver_cache.keys()):
+                if cache_key.startswith("solver/keys_") and \
+                        cache_key not in state:
+                    del self._solver_cache[cache_key]
+
+            digests = {}
+            for key, items in candidates.items():
+                digests[key] = hashlib.md5(const_convert_to_rawstring(
+                    ";".join(items))).hexdigest()
+
+            self._solver_cache["digests"] = (state, digests)
+            return digests
+
+    def _solver_cache_get(self, kind, cache_s):
+        """
+        Return the incremental solver cache of the given kind for the
+        settings described by cache_s, a (cache_key, dict) tuple. The dict
+        maps cached objects (dependency strings, package identifiers) to
+        (package key, package key digest, outcome...) tuples, entries are
+        valid as long as the digest matches _solver_key_digests().
+        """
+        sha = hashlib.sha1()
+        sha.update(const_convert_to_rawstring(cache_s))
+        cache_key = "solver/%s_%s" % (kind, sha.hexdigest())
+
+        with self._solver_cache_lock:
+            data = self._solver_cache.get(cache_key)
+            if data is None:
+                data = self._cacher.pop(cache_key)
+                if not isinstance(data, dict):
+                    data = {}
+                self._solver_cache[cache_key] = data
+            return cache_key, data
+
+    def _solver_cache_sync(self):
+        """
+        Store the modified incremental solver caches, dropping the
+        entries that are no longer valid.
+        """
+        with self._solver_cache_lock:
+            if not self._solver_cache_dirty:
+                return
+            digests = self._solver_key_digests()
+            for cache_key in self._solver_cache_dirty:
+                data = self._solver_cache.get(cache_key)
+                if data is None:
+                    continue
+                for obj, entry in list(data.items()):
+                    if digests.get(entry[0]) != entry[1]:
+                        del data[obj]
+                # the cacher writes asynchronously, give it a copy
+                self._cacher.push(cache_key, data.copy())
+            self._solver_cache_dirty.clear()
+
+    def _solver_dependency_key(self, dependency):
+        """
+        Return the package key the given dependency string outcome depends
+        on, or None if it cannot be cached incrementally (old-style virtual
+        packages, satisfied by any package providing them).
+        """
+        if dependency.startswith("!"):
+            dependency = dependency[1:]
+        if entropy.dep.dep_getcat(dependency) == \
+                EntropyRepositoryBase.VIRTUAL_META_PACKAGE_CATEGORY:
+            return None
+        return entropy.dep.dep_getkey(dependency)
+
+    def _solver_match_key(self, atom):
+        """
+        Return the package key the atom_match() outcome of the given atom
+        depends on, or None if it cannot be cached incrementally ("or"
+        dependencies, atoms without category).
+        """
+        if atom.endswith(etpConst['entropyordepquestion']):
+            return None
+        pkg_key = self._solver_dependency_key(atom)
+        if pkg_key is None or "/" not in pkg_key:
+            return None
+        return pkg_key
 
     def _get_unsatisfied_dependencies(self, dependencies, deep_deps = False,
                                       relaxed_deps = False, depcache = None,
@@ -648,7 +853,7 @@ class CalculatorsMixin:
             cache_s = "%s|%s|%s|%s|%s|%s|%s|%s|%s|%s|v7" % (
                 ";".join(sorted(dependencies)),
                 deep_deps,
-                inst_repo.checksum(),
+                inst_repo.generation(),
                 self.repositories_checksum(),
                 self._settings.packages_configuration_hash(),
                 self._settings_client_plugin.packages_configuration_hash(),
@@ -676,9 +881,43 @@ class CalculatorsMixin:
         if depcache is None:
             depcache = {}
 
+        # incremental solver cache, the outcome of every dependency
+        # is valid as long as the candidates of its package key are
+        # the same
+        inc_cache = None
+        inc_hits = {}
+        inc_outcomes = {}
+        # the dependency being analyzed, as passed by the caller
+        inc_current = [None]
+        if self._solver_cache_enabled():
+            inc_cache_key, inc_cache = self._solver_cache_get("unsat",
+                "%s|%s|%s|%s|%s|%s|%s|%s|%s|v1" % (
+                    deep_deps,
+                    self._settings.packages_configuration_hash(),
+                    self._settings_client_plugin.packages_configuration_hash(),
+                    ";".join(sorted(
+                        self._settings['repositories']['available'])),
+                    self._settings['repositories']['branch'],
+                    relaxed_deps,
+                    ignore_spm_downgrades,
+                    match_repo,
+                    self.DISABLE_SLOT_INTERSECTION))
+            key_digests = self._solver_key_digests()
+            for dependency in dependencies:
+                if dependency in depcache:
+                    continue
+                entry = inc_cache.get(dependency)
+                if entry is None:
+                    continue
+                pkg_key, digest, final_dependency, is_unsat = entry
+                if key_digests.get(pkg_key) == digest:
+                    inc_hits[dependency] = (final_dependency, is_unsat)
+
         def push_to_cache(dependency, is_unsat):
             # push to cache
             depcache[dependency] = is_unsat
+            if inc_current[0] is not None:
+                inc_outcomes[inc_current[0]] = (dependency, is_unsat)
 
         def _my_get_available_tags(dependency, installed_tags):
             available_tags = set()
@@ -704,6 +943,18 @@ class CalculatorsMixin:
                 return True
             return False
 
+        # match everything against the installed packages repository
+        # at once, the loop below only deals with the outcome.
+        pending = [x for x in dependencies if x not in depcache
+                   and x not in inc_hits]
+        conflict_deps = [x[1:] for x in pending if x.startswith("!")]
+        conflict_matches = dict(zip(
+            conflict_deps, inst_repo.atomMatchMany(conflict_deps)))
+        pending = [x for x in pending if not x.startswith("!")]
+        installed_matches = dict(zip(
+            pending, inst_repo.atomMatchMany(pending, multiMatch = True)))
+        del pending
+
         unsatisfied = set()
         for dependency in dependencies:
 
@@ -719,10 +970,20 @@ class CalculatorsMixin:
                     const_debug_write(__name__, "...")
                 continue
 
+            inc_hit = inc_hits.get(dependency)
+            if inc_hit is not None:
+                final_dependency, is_unsat = inc_hit
+                if is_unsat:
+                    unsatisfied.add(final_dependency)
+                inc_current[0] = None
+                push_to_cache(final_dependency, is_unsat)
+                continue
+            if inc_cache is not None:
+                inc_current[0] = dependency
+
             ### conflict
             if dependency.startswith("!"):
-                package_id, rc = inst_repo.atomMatch(
-                    dependency[1:])
+                package_id, rc = conflict_matches[dependency[1:]]
                 if package_id != -1:
                     if const_debug_enabled():
                         const_debug_write(
@@ -739,8 +1000,7 @@ class CalculatorsMixin:
                 push_to_cache(dependency, False)
                 continue
 
-            c_ids, c_rc = inst_repo.atomMatch(dependency,
-                multiMatch = True)
+            c_ids, c_rc = installed_matches[dependency]
             if c_rc != 0:
 
                 # check if dependency can be matched in available repos and
@@ -1041,6 +1301,16 @@ class CalculatorsMixin:
             unsatisfied.add(dependency)
             push_to_cache(dependency, True)
 
+        if inc_outcomes:
+            for dependency, outcome in inc_outcomes.items():
+                pkg_key = self._solver_dependency_key(dependency)
+                if pkg_key is None:
+                    continue
+                inc_cache[dependency] = (pkg_key, key_digests.get(pkg_key)) \
+                    + outcome
+            with self._solver_cache_lock:
+                self._solver_cache_dirty.add(inc_cache_key)
+
         if self.xcache:
             self._cacher.push(cache_key, unsatisfied)
 
@@ -1290,6 +1560,10 @@ class CalculatorsMixin:
                 "generate_dependency_tree POST dependencies ADDED => %s" % (
                     post_deps,))
 
+        if recursive:
+            self._prefetch_repository_matches(
+                list(myundeps) + list(post_deps))
+
         deps = set()
         for unsat_dep in myundeps:
             match_pkg_id, match_repo_id = self.atom_match(unsat_dep)
@@ -1317,6 +1591,33 @@ class CalculatorsMixin:
 
         return deps, post_deps_matches
 
+    def _prefetch_repository_matches(self, dependencies):
+        """
+        Match the given dependencies in bulk against every enabled
+        repository using atomMatchMany(), so that the atomMatch() calls
+        issued by atom_match() afterwards hit the repository cache.
+        Repositories without caching are skipped, there would be nothing
+        to gain.
+
+        @param dependencies: list of dependency strings
+        @type dependencies: list
+        """
+        if len(dependencies) < 2:
+            return
+
+        for repository_id in self._enabled_repos:
+            try:
+                repo = self.open_repository(repository_id)
+            except (RepositoryError, SystemDatabaseError):
+                continue
+            if not repo.caching():
+                continue
+            try:
+                repo.atomMatchMany(dependencies)
+            except (OperationalError, DatabaseError):
+                # atom_match() will deal with it
+                continue
+
     def _generate_dependency_inverse_conflicts(self, package_match,
                                                just_id = False):
         """
@@ -1888,7 +2189,7 @@ class CalculatorsMixin:
             cache_s = "%s|%s|%s|%s|%s|%s|%s|%s|r8" % (
                 match,
                 installed_package_id,
-                inst_repo.checksum(),
+                inst_repo.generation(),
                 self.repositories_checksum(),
                 self._settings.packages_configuration_hash(),
                 self._settings_client_plugin.packages_configuration_hash(),
@@ -2184,7 +2485,7 @@ class CalculatorsMixin:
                 build_deps,
                 only_deps,
                 recursive,
-                inst_repo.checksum(),
+                inst_repo.generation(),
                 self.repositories_checksum(),
                 self._settings.packages_configuration_hash(),
                 self._settings_client_plugin.packages_configuration_hash(),
@@ -2272,13 +2573,14 @@ class CalculatorsMixin:
 
             deptree_conflicts |= conflicts
 
+        self._solver_cache_sync()
+
         if deps_not_found:
             graph.destroy()
             raise DependenciesNotFound(deps_not_found)
 
         # get adjacency map before it gets destroyed by solve()
-        adj_map = dict((x.item(), set(k.item() for k in y)) \
-            for x, y in graph.get_adjacency_map().items())
+        adj_map = graph.get_item_adjacency_map()
         # solve depgraph and append conflicts
         deptree = graph.solve()
         if 0 in deptree:
@@ -2387,7 +2689,7 @@ class CalculatorsMixin:
 
         inst_repo = self.installed_repository()
         cache_s = "%s|%s|v1" % (
-            inst_repo.checksum(),
+            inst_repo.generation(),
             self._settings['repositories']['branch'])
 
         sha.update(const_convert_to_rawstring(cache_s))
@@ -2474,7 +2776,7 @@ class CalculatorsMixin:
                 empty,
                 system_packages,
                 elf_needed_scanning,
-                inst_repo.checksum(),
+                inst_repo.generation(),
                 self.repositories_checksum(),
                 self._settings.packages_configuration_hash(),
                 self._settings_client_plugin.packages_configuration_hash(),
@@ -3024,7 +3326,7 @@ class CalculatorsMixin:
 
         cache_s = "%s|%s|%s|%s|%s|%s|%s|%s|v5" % (
             enabled_repos,
-            inst_repo.checksum(),
+            inst_repo.generation(),
             self.repositories_checksum(),
             self._settings.packages_configuration_hash(),
                 self._settings_client_plugin.packages_configuration_hash(),
@@ -3168,7 +3470,7 @@ class CalculatorsMixin:
         cache_s = "%s|%s|%s|%s|%s|%s|%s|%s|%s|%s|v7" % (
             empty,
             enabled_repos,
-            inst_repo.checksum(),
+            inst_repo.generation(),
             self.repositories_checksum(),
             self._settings.packages_configuration_hash(),
             self._settings_client_plugin.packages_configuration_hash(),
@@ -3211,6 +3513,37 @@ class CalculatorsMixin:
         spm_fine = collections.deque()
         update = set()
 
+        # incremental solver cache, the outcome of every installed package
+        # is valid as long as the candidates of its package key are the same
+        inc_cache = None
+        if use_cache and self._solver_cache_enabled():
+            inc_cache_key, inc_cache = self._solver_cache_get("updates",
+                "%s|%s|%s|%s|%s|%s|%s|%s|v1" % (
+                    empty,
+                    enabled_repos,
+                    self._settings.packages_configuration_hash(),
+                    self._settings_client_plugin.packages_configuration_hash(),
+                    ";".join(sorted(
+                        self._settings['repositories']['available'])),
+                    repo_order,
+                    ignore_spm_downgrades,
+                    self._settings['repositories']['branch']))
+            key_digests = self._solver_key_digests()
+
+        def _outcome(kind, value):
+            if kind == "update":
+                update.add(value)
+            elif kind == "fine":
+                fine.append(value)
+            elif kind == "spm_fine":
+                fine.append(value[0])
+                spm_fine.append(value[1])
+            elif kind == "remove":
+                remove.append(value)
+            if inc_cache is not None:
+                inc_cache[package_id] = (cl_pkgkey,
+                    key_digests.get(cl_pkgkey), kind, value)
+
         while True:
             try:
                 package_id = package_ids.pop()
@@ -3246,6 +3579,14 @@ class CalculatorsMixin:
             except TypeError:
                 # check against broken entries, or removed during iteration
                 continue
+
+            if inc_cache is not None:
+                entry = inc_cache.get(package_id)
+                if entry is not None and entry[0] == cl_pkgkey \
+                        and entry[1] == key_digests.get(cl_pkgkey):
+                    _outcome(entry[2], entry[3])
+                    continue
+
             use_match_cache = True
             do_continue = False
 
@@ -3315,26 +3656,26 @@ class CalculatorsMixin:
                 tag = match[0][2]
                 revision = match[0][3]
                 if empty:
-                    update.add((m_package_id, repoid))
+                    _outcome("update", (m_package_id, repoid))
                     continue
                 if cl_revision != revision:
                     # different revision
                     if cl_revision == etpConst['spmetprev'] \
                             and ignore_spm_downgrades:
                         # no difference, we're ignoring revision 9999
-                        fine.append(cl_atom)
-                        spm_fine.append((m_package_id, repoid))
+                        _outcome("spm_fine",
+                                 (cl_atom, (m_package_id, repoid)))
                         continue
                     else:
-                        update.add((m_package_id, repoid))
+                        _outcome("update", (m_package_id, repoid))
                         continue
                 elif (cl_version != version):
                     # different versions
-                    update.add((m_package_id, repoid))
+                    _outcome("update", (m_package_id, repoid))
                     continue
                 elif (cl_tag != tag):
                     # different tags
-                    update.add((m_package_id, repoid))
+                    _outcome("update", (m_package_id, repoid))
                     continue
                 else:
 
@@ -3355,11 +3696,11 @@ class CalculatorsMixin:
                             if (r_digest != c_digest) and \
                                (r_digest is not None) \
                                and (c_digest is not None):
-                                update.add((m_package_id, repoid))
+                                _outcome("update", (m_package_id, repoid))
                                 continue
 
                     # no difference
-                    fine.append(cl_atom)
+                    _outcome("fine", cl_atom)
                     continue
 
             # don't take action if it's just masked
@@ -3367,7 +3708,9 @@ class CalculatorsMixin:
                 cl_pkgkey, match_slot = cl_slot,
                 mask_filter = False, match_repo = match_repos)
             if maskedresults[0] == -1:
-                remove.append(package_id)
+                _outcome("remove", package_id)
+            else:
+                _outcome(None, None)
 
         # validate remove, do not return installed packages that are
         # still referenced by others as "removable"
@@ -3395,6 +3738,11 @@ class CalculatorsMixin:
             'critical_found': False,
             }
 
+        if inc_cache is not None:
+            with self._solver_cache_lock:
+                self._solver_cache_dirty.add(inc_cache_key)
+        self._solver_cache_sync()
+
         if self.xcache:
             self._cacher.push(cache_key, outcome, async_mode = False)
             self._cacher.sync()
@@ -3576,7 +3924,7 @@ class CalculatorsMixin:
             cache_s = "{%s;%s;%s;%s;%s;%s;%s}v5" % (
                 atom,
                 deep,
-                inst_repo.checksum(),
+                inst_repo.generation(),
                 self.repositories_checksum(),
                 self._settings.packages_configuration_hash(),
                 self._settings_client_plugin.packages_configuration_hash(),
@@ -31,7 +31,8 @@ from entropy.const import etpConst, const_debug_write, etpSys, \
     const_setup_file, initconfig_entropy_constants, const_pid_exists, \
     const_setup_perms, const_isstring, const_convert_to_unicode, \
     const_isnumber, const_convert_to_rawstring, const_mkdtemp, \
-    const_mkstemp, const_file_readable, const_file_writable
+    const_mkstemp, const_file_readable, const_file_writable, \
+    const_is_python3
 from entropy.exceptions import RepositoryError, SystemDatabaseError, \
     RepositoryPluginError, SecurityError, EntropyPackageException
 from entropy.db.skel import EntropyRepositoryBase
@@ -987,7 +988,8 @@ class RepositoryMixin:
 
     def repositories_checksum(self):
         """
-        Return a SHA1 of the checksums and mtimes of all the repositories.
+        Return a SHA1 of the generation stamps and mtimes of all the
+        repositories.
 
         This method can be used for cache validation/lookup purposes.
 
@@ -1005,7 +1007,7 @@ class RepositoryMixin:
         for repository_id in repository_ids:
 
             mtime = None
-            checksum = None
+            generation = None
 
             try:
                 repo = self.open_repository(repository_id)
@@ -1019,11 +1021,11 @@ class RepositoryMixin:
                     pass
 
                 try:
-                    checksum = repo.checksum()
+                    generation = repo.generation()
                 except EntropyRepositoryError:
                     pass
 
-            cache_s = "{%s:{%r;%s}}" % (repository_id, mtime, checksum)
+            cache_s = "{%s:{%r;%s}}" % (repository_id, mtime, generation)
             sha.update(const_convert_to_rawstring(cache_s))
 
         sha.update(const_convert_to_rawstring("-end-"))
@@ -1301,7 +1303,6 @@ class RepositoryMixin:
         @keyword silent: execute in silent mode if True
         @type silent: bool
         """
-        # uncompress the backup
         if not silent:
             mytxt = "%s: %s => %s ..." % (
                 darkgreen(_("Restoring backed up repository")),
@@ -1315,21 +1316,27 @@ class RepositoryMixin:
                 header = blue(" @@ "),
                 back = True
             )
-        uncompressed_backup_path = backup_path[:-len(".bz2")]
+        # the backup is imported while being decompressed
         try:
-            entropy.tools.uncompress_file(backup_path, uncompressed_backup_path,
-                bz2.BZ2File)
+            backup_f = bz2.BZ2File(backup_path, "rb")
         except (IOError, OSError):
             if not silent:
                 entropy.tools.print_traceback()
             return False, _("Unable to unpack")
 
+        # the live repository must be closed before being replaced,
+        # it is reopened on demand
+        if os.path.realpath(repository_path) == os.path.realpath(
+                self.installed_repository_path()):
+            self.close_installed_repository()
+
         repo_class = self.get_repository(repository_id)
         try:
-            repo_class.importRepository(uncompressed_backup_path,
-                repository_path)
+            rc = repo_class.importRepository(backup_f, repository_path)
         finally:
-            os.remove(uncompressed_backup_path)
+            backup_f.close()
+        if rc != 0:
+            return False, _("Unable to restore")
         if not silent:
             mytxt = "%s: %s" % (
                 darkgreen(_("Repository restored successfully")),
@@ -1489,6 +1496,7 @@ class RepositoryMixin:
                 successfully_removed.append(repo_pkg)
             except OSError:
                 pass
+            entropy.tools.remove_file_digests(repo_pkg)
 
             for path in glob.iglob(repo_pkg + ".*"):
                 try:
@@ -2173,8 +2181,8 @@ class MiscMixin:
         @type edb: bool
         @keyword fake: create a fake package (empty)
         @type fake: bool
-        @keyword compression: supported compressions: "gz", "bz2" or "" (no
-            compression)
+        @keyword compression: supported compressions: "gz", "bz2", "xz"
+            (Python 3.x only) or "" (no compression)
         @type compression: string
         @keyword shiftpath: if package files are stored into an alternative
             root directory.
@@ -2183,7 +2191,10 @@ class MiscMixin:
         @rtype: string or None
         """
         import tarfile
-        if compression not in ("bz2", "", "gz"):
+        supported_compressions = ["bz2", "", "gz"]
+        if const_is_python3():
+            supported_compressions.append("xz")
+        if compression not in supported_compressions:
             compression = "bz2"
         if shiftpath is None:
             shiftpath = os.path.sep
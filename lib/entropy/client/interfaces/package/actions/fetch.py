@@ -21,6 +21,7 @@ from entropy.client.mirrors import StatusInterface
 from entropy.exceptions import InterruptError
 from entropy.fetchers import UrlFetcher
 from entropy.i18n import _
+from entropy.misc import MultiHasher
 from entropy.output import red, darkred, blue, purple, darkgreen, brown
 from entropy.security import Repository as RepositorySecurity
 
@@ -535,8 +536,12 @@ class _PackageFetchAction(PackageAction):
                 os.remove(xpath)
             except OSError:
                 pass
+            entropy.tools.remove_file_digests(xpath)
 
         def do_get_md5sum(path):
+            digests = entropy.tools.read_file_digests(path)
+            if digests is not None and "md5" in digests:
+                return digests["md5"]
             try:
                 return entropy.tools.md5sum(path)
             except IOError:
@@ -572,7 +577,8 @@ class _PackageFetchAction(PackageAction):
             abort_check_func = fetch_abort_function,
             http_basic_user = basic_user,
             http_basic_pwd = basic_pwd,
-            https_validate_cert = https_validate_cert)
+            https_validate_cert = https_validate_cert,
+            store_digests = True)
 
         if (package_id is not None) and (repository_id is not None):
             self._setup_differential_download(
@@ -1045,10 +1051,33 @@ class _PackageFetchAction(PackageAction):
                 )
             return False
 
+        # package file digests, filled below
+        digests = {}
+
+        def get_digests(hash_types):
+            # use the digests computed while downloading, if still valid,
+            # or read the file just once to calculate all of them
+            stored_digests = entropy.tools.read_file_digests(download_path)
+            if stored_digests is None:
+                stored_digests = {}
+            missing = [x for x in hash_types if x not in stored_digests]
+            if missing:
+                hasher = MultiHasher(missing)
+                hasher.update_from_file(download_path)
+                stored_digests.update(hasher.hexdigests())
+                entropy.tools.store_file_digests(
+                    download_path, stored_digests)
+            return stored_digests
+
+        def do_compare_digest(hash_type):
+            def _compare(pkg_path, hash_val):
+                return digests.get(hash_type) == str(hash_val)
+            return _compare
+
         signature_vry_map = {
-            'sha1': entropy.tools.compare_sha1,
-            'sha256': entropy.tools.compare_sha256,
-            'sha512': entropy.tools.compare_sha512,
+            'sha1': do_compare_digest("sha1"),
+            'sha256': do_compare_digest("sha256"),
+            'sha512': do_compare_digest("sha512"),
             'gpg': do_compare_gpg,
         }
 
@@ -1131,10 +1160,18 @@ class _PackageFetchAction(PackageAction):
             header = red("   ## ")
         )
 
+        # check if package has been already checked
+        mtime_validated = do_mtime_validation() == 0
+        hash_types = ["md5"]
+        if not mtime_validated:
+            hash_types += [x for x in MultiHasher.DIGESTS
+                           if x in enabled_hashes]
+
         download_name = os.path.basename(download_path)
         valid_checksum = False
         try:
-            valid_checksum = entropy.tools.compare_md5(download_path, checksum)
+            digests.update(get_digests(hash_types))
+            valid_checksum = digests["md5"] == str(checksum)
         except (OSError, IOError) as err:
             valid_checksum = False
             const_debug_write(
@@ -1168,9 +1205,8 @@ class _PackageFetchAction(PackageAction):
             )
             return 1
 
-        # check if package has been already checked
         validated = True
-        if do_mtime_validation() != 0:
+        if not mtime_validated:
             validated = do_signatures_validation(signatures) == 0
 
         if not validated:
@@ -13,6 +13,7 @@ import errno
 import os
 import shutil
 import stat
+import tarfile
 import time
 
 from entropy.const import etpConst, const_convert_to_unicode, \
@@ -165,6 +166,12 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
             metadata['merge_from'] = const_convert_to_unicode(mf)
         metadata['removeconfig'] = self._opts.get('removeconfig', False)
 
+        # merge package files straight from the package tarballs?
+        metadata['streaming_merge'] = False
+        if misc_settings['streaming_merge'] and not metadata['merge_from']:
+            metadata['streaming_merge'] = self._streaming_merge_supported(
+                repo)
+
         # collects directories whose content has been modified
         # this information is then handed to the Trigger
         metadata['affected_directories'] = set()
@@ -262,6 +269,26 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
                 break
         return exit_st
 
+    def _streaming_merge_supported(self, repo):
+        """
+        Return whether the package files can be merged to the live
+        filesystem straight from the package tarballs, without unpacking
+        them to the image directory first. This is not possible if the
+        package comes with phases or triggers that run before the install
+        phase and may read or modify the image directory.
+        """
+        if repo.retrieveTrigger(self._package_id):
+            return False
+
+        spm_phases = repo.retrieveSpmPhases(self._package_id)
+        if spm_phases is None:
+            # unknown phases, assume the worst
+            return False
+
+        spm_class = self._entropy.Spm_class()
+        phases_map = spm_class.package_phases_map()
+        return phases_map.get('preinstall') not in spm_phases
+
     def _escape_path(self, path):
         """
         Some applications (like ld) don't like ":" in path, others just don't
@@ -480,6 +507,11 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
                 )
                 return 1
 
+        if self._meta['streaming_merge']:
+            # package files are merged straight from the tarball
+            # during the install phase.
+            return 0
+
         try:
             exit_st = entropy.tools.uncompress_tarball(
                 package_path,
@@ -764,6 +796,10 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
         Execute the tarball file ownership fixup phase.
         New uid or gids could have created after the setup phase.
         """
+        if self._meta['streaming_merge']:
+            # ownership is applied while merging, after the setup phase
+            return 0
+
         # NOTE: fixup permissions in the image directory
         # the setup phase could have created additional users and groups
         package_paths = [self._meta['pkgpath']]
@@ -1484,14 +1520,19 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
     def _handle_install_collision_protect_unlocked(self, inst_repo,
                                                    remove_package_id,
                                                    tofile,
-                                                   todbfile):
+                                                   todbfile,
+                                                   owners = None):
         """
         Handle files collition protection for the install phase.
+        owners, if given, maps the package files to the installed
+        packages owning them, as returned by searchBelongsMany().
         """
-
-        avail = inst_repo.isFileAvailable(
-            const_convert_to_unicode(todbfile),
-            get_id = True)
+        todbfile = const_convert_to_unicode(todbfile)
+        avail = None
+        if owners is not None:
+            avail = owners.get(todbfile)
+        if avail is None:
+            avail = inst_repo.isFileAvailable(todbfile, get_id = True)
 
         if (remove_package_id not in avail) and avail:
             mytxt = darkred(_("Collision found during install for"))
@@ -1533,6 +1574,12 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
         sys_root = self._get_system_root(metadata)
         misc_data = self._entropy.ClientSettings()['misc']
         col_protect = misc_data['collisionprotect']
+        col_owners = None
+        if col_protect > 1:
+            # look up the owners of all the package files at once
+            col_owners = inst_repo.searchBelongsMany(
+                [x for x, _ftype in repo.retrieveContentIter(
+                        self._package_id)])
         splitdebug, splitdebug_dirs = metadata['splitdebug'], \
             metadata['splitdebug_dirs']
         info_dirs = self._get_info_directories()
@@ -1546,27 +1593,31 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
                 from_enctype = etpConst['conf_encoding'])
         movefile = entropy.tools.movefile
 
-        def workout_subdir(currentdir, subdir):
-
-            imagepath_dir = os.path.join(currentdir, subdir)
-            rel_imagepath_dir = imagepath_dir[len(image_dir):]
-            rootdir = sys_root + rel_imagepath_dir
+        def splitdebug_skip(path):
 
             # splitdebug (.debug files) support
-            # If splitdebug is not enabled, do not create splitdebug directories
-            # and move on instead (return)
+            # If splitdebug is not enabled, do not create splitdebug
+            # directories and files and move on instead
             if not splitdebug:
                 for split_dir in splitdebug_dirs:
-                    if rootdir.startswith(split_dir):
+                    if path.startswith(split_dir):
                         # also drop item from content metadata. In this way
                         # SPM has in sync information on what the package
                         # content really is.
                         # ---
                         # we should really use unicode
                         # strings for items_not_installed
-                        unicode_rootdir = const_convert_to_unicode(rootdir)
-                        items_not_installed.add(unicode_rootdir)
-                        return 0
+                        unicode_path = const_convert_to_unicode(path)
+                        items_not_installed.add(unicode_path)
+                        return True
+            return False
+
+        def workout_subdir(imagepath_dir, rel_imagepath_dir):
+
+            rootdir = sys_root + rel_imagepath_dir
+
+            if splitdebug_skip(rootdir):
+                return 0
 
             # handle broken symlinks
             if os.path.islink(rootdir) and not os.path.exists(rootdir):
@@ -1745,13 +1796,9 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
             return 0
 
 
-        def workout_file(currentdir, item):
+        def account_file(rel_fromfile):
 
-            fromfile = os.path.join(currentdir, item)
-            rel_fromfile = fromfile[len(image_dir):]
             rel_fromfile_dir = os.path.dirname(rel_fromfile)
-            tofile = sys_root + rel_fromfile
-
             rel_fromfile_dir_utf = const_convert_to_unicode(
                 rel_fromfile_dir)
             metadata['affected_directories'].add(
@@ -1767,26 +1814,20 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
                             rel_fromfile_utf)
                         break
 
-            # splitdebug (.debug files) support
-            # If splitdebug is not enabled, do not create
-            # splitdebug directories and move on instead (return)
-            if not splitdebug:
-                for split_dir in splitdebug_dirs:
-                    if tofile.startswith(split_dir):
-                        # also drop item from content metadata. In this way
-                        # SPM has in sync information on what the package
-                        # content really is.
-                        # ---
-                        # we should really use unicode
-                        # strings for items_not_installed
-                        unicode_tofile = const_convert_to_unicode(tofile)
-                        items_not_installed.add(unicode_tofile)
-                        return 0
+        def workout_file(fromfile, rel_fromfile, moved_files=None):
+
+            tofile = sys_root + rel_fromfile
+
+            account_file(rel_fromfile)
+
+            if splitdebug_skip(tofile):
+                return 0
 
             if col_protect > 1:
-                todbfile = fromfile[len(image_dir):]
+                todbfile = rel_fromfile
                 myrc = self._handle_install_collision_protect_unlocked(
-                    inst_repo, remove_package_id, tofile, todbfile)
+                    inst_repo, remove_package_id, tofile, todbfile,
+                    owners = col_owners)
                 if not myrc:
                     return 0
 
@@ -1990,6 +2031,9 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
             item_inst = const_convert_to_unicode(item_inst)
             items_installed.add(item_inst)
 
+            if moved_files is not None:
+                moved_files[rel_fromfile] = tofile
+
             if protected and \
                     os.getenv("ENTROPY_CLIENT_ENABLE_OLD_FILEUPDATES"):
                 # add to disk cache
@@ -1998,18 +2042,194 @@ class _PackageInstallAction(_PackageInstallRemoveAction):
 
             return 0
 
+        if metadata['streaming_merge']:
+            return self._stream_packages_to_system_unlocked(
+                sys_root, workout_subdir, workout_file,
+                account_file, splitdebug_skip)
+
         # merge data into system
         for currentdir, subdirs, files in os.walk(image_dir):
 
             # create subdirs
             for subdir in subdirs:
-                exit_st = workout_subdir(currentdir, subdir)
+                imagepath_dir = os.path.join(currentdir, subdir)
+                exit_st = workout_subdir(
+                    imagepath_dir, imagepath_dir[len(image_dir):])
                 if exit_st != 0:
                     return exit_st
 
             for item in files:
-                move_st = workout_file(currentdir, item)
+                fromfile = os.path.join(currentdir, item)
+                move_st = workout_file(
+                    fromfile, fromfile[len(image_dir):])
                 if move_st != 0:
                     return move_st
 
         return 0
+
+    def _stream_packages_to_system_unlocked(self, sys_root, workout_subdir,
+                                            workout_file, account_file,
+                                            splitdebug_skip):
+        """
+        Streaming merge counterpart of the image directory walk done by
+        _move_image_to_system_unlocked(): merge the package tarball members
+        straight to the live filesystem, in archive order, skipping the
+        image directory. Every member is extracted to a temporary path
+        next to its final location (thus on the same filesystem) and
+        handed to workout_subdir() or workout_file(), which take the usual
+        per-file decisions (config protection, collision protection,
+        splitdebug) and atomically rename it into place.
+        The temporary path of the member being merged is removed if the
+        merge fails or gets interrupted, leaving the live filesystem and
+        the installed packages repository in the same state an
+        interrupted image directory merge would.
+        """
+        package_paths = [self._meta['pkgpath']]
+        for extra_download in self._meta['extra_download']:
+            package_paths.append(
+                self.get_standard_fetch_disk_path(extra_download['download']))
+
+        # relative paths of the directories already merged
+        merged_dirs = set([os.path.sep])
+        # relative path -> live path of the files already merged,
+        # used to merge hard links
+        moved_files = {}
+
+        def _temp_path(path):
+            return "%s#entropy_new_%s" % (
+                path, entropy.tools.get_random_number(),)
+
+        def _remove_temp_path(tmp_path):
+            try:
+                if os.path.isdir(tmp_path) and not os.path.islink(tmp_path):
+                    os.rmdir(tmp_path)
+                else:
+                    os.remove(tmp_path)
+            except OSError as err:
+                if err.errno != errno.ENOENT:
+                    raise
+
+        def _merge_dir(rel_path, extract_func):
+            tmp_path = _temp_path(sys_root + rel_path)
+            try:
+                extract_func(tmp_path)
+                exit_st = workout_subdir(tmp_path, rel_path)
+            finally:
+                _remove_temp_path(tmp_path)
+            merged_dirs.add(rel_path)
+            return exit_st
+
+        def _merge_parent_dirs(rel_path):
+            # directories missing from the tarball get the same
+            # default metadata they would get in the image directory
+            missing = []
+            rel_dir = os.path.dirname(rel_path)
+            while rel_dir not in merged_dirs:
+                missing.append(rel_dir)
+                rel_dir = os.path.dirname(rel_dir)
+            for rel_dir in reversed(missing):
+                exit_st = _merge_dir(
+                    rel_dir, lambda tmp_path: os.mkdir(tmp_path, 0o755))
+                if exit_st != 0:
+                    return exit_st
+            return 0
+
+        def _merge_member(tar, tarinfo, link_targets):
+            rel_path = os.path.normpath(
+                os.path.join(os.path.sep, tarinfo.name))
+            if rel_path in merged_dirs:
+                return 0
+
+            root_path = sys_root + rel_path
+            if splitdebug_skip(root_path):
+                if not tarinfo.isdir():
+                    account_file(rel_path)
+                return 0
+
+            exit_st = _merge_parent_dirs(rel_path)
+            if exit_st != 0:
+                return exit_st
+
+            if tarinfo.isdir():
+                return _merge_dir(
+                    rel_path,
+                    lambda tmp_path: entropy.tools.extract_tarball_member(
+                        tar, tarinfo, tmp_path))
+
+            tmp_path = _temp_path(root_path)
+            try:
+                linked_path = None
+                if tarinfo.islnk():
+                    linked_path = moved_files.get(os.path.normpath(
+                        os.path.join(os.path.sep, tarinfo.linkname)))
+                try:
+                    if linked_path is None:
+                        raise OSError(errno.ENOENT, "not merged")
+                    os.link(linked_path, tmp_path)
+                except OSError:
+                    entropy.tools.extract_tarball_member(
+                        tar, tarinfo, tmp_path,
+                        link_targets = link_targets)
+
+                if tarinfo.issym() and os.path.isdir(tmp_path):
+                    # symlinks to directories are handled like
+                    # os.walk() does in the image directory
+                    exit_st = workout_subdir(tmp_path, rel_path)
+                    merged_dirs.add(rel_path)
+                else:
+                    exit_st = workout_file(
+                        tmp_path, rel_path, moved_files = moved_files)
+            finally:
+                # not merged (protected, colliding, etc) or failure
+                _remove_temp_path(tmp_path)
+
+            return exit_st
+
+        for package_path in package_paths:
+            lock = None
+            members = None
+            try:
+                lock = self.path_lock(package_path)
+                with lock.shared():
+
+                    if not self._stat_path(package_path):
+                        const_debug_write(
+                            __name__,
+                            "_stream_packages_to_system_unlocked: "
+                            "%s vanished" % (package_path,))
+                        return 2
+
+                    members = entropy.tools.iter_tarball_members(
+                        package_path)
+                    for tar, tarinfo, link_targets in members:
+                        exit_st = _merge_member(tar, tarinfo, link_targets)
+                        if exit_st != 0:
+                            return exit_st
+
+            except (EOFError, tarfile.ExtractError, IOError) as err:
+                self._entropy.logger.log(
+                    "[Package]",
+                    etpConst['logging']['normal_loglevel_id'],
+                    "Error while merging %s: %s" % (
+                        package_path, repr(err),)
+                )
+                mytxt = "%s: %s, %s" % (
+                    _("Unable to merge package file"),
+                    const_convert_to_unicode(package_path),
+                    err,
+                )
+                self._entropy.output(
+                    darkred(mytxt),
+                    importance = 1,
+                    level = "error",
+                    header = red(" !!! ")
+                )
+                return 4
+
+            finally:
+                if members is not None:
+                    members.close()
+                if lock is not None:
+                    lock.close()
+
+        return 0
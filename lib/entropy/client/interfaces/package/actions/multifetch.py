@@ -488,7 +488,8 @@ class _PackageMultiFetchAction(_PackageFetchAction):
             post_download_hook = post_download_hook,
             http_basic_user = basic_user,
             http_basic_pwd = basic_pwd,
-            https_validate_cert = https_validate_cert)
+            https_validate_cert = https_validate_cert,
+            store_digests = True)
         try:
             # make sure that we don't need to abort already
             # doing the check here avoids timeouts
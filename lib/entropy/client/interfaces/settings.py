@@ -386,12 +386,14 @@ class ClientSystemSettingsPlugin(SystemSettingsPlugin):
             'splitdebug': etpConst['splitdebug'],
             'splitdebug_dirs': etpConst['splitdebug_dirs'],
             'multifetch': 1,
+            'fetch_pipeline': 0, # disabled by default
             'collisionprotect': etpConst['collisionprotect'],
             'configprotect': set(),
             'configprotectmask': set(),
             'configprotectskip': set(),
             'autoprune_days': None, # disabled by default
             'edelta_support': False, # disabled by default
+            'streaming_merge': False, # disabled by default
         }
 
         cli_conf = ClientSystemSettingsPlugin.client_conf_path()
@@ -439,6 +441,22 @@ class ClientSystemSettingsPlugin(SystemSettingsPlugin):
                 if bool_setting:
                     data['multifetch'] = 3
 
+        def _fetch_pipeline(setting):
+            int_setting = entropy.tools.setting_to_int(setting, 0, 100)
+            bool_setting = entropy.tools.setting_to_bool(setting)
+            if int_setting is not None:
+                data['fetch_pipeline'] = int_setting
+            elif bool_setting is not None:
+                if bool_setting:
+                    data['fetch_pipeline'] = 5
+                else:
+                    data['fetch_pipeline'] = 0
+
+        def _streaming_merge(setting):
+            bool_setting = entropy.tools.setting_to_bool(setting)
+            if bool_setting is not None:
+                data['streaming_merge'] = bool_setting
+
         def _gpg(setting):
             bool_setting = entropy.tools.setting_to_bool(setting)
             if bool_setting is not None:
@@ -485,6 +503,8 @@ class ClientSystemSettingsPlugin(SystemSettingsPlugin):
             'packagehashes': _packagehashes,
             'package-hashes': _packagehashes,
             'multifetch': _multifetch,
+            'fetch-pipeline': _fetch_pipeline,
+            'streaming-merge': _streaming_merge,
             'gpg': _gpg,
             'ignore-spm-downgrades': _spm_downgrades,
             'splitdebug': _splitdebug,
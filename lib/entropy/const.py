@@ -404,6 +404,12 @@ def const_default_settings(rootdir):
         'etpdatabasedumplighthashfilebz2': default_etp_dbfile+".dumplight.bz2.md5",
         'etpdatabasedumplighthashfilegzip': default_etp_dbfile+".dumplight.gz.md5",
         'etpdatabasedumplight': default_etp_dbfile+".dumplight",
+        # EAPI4 repository changesets index, one changeset per line
+        'etpdatabasechangesetsfile': default_etp_dbfile+".changesets",
+        # EAPI4 changeset file, from revision, to revision, compression format
+        'etpdatabasechangesetfile': default_etp_dbfile+".changeset.%d-%d.%s",
+        # server-side status of the last published changeset (not uploaded)
+        'etpdatabasechangesetsstatefile': default_etp_dbfile+".changesets.state",
         # expiration based server-side packages removal
 
         'etpdatabaseexpbasedpkgsrm': default_etp_dbfile+".fatscope",
@@ -484,6 +490,9 @@ def const_default_settings(rootdir):
         'packagehashes': ("sha1", "sha256", "sha512", "gpg"),
         # Used by Entropy client to override some digest checks
         'packagemtimefileext': ".mtime",
+        # Extension of the file that contains the digests of its related
+        # package file, computed while downloading it
+        'packagedigestsfileext': ".digests",
         # Extension of the file that "contains" expiration mtime
         'packagesexpirationfileext': ".expired",
         # Extension of the file that contains package file
@@ -543,7 +552,7 @@ def const_default_settings(rootdir):
         # Entropy database API revision
         'etpapi': etpSys['api'],
         # Entropy database API currently supported
-        'supportedapis': (1, 2, 3),
+        'supportedapis': (1, 2, 3, 4),
         # contains the current running architecture
         'currentarch': etpSys['arch'],
         # Entropy supported Archs
@@ -562,6 +571,10 @@ def const_default_settings(rootdir):
         'officialrepositoryid': "sabayonlinux.org",
         # tag to append to .tbz2 file before entropy database (must be 32bytes)
         'databasestarttag': "|ENTROPY:PROJECT:DB:MAGIC:START|",
+        # tag of the fixed size trailer appended to .tbz2 files after the
+        # entropy database, followed by the 16 hex digits database offset
+        # and by "|"
+        'databaseoffsettag': "|ENTROPY:PROJECT:DB:MAGIC:OFFSET:",
         # option to keep a backup of config files after
         # being overwritten by equo conf update
         'filesbackup': True,
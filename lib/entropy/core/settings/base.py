@@ -1894,6 +1894,7 @@ class SystemSettings(Singleton, EntropyPluginStore):
             'security_advisories_url': etpConst['securityurl'],
             'developer_repo': False,
             'differential_update': True,
+            'changesets_max_chain': 16,
         }
 
         enc = etpConst['conf_encoding']
@@ -1980,6 +1981,12 @@ class SystemSettings(Singleton, EntropyPluginStore):
             if bool_setting is not None:
                 data['differential_update'] = bool_setting
 
+        def _changesets_max_chain(line, setting):
+            try:
+                data['changesets_max_chain'] = int(setting)
+            except ValueError:
+                return
+
         def _down_speed_limit(line, setting):
             data['transfer_limit'] = None
             try:
@@ -2008,6 +2015,7 @@ class SystemSettings(Singleton, EntropyPluginStore):
             'official-repository-id': _offrepoid,
             'developer-repo': _developer_repo,
             'differential-update': _differential_update,
+            'changesets-max-chain': _changesets_max_chain,
             # backward compatibility
             'downloadspeedlimit': _down_speed_limit,
             'download-speed-limit': _down_speed_limit,
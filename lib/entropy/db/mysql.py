@@ -12,6 +12,7 @@
 """
 import os
 import hashlib
+import shutil
 import time
 try:
     import thread
@@ -658,76 +659,36 @@ class EntropyMySQLRepository(EntropySQLRepository):
         """
         Reimplemented from EntropySQLRepository.
         """
-        current_thread = threading.current_thread()
-        c_key = self._cursor_connection_pool_key()
-
-        cursor = None
-        with self._cursor_pool_mutex():
-            threads = set()
-            cursor_pool = self._cursor_pool()
-            cursor_data = cursor_pool.get(c_key)
-            if cursor_data is not None:
-                cursor, threads = cursor_data
-            # handle possible thread ident clashing
-            # in the cleanup thread function, because
-            # thread idents are recycled
-            # on thread termination
-            threads.add(current_thread)
-
-            if cursor is None:
-                conn = self._connection_impl(_from_cursor=True)
-                cursor = conn.cursor()
-                cursor.execute("SET storage_engine=InnoDB;")
-                cursor.execute("SET autocommit=OFF;")
-                cursor = MySQLCursorWrapper(
-                    cursor, self.ModuleProxy.exceptions(),
-                    self.ModuleProxy().errno())
-                cursor_pool[c_key] = cursor, threads
-                self._start_cleanup_monitor(current_thread, c_key)
-
+        pooled = self._connection_pool().checkout(self._connect)
+        cursor = pooled.cursor
+        if cursor is None:
+            cursor = pooled.connection.cursor()
+            cursor.execute("SET storage_engine=InnoDB;")
+            cursor.execute("SET autocommit=OFF;")
+            cursor = MySQLCursorWrapper(
+                cursor, self.ModuleProxy.exceptions(),
+                self.ModuleProxy().errno())
+            pooled.cursor = cursor
         return cursor
 
-    def _connection_impl(self, _from_cursor=False):
+    def _connect(self):
         """
-        Connection getter method implementation, adds
-        _from_cursor argument to avoid calling the
-        cleanup routine if True.
+        Open a new connection to the repository, for the connection pool.
         """
-        current_thread = threading.current_thread()
-        c_key = self._cursor_connection_pool_key()
-
-        conn = None
-        with self._connection_pool_mutex():
-            threads = set()
-            connection_pool = self._connection_pool()
-            conn_data = connection_pool.get(c_key)
-            if conn_data is not None:
-                conn, threads = conn_data
-            # handle possible thread ident clashing
-            # in the cleanup thread function
-            # because thread idents are recycled on
-            # thread termination
-            threads.add(current_thread)
-
-            if conn is None:
-                conn = MySQLConnectionWrapper.connect(
-                    self.ModuleProxy, self._mysql,
-                    MySQLConnectionWrapper,
-                    host = self._host, user = self._user,
-                    passwd = self._password, db = self._db,
-                    port = self._port, autoreconnect = True)
-                connection_pool[c_key] = conn, threads
-                if not _from_cursor:
-                    self._start_cleanup_monitor(current_thread, c_key)
-            else:
-                conn.ping()
-        return conn
+        return MySQLConnectionWrapper.connect(
+            self.ModuleProxy, self._mysql,
+            MySQLConnectionWrapper,
+            host = self._host, user = self._user,
+            passwd = self._password, db = self._db,
+            port = self._port, autoreconnect = True)
 
     def _connection(self):
         """
         Reimplemented from EntropySQLRepository.
         """
-        return self._connection_impl()
+        conn = self._connection_pool().checkout(self._connect).connection
+        conn.ping()
+        return conn
 
     def __show_info(self):
         password = hashlib.new("md5")
@@ -741,8 +702,8 @@ class EntropyMySQLRepository(EntropySQLRepository):
             self._indexing,)
         third_part = ", name: %s, skip_upd: %s, st_upd: %s" % (
             self.name, self._skip_checks, self.__structure_update,)
-        fourth_part = ", conn_pool: %s, cursor_cache: %s>" % (
-            self._connection_pool(), self._cursor_pool(),)
+        fourth_part = ", conn_pool: %s>" % (
+            self._connection_pool().stats(),)
 
         return first_part + second_part + third_part + fourth_part
 
@@ -812,6 +773,7 @@ class EntropyMySQLRepository(EntropySQLRepository):
         Specialized version that only handles UNIQUE
         constraint violations.
         """
+        self._generation_dirty = True
         branchstring = ''
         insertdata = (spm_package_uid, package_id)
         if branch:
@@ -889,9 +851,10 @@ class EntropyMySQLRepository(EntropySQLRepository):
         """
         Reimplemented from EntropyRepositoryBase.
         """
-        dumpfile = os.path.realpath(dumpfile)
-        if not entropy.tools.is_valid_path_string(dumpfile):
-            raise AttributeError("dumpfile value is invalid")
+        if not hasattr(dumpfile, "read"):
+            dumpfile = os.path.realpath(dumpfile)
+            if not entropy.tools.is_valid_path_string(dumpfile):
+                raise AttributeError("dumpfile value is invalid")
         if data is None:
             raise AttributeError(
                 "connection data required (dict)")
@@ -902,15 +865,25 @@ class EntropyMySQLRepository(EntropySQLRepository):
         except KeyError as err:
             raise AttributeError(err)
 
+        args = ("/usr/bin/mysql", "-u", user, "-h", host,
+                "-P", str(port), "-p" + password, "-D", db)
         try:
+            if hasattr(dumpfile, "read"):
+                # compressed dumps cannot be handed over as stdin
+                proc = subprocess.Popen(args, bufsize = -1,
+                    stdin = subprocess.PIPE)
+                try:
+                    shutil.copyfileobj(dumpfile, proc.stdin)
+                except (OSError, IOError, EOFError):
+                    proc.kill()
+                    proc.wait()
+                    return 1
+                proc.stdin.close()
+                return proc.wait()
             with open(dumpfile, "rb") as f_in:
-                proc = subprocess.Popen(
-                    ("/usr/bin/mysql",
-                     "-u", user, "-h", host,
-                     "-P", str(port), "-p" + password,
-                     "-D", db), bufsize = -1, stdin = f_in)
+                proc = subprocess.Popen(args, bufsize = -1, stdin = f_in)
                 return proc.wait()
-        except OSError:
+        except (OSError, IOError):
             return 1
 
     def exportRepository(self, dumpfile):
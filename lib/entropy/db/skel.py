@@ -9,6 +9,7 @@
     B{Entropy Framework repository database prototype classes module}.
 """
 import base64
+import re
 import os
 import shutil
 import warnings
@@ -16,12 +17,14 @@ import hashlib
 import codecs
 import collections
 import contextlib
+import json
 import threading
 
 from entropy.i18n import _
 from entropy.exceptions import InvalidAtom
 from entropy.const import etpConst, const_cmp, const_debug_write, \
-    const_convert_to_rawstring, const_mkstemp, const_is_python3
+    const_convert_to_rawstring, const_convert_to_unicode, const_mkstemp, \
+    const_is_python3
 from entropy.output import TextInterface, brown, bold, red, blue, purple, \
     darkred, darkgreen
 from entropy.cache import EntropyCacher
@@ -358,6 +361,23 @@ class EntropyRepositoryPluginStore(EntropyPluginStore):
         meta[key] = value
 
 
+class _AtomMatchBatch(object):
+
+    """
+    State shared by the atomMatch() calls issued by atomMatchMany():
+    the metadata lookup object, the cache generation stamp, the parsed
+    atoms and the candidate package identifiers found for each key.
+    """
+
+    __slots__ = ("view", "generation", "parsed", "found")
+
+    def __init__(self, view, generation):
+        self.view = view
+        self.generation = generation
+        self.parsed = {}
+        self.found = {}
+
+
 class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
     """
     EntropyRepository interface base class.
@@ -1980,6 +2000,37 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
         return data
 
+    def getPackageDataMany(self, package_ids, get_content = True,
+            content_insert_formatted = False, get_changelog = True,
+            get_content_safety = True):
+        """
+        Reconstruct all the package metadata belonging to the provided
+        package identifiers, like getPackageData() does for a single one.
+        Subclasses can reimplement this method to fetch the metadata
+        of several packages at once.
+
+        @param package_ids: list of package indentifiers
+        @type package_ids: list
+        @keyword get_content:
+        @type get_content: bool
+        @keyword content_insert_formatted:
+        @type content_insert_formatted: bool
+        @keyword get_changelog:  return ChangeLog text metadatum or None
+        @type get_changelog: bool
+        @keyword get_content_safety: return content_safety metadata or {}
+        @type get_content_safety: bool
+        @return: iterator yielding the package metadata in dict() form
+            (or None, if the package is not available), following the
+            package_ids order
+        @rtype: iterator
+        """
+        for package_id in package_ids:
+            yield self.getPackageData(
+                package_id, get_content = get_content,
+                content_insert_formatted = content_insert_formatted,
+                get_changelog = get_changelog,
+                get_content_safety = get_content_safety)
+
     def getPackageXmlData(self, package_ids, get_content=True,
                           get_changelog=True, get_content_safety=True):
         """
@@ -2010,11 +2061,14 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         package_changelogs_id = 1
         package_changelogs = {}
 
+        package_ids = list(package_ids)
+        data_iter = self.getPackageDataMany(
+            package_ids, get_content = get_content,
+            get_changelog = get_changelog,
+            get_content_safety = get_content_safety)
+
         for package_id in package_ids:
-            data = self.getPackageData(
-                package_id, get_content = get_content,
-                get_changelog = get_changelog,
-                get_content_safety = get_content_safety)
+            data = next(data_iter)
 
             package = doc.createElement("package")
             package.setAttribute("id", "id-%d" % (package_id,))
@@ -3986,6 +4040,22 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def searchBelongsMany(self, paths):
+        """
+        Search packages which the given file paths belong to, like
+        searchBelongs() does for a single (exact) path. Subclasses can
+        reimplement this method to look up several paths at once.
+
+        @param paths: list of file paths to search
+        @type paths: list
+        @return: dict composed by file path as key and list (frozenset)
+            of package identifiers owning it as value. Every path in paths
+            is a key, paths not belonging to any package map to an empty
+            frozenset.
+        @rtype: dict
+        """
+        return dict((path, self.searchBelongs(path)) for path in paths)
+
     def searchContentSafety(self, sfile):
         """
         Search content safety metadata (usually, sha256 and mtime) related to
@@ -4225,6 +4295,103 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def searchPackagesRanked(self, keyword, limit = None):
+        """
+        Search packages by name, category and description using the given
+        free text, returning the most relevant results first. Every
+        whitespace separated word in keyword must match, as a sub-string
+        or, when a full-text index is used, as a word prefix. This is the
+        search-as-you-type entry point used by frontends; subclasses can
+        reimplement it on top of a full-text index. This implementation
+        is based on searchPackages() and searchDescription().
+
+        @param keyword: free text to search
+        @type keyword: string
+        @keyword limit: maximum number of results to return
+        @type limit: int
+        @return: tuple of (package_id, relevance) pairs, ordered by
+            decreasing relevance. Relevance values of different
+            repositories are comparable.
+        @rtype: tuple
+        """
+        words = self._searchWords(keyword)
+        if not words:
+            return ()
+
+        package_ids = None
+        for word in words:
+            found = set(self.searchPackages(word, just_id = True))
+            found.update(self.searchDescription(word, just_id = True))
+            if package_ids is None:
+                package_ids = found
+            else:
+                package_ids &= found
+            if not package_ids:
+                return ()
+
+        ranked = []
+        for package_id in package_ids:
+            name = self.retrieveName(package_id)
+            if name is None:
+                continue
+            relevance = self._searchRelevance(
+                words, name, self.retrieveCategory(package_id),
+                self.retrieveDescription(package_id))
+            ranked.append((relevance, name, package_id))
+        return self._sortRankedSearch(ranked, limit)
+
+    _SEARCH_SPLIT_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+    @classmethod
+    def _searchWords(cls, keyword):
+        """
+        Split a searchPackagesRanked() keyword into its lowercase words,
+        skipping those without any letter or digit in them.
+        """
+        return [x for x in keyword.lower().split() if
+                cls._SEARCH_SPLIT_RE.sub("", x)]
+
+    @classmethod
+    def _searchRelevance(cls, words, name, category, description):
+        """
+        Return the relevance of a package, given its name, category and
+        description, for the lowercase search words: package name matches
+        weigh more than category ones, which weigh more than description
+        ones. The outcome is an integer.
+        """
+        name = name.lower()
+        name_parts = cls._SEARCH_SPLIT_RE.split(name)
+        category_parts = cls._SEARCH_SPLIT_RE.split((category or "").lower())
+        description = (description or "").lower()
+
+        relevance = 0
+        for word in words:
+            if name == word:
+                relevance += 16
+            elif name.startswith(word):
+                relevance += 8
+            elif any(x.startswith(word) for x in name_parts):
+                relevance += 4
+            elif word in name:
+                relevance += 3
+            elif any(x.startswith(word) for x in category_parts):
+                relevance += 2
+            elif word in description:
+                relevance += 1
+        return relevance
+
+    @staticmethod
+    def _sortRankedSearch(ranked, limit):
+        """
+        Sort a list of (relevance, name, package_id) searchPackagesRanked()
+        results and turn it into its return value.
+        """
+        ranked.sort(key = lambda x: (-x[0], x[1], x[2]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return tuple((package_id, relevance) for relevance, _name, package_id
+                     in ranked)
+
     def searchUseflag(self, keyword, just_id = False):
         """
         Search packages using given use flag string as keyword. An exact search
@@ -4670,13 +4837,170 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             return 1
         return 0
 
+    def exportChangeset(self, changeset_f, added_ids, removed_ids,
+                        metadata = None):
+        """
+        Export a changeset bringing a repository without added_ids and
+        still containing removed_ids to the status of this one. Package
+        metadata is stored without content and changelog, like in the
+        light repository dumps, together with package sets, treeupdates
+        and the repository checksum verified by clients, see
+        importChangesets().
+
+        @param changeset_f: file object to write to, open in binary mode
+        @type changeset_f: file object
+        @param added_ids: package identifiers added to the repository
+        @type added_ids: iterable
+        @param removed_ids: package identifiers removed from the repository
+        @type removed_ids: iterable
+        @keyword metadata: extra metadata to store, like the repository
+            revisions the changeset applies to
+        @type metadata: dict
+        """
+        changeset = {}
+        if metadata:
+            changeset.update(metadata)
+
+        added = {}
+        for package_id in added_ids:
+            pkg_data = self.getPackageData(package_id, get_content = False,
+                content_insert_formatted = True, get_changelog = False,
+                get_content_safety = False)
+            if pkg_data is None:
+                continue
+            # trigger scripts are raw strings
+            pkg_data['trigger'] = const_convert_to_unicode(
+                base64.b64encode(pkg_data['trigger']))
+            added[str(package_id)] = pkg_data
+
+        repository_id = self.repository_id()
+        changeset['added'] = added
+        changeset['removed'] = sorted(removed_ids)
+        changeset['sets'] = self.retrievePackageSets()
+        changeset['treeupdates_actions'] = self.listAllTreeUpdatesActions()
+        changeset['treeupdates_digest'] = (repository_id,
+            self.retrieveRepositoryUpdatesDigest(repository_id))
+        changeset['checksum'] = self.checksum(do_order = True,
+            strict = False, include_signatures = True)
+
+        def _encode(obj):
+            if isinstance(obj, (set, frozenset)):
+                return list(obj)
+            raise TypeError("%r is not JSON serializable" % (obj,))
+
+        changeset_f.write(const_convert_to_rawstring(json.dumps(
+            changeset, default = _encode, separators = (",", ":"))))
+
+    @staticmethod
+    def loadChangeset(changeset_f):
+        """
+        Load a changeset written by exportChangeset().
+
+        @param changeset_f: file object to read from, open in binary mode
+        @type changeset_f: file object
+        @return: the changeset
+        @rtype: dict
+        @raise ValueError: if the changeset is malformed
+        """
+        changeset = json.loads(const_convert_to_unicode(changeset_f.read()))
+        added = {}
+        for package_id, pkg_data in changeset['added'].items():
+            pkg_data['trigger'] = base64.b64decode(
+                const_convert_to_rawstring(pkg_data['trigger']))
+            added[int(package_id)] = pkg_data
+        changeset['added'] = added
+        return changeset
+
+    def importChangesets(self, changesets, output_header = "  "):
+        """
+        Apply a chain of changesets loaded by loadChangeset(), ordered by
+        repository revision. Packages added and removed again along the
+        chain are skipped. Changes are not committed, callers are supposed
+        to verify the repository checksum stored in the last changeset
+        and then call either commit() or rollback().
+
+        @param changesets: list of changesets
+        @type changesets: list
+        @keyword output_header: output header for printing purposes
+        @type output_header: string
+        @return: tuple composed by the package identifiers added and removed
+        @rtype: tuple
+        """
+        added = {}
+        removed = set()
+        for changeset in changesets:
+            for package_id in changeset['removed']:
+                if added.pop(package_id, None) is None:
+                    removed.add(package_id)
+            added.update(changeset['added'])
+
+        removed_ids = sorted(removed)
+        maxcount = len(removed_ids)
+        mycount = 0
+        for package_id in removed_ids:
+            mycount += 1
+            if not self.isPackageIdAvailable(package_id):
+                continue
+            mytxt = "%s: %s" % (
+                red(_("Removing entry")),
+                blue(str(self.retrieveAtom(package_id))),
+            )
+            self.output(
+                mytxt,
+                importance = 0,
+                level = "info",
+                header = output_header,
+                back = True,
+                count = (mycount, maxcount)
+            )
+            self.removePackage(package_id)
+
+        added_ids = sorted(added)
+        maxcount = len(added_ids)
+        mycount = 0
+        for package_id in added_ids:
+            mycount += 1
+            mydata = added[package_id]
+            mytxt = "%s: %s" % (
+                red(_("Adding entry")),
+                blue(str(mydata['atom'])),
+            )
+            self.output(
+                mytxt,
+                importance = 0,
+                level = "info",
+                header = output_header,
+                back = True,
+                count = (mycount, maxcount)
+            )
+            if self.isPackageIdAvailable(package_id):
+                self.removePackage(package_id)
+            self.addPackage(
+                mydata,
+                revision = mydata['revision'],
+                package_id = package_id,
+                formatted_content = True
+            )
+
+        if changesets:
+            last = changesets[-1]
+            self.clearPackageSets()
+            self.insertPackageSets(last['sets'])
+            self.bumpTreeUpdatesActions(last['treeupdates_actions'])
+            repository_id, digest = last['treeupdates_digest']
+            self.setRepositoryUpdatesDigest(repository_id, digest)
+
+        self.clearCache()
+        return added_ids, removed_ids
+
     @staticmethod
     def importRepository(dumpfile, db, data = None):
         """
         Import dump file to this database.
 
-        @param dumpfile: dump file to read
-        @type dumpfile: string
+        @param dumpfile: dump file path or file object to read, in binary
+            mode, like bz2.BZ2File objects reading compressed dumps
+        @type dumpfile: string or file object
         @param dbfile: database file path or reference name
         @type dbfile: string
         @keyword data: connection data (dict object)
@@ -4717,6 +5041,59 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def generation(self):
+        """
+        Return the repository generation stamp, an opaque string that
+        changes every time the repository content is modified. Unlike
+        checksum(), it is cheap to compute, thus it is meant to be used
+        for cache validation/lookup purposes.
+        The base implementation returns checksum().
+
+        @return: repository generation stamp
+        @rtype: string
+        """
+        return self.checksum()
+
+    def packageKeyDigests(self):
+        """
+        Return a digest of the packages available for every package key
+        (category/name) in the repository, covering package identifiers,
+        versions, tags, revisions, slots and package file digests.
+        Unlike generation(), the digest of a package key only changes if
+        packages with that key are added, removed or modified, thus it
+        can be used to validate per-package cache entries.
+
+        @return: dict mapping package keys to digest strings
+        @rtype: dict
+        """
+        packages = {}
+        for package_id in self.listAllPackageIds():
+            data = self.getStrictData(package_id)
+            if data is None:
+                continue
+            key, slot, version, tag, revision, _atom = data
+            obj = packages.setdefault(key, [])
+            obj.append((package_id, version, tag, revision, slot,
+                        self.retrieveDigest(package_id)))
+        return self._digestPackageKeys(packages)
+
+    @staticmethod
+    def _digestPackageKeys(packages):
+        """
+        Turn the {key: [(package_id, version, tag, revision, slot,
+        digest), ...]} mapping built by packageKeyDigests()
+        implementations into {key: digest}.
+        """
+        digests = {}
+        for key, rows in packages.items():
+            sha = hashlib.md5()
+            # package identifiers are unique, no other fields are compared
+            for row in sorted(rows):
+                sha.update(const_convert_to_rawstring(
+                        "%s|%s|%s|%s|%s|%s;" % row))
+            digests[key] = sha.hexdigest()
+        return digests
+
     def mtime(self):
         """
         Return last modification time of given repository.
@@ -5037,27 +5414,126 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             identifiers) and command status is returned.
         @rtype: tuple or set
         """
+        return self.__atomMatchLookup(_AtomMatchBatch(self, None), atom,
+            matchSlot, multiMatch, maskFilter, extendedResults, useCache)
+
+    def atomMatchMany(self, atoms, matchSlot = None, multiMatch = False,
+        maskFilter = True, extendedResults = False, useCache = True):
+        """
+        Match given atoms (or dependencies) in repository, like atomMatch()
+        does for a single one. Metadata lookups are batched through the
+        object returned by _atomMatchView() and the on-disk cache key is
+        calculated once.
+
+        @param atoms: list of atoms or dependencies to match in repository
+        @type atoms: list
+        @keyword matchSlot: match packages with given slot
+        @type matchSlot: string
+        @keyword multiMatch: match all the available packages, not just the
+            best one
+        @type multiMatch: bool
+        @keyword maskFilter: enable package masking filter
+        @type maskFilter: bool
+        @keyword extendedResults: return extended results
+        @type extendedResults: bool
+        @keyword useCache: use on-disk cache
+        @type useCache: bool
+        @return: list of atomMatch() results, in the same order of atoms
+        @rtype: list
+        """
+        atoms = list(atoms)
+        generation = None
+        if self._caching:
+            generation = self.generation()
+
+        matches = {}
+        missing = []
+        for atom in atoms:
+            if atom in matches:
+                continue
+            if not atom:
+                matches[atom] = (-1, 1)
+                continue
+
+            cached = None
+            if useCache:
+                cached = self.__atomMatchFetchCache(atom, matchSlot,
+                    multiMatch, maskFilter, extendedResults,
+                    generation = generation)
+            # placeholder, keeps duplicates out of missing
+            matches[atom] = cached
+            if cached is None:
+                missing.append(atom)
+
+        if not missing:
+            return [matches[atom] for atom in atoms]
+
+        # parse atoms once, then let the view prefetch the metadata
+        # of all the packages they reference.
+        parsed = {}
+        names = set()
+        use_deps = False
+        for atom in missing:
+            sub_atoms = [atom]
+            if atom.endswith(etpConst['entropyordepquestion']):
+                sub_atoms += atom[:-1].split(etpConst['entropyordepsep'])
+            for sub_atom in sub_atoms:
+                if not sub_atom or sub_atom in parsed:
+                    continue
+                data = self.__atomMatchParse(sub_atom)
+                parsed[sub_atom] = data
+                if data[1]:
+                    use_deps = True
+                if data[4]:
+                    names.add(data[8])
+
+        batch = _AtomMatchBatch(
+            self._atomMatchView(names, use_deps), generation)
+        batch.parsed.update(parsed)
+        for atom in missing:
+            matches[atom] = self.__atomMatch(batch, atom, matchSlot,
+                multiMatch, maskFilter, extendedResults, useCache)
+
+        return [matches[atom] for atom in atoms]
+
+    def _atomMatchView(self, names, use_deps):
+        """
+        Return the object used by atomMatchMany() to look up package
+        metadata (searchName(), searchNameCategory(), retrieveVersion(),
+        retrieveSlot(), retrieveUseflags(), etc) while matching atoms.
+        Subclasses can reimplement this to prefetch the metadata of all
+        the candidate packages at once.
+        The base implementation returns the repository itself.
+
+        @param names: names of the packages referenced by the atoms
+        @type names: set
+        @param use_deps: True, if atoms contain USE dependencies
+        @type use_deps: bool
+        @return: object implementing the EntropyRepositoryBase lookup methods
+        @rtype: object
+        """
+        return self
+
+    def __atomMatchLookup(self, batch, atom, matchSlot, multiMatch,
+                          maskFilter, extendedResults, useCache):
         if not atom:
             return -1, 1
 
         if useCache:
             cached = self.__atomMatchFetchCache(atom, matchSlot,
-                multiMatch, maskFilter, extendedResults)
+                multiMatch, maskFilter, extendedResults,
+                generation = batch.generation)
             if cached is not None:
                 return cached
 
-        # "or" dependency support
-        # app-foo/foo-1.2.3;app-foo/bar-1.4.3?
-        if atom.endswith(etpConst['entropyordepquestion']):
-            # or dependency!
-            atoms = atom[:-1].split(etpConst['entropyordepsep'])
-            for s_atom in atoms:
-                data, rc = self.atomMatch(s_atom, matchSlot = matchSlot,
-                    multiMatch = multiMatch, maskFilter = maskFilter,
-                    extendedResults = extendedResults, useCache = useCache)
-                if rc == 0:
-                    return data, rc
+        return self.__atomMatch(batch, atom, matchSlot, multiMatch,
+            maskFilter, extendedResults, useCache)
 
+    def __atomMatchParse(self, atom):
+        """
+        Split atom into the components used by atomMatch(), see
+        __atomMatch() for the tuple layout.
+        """
         matchTag = entropy.dep.dep_gettag(atom)
         try:
             matchUse = entropy.dep.dep_getusedeps(atom)
@@ -5073,12 +5549,8 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         scan_atom = entropy.dep.remove_usedeps(atom)
         # tag match
         scan_atom = entropy.dep.remove_tag(scan_atom)
-
         # slot match
         scan_atom = entropy.dep.remove_slot(scan_atom)
-        if (matchSlot is None) and (atomSlot is not None):
-            matchSlot = atomSlot
-
         # revision match
         scan_atom = entropy.dep.remove_entropy_revision(scan_atom)
 
@@ -5089,8 +5561,6 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         pkgcat = ''
         pkgversion = ''
         stripped_atom = ''
-        found_ids = []
-        default_package_ids = None
 
         if scan_atom:
 
@@ -5123,23 +5593,61 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
                 break
 
+        return (matchTag, matchUse, atomSlot, matchRevision, scan_atom,
+                direction, justname, pkgkey, pkgname, pkgcat, pkgversion,
+                stripped_atom)
 
-            # IDs found in the database that match our search
-            try:
-                found_ids, default_package_ids = self.__generate_found_ids_match(
-                    pkgkey, pkgname, pkgcat, multiMatch)
-            except OperationalError:
-                # we are fault tolerant, cannot crash because
-                # tables are not available and validateDatabase()
-                # hasn't run
-                # found_ids = []
-                # default_package_ids = None
-                pass
+    def __atomMatch(self, batch, atom, matchSlot, multiMatch,
+                    maskFilter, extendedResults, useCache):
+
+        # "or" dependency support
+        # app-foo/foo-1.2.3;app-foo/bar-1.4.3?
+        if atom.endswith(etpConst['entropyordepquestion']):
+            # or dependency!
+            atoms = atom[:-1].split(etpConst['entropyordepsep'])
+            for s_atom in atoms:
+                data, rc = self.__atomMatchLookup(batch, s_atom, matchSlot,
+                    multiMatch, maskFilter, extendedResults, useCache)
+                if rc == 0:
+                    return data, rc
+
+        view = batch.view
+        generation = batch.generation
+        parsed = batch.parsed.get(atom)
+        if parsed is None:
+            parsed = self.__atomMatchParse(atom)
+        (matchTag, matchUse, atomSlot, matchRevision, scan_atom,
+         direction, justname, pkgkey, pkgname, pkgcat, pkgversion,
+         stripped_atom) = parsed
+
+        if (matchSlot is None) and (atomSlot is not None):
+            matchSlot = atomSlot
+
+        found_ids = []
+        default_package_ids = None
+
+        if scan_atom:
+
+            # atoms sharing the same key share the same candidates
+            found_key = (pkgkey, pkgname, pkgcat, multiMatch)
+            found = batch.found.get(found_key)
+            if found is None:
+                # IDs found in the database that match our search
+                try:
+                    found = self.__generate_found_ids_match(
+                        view, pkgkey, pkgname, pkgcat, multiMatch)
+                except OperationalError:
+                    # we are fault tolerant, cannot crash because
+                    # tables are not available and validateDatabase()
+                    # hasn't run
+                    found = ([], None)
+                batch.found[found_key] = found
+            found_ids, default_package_ids = found
 
         ### FILTERING
         # filter slot and tag
         if found_ids:
-            found_ids = self.__filterSlotTagUse(found_ids, matchSlot,
+            found_ids = self.__filterSlotTagUse(view, found_ids, matchSlot,
                 matchTag, matchUse, direction)
             if maskFilter:
                 def _filter(pkg_id):
@@ -5151,7 +5659,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
         dbpkginfo = set()
         if found_ids:
-            dbpkginfo = self.__handle_found_ids_match(found_ids, direction,
+            dbpkginfo = self.__handle_found_ids_match(view, found_ids, direction,
                 matchTag, matchRevision, justname, stripped_atom, pkgversion)
 
         if not dbpkginfo:
@@ -5163,7 +5671,8 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                 self.__atomMatchStoreCache(
                     atom, matchSlot,
                     multiMatch, maskFilter,
-                    extendedResults, result = (x, 1)
+                    extendedResults, generation = generation,
+                    result = (x, 1)
                 )
                 return x, 1
             else:
@@ -5174,18 +5683,20 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                 self.__atomMatchStoreCache(
                     atom, matchSlot,
                     multiMatch, maskFilter,
-                    extendedResults, result = (x, 1)
+                    extendedResults, generation = generation,
+                    result = (x, 1)
                 )
                 return x, 1
 
         if multiMatch:
             if extendedResults:
-                x = set([(x[0], 0, x[1], self.retrieveTag(x[0]), \
-                    self.retrieveRevision(x[0])) for x in dbpkginfo])
+                x = set([(x[0], 0, x[1], view.retrieveTag(x[0]), \
+                    view.retrieveRevision(x[0])) for x in dbpkginfo])
                 self.__atomMatchStoreCache(
                     atom, matchSlot,
                     multiMatch, maskFilter,
-                    extendedResults, result = (x, 0)
+                    extendedResults, generation = generation,
+                    result = (x, 0)
                 )
                 return x, 0
             else:
@@ -5193,27 +5704,30 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                 self.__atomMatchStoreCache(
                     atom, matchSlot,
                     multiMatch, maskFilter,
-                    extendedResults, result = (x, 0)
+                    extendedResults, generation = generation,
+                    result = (x, 0)
                 )
                 return x, 0
 
         if len(dbpkginfo) == 1:
             x = dbpkginfo.pop()
             if extendedResults:
-                x = (x[0], 0, x[1], self.retrieveTag(x[0]),
-                    self.retrieveRevision(x[0]),)
+                x = (x[0], 0, x[1], view.retrieveTag(x[0]),
+                    view.retrieveRevision(x[0]),)
 
                 self.__atomMatchStoreCache(
                     atom, matchSlot,
                     multiMatch, maskFilter,
-                    extendedResults, result = (x, 0)
+                    extendedResults, generation = generation,
+                    result = (x, 0)
                 )
                 return x, 0
             else:
                 self.__atomMatchStoreCache(
                     atom, matchSlot,
                     multiMatch, maskFilter,
-                    extendedResults, result = (x[0], 0)
+                    extendedResults, generation = generation,
+                    result = (x[0], 0)
                 )
                 return x[0], 0
 
@@ -5235,8 +5749,8 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         versions = set()
 
         for x in dbpkginfo:
-            info_tuple = (x[1], self.retrieveTag(x[0]), \
-                self.retrieveRevision(x[0]))
+            info_tuple = (x[1], view.retrieveTag(x[0]), \
+                view.retrieveRevision(x[0]))
             versions.add(info_tuple)
             pkgdata[info_tuple] = x[0]
 
@@ -5277,24 +5791,27 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             self.__atomMatchStoreCache(
                 atom, matchSlot,
                 multiMatch, maskFilter,
-                extendedResults, result = (x, rc)
+                extendedResults, generation = generation,
+                result = (x, rc)
             )
             return x, rc
         else:
             self.__atomMatchStoreCache(
                 atom, matchSlot,
                 multiMatch, maskFilter,
-                extendedResults, result = (x, rc)
+                extendedResults, generation = generation,
+                result = (x, rc)
             )
             return x, rc
 
-    def __generate_found_ids_match(self, pkgkey, pkgname, pkgcat, multiMatch):
+    def __generate_found_ids_match(self, view, pkgkey, pkgname, pkgcat,
+                                   multiMatch):
 
         if pkgcat == "null":
-            results = self.searchName(pkgname, sensitive = True,
+            results = view.searchName(pkgname, sensitive = True,
                 just_id = True)
         else:
-            results = self.searchNameCategory(pkgname, pkgcat, just_id = True)
+            results = view.searchNameCategory(pkgname, pkgcat, just_id = True)
 
         old_style_virtuals = None
         # if it's a PROVIDE, search with searchProvide
@@ -5302,7 +5819,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         if (not results) and (pkgcat == self.VIRTUAL_META_PACKAGE_CATEGORY):
 
             # look for default old-style virtual
-            virtuals = self.searchProvidedVirtualPackage(pkgkey)
+            virtuals = view.searchProvidedVirtualPackage(pkgkey)
             if virtuals:
                 old_style_virtuals = set([x[0] for x in virtuals if x[1]])
                 flat_virtuals = [x[0] for x in virtuals]
@@ -5327,7 +5844,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             found_id = None
             cats = set()
             for package_id in results:
-                cat = self.retrieveCategory(package_id)
+                cat = view.retrieveCategory(package_id)
                 cats.add(cat)
                 if (cat == pkgcat) or \
                     ((pkgcat == self.VIRTUAL_META_PACKAGE_CATEGORY) and \
@@ -5352,7 +5869,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             # we need to search using the category
             if (not multiMatch) and (pkgcat == "null"):
                 # we searched by name, we need to search using category
-                results = self.searchNameCategory(
+                results = view.searchNameCategory(
                     pkgname, pkgcat, just_id = True)
 
             # if we get here, we have found the needed IDs
@@ -5368,11 +5885,11 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             (old_style_virtuals is not None):
             # in case of virtual packages only
             # (that they're not stored as provide)
-            pkgcat, pkgname = self.retrieveKeySplit(package_id)
+            pkgcat, pkgname = view.retrieveKeySplit(package_id)
 
         # check if category matches
         if pkgcat != "null":
-            found_cat = self.retrieveCategory(package_id)
+            found_cat = view.retrieveCategory(package_id)
             if pkgcat == found_cat:
                 return set([package_id]), old_style_virtuals
             del results
@@ -5383,7 +5900,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         return set([package_id]), old_style_virtuals
 
 
-    def __handle_found_ids_match(self, found_ids, direction, matchTag,
+    def __handle_found_ids_match(self, view, found_ids, direction, matchTag,
             matchRevision, justname, stripped_atom, pkgversion):
 
         dbpkginfo = set()
@@ -5415,7 +5932,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
                 for package_id in found_ids:
 
-                    dbver = self.retrieveVersion(package_id)
+                    dbver = view.retrieveVersion(package_id)
                     if (direction == "~"):
                         myrev = entropy.dep.dep_get_spm_revision(
                             dbver)
@@ -5429,7 +5946,7 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                             if dbver.startswith(pkgversion[:-1]):
                                 dbpkginfo.add((package_id, dbver))
                         elif (matchRevision is not None) and (pkgversion == dbver):
-                            dbrev = self.retrieveRevision(package_id)
+                            dbrev = view.retrieveRevision(package_id)
                             if dbrev == matchRevision:
                                 dbpkginfo.add((package_id, dbver))
                         elif (pkgversion == dbver) and (matchRevision is None):
@@ -5449,14 +5966,14 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                         revcmp = 0
                         tagcmp = 0
                         if matchRevision is not None:
-                            dbrev = self.retrieveRevision(package_id)
+                            dbrev = view.retrieveRevision(package_id)
                             revcmp = const_cmp(matchRevision, dbrev)
 
                         if matchTag is not None:
-                            dbtag = self.retrieveTag(package_id)
+                            dbtag = view.retrieveTag(package_id)
                             tagcmp = const_cmp(matchTag, dbtag)
 
-                        dbver = self.retrieveVersion(package_id)
+                        dbver = view.retrieveVersion(package_id)
                         pkgcmp = entropy.dep.compare_versions(
                             pkgversion, dbver)
 
@@ -5517,15 +6034,17 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
         else: # just the key
 
-            dbpkginfo = set([(x, self.retrieveVersion(x),) for x in found_ids])
+            dbpkginfo = set([(x, view.retrieveVersion(x),) for x in found_ids])
 
         return dbpkginfo
 
-    def __atomMatchFetchCache(self, *args):
+    def __atomMatchFetchCache(self, *args, **kwargs):
         if self._caching:
-            ck_sum = self.checksum(strict = False)
+            ck_sum = kwargs.get('generation')
+            if ck_sum is None:
+                ck_sum = self.generation()
             hash_str = self.__atomMatch_gen_hash_str(args)
-            cached = entropy.dump.loadobj(
+            cached = self._cacher.pop(
                 "%s/%s/%s_%s_%s" % (
                     self.__db_match_cache_key,
                     self.name,
@@ -5547,7 +6066,9 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
     def __atomMatchStoreCache(self, *args, **kwargs):
         if self._caching:
-            ck_sum = self.checksum(strict = False)
+            ck_sum = kwargs.get('generation')
+            if ck_sum is None:
+                ck_sum = self.generation()
             hash_str = self.__atomMatch_gen_hash_str(args)
             self._cacher.push(
                 "%s/%s/%s_%s_%s" % (
@@ -5560,27 +6081,27 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                 kwargs.get('result'),
                 async_mode = False)
 
-    def __filterSlot(self, package_id, slot):
+    def __filterSlot(self, view, package_id, slot):
         if slot is None:
             return package_id
-        dbslot = self.retrieveSlot(package_id)
+        dbslot = view.retrieveSlot(package_id)
         if dbslot == slot:
             return package_id
 
-    def __filterTag(self, package_id, tag, operators):
+    def __filterTag(self, view, package_id, tag, operators):
         if tag is None:
             return package_id
 
-        dbtag = self.retrieveTag(package_id)
+        dbtag = view.retrieveTag(package_id)
         compare = const_cmp(tag, dbtag)
         # cannot do operator compare because it breaks the tag concept
         if compare == 0:
             return package_id
 
-    def __filterUse(self, package_id, uses):
+    def __filterUse(self, view, package_id, uses):
         if not uses:
             return package_id
-        pkguse = set(self.retrieveUseflags(package_id))
+        pkguse = set(view.retrieveUseflags(package_id))
         enabled = set([x for x in uses if not x.startswith("-")])
         disabled = set(uses) - enabled
 
@@ -5647,19 +6168,19 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
             return None
         return package_id
 
-    def __filterSlotTagUse(self, found_ids, slot, tag, use, operators):
+    def __filterSlotTagUse(self, view, found_ids, slot, tag, use, operators):
 
         def myfilter(package_id):
 
-            package_id = self.__filterSlot(package_id, slot)
+            package_id = self.__filterSlot(view, package_id, slot)
             if not package_id:
                 return False
 
-            package_id = self.__filterUse(package_id, use)
+            package_id = self.__filterUse(view, package_id, use)
             if not package_id:
                 return False
 
-            package_id = self.__filterTag(package_id, tag, operators)
+            package_id = self.__filterTag(view, package_id, tag, operators)
             if not package_id:
                 return False
 
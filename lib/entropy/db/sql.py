@@ -15,6 +15,8 @@ import hashlib
 import itertools
 import time
 import threading
+import uuid
+import weakref
 
 from entropy.const import etpConst, const_debug_write, \
     const_debug_enabled, const_isunicode, const_convert_to_unicode, \
@@ -240,6 +242,446 @@ class SQLCursorWrapper(object):
         return self._cur.description
 
 
+class SQLConnectionPool(object):
+    """
+    Bounded pool of connections to a repository.
+
+    A connection is bound to the thread that checked it out, since
+    transactions belong to connections, until it is checked back in,
+    either explicitly through checkin() or by the janitor once the
+    thread is gone. Checked in connections are handed over to other
+    threads and closed after being idle for idle_timeout seconds.
+    A single janitor thread serves all the pools of the process, and
+    it is only started once threads other than the main one use them.
+    When max_size connections are open, further checkouts wait for a
+    connection to be checked in, up to checkout_timeout seconds, then
+    OperationalError is raised. Terminated threads are only noticed
+    periodically, threads using the pool for short jobs should check
+    their connection in once done (see
+    EntropySQLRepository.releaseConnection()).
+    """
+
+    # seconds between two janitor runs
+    JANITOR_INTERVAL = 5.0
+
+    _pools = weakref.WeakSet()
+    _pools_lock = threading.Lock()
+    _janitor_pid = None
+
+    class Pooled(object):
+        """
+        A pooled connection and its cursor, set by the repository.
+        """
+        __slots__ = ("connection", "cursor", "last_used")
+
+        def __init__(self, connection):
+            self.connection = connection
+            self.cursor = None
+            self.last_used = time.time()
+
+    def __init__(self, max_size, idle_timeout, reusable = True,
+                 checkout_timeout = 0):
+        """
+        SQLConnectionPool constructor.
+
+        @param max_size: maximum number of open connections, 0 means
+            unbounded
+        @type max_size: int
+        @param idle_timeout: seconds after which an idle connection
+            is closed
+        @type idle_timeout: float
+        @keyword reusable: if False, checked in connections are closed
+            rather than handed over to other threads
+        @type reusable: bool
+        @keyword checkout_timeout: seconds a checkout waits for a
+            connection when the pool is full, 0 means forever
+        @type checkout_timeout: float
+        """
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._checkout_timeout = checkout_timeout
+        self._reusable = reusable
+        self._pid = os.getpid()
+        self._lock = threading.RLock()
+        self._available = threading.Condition(self._lock)
+        self._bound = {}
+        # most recently used last
+        self._idle = []
+        self._stats = {
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "reused": 0,
+            "reaped": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+        }
+        with SQLConnectionPool._pools_lock:
+            SQLConnectionPool._pools.add(self)
+
+    def checkout(self, connect):
+        """
+        Return the connection bound to the calling thread, binding an
+        idle or, if the pool is not full, a new one if needed.
+
+        @param connect: callable returning a new connection
+        @type connect: callable
+        @return: the pooled connection
+        @rtype: SQLConnectionPool.Pooled
+        @raise OperationalError: if no connection became available
+            within checkout_timeout seconds
+        """
+        thread = threading.current_thread()
+        pooled = self._bound.get(thread)
+        if pooled is not None and self._pid == os.getpid():
+            return pooled
+
+        with self._lock:
+            self._check_pid()
+            pooled = self._bound.get(thread)
+            if pooled is not None:
+                return pooled
+
+            started = None
+            while True:
+                if self._idle:
+                    pooled = self._idle.pop()
+                    self._stats["reused"] += 1
+                    break
+                if not self._max_size or len(self._bound) < self._max_size:
+                    pooled = self.Pooled(connect())
+                    self._stats["created"] += 1
+                    break
+                if self._reclaim():
+                    continue
+                if started is None:
+                    started = time.time()
+                    self._stats["waits"] += 1
+                # threads may go away without waking us up
+                timeout = 1.0
+                if self._checkout_timeout:
+                    remaining = started + self._checkout_timeout - \
+                        time.time()
+                    if remaining <= 0:
+                        self._stats["wait_time"] += time.time() - started
+                        self._stats["timeouts"] += 1
+                        raise OperationalError(
+                            "no connection available in %.1f seconds, "
+                            "%d connections in use" % (
+                                self._checkout_timeout, len(self._bound)))
+                    timeout = min(timeout, remaining)
+                self._available.wait(timeout)
+            if started is not None:
+                self._stats["wait_time"] += time.time() - started
+
+            self._bound[thread] = pooled
+            self._stats["checkouts"] += 1
+
+        if not EntropySQLRepository.isMainThread(thread):
+            self._start_janitor()
+        return pooled
+
+    def checkin(self):
+        """
+        Check the connection bound to the calling thread back in, rolling
+        back its uncommitted changes.
+        """
+        with self._lock:
+            self._check_pid()
+            pooled = self._bound.pop(threading.current_thread(), None)
+            if pooled is None:
+                return
+            self._release(pooled)
+        self._start_janitor()
+
+    def close(self, main_thread = True):
+        """
+        Close the idle connections and those bound to threads that are
+        gone, to the calling thread and, if main_thread is True, to the
+        main thread. Connections bound to other live threads are left
+        alone. Uncommitted changes are discarded.
+
+        @keyword main_thread: close the main thread connection as well
+        @type main_thread: bool
+        """
+        current_thread = threading.current_thread()
+        with self._lock:
+            self._check_pid()
+            for thread, pooled in list(self._bound.items()):
+                closable = thread is current_thread or \
+                    not thread.is_alive()
+                if main_thread and EntropySQLRepository.isMainThread(thread):
+                    closable = True
+                if closable:
+                    del self._bound[thread]
+                    self._close(pooled)
+            while self._idle:
+                self._close(self._idle.pop())
+            self._available.notify_all()
+
+    def reap(self):
+        """
+        Check in the connections bound to threads that are gone and close
+        the connections idle for more than idle_timeout seconds.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._reclaim()
+            expired = time.time() - self._idle_timeout
+            while self._idle and self._idle[0].last_used < expired:
+                self._close(self._idle.pop(0))
+
+    def stats(self):
+        """
+        Return the pool statistics: open connections ("open"), those
+        bound to threads ("in_use") and idle ("idle"), the pool size
+        ("max_size"), connections created, closed, checked out (bound
+        to a thread), reused from the idle ones and reclaimed from
+        threads that are gone ("created", "closed", "checkouts",
+        "reused", "reaped"), checkouts that had to wait for a free
+        connection, the overall time spent waiting, in seconds, and
+        checkouts that gave up waiting ("waits", "wait_time",
+        "timeouts").
+
+        @return: the pool statistics
+        @rtype: dict
+        """
+        with self._lock:
+            stats = self._stats.copy()
+            stats["in_use"] = len(self._bound)
+            stats["idle"] = len(self._idle)
+            stats["open"] = stats["in_use"] + stats["idle"]
+            stats["max_size"] = self._max_size
+        return stats
+
+    def _check_pid(self):
+        """
+        Forget the connections inherited from the parent process, they
+        cannot be used (nor closed, which would release the parent
+        locks) by a forked child. Must be called with the pool lock held.
+        """
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            self._bound.clear()
+            del self._idle[:]
+
+    def _reclaim(self):
+        """
+        Check in the connections bound to threads that are gone.
+        Must be called with the pool lock held.
+
+        @return: True, if any connection has been reclaimed
+        @rtype: bool
+        """
+        dead = [x for x in self._bound if not x.is_alive()]
+        for thread in dead:
+            if const_debug_enabled():
+                const_debug_write(
+                    __name__,
+                    "thread '%s' exited, reclaiming its connection" % (
+                        thread,))
+            self._release(self._bound.pop(thread))
+            self._stats["reaped"] += 1
+        return bool(dead)
+
+    def _release(self, pooled):
+        """
+        Make a connection bound to a thread available again, or close it.
+        Must be called with the pool lock held.
+        """
+        if self._reusable:
+            try:
+                # WARNING !! no implicit commit()
+                # caller has to do it!
+                pooled.connection.rollback()
+            except Error as err:
+                if const_debug_enabled():
+                    const_debug_write(
+                        __name__,
+                        "SQLConnectionPool: cannot rollback: %s" % (err,))
+                self._close(pooled)
+            else:
+                pooled.last_used = time.time()
+                self._idle.append(pooled)
+        else:
+            self._close(pooled)
+        self._available.notify()
+
+    def _close(self, pooled):
+        """
+        Close a connection no longer bound to any thread.
+        Must be called with the pool lock held.
+        """
+        self._stats["closed"] += 1
+        conn = pooled.connection
+        try:
+            conn.close()
+        except OperationalError as err:
+            if const_debug_enabled():
+                const_debug_write(
+                    __name__,
+                    "SQLConnectionPool: cannot close: %s" % (err,))
+            try:
+                conn.interrupt()
+                conn.close()
+            except OperationalError as err:
+                # heh, unable to close due to
+                # unfinalized statements
+                # interpreter shutdown?
+                if const_debug_enabled():
+                    const_debug_write(
+                        __name__,
+                        "SQLConnectionPool: cannot close: %s" % (err,))
+
+    @classmethod
+    def _start_janitor(cls):
+        """
+        Start the janitor thread of this process, if not running already.
+        """
+        pid = os.getpid()
+        if cls._janitor_pid == pid:
+            return
+        with cls._pools_lock:
+            if cls._janitor_pid == pid:
+                return
+            cls._janitor_pid = pid
+        janitor = ParallelTask(cls._janitor)
+        janitor.name = "SQLConnectionPoolJanitor"
+        janitor.daemon = True
+        janitor.start()
+
+    @classmethod
+    def _janitor(cls):
+        """
+        Janitor thread body, periodically reaping all the pools.
+        """
+        while True:
+            time.sleep(cls.JANITOR_INTERVAL)
+            with cls._pools_lock:
+                pools = list(cls._pools)
+            for pool in pools:
+                pool.reap()
+
+
+class SQLAtomMatchView(object):
+
+    """
+    Package metadata prefetched in bulk by EntropySQLRepository for
+    atomMatchMany(). It exposes the subset of the EntropyRepositoryBase
+    API used by atomMatch(), lookups of packages that have not been
+    prefetched are forwarded to the repository.
+    """
+
+    def __init__(self, repository, names, metadata, useflags):
+        """
+        SQLAtomMatchView constructor.
+
+        @param repository: the repository
+        @type repository: EntropySQLRepository
+        @param names: package names that have been prefetched
+        @type names: set
+        @param metadata: map of package_id -> (category, name, version,
+            versiontag, revision, slot)
+        @type metadata: dict
+        @param useflags: map of package_id -> set of USE flags, or None if
+            not prefetched
+        @type useflags: dict or None
+        """
+        self._repository = repository
+        self._names = names
+        self._metadata = metadata
+        self._useflags = useflags
+        self._by_name = {}
+        for package_id in sorted(metadata.keys()):
+            name = metadata[package_id][1]
+            obj = self._by_name.setdefault(name, [])
+            obj.append(package_id)
+
+    def __getattr__(self, name):
+        return getattr(self._repository, name)
+
+    def searchName(self, keyword, sensitive = False, just_id = False):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        if sensitive and just_id and keyword in self._names:
+            return tuple(self._by_name.get(keyword, ()))
+        return self._repository.searchName(
+            keyword, sensitive = sensitive, just_id = just_id)
+
+    def searchNameCategory(self, name, category, just_id = False):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        if just_id and name in self._names:
+            return frozenset(
+                (x for x in self._by_name.get(name, ())
+                 if self._metadata[x][0] == category))
+        return self._repository.searchNameCategory(
+            name, category, just_id = just_id)
+
+    def _field(self, package_id, index, fallback):
+        meta = self._metadata.get(package_id)
+        if meta is None:
+            return fallback(package_id)
+        return meta[index]
+
+    def retrieveCategory(self, package_id):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        return self._field(
+            package_id, 0, self._repository.retrieveCategory)
+
+    def retrieveKeySplit(self, package_id):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        meta = self._metadata.get(package_id)
+        if meta is None:
+            return self._repository.retrieveKeySplit(package_id)
+        return meta[0], meta[1]
+
+    def retrieveVersion(self, package_id):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        return self._field(
+            package_id, 2, self._repository.retrieveVersion)
+
+    def retrieveTag(self, package_id):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        return self._field(
+            package_id, 3, self._repository.retrieveTag)
+
+    def retrieveRevision(self, package_id):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        return self._field(
+            package_id, 4, self._repository.retrieveRevision)
+
+    def retrieveSlot(self, package_id):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        return self._field(
+            package_id, 5, self._repository.retrieveSlot)
+
+    def retrieveUseflags(self, package_id):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        if self._useflags is None or package_id not in self._metadata:
+            return self._repository.retrieveUseflags(package_id)
+        return frozenset(self._useflags.get(package_id, ()))
+
+
 class EntropySQLRepository(EntropyRepositoryBase):
 
     """
@@ -593,6 +1035,10 @@ class EntropySQLRepository(EntropyRepositoryBase):
             """
             return data
 
+    # maximum number of bound parameters of batched "IN (...)" queries,
+    # SQLite supports up to 999 by default.
+    _BATCH_QUERY_SIZE = 256
+
     # the "INSERT OR REPLACE" dialect
     # For SQLite3 it's "INSERT OR REPLACE"
     # while for MySQL it's "REPLACE"
@@ -615,20 +1061,32 @@ class EntropySQLRepository(EntropyRepositoryBase):
     # Generic repository name to use when none is given.
     GENERIC_NAME = "__generic__"
 
+    # settings table key of the repository generation stamp
+    _GENERATION_SETTING = "generation"
+
+    # maximum number of connections open by threads to the same repository
+    # (0 means unbounded) and seconds after which connections checked in
+    # by threads are closed, see SQLConnectionPool.
+    CONNECTION_POOL_SIZE = int(
+        os.getenv("ETP_REPO_CONNECTION_POOL_SIZE", "64"))
+    CONNECTION_POOL_IDLE_TIMEOUT = float(
+        os.getenv("ETP_REPO_CONNECTION_POOL_IDLE_TIMEOUT", "60"))
+    # seconds a thread waits for a connection when the pool is full
+    # before OperationalError is raised (0 means forever)
+    CONNECTION_POOL_CHECKOUT_TIMEOUT = float(
+        os.getenv("ETP_REPO_CONNECTION_POOL_CHECKOUT_TIMEOUT", "300"))
+
     def __init__(self, db, read_only, skip_checks, indexing,
                  xcache, temporary, name, direct=False, cache_policy=None):
-        # connection and cursor automatic cleanup support
-        self._cleanup_monitor_cache_mutex = threading.Lock()
-        self._cleanup_monitor_cache = {}
-
         self._db = db
         self._indexing = indexing
         self._skip_checks = skip_checks
         self._settings_cache = {}
-        self.__connection_pool = {}
-        self.__connection_pool_mutex = threading.RLock()
-        self.__cursor_pool_mutex = threading.RLock()
-        self.__cursor_pool = {}
+        # set by the methods changing the repository content without
+        # bumping the generation stamp, see commit(). Never set it when
+        # just clearing caches, that happens on every lock release.
+        self._generation_dirty = False
+        self.__connection_pool = self._newConnectionPool()
         if name is None:
             name = self.GENERIC_NAME
         self._live_cacher = EntropyRepositoryCacher()
@@ -637,16 +1095,14 @@ class EntropySQLRepository(EntropyRepositoryBase):
                                        temporary, name, direct=direct,
                                        cache_policy=cache_policy)
 
-    def _cursor_connection_pool_key(self):
+    def _newConnectionPool(self):
         """
-        Return the Cursor and Connection Pool key
-        that can be used inside the current thread
-        and process (multiprocessing not supported).
+        Return a new SQLConnectionPool for this repository.
         """
-        current_thread = threading.current_thread()
-        thread_id = current_thread.ident
-        pid = os.getpid()
-        return self._db, thread_id, pid
+        return SQLConnectionPool(
+            self.CONNECTION_POOL_SIZE,
+            self.CONNECTION_POOL_IDLE_TIMEOUT,
+            checkout_timeout = self.CONNECTION_POOL_CHECKOUT_TIMEOUT)
 
     def _cleanup_all(self, _cleanup_main_thread=True):
         """
@@ -657,164 +1113,37 @@ class EntropySQLRepository(EntropyRepositoryBase):
             const_debug_write(
                 __name__,
                 "called _cleanup_all() for %s" % (self,))
-        with self._cursor_pool_mutex():
-            with self._connection_pool_mutex():
-                th_data = set(self._cursor_pool().keys())
-                th_data.update(self._connection_pool().keys())
-                for c_key in th_data:
-                    self._cleanup_killer(
-                        c_key,
-                        _cleanup_main_thread=_cleanup_main_thread)
+        # closing the main thread objects (forcibly)
+        # is VERY dangerous, but it turned out
+        # that the original version of EntropyRepository.close()
+        # did that (that is why we have rwsems encapsulating
+        # entropy calls in RigoDaemon and Rigo).
+        # Also, one expects that close() really terminates
+        # all the connections and releases all the resources.
+        self._connection_pool().close(main_thread=_cleanup_main_thread)
 
-    def _cleanup_monitor(self, target_thread, c_key):
+    def releaseConnection(self):
         """
-        Execute Cursor and Connection resources
-        termination.
+        Check the connection used by the calling thread back in to the
+        connection pool, making it available to other threads.
+        Uncommitted changes are rolled back, call commit() first.
+        Threads that use the repository for short jobs, like thread pool
+        workers, should call this once done. Connections of terminated
+        threads are reclaimed automatically, but not right away: when
+        the pool is full, other threads wait for them and give up after
+        CONNECTION_POOL_CHECKOUT_TIMEOUT seconds.
         """
-        # join on thread
-        target_thread.join()
-
-        if const_debug_enabled():
-            const_debug_write(
-                __name__,
-                "thread '%s' exited [%s], cleaning: %s" % (
-                    target_thread, hex(target_thread.ident),
-                    c_key,))
-        with self._cleanup_monitor_cache_mutex:
-            self._cleanup_monitor_cache.pop(c_key, None)
-        self._cleanup_killer(c_key)
-
-    def _start_cleanup_monitor(self, current_thread, c_key):
-        """
-        Allocate a new thread that monitors the thread object
-        passed as "current_thread". Once this thread terminates,
-        all its resources are automatically released.
-        current_thread is actually joined() and live cursor and
-        connections are checked against thread identity value
-        clashing (because thread.ident values are recycled).
-        For the main thread, this method is a NO-OP.
-        The allocated thread is a daemon thread, so it should
-        be safe to use join() on daemon threads as well.
-        """
-        if self.isMainThread(current_thread):
-            const_debug_write(
-                __name__,
-                "NOT setting up a cleanup monitor for the MainThread")
-            # do not install any cleanup monitor then
-            return
-
-        with self._cleanup_monitor_cache_mutex:
-            mon = self._cleanup_monitor_cache.get(c_key)
-            if mon is not None:
-                # there is already a monitor for this
-                # cache key, quit straight away
-                return
-            self._cleanup_monitor_cache[c_key] = mon
+        self._connection_pool().checkin()
 
-        if const_debug_enabled():
-            const_debug_write(
-                __name__,
-                "setting up a new cleanup monitor")
-        mon = ParallelTask(self._cleanup_monitor,
-                           current_thread, c_key)
-        mon.name = "CleanupMonitor"
-        mon.daemon = True
-        mon.start()
-
-    def _cleanup_killer(self, c_key, _cleanup_main_thread=False):
-        """
-        Cursor and Connection cleanup method.
-        """
-        db, th_ident, pid = c_key
-
-        with self._cursor_pool_mutex():
-            with self._connection_pool_mutex():
-                cursor_pool = self._cursor_pool()
-                cur = None
-                threads = set()
-
-                cur_data = cursor_pool.get(c_key)
-                if cur_data is not None:
-                    cur, threads = cur_data
-
-                connection_pool = self._connection_pool()
-                conn_data = connection_pool.get(c_key)
-                conn = None
-                if conn_data is not None:
-                    conn, _threads = conn_data
-                    threads |= _threads
-
-                if not threads:
-                    # no threads?
-                    return
-
-                # now cleanup threads set() first
-                # if it's empty, we can kill both
-                # connection and cursor
-                _dead_threads = set(
-                    (x for x in threads if not x.is_alive()))
-                # we need to use the method rather than
-                # the operator, because we alter its data in
-                # place.
-                threads.difference_update(_dead_threads)
-
-                # also remove myself from the list
-                current_thread = threading.current_thread()
-                threads.discard(current_thread)
-
-                # closing the main thread objects (forcibly)
-                # is VERY dangerous, but it turned out
-                # that the original version of EntropyRepository.close()
-                # did that (that is why we have rwsems encapsulating
-                # entropy calls in RigoDaemon and Rigo).
-                # Also, one expects that close() really terminates
-                # all the connections and releases all the resources.
-                if _cleanup_main_thread and threads:
-                    threads.discard(self._MAIN_THREAD)
-
-                if threads:
-                    if const_debug_enabled():
-                        const_debug_write(
-                            __name__,
-                            "_cleanup_killer: "
-                            "there are still alive threads, "
-                            "not cleaning up resources, "
-                            "alive: %s -- dead: %s" % (
-                                threads, _dead_threads,))
-                    return
-
-                cursor_pool.pop(c_key, None)
-                connection_pool.pop(c_key, None)
+    def connectionPoolStats(self):
+        """
+        Return the connection pool statistics.
+        See SQLConnectionPool.stats().
 
-            if const_debug_enabled():
-                const_debug_write(
-                    __name__,
-                    "_cleanup_killer: "
-                    "all threads sharing the same "
-                    "ident are gone, i canz kill thread "
-                    "ids: %s." % (hex(th_ident),))
-
-            # WARNING !! BEHAVIOUR CHANGE
-            # no more implicit commit()
-            # caller has to do it!
-            try:
-                conn.close()
-            except OperationalError as err:
-                if const_debug_enabled():
-                    const_debug_write(
-                        __name__,
-                        "_cleanup_killer_1: %s" % (err,))
-                try:
-                    conn.interrupt()
-                    conn.close()
-                except OperationalError as err:
-                    # heh, unable to close due to
-                    # unfinalized statements
-                    # interpreter shutdown?
-                    if const_debug_enabled():
-                        const_debug_write(
-                            __name__,
-                            "_cleanup_killer_2: %s" % (err,))
+        @return: the connection pool statistics
+        @rtype: dict
+        """
+        return self._connection_pool().stats()
 
     def _concatOperator(self, fields):
         """
@@ -909,28 +1238,10 @@ class EntropySQLRepository(EntropyRepositoryBase):
 
     def _connection_pool(self):
         """
-        Return the Connection Pool mapping object
+        Return the Connection Pool object
         """
         return self.__connection_pool
 
-    def _connection_pool_mutex(self):
-        """
-        Return the Connection Pool mapping mutex
-        """
-        return self.__connection_pool_mutex
-
-    def _cursor_pool(self):
-        """
-        Return the Cursor Pool mapping object
-        """
-        return self.__cursor_pool
-
-    def _cursor_pool_mutex(self):
-        """
-        Return the Cursor Pool mapping mutex
-        """
-        return self.__cursor_pool_mutex
-
     def _doesTableExist(self, table, temporary = False):
         """
         Return whether a table exists.
@@ -1006,6 +1317,11 @@ class EntropySQLRepository(EntropyRepositoryBase):
             # database file are opened and used before data is actually written
             # to disk, causing a tricky race condition hard to exploit.
             # So, FIRST commit changes, then call plugins.
+            if self._generation_dirty and not self.readonly():
+                self._bumpGeneration()
+            # reverse dependencies metadata updated by addPackage() and
+            # removePackage(), stored for the new repository status below
+            rev_deps_data = self._getLiveCache("reverseDependenciesMetadata")
             try:
                 self._connection().commit()
             except OperationalError as err:
@@ -1015,6 +1331,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
                 if str(err.message).find("no transaction is active") == -1:
                     raise
 
+            if rev_deps_data is not None and rev_deps_data['dirty']:
+                self._saveReverseDependenciesMetadata(rev_deps_data)
+
         super(EntropySQLRepository, self).commit(
             force = force, no_plugins = no_plugins)
 
@@ -1023,6 +1342,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         Reimplemented from EntropyRepositoryBase.
         """
         self._connection().rollback()
+        self._clearLiveCache("reverseDependenciesMetadata")
 
     def initializeRepository(self):
         """
@@ -1030,6 +1350,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         Needs to call superclass method. This is a stub,
         please implement the SQL logic.
         """
+        self._generation_dirty = True
         super(EntropySQLRepository, self).initializeRepository()
 
     def handlePackage(self, pkg_data, revision = None,
@@ -1238,8 +1559,12 @@ class EntropySQLRepository(EntropyRepositoryBase):
         mypackage_id_string = 'NULL'
         if package_id is not None:
 
-            manual_deps = self.retrieveManualDependencies(package_id,
-                resolve_conditional_deps = False)
+            # new package identifiers, like the ones coming from
+            # changesets, would load the dependencies cache for nothing
+            manual_deps = ()
+            if self.isPackageIdAvailable(package_id):
+                manual_deps = self.retrieveManualDependencies(package_id,
+                    resolve_conditional_deps = False)
 
             # does it exist?
             self.removePackage(package_id, from_add_package = True)
@@ -1396,9 +1721,21 @@ class EntropySQLRepository(EntropyRepositoryBase):
         Needs to call superclass method.
         """
         try:
+            # keep the reverse dependencies metadata, if available, up
+            # to date instead of generating it again from scratch
+            rev_deps_data = self._getLiveCache("reverseDependenciesMetadata")
             package_id = self._addPackage(pkg_data, revision = revision,
                 package_id = package_id,
                 formatted_content = formatted_content)
+            if rev_deps_data is not None:
+                keys = rev_deps_data['pending']
+                keys.add(entropy.dep.dep_getkey(pkg_data['atom']))
+                self._updateReverseDependenciesMetadata(
+                    rev_deps_data, keys, package_id = package_id)
+                keys.clear()
+                self._setLiveCache("reverseDependenciesMetadata",
+                    rev_deps_data)
+            self._bumpGeneration()
             super(EntropySQLRepository, self).addPackage(
                 pkg_data, revision = revision,
                 package_id = package_id,
@@ -1406,6 +1743,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
             return package_id
         except:
             self._connection().rollback()
+            self._clearLiveCache("reverseDependenciesMetadata")
             raise
 
     def removePackage(self, package_id, from_add_package = False):
@@ -1414,15 +1752,37 @@ class EntropySQLRepository(EntropyRepositoryBase):
         Needs to call superclass method.
         """
         try:
+            rev_deps_data = self._getLiveCache("reverseDependenciesMetadata")
+            key_slot = None
+            if rev_deps_data is not None:
+                key_slot = self.retrieveKeySlot(package_id)
+
             self.clearCache()
             super(EntropySQLRepository, self).removePackage(
                 package_id, from_add_package = from_add_package)
             self.clearCache()
 
-            return self._removePackage(package_id,
+            outcome = self._removePackage(package_id,
                 from_add_package = from_add_package)
+
+            if rev_deps_data is not None:
+                for dep_id in rev_deps_data['packages'].pop(package_id, ()):
+                    rev_deps_data['dependencies'][dep_id].discard(package_id)
+                if key_slot is not None:
+                    rev_deps_data['pending'].add(key_slot[0])
+                if not from_add_package:
+                    # otherwise, addPackage() takes care of the pending keys
+                    keys = rev_deps_data['pending']
+                    self._updateReverseDependenciesMetadata(
+                        rev_deps_data, keys)
+                    keys.clear()
+                self._setLiveCache("reverseDependenciesMetadata",
+                    rev_deps_data)
+            self._bumpGeneration()
+            return outcome
         except:
             self._connection().rollback()
+            self._clearLiveCache("reverseDependenciesMetadata")
             raise
 
     def _removePackage(self, package_id, from_add_package = False):
@@ -1551,6 +1911,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         if not self.isInjected(package_id):
             self._cursor().execute("""
             INSERT INTO injected VALUES (?)
@@ -1560,6 +1921,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         UPDATE extrainfo SET datecreation = ? WHERE idpackage = ?
         """, (str(date), package_id,))
@@ -1568,6 +1930,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         UPDATE extrainfo SET digest = ? WHERE idpackage = ?
         """, (digest, package_id,))
@@ -1576,6 +1939,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         UPDATE packagesignatures SET sha1 = ?, sha256 = ?, sha512 = ?,
         gpg = ? WHERE idpackage = ?
@@ -1590,6 +1954,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         @param url: URL prefix to set
         @type url: string
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         UPDATE extrainfo SET download = ? WHERE idpackage = ?
         """, (url, package_id,))
@@ -1598,6 +1963,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         UPDATE baseinfo SET category = ? WHERE idpackage = ?
         """, (category, package_id,))
@@ -1606,6 +1972,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         DELETE FROM categoriesdescription WHERE category = ?
         """, (category,))
@@ -1619,6 +1986,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         UPDATE baseinfo SET name = ? WHERE idpackage = ?
         """, (name, package_id,))
@@ -1627,6 +1995,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         UPDATE dependenciesreference SET dependency = ?
         WHERE iddependency = ?
@@ -1636,6 +2005,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         UPDATE baseinfo SET atom = ? WHERE idpackage = ?
         """, (atom, package_id,))
@@ -1644,6 +2014,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         UPDATE baseinfo SET slot = ? WHERE idpackage = ?
         """, (slot, package_id,))
@@ -1652,6 +2023,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         UPDATE baseinfo SET revision = ? WHERE idpackage = ?
         """, (revision, package_id,))
@@ -1660,6 +2032,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         DELETE FROM dependencies WHERE idpackage = ?
         """, (package_id,))
@@ -1668,6 +2041,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
 
         def insert_list():
             deps = []
@@ -1699,6 +2073,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         @param package_id: package indentifier
         @type package_id: int
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         DELETE FROM conflicts WHERE idpackage = ?
         """, (package_id,))
@@ -1712,6 +2087,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         @param conflicts: list of dep. conflicts
         @type conflicts: list
         """
+        self._generation_dirty = True
         self._cursor().executemany("""
         INSERT INTO conflicts VALUES (?, ?)
         """, [(package_id, x,) for x in conflicts])
@@ -1720,6 +2096,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         # respect iterators, so that if they're true iterators
         # we save a lot of memory.
         class MyIter:
@@ -1816,6 +2193,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().executemany("""
         INSERT INTO automergefiles VALUES (?, ?, ?)""",
             [(package_id, x, y,) for x, y in automerge_data])
@@ -2165,6 +2543,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         %s INTO preserved_libs VALUES (?, ?, ?, ?)
         """ % (self._INSERT_OR_REPLACE,), (library, elfclass, path, atom))
@@ -2173,6 +2552,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         DELETE FROM preserved_libs
         WHERE library = ? AND elfclass = ? AND path = ?
@@ -2201,6 +2581,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         %s INTO entropy_branch_migration VALUES (?,?,?,?,?)
         """ % (self._INSERT_OR_REPLACE,), (
@@ -2215,6 +2596,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         UPDATE entropy_branch_migration SET post_upgrade_md5sum = ? WHERE
         repository = ? AND from_branch = ? AND to_branch = ?
@@ -2253,6 +2635,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         branch = self._settings['repositories']['branch']
 
         self._cursor().execute("""
@@ -2271,6 +2654,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         Remove given Source Package Manager unique package identifiers from
         the "trashed" list. This is only used by Entropy Server.
         """
+        self._generation_dirty = True
         self._cursor().executemany("""
         DELETE FROM trashedcounters WHERE counter = ?
         """, [(x,) for x in spm_package_uids])
@@ -2279,6 +2663,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         %s INTO trashedcounters VALUES (?)
         """ % (self._INSERT_OR_REPLACE,), (spm_package_uid,))
@@ -2287,6 +2672,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         branchstring = ''
         insertdata = (spm_package_uid, package_id)
         if branch:
@@ -2320,6 +2706,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         DELETE FROM contentsafety where idpackage = ?
         """, (package_id,))
@@ -2584,6 +2971,421 @@ class EntropySQLRepository(EntropyRepositoryBase):
         cur = self._cursor().execute(sql, (package_id,))
         return cur.fetchone()
 
+    def _getPackageDataManyRows(self, sql, package_ids, table = None):
+        """
+        Execute a "IN (...)" query, whose placeholder is expanded to
+        as many bound parameters as package_ids, and return the cursor.
+        If table is given, the table is considered optional and an
+        empty list is returned if it is not available.
+        """
+        try:
+            return self._cursor().execute(sql % (
+                    ", ".join(["?"] * len(package_ids)),), package_ids)
+        except OperationalError:
+            if table is None or self._doesTableExist(table):
+                raise
+            return []
+
+    def getPackageDataMany(self, package_ids, get_content = True,
+            content_insert_formatted = False, get_changelog = True,
+            get_content_safety = True):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        Fetch the metadata of _BATCH_QUERY_SIZE packages at a time,
+        using one query per table.
+        """
+        package_ids = list(package_ids)
+        for chunk in entropy.tools.split_indexable_into_chunks(
+                package_ids, self._BATCH_QUERY_SIZE):
+            data = self._getPackageDataChunk(
+                sorted(set(chunk)), get_content, content_insert_formatted,
+                get_changelog, get_content_safety)
+            for package_id in chunk:
+                yield data.get(package_id)
+
+    def _getPackageDataChunk(self, package_ids, get_content,
+                             content_insert_formatted, get_changelog,
+                             get_content_safety):
+        """
+        Return a dict of package metadata, keyed by package identifier,
+        as returned by getPackageData(), for the given package_ids.
+        Missing packages are not part of the returned dict.
+        """
+        def rows(sql, table = None):
+            return self._getPackageDataManyRows(
+                sql, package_ids, table = table)
+
+        base = {}
+        for row in rows("""
+        SELECT
+            baseinfo.idpackage,
+            baseinfo.atom,
+            baseinfo.name,
+            baseinfo.version,
+            baseinfo.versiontag,
+            extrainfo.description,
+            baseinfo.category,
+            extrainfo.chost,
+            extrainfo.cflags,
+            extrainfo.cxxflags,
+            extrainfo.homepage,
+            baseinfo.license,
+            baseinfo.branch,
+            extrainfo.download,
+            extrainfo.digest,
+            baseinfo.slot,
+            baseinfo.etpapi,
+            extrainfo.datecreation,
+            extrainfo.size,
+            baseinfo.revision
+        FROM
+            baseinfo,
+            extrainfo
+        WHERE
+            baseinfo.idpackage IN (%s)
+            AND baseinfo.idpackage = extrainfo.idpackage
+        """):
+            base.setdefault(row[0], row[1:])
+        if not base:
+            return {}
+
+        def _group(cur, factory = list, value = lambda x: x[1:]):
+            grouped = {}
+            for row in cur:
+                obj = grouped.get(row[0])
+                if obj is None:
+                    obj = grouped[row[0]] = []
+                obj.append(value(row))
+            return dict((k, factory(v)) for k, v in grouped.items())
+
+        def _first(cur):
+            first = {}
+            for package_id, value in cur:
+                first.setdefault(package_id, value)
+            return first
+
+        def _flatten(cur):
+            return _group(cur, factory = frozenset, value = lambda x: x[1])
+
+        content = {}
+        if get_content:
+            if content_insert_formatted:
+                content = _group(
+                    rows("""
+                    SELECT idpackage, file, type FROM content
+                    WHERE idpackage IN (%s)"""),
+                    factory = tuple, value = tuple)
+            else:
+                content = _group(
+                    rows("""
+                    SELECT idpackage, file, type FROM content
+                    WHERE idpackage IN (%s)"""),
+                    factory = dict)
+
+        sources = _flatten(rows("""
+        SELECT sources.idpackage, sourcesreference.source
+        FROM sources, sourcesreference
+        WHERE sources.idpackage IN (%s) AND
+        sources.idsource = sourcesreference.idsource
+        """))
+
+        signatures = {}
+        for row in rows("""
+        SELECT idpackage, sha1, sha256, sha512, gpg FROM packagesignatures
+        WHERE idpackage IN (%s)
+        """):
+            signatures.setdefault(row[0], row[1:])
+
+        changelogs = {}
+        if get_changelog:
+            changelogs = _first(rows("""
+            SELECT baseinfo.idpackage, packagechangelogs.changelog
+            FROM packagechangelogs, baseinfo
+            WHERE baseinfo.idpackage IN (%s) AND
+            packagechangelogs.category = baseinfo.category AND
+            packagechangelogs.name = baseinfo.name
+            """))
+
+        content_safety = {}
+        if get_content_safety:
+            content_safety = _group(
+                rows("""
+                SELECT idpackage, file, sha256, mtime FROM contentsafety
+                WHERE idpackage IN (%s)
+                """, table = "contentsafety"),
+                factory = dict,
+                value = lambda x: (x[1], {'sha256': x[2], 'mtime': x[3]}))
+
+        dependencies = _group(rows("""
+        SELECT dependencies.idpackage, dependenciesreference.dependency,
+            dependencies.type
+        FROM dependencies, dependenciesreference
+        WHERE dependencies.idpackage IN (%s) AND
+        dependencies.iddependency = dependenciesreference.iddependency
+        """), factory = tuple, value = lambda x: tuple(x[1:]))
+
+        needed_libs = _group(rows("""
+        SELECT idpackage, lib_user_path, lib_user_soname, soname, elfclass,
+            rpath
+        FROM needed_libs WHERE idpackage IN (%s)
+        """), factory = frozenset, value = lambda x: tuple(x[1:]))
+
+        counters = _first(rows("""
+        SELECT counters.idpackage, counters.counter FROM counters, baseinfo
+        WHERE counters.idpackage IN (%s) AND
+        baseinfo.idpackage = counters.idpackage AND
+        baseinfo.branch = counters.branch
+        """))
+
+        triggers = _first(rows("""
+        SELECT idpackage, data FROM triggers WHERE idpackage IN (%s)
+        """))
+
+        sizes = _first(rows("""
+        SELECT idpackage, size FROM sizes WHERE idpackage IN (%s)
+        """))
+
+        injected = frozenset(x for x, in rows("""
+        SELECT idpackage FROM injected WHERE idpackage IN (%s)
+        """))
+
+        system_packages = frozenset(x for x, in rows("""
+        SELECT idpackage FROM systempackages WHERE idpackage IN (%s)
+        """))
+
+        protect = _first(rows("""
+        SELECT configprotect.idpackage, protect
+        FROM configprotect, configprotectreference
+        WHERE configprotect.idpackage IN (%s) AND
+        configprotect.idprotect = configprotectreference.idprotect
+        """))
+
+        protect_mask = _first(rows("""
+        SELECT configprotectmask.idpackage, protect
+        FROM configprotectmask, configprotectreference
+        WHERE configprotectmask.idpackage IN (%s) AND
+        configprotectmask.idprotect = configprotectreference.idprotect
+        """))
+
+        useflags = _flatten(rows("""
+        SELECT useflags.idpackage, useflagsreference.flagname
+        FROM useflags, useflagsreference
+        WHERE useflags.idpackage IN (%s)
+        AND useflags.idflag = useflagsreference.idflag
+        """))
+
+        keywords = _flatten(rows("""
+        SELECT keywords.idpackage, keywordsreference.keywordname
+        FROM keywords, keywordsreference
+        WHERE keywords.idpackage IN (%s) AND
+        keywords.idkeyword = keywordsreference.idkeyword
+        """))
+
+        provided_libs = _group(rows("""
+        SELECT idpackage, library, path, elfclass FROM provided_libs
+        WHERE idpackage IN (%s)
+        """), factory = frozenset, value = lambda x: tuple(x[1:]))
+
+        provide = _group(rows("""
+        SELECT idpackage, atom, is_default FROM provide
+        WHERE idpackage IN (%s)
+        """), factory = frozenset, value = lambda x: tuple(x[1:]))
+
+        conflicts = _flatten(rows("""
+        SELECT idpackage, conflict FROM conflicts WHERE idpackage IN (%s)
+        """))
+
+        spm_phases = _first(rows("""
+        SELECT idpackage, phases FROM packagespmphases
+        WHERE idpackage IN (%s)
+        """))
+
+        spm_repositories = _first(rows("""
+        SELECT idpackage, repository FROM packagespmrepository
+        WHERE idpackage IN (%s)
+        """))
+
+        desktop_mime = _group(rows("""
+        SELECT idpackage, name, mimetype, executable, icon
+        FROM packagedesktopmime WHERE idpackage IN (%s)
+        """, table = "packagedesktopmime"),
+            value = lambda x: {'name': x[1], 'mimetype': x[2],
+                               'executable': x[3], 'icon': x[4]})
+
+        provided_mime = _flatten(rows("""
+        SELECT idpackage, mimetype FROM provided_mime
+        WHERE idpackage IN (%s)
+        """, table = "provided_mime"))
+
+        installed_repositories = _first(rows("""
+        SELECT idpackage, repositoryname FROM installedtable
+        WHERE idpackage IN (%s)
+        """))
+
+        extra_downloads = _group(rows("""
+        SELECT idpackage, download, type, size, disksize, md5, sha1,
+            sha256, sha512, gpg
+        FROM packagedownloads WHERE idpackage IN (%s)
+        """, table = "packagedownloads"),
+            factory = tuple,
+            value = lambda x: {
+                "download": x[1],
+                "type": x[2],
+                "size": x[3],
+                "disksize": x[4],
+                "md5": x[5],
+                "sha1": x[6],
+                "sha256": x[7],
+                "sha512": x[8],
+                "gpg": x[9],
+            })
+
+        # license texts and mirror links are shared among packages
+        license_names = set()
+        mirror_names = set()
+        for package_id, base_data in base.items():
+            if base_data[10] is not None:
+                for licname in base_data[10].split():
+                    if licname.strip() and \
+                            entropy.tools.is_valid_string(licname):
+                        license_names.add(licname)
+            for source in sources.get(package_id, ()):
+                if source.startswith("mirror://"):
+                    mirror_names.add(source.split("/")[2])
+
+        license_texts = {}
+        for chunk in entropy.tools.split_indexable_into_chunks(
+                sorted(license_names), self._BATCH_QUERY_SIZE):
+            cur = self._getPackageDataManyRows("""
+            SELECT licensename, text FROM licensedata
+            WHERE licensename IN (%s)
+            """, chunk)
+            for licname, lictext in cur:
+                if licname in license_texts:
+                    continue
+                try:
+                    license_texts[licname] = const_convert_to_unicode(
+                        lictext)
+                except UnicodeDecodeError:
+                    license_texts[licname] = const_convert_to_unicode(
+                        lictext, enctype = 'utf-8')
+
+        mirror_links = {}
+        for chunk in entropy.tools.split_indexable_into_chunks(
+                sorted(mirror_names), self._BATCH_QUERY_SIZE):
+            mirror_links.update(_flatten(self._getPackageDataManyRows("""
+            SELECT mirrorname, mirrorlink FROM mirrorlinks
+            WHERE mirrorname IN (%s)
+            """, chunk)))
+
+        empty_set = frozenset()
+        result = {}
+        for package_id, base_data in base.items():
+
+            atom, name, version, versiontag, \
+            description, category, chost, \
+            cflags, cxxflags, homepage, \
+            mylicense, branch, download, \
+            digest, slot, etpapi, \
+            datecreation, size, revision = base_data
+
+            pkg_sources = sources.get(package_id, empty_set)
+            mirrornames = set()
+            for x in pkg_sources:
+                if x.startswith("mirror://"):
+                    mirrornames.add(x.split("/")[2])
+
+            pkg_content = {}
+            if get_content:
+                pkg_content = content.get(package_id)
+                if pkg_content is None:
+                    pkg_content = {}
+                    if content_insert_formatted:
+                        pkg_content = tuple()
+
+            sha1, sha256, sha512, gpg = signatures.get(
+                package_id, (None, None, None, None))
+
+            changelog = changelogs.get(package_id)
+            if changelog is not None:
+                try:
+                    changelog = const_convert_to_unicode(changelog)
+                except UnicodeDecodeError:
+                    changelog = const_convert_to_unicode(
+                        changelog, enctype = 'utf-8')
+
+            pkg_needed_libs = needed_libs.get(package_id, empty_set)
+            compat_needed_libs = tuple(
+                sorted((soname, elfclass) for _x, _x, soname, elfclass, _x
+                        in pkg_needed_libs)
+            )
+
+            licdata = {}
+            if mylicense is not None:
+                for licname in mylicense.split():
+                    if licname in license_texts:
+                        licdata[licname] = license_texts[licname]
+
+            result[package_id] = {
+                'atom': atom,
+                'name': name,
+                'version': version,
+                'versiontag': versiontag,
+                'description': description,
+                'category': category,
+                'chost': chost,
+                'cflags': cflags,
+                'cxxflags': cxxflags,
+                'homepage': homepage,
+                'license': mylicense,
+                'branch': branch,
+                'download': download,
+                'digest': digest,
+                'slot': slot,
+                'etpapi': etpapi,
+                'datecreation': datecreation,
+                'size': size,
+                'revision': revision,
+                'counter': counters.get(package_id, -1),
+                'trigger': const_convert_to_rawstring(
+                    triggers.get(package_id, '')),
+                'disksize': sizes.get(package_id, 0),
+                'changelog': changelog,
+                'injected': package_id in injected,
+                'systempackage': package_id in system_packages,
+                'config_protect': protect.get(package_id, ''),
+                'config_protect_mask': protect_mask.get(package_id, ''),
+                'useflags': useflags.get(package_id, empty_set),
+                'keywords': keywords.get(package_id, empty_set),
+                'sources': pkg_sources,
+                'needed': compat_needed_libs,
+                'needed_libs': pkg_needed_libs,
+                'provided_libs': provided_libs.get(package_id, empty_set),
+                'provide_extended': provide.get(package_id, empty_set),
+                'conflicts': conflicts.get(package_id, empty_set),
+                'licensedata': licdata,
+                'content': pkg_content,
+                'content_safety': content_safety.get(package_id, {}),
+                'pkg_dependencies': dependencies.get(package_id, tuple()),
+                'mirrorlinks': [[x, mirror_links.get(x, empty_set)]
+                                for x in mirrornames],
+                'signatures': {
+                    'sha1': sha1,
+                    'sha256': sha256,
+                    'sha512': sha512,
+                    'gpg': gpg,
+                },
+                'spm_phases': spm_phases.get(package_id),
+                'spm_repository': spm_repositories.get(package_id),
+                'desktop_mime': desktop_mime.get(package_id, []),
+                'provided_mime': provided_mime.get(package_id, empty_set),
+                'original_repository': installed_repositories.get(
+                    package_id),
+                'extra_download': extra_downloads.get(package_id, tuple()),
+            }
+
+        return result
+
     def retrieveRepositoryUpdatesDigest(self, repository):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -2628,6 +3430,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute('DELETE FROM treeupdatesactions')
         self._cursor().executemany("""
         INSERT INTO treeupdatesactions VALUES (?, ?, ?, ?, ?)
@@ -2637,6 +3440,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         DELETE FROM treeupdatesactions WHERE repository = ?
         """, (repository,))
@@ -2645,6 +3449,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         myupdates = [[repository]+list(x) for x in updates]
         self._cursor().executemany("""
         INSERT INTO treeupdatesactions VALUES (NULL, ?, ?, ?, ?)
@@ -2654,6 +3459,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         DELETE FROM treeupdates where repository = ?
         """, (repository,))
@@ -2665,6 +3471,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         mytime = str(time.time())
         myupdates = [
             (repository, x, branch, mytime,) for x in actions \
@@ -2705,12 +3512,14 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute('DELETE FROM packagesets')
 
     def insertPackageSets(self, sets_data):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         mysets = []
         for setname in sorted(sets_data):
             for dependency in sorted(sets_data[setname]):
@@ -3705,11 +4514,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
-        cached = self._getLiveCache("reverseDependenciesMetadata")
-        if cached is None:
-            cached = self._generateReverseDependenciesMetadata()
+        cached = self._reverseDependenciesMetadata()
 
-        dep_ids = set((k for k, v in cached.items() if package_id in v))
+        dep_ids = cached['packages'].get(package_id)
         if not dep_ids:
             # avoid python3.x memleak
             del cached
@@ -3828,13 +4635,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
-        cached = self._getLiveCache("reverseDependenciesMetadata")
-        if cached is None:
-            cached = self._generateReverseDependenciesMetadata()
+        cached = self._reverseDependenciesMetadata()
 
-        pkg_ids = set()
-        for v in cached.values():
-            pkg_ids |= v
+        pkg_ids = [x for x, y in cached['packages'].items() if y]
         if not pkg_ids:
             # avoid python3.x memleak
             del cached
@@ -4093,6 +4896,26 @@ class EntropySQLRepository(EntropyRepositoryBase):
 
         return self._cur2frozenset(cur)
 
+    def searchBelongsMany(self, paths):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        Look up _BATCH_QUERY_SIZE paths at a time.
+        """
+        result = dict((path, set()) for path in paths)
+        for chunk in entropy.tools.split_indexable_into_chunks(
+                sorted(result), self._BATCH_QUERY_SIZE):
+            cur = self._cursor().execute("""
+            SELECT content.file, content.idpackage FROM content, baseinfo
+            WHERE content.file IN (%s) AND
+            content.idpackage = baseinfo.idpackage""" % (
+                    ", ".join(["?"] * len(chunk)),), chunk)
+            for path, package_id in cur:
+                package_ids = result.get(path)
+                if package_ids is not None:
+                    package_ids.add(package_id)
+        return dict((path, frozenset(package_ids)) for path, package_ids
+                    in result.items())
+
     def searchContentSafety(self, sfile):
         """
         Search content safety metadata (usually, sha256 and mtime) related to
@@ -4139,6 +4962,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         Reimplemented from EntropyRepositoryBase.
         Needs to call superclass method.
         """
+        self._generation_dirty = True
         super(EntropySQLRepository, self).acceptLicense(license_name)
 
         self._cursor().execute("""
@@ -4569,6 +5393,47 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """, (name, category))
         return tuple(cur)
 
+    def _atomMatchView(self, names, use_deps):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        Fetch the base metadata (and USE flags, if required) of all the
+        packages with the given names using one query every
+        _BATCH_QUERY_SIZE names.
+        """
+        if not names:
+            return self
+
+        metadata = {}
+        useflags = None
+        try:
+            for chunk in entropy.tools.split_indexable_into_chunks(
+                    sorted(names), self._BATCH_QUERY_SIZE):
+                cur = self._cursor().execute("""
+                SELECT idpackage, category, name, version, versiontag,
+                revision, slot FROM baseinfo WHERE name IN (%s)
+                """ % (", ".join(["?"] * len(chunk)),), chunk)
+                for row in cur:
+                    metadata[row[0]] = tuple(row[1:])
+
+            if use_deps and metadata:
+                useflags = {}
+                for chunk in entropy.tools.split_indexable_into_chunks(
+                        sorted(metadata.keys()), self._BATCH_QUERY_SIZE):
+                    cur = self._cursor().execute("""
+                    SELECT useflags.idpackage, useflagsreference.flagname
+                    FROM useflags, useflagsreference
+                    WHERE useflags.idpackage IN (%s)
+                    AND useflags.idflag = useflagsreference.idflag
+                    """ % (", ".join(["?"] * len(chunk)),), chunk)
+                    for package_id, flag in cur:
+                        obj = useflags.setdefault(package_id, set())
+                        obj.add(flag)
+        except OperationalError:
+            # tables not available, atomMatch() is fault tolerant
+            return self
+
+        return SQLAtomMatchView(self, names, metadata, useflags)
+
     def isPackageScopeAvailable(self, atom, slot, revision):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -4812,6 +5677,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         UPDATE baseinfo SET branch = ?
         WHERE idpackage = ?""", (tobranch, package_id,))
@@ -4862,6 +5728,72 @@ class EntropySQLRepository(EntropyRepositoryBase):
             const_convert_to_unicode(setting_value),))
         self._settings_cache.clear()
 
+    def _getGeneration(self):
+        """
+        Return the generation stamp stored in the settings table, or
+        None if not available. The settings cache is not used because
+        the stamp can be bumped by other processes.
+        """
+        try:
+            cur = self._cursor().execute("""
+            SELECT setting_value FROM settings WHERE setting_name = ?
+            LIMIT 1
+            """, (self._GENERATION_SETTING,))
+        except Error:
+            return None
+        stamp = cur.fetchone()
+        if stamp is None:
+            return None
+        return stamp[0]
+
+    def _bumpGeneration(self):
+        """
+        Store a new generation stamp, made of a monotonic counter and
+        a random token, so that stamps of unrelated repositories (for
+        instance, a rebuilt one) never clash.
+        """
+        counter = 0
+        stamp = self._getGeneration()
+        if stamp is not None:
+            try:
+                counter = int(stamp.split(":", 1)[0])
+            except ValueError:
+                counter = 0
+        self._setSetting(self._GENERATION_SETTING,
+            "%d:%s" % (counter + 1, uuid.uuid4().hex))
+        self._generation_dirty = False
+
+    def generation(self):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        The stamp is kept in the settings table and bumped by addPackage(),
+        removePackage() and commit(), if data has been modified.
+        """
+        stamp = self._getGeneration()
+        if stamp is not None:
+            return stamp
+        # repository not modified since generations got introduced
+        return super(EntropySQLRepository, self).generation()
+
+    def packageKeyDigests(self):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        """
+        concat = self._concatOperator(
+            ("baseinfo.category", "'/'", "baseinfo.name"))
+        cur = self._cursor().execute("""
+        SELECT %s, baseinfo.idpackage, baseinfo.version, baseinfo.versiontag,
+            baseinfo.revision, baseinfo.slot, extrainfo.digest
+        FROM baseinfo LEFT OUTER JOIN extrainfo
+            ON baseinfo.idpackage = extrainfo.idpackage
+        """ % (concat,))
+
+        packages = {}
+        for row in cur:
+            obj = packages.setdefault(row[0], [])
+            obj.append(row[1:])
+        return self._digestPackageKeys(packages)
+
     def _setupInitialSettings(self):
         """
         Not implemented, subclasses must implement this.
@@ -5025,6 +5957,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropySQLRepository.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         %s INTO installedtable VALUES (?,?,?)
         """ % (self._INSERT_OR_REPLACE,),
@@ -5062,6 +5995,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         UPDATE installedtable SET source = ? WHERE idpackage = ?
         """, (source, package_id,))
@@ -5070,6 +6004,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         DELETE FROM installedtable
         WHERE idpackage = ?""", (package_id,))
@@ -5078,6 +6013,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         INSERT INTO xpakdata VALUES (?, ?)
         """, (package_id, const_get_buffer()(blob),))
@@ -5115,6 +6051,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute('DELETE FROM content')
         self.dropContentSafety()
 
@@ -5122,18 +6059,21 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute('DELETE FROM contentsafety')
 
     def dropChangelog(self):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute('DELETE FROM packagechangelogs')
 
     def dropGpgSignatures(self):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute('UPDATE packagesignatures set gpg = NULL')
 
     def dropAllIndexes(self):
@@ -5400,6 +6340,14 @@ class EntropySQLRepository(EntropyRepositoryBase):
             """)
         except OperationalError:
             pass
+        try:
+            # used by reverse dependencies lookups
+            self._cursor().execute("""
+            CREATE INDEX dependenciesindex_iddp_idpk
+                ON dependencies ( iddependency, idpackage );
+            """)
+        except OperationalError:
+            pass
         try:
             self._cursor().execute("""
             CREATE INDEX dependenciesreferenceindex_dependency
@@ -5471,6 +6419,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         spm = get_spm(self)
 
         # this is necessary now, counters table should be empty
@@ -5531,6 +6480,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         DELETE FROM treeupdates WHERE repository = ?
         """, (repository,))
@@ -5539,13 +6489,15 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         UPDATE treeupdates SET digest = '-1'
         """)
 
-    def _generateReverseDependenciesMetadata(self):
+    def _reverseDependenciesMetadataCacheKey(self):
         """
-        Reverse dependencies dynamic metadata generation.
+        Return the on-disk cache key of the reverse dependencies metadata
+        for the current repository status.
         """
         checksum = self.checksum()
         try:
@@ -5563,49 +6515,177 @@ class EntropySQLRepository(EntropyRepositoryBase):
             hash_str = hash_str.encode("utf-8")
         sha = hashlib.sha1()
         sha.update(hash_str)
-        cache_key = "__generateReverseDependenciesMetadata2_" + \
-            sha.hexdigest()
+        return "__generateReverseDependenciesMetadata3_" + sha.hexdigest()
+
+    def _reverseDependenciesMetadata(self):
+        """
+        Return the reverse dependencies metadata, generating it if not
+        available.
+        """
+        cached = self._getLiveCache("reverseDependenciesMetadata")
+        if cached is None:
+            cached = self._generateReverseDependenciesMetadata()
+        return cached
+
+    def _saveReverseDependenciesMetadata(self, metadata):
+        """
+        Store the reverse dependencies metadata on disk, for the current
+        repository status.
+        """
+        metadata['dirty'] = False
+        try:
+            self._cacher.save(
+                self._reverseDependenciesMetadataCacheKey(), metadata)
+        except IOError:
+            # race condition, ignore
+            pass
+
+    @classmethod
+    def _reverseDependencyKeys(cls, dependency):
+        """
+        Return the package keys whose packages can satisfy the given
+        dependency string, or None if it cannot be determined (old-style
+        virtuals, dependencies without category).
+        """
+        if dependency.endswith(etpConst['entropyordepquestion']):
+            dependencies = dependency[:-1].split(etpConst['entropyordepsep'])
+        else:
+            dependencies = [dependency]
+
+        keys = set()
+        for dep in dependencies:
+            key = entropy.dep.dep_getkey(
+                entropy.dep.remove_entropy_revision(dep))
+            if not key:
+                return None
+            category = key.split("/", 1)[0]
+            if "/" not in key or category in (
+                    "null", cls.VIRTUAL_META_PACKAGE_CATEGORY):
+                return None
+            keys.add(key)
+        return keys
+
+    def _matchReverseDependencies(self, metadata, dependencies):
+        """
+        Match the given (dependency identifier, dependency string) pairs
+        against this repository, all at once, and store the outcome into
+        the reverse dependencies metadata.
+        """
+        dep_map = metadata['dependencies']
+        pkg_map = metadata['packages']
+
+        atoms = []
+        for dep_id, dependency in dependencies:
+            if dependency.endswith(etpConst['entropyordepquestion']):
+                atoms.extend(dependency[:-1].split(
+                        etpConst['entropyordepsep']))
+            else:
+                atoms.append(dependency)
+        # not safe to use cache here, people messing with multiple
+        # instances can make this crash
+        matches = dict(zip(atoms, self.atomMatchMany(atoms, useCache = False)))
+
+        for dep_id, dependency in dependencies:
+            for package_id in dep_map.pop(dep_id, ()):
+                pkg_map[package_id].discard(dep_id)
+
+            if dependency.endswith(etpConst['entropyordepquestion']):
+                or_atoms = dependency[:-1].split(etpConst['entropyordepsep'])
+            else:
+                or_atoms = [dependency]
+
+            for atom in or_atoms:
+                package_id, rc = matches[atom]
+                if package_id == -1:
+                    continue
+                dep_map.setdefault(dep_id, set()).add(package_id)
+                pkg_map.setdefault(package_id, set()).add(dep_id)
+
+    def _indexReverseDependencies(self, metadata, dependencies):
+        """
+        Add the given (dependency identifier, dependency string) pairs to
+        the package key index of the reverse dependencies metadata.
+        """
+        key_map = metadata['keys']
+        for dep_id, dependency in dependencies:
+            keys = self._reverseDependencyKeys(dependency)
+            if keys is None:
+                metadata['volatile'].add(dep_id)
+                continue
+            for key in keys:
+                key_map.setdefault(key, set()).add(dep_id)
+
+    def _generateReverseDependenciesMetadata(self):
+        """
+        Reverse dependencies dynamic metadata generation.
+
+        The metadata is a dict containing: "dependencies", mapping
+        dependency identifiers to the package identifiers satisfying them,
+        "packages", the inverted map, "keys", mapping package keys to the
+        dependency identifiers they can satisfy and "volatile", the
+        dependency identifiers without a package key, always matched
+        again by addPackage() and removePackage().
+        """
+        cache_key = self._reverseDependenciesMetadataCacheKey()
         rev_deps_data = self._cacher.pop(cache_key)
         if rev_deps_data is not None:
             self._setLiveCache("reverseDependenciesMetadata",
                 rev_deps_data)
             return rev_deps_data
 
-        dep_data = {}
-        for iddep, atom in self.listAllDependencies():
-
-            if iddep == -1:
-                continue
-
-            if atom.endswith(etpConst['entropyordepquestion']):
-                or_atoms = atom[:-1].split(etpConst['entropyordepsep'])
-                for or_atom in or_atoms:
-                    # not safe to use cache here, people messing with multiple
-                    # instances can make this crash
-                    package_id, rc = self.atomMatch(or_atom, useCache = False)
-                    if package_id != -1:
-                        obj = dep_data.setdefault(iddep, set())
-                        obj.add(package_id)
-            else:
-                # not safe to use cache here, people messing with multiple
-                # instances can make this crash
-                package_id, rc = self.atomMatch(atom, useCache = False)
-                if package_id != -1:
-                    obj = dep_data.setdefault(iddep, set())
-                    obj.add(package_id)
+        dep_data = {
+            'dependencies': {},
+            'packages': {},
+            'keys': {},
+            'volatile': set(),
+            'pending': set(),
+            'dirty': False,
+        }
+        dependencies = [x for x in self.listAllDependencies() if x[0] != -1]
+        self._indexReverseDependencies(dep_data, dependencies)
+        self._matchReverseDependencies(dep_data, dependencies)
 
         self._setLiveCache("reverseDependenciesMetadata", dep_data)
-        try:
-            self._cacher.save(cache_key, dep_data)
-        except IOError:
-            # race condition, ignore
-            pass
+        self._saveReverseDependenciesMetadata(dep_data)
         return dep_data
 
+    def _updateReverseDependenciesMetadata(self, metadata, keys,
+                                           package_id = None):
+        """
+        Update the reverse dependencies metadata after the packages with
+        the given keys changed, by matching again the dependencies they
+        can satisfy. If package_id is provided, its dependencies are
+        added to the metadata as well.
+        """
+        dep_ids = set()
+        if package_id is not None:
+            cur = self._cursor().execute("""
+            SELECT dependenciesreference.iddependency,
+                dependenciesreference.dependency
+            FROM dependencies, dependenciesreference
+            WHERE dependencies.idpackage = ? AND
+            dependencies.iddependency = dependenciesreference.iddependency
+            """, (package_id,))
+            dependencies = [x for x in cur if x[0] not in metadata['volatile']]
+            self._indexReverseDependencies(metadata, dependencies)
+            dep_ids.update(x[0] for x in dependencies)
+
+        dep_ids.update(metadata['volatile'])
+        for key in keys:
+            dep_ids.update(metadata['keys'].get(key, ()))
+        if dep_ids:
+            cur = self._cursor().execute("""
+            SELECT iddependency, dependency FROM dependenciesreference
+            WHERE iddependency IN (%s)""" % (
+                ", ".join([str(x) for x in dep_ids]),))
+            self._matchReverseDependencies(metadata, list(cur))
+        metadata['dirty'] = True
+
     def moveSpmUidsToBranch(self, to_branch):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        self._generation_dirty = True
         self._cursor().execute("""
         UPDATE counters SET branch = ?
         """, (to_branch,))
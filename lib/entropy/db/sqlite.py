@@ -20,7 +20,6 @@ try:
 except ImportError:
     import _thread as thread
 import threading
-import subprocess
 
 from entropy.const import etpConst, const_convert_to_unicode, \
     const_get_buffer, const_convert_to_rawstring, const_pid_exists, \
@@ -33,8 +32,9 @@ from entropy.locks import ResourceLock
 from entropy.db.exceptions import Warning, Error, InterfaceError, \
     DatabaseError, DataError, OperationalError, IntegrityError, \
     InternalError, ProgrammingError, NotSupportedError, LockAcquireError
+from entropy.db.skel import EntropyRepositoryBase
 from entropy.db.sql import EntropySQLRepository, SQLConnectionWrapper, \
-    SQLCursorWrapper
+    SQLCursorWrapper, SQLConnectionPool
 
 from entropy.i18n import _
 
@@ -141,7 +141,57 @@ class EntropySQLiteRepository(EntropySQLRepository):
     _CACHE_SIZE = 8192
 
     SETTING_KEYS = ("arch", "on_delete_cascade", "schema_revision",
-        "_baseinfo_extrainfo_2010")
+        "_baseinfo_extrainfo_2010", "_content_interned")
+
+    # Migrate content and contentsafety to the interned paths layout
+    # (see _migrateContentInterned()) when updating the schema.
+    # Migrated repositories cannot be read by older Entropy versions,
+    # so this is opt-in.
+    CONTENT_INTERNING = os.getenv("ETP_REPO_CONTENT_INTERNING") is not None
+
+    # SQLite tuning profiles, (pragma, value) tuples applied in order
+    # to every new connection. Subclasses pick one through
+    # PERFORMANCE_PROFILE, ETP_REPO_PERFORMANCE_PROFILE overrides it for
+    # every repository (use "default" to go back to plain SQLite).
+    # "available" is for read-mostly repositories that are replaced as
+    # a whole on update: memory mapped I/O and a bigger page cache, the
+    # journal mode is left alone since these files are distributed.
+    # "installed" is for the installed packages repository: WAL
+    # journaling, so that readers do not block the writer and the writer
+    # does not block readers, with the "NORMAL" synchronous level, which
+    # is durable enough under WAL, and a bounded WAL file.
+    # page_size only affects newly created repositories.
+    PERFORMANCE_PROFILES = {
+        "default": (),
+        "available": (
+            ("mmap_size", 268435456),
+            ("cache_size", -16384),
+        ),
+        "installed": (
+            ("page_size", 4096),
+            ("journal_mode", "WAL"),
+            ("synchronous", "NORMAL"),
+            ("wal_autocheckpoint", 1000),
+            ("journal_size_limit", 16777216),
+            ("mmap_size", 67108864),
+            ("cache_size", -16384),
+        ),
+    }
+    PERFORMANCE_PROFILE = "default"
+    _PERFORMANCE_PROFILE_OVERRIDE = os.getenv("ETP_REPO_PERFORMANCE_PROFILE")
+
+    # importRepository() reads SQL dumps in blocks of this size and
+    # executes every block of complete statements in its own transaction.
+    _IMPORT_BLOCK_SIZE = 1024 * 1024
+    # importRepository() builds the repository in a temporary file that
+    # is renamed into place once complete, durability is not needed.
+    _IMPORT_PRAGMAS = (
+        ("journal_mode", "OFF"),
+        ("synchronous", "OFF"),
+        ("locking_mode", "EXCLUSIVE"),
+        ("temp_store", "MEMORY"),
+        ("cache_size", -65536),
+    )
 
     class SQLiteProxy(object):
 
@@ -207,6 +257,9 @@ class EntropySQLiteRepository(EntropySQLRepository):
         """
         self._rwsem_lock = threading.RLock()
         self._rwsem = None
+        # set when a connection switched the repository to WAL
+        # journaling, see _applyPerformanceProfile()
+        self._wal_journal = False
 
         self._sqlite = self.ModuleProxy.get()
 
@@ -376,85 +429,149 @@ class EntropySQLiteRepository(EntropySQLRepository):
         """
         Reimplemented from EntropySQLRepository.
         """
-        current_thread = threading.current_thread()
-        c_key = self._cursor_connection_pool_key()
-
-        _init_db = False
-        cursor = None
-        with self._cursor_pool_mutex():
-            threads = set()
-            cursor_pool = self._cursor_pool()
-            cursor_data = cursor_pool.get(c_key)
-            if cursor_data is not None:
-                cursor, threads = cursor_data
-            # handle possible thread ident clashing
-            # in the cleanup thread function, because
-            # thread idents are recycled
-            # on thread termination
-            threads.add(current_thread)
-
-            if cursor is None:
-                conn = self._connection_impl(_from_cursor=True)
-                cursor = SQLiteCursorWrapper(
-                    conn.cursor(),
-                    self.ModuleProxy.exceptions())
-                # !!! enable foreign keys pragma !!! do not remove this
-                # otherwise removePackage won't work properly
-                cursor.execute("pragma foreign_keys = 1").fetchall()
-                # setup temporary tables and indices storage
-                # to in-memory value
-                # http://www.sqlite.org/pragma.html#pragma_temp_store
-                cursor.execute("pragma temp_store = 2").fetchall()
-                cursor_pool[c_key] = cursor, threads
-                self._start_cleanup_monitor(current_thread, c_key)
-                _init_db = True
-        # memory databases are critical because every new cursor brings
-        # up a totally empty repository. So, enforce initialization.
-        if _init_db and self._is_memory():
-            self.initializeRepository()
+        pooled = self._connection_pool().checkout(self._connect)
+        cursor = pooled.cursor
+        if cursor is None:
+            cursor = SQLiteCursorWrapper(
+                pooled.connection.cursor(),
+                self.ModuleProxy.exceptions())
+            # !!! enable foreign keys pragma !!! do not remove this
+            # otherwise removePackage won't work properly
+            cursor.execute("pragma foreign_keys = 1").fetchall()
+            # setup temporary tables and indices storage
+            # to in-memory value
+            # http://www.sqlite.org/pragma.html#pragma_temp_store
+            cursor.execute("pragma temp_store = 2").fetchall()
+            self._applyPerformanceProfile(cursor)
+            pooled.cursor = cursor
+            # memory databases are critical because every new connection
+            # brings up a totally empty repository. So, enforce
+            # initialization.
+            if self._is_memory():
+                self.initializeRepository()
         return cursor
 
-    def _connection_impl(self, _from_cursor=False):
-        """
-        Connection getter method implementation, adds
-        _from_cursor argument to avoid calling the
-        cleanup routine if True.
-        """
-        current_thread = threading.current_thread()
-        c_key = self._cursor_connection_pool_key()
-
-        conn = None
-        with self._connection_pool_mutex():
-            threads = set()
-            connection_pool = self._connection_pool()
-            conn_data = connection_pool.get(c_key)
-            if conn_data is not None:
-                conn, threads = conn_data
-            # handle possible thread ident clashing
-            # in the cleanup thread function
-            # because thread idents are recycled on
-            # thread termination
-            threads.add(current_thread)
-
-            if conn is None:
-                # check_same_thread still required for
-                # conn.close() called from
-                # arbitrary thread
-                conn = SQLiteConnectionWrapper.connect(
-                    self.ModuleProxy, self._sqlite,
-                    SQLiteConnectionWrapper,
-                    self._db, timeout=300.0,
-                    check_same_thread=False)
-                connection_pool[c_key] = conn, threads
-                if not _from_cursor:
-                    self._start_cleanup_monitor(current_thread, c_key)
-        return conn
+    def _performanceProfile(self):
+        """
+        Return the SQLite tuning profile in use, as a tuple of
+        (pragma, value) tuples. See PERFORMANCE_PROFILES.
+
+        @return: the profile pragmas
+        @rtype: tuple
+        """
+        name = self._PERFORMANCE_PROFILE_OVERRIDE
+        if name is None:
+            name = self.PERFORMANCE_PROFILE
+        return self.PERFORMANCE_PROFILES.get(name, ())
+
+    def _applyPerformanceProfile(self, cursor):
+        """
+        Apply the SQLite tuning profile to a newly created cursor.
+        Tuning is best effort, pragmas that cannot be applied are
+        skipped.
+
+        @param cursor: the new cursor
+        @type cursor: SQLiteCursorWrapper
+        """
+        if self._is_memory():
+            return
+
+        for pragma, value in self._performanceProfile():
+            if pragma == "journal_mode":
+                self._setJournalMode(cursor, value)
+                continue
+            try:
+                cursor.execute(
+                    "PRAGMA %s = %s" % (pragma, value)).fetchall()
+            except OperationalError:
+                continue
+
+    def _setJournalMode(self, cursor, mode):
+        """
+        Switch the repository journal mode, if the repository can be
+        written. WAL journaling needs write access to the directory
+        containing the repository as well, for the -wal and -shm files.
+        Switching needs exclusive access to the repository: in-flight
+        queries from other connections are waited for only briefly,
+        then the switch is skipped.
+
+        @param cursor: the cursor to use
+        @type cursor: SQLiteCursorWrapper
+        @param mode: the new journal mode
+        @type mode: string
+        """
+        if self.readonly():
+            return
+        if not os.access(os.path.dirname(self._db) or os.curdir, os.W_OK):
+            return
+
+        cursor.execute("PRAGMA busy_timeout = 1000").fetchall()
+        try:
+            row = cursor.execute(
+                "PRAGMA journal_mode = %s" % (mode,)).fetchone()
+        except OperationalError:
+            row = None
+        finally:
+            cursor.execute("PRAGMA busy_timeout = 300000").fetchall()
+
+        if row and const_convert_to_unicode(row[0]).lower() == "wal":
+            self._wal_journal = True
+
+    def _restoreJournalMode(self):
+        """
+        Checkpoint the WAL file and go back to the rollback journal once
+        the repository is closed: a repository at rest in WAL mode
+        cannot be read by users that cannot write its directory.
+        This is best effort, it silently fails if other connections,
+        from this or other processes, are still using the repository.
+        """
+        if not self._wal_journal:
+            return
+        self._wal_journal = False
+
+        try:
+            conn = self._sqlite.connect(self._db, timeout=0.0)
+        except self._sqlite.Error:
+            return
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            conn.execute("PRAGMA journal_mode = DELETE").fetchall()
+        except self._sqlite.Error:
+            pass
+        finally:
+            conn.close()
+
+    def _connect(self):
+        """
+        Open a new connection to the repository, for the connection pool.
+        """
+        # check_same_thread still required for
+        # conn.close() called from
+        # arbitrary thread and for connections
+        # handed over to other threads by the pool
+        return SQLiteConnectionWrapper.connect(
+            self.ModuleProxy, self._sqlite,
+            SQLiteConnectionWrapper,
+            self._db, timeout=300.0,
+            check_same_thread=False)
 
     def _connection(self):
         """
         Reimplemented from EntropySQLRepository.
         """
-        return self._connection_impl()
+        return self._connection_pool().checkout(self._connect).connection
+
+    def _newConnectionPool(self):
+        """
+        Reimplemented from EntropySQLRepository.
+        """
+        # every connection to a memory database is a different
+        # database, do not hand them over to other threads
+        return SQLConnectionPool(
+            self.CONNECTION_POOL_SIZE,
+            self.CONNECTION_POOL_IDLE_TIMEOUT,
+            reusable = not self._is_memory(),
+            checkout_timeout = self.CONNECTION_POOL_CHECKOUT_TIMEOUT)
 
     def __show_info(self):
         first_part = "<EntropySQLiteRepository instance at %s, %s" % (
@@ -464,8 +581,8 @@ class EntropySQLiteRepository(EntropySQLRepository):
             self._indexing,)
         third_part = ", name: %s, skip_upd: %s" % (
             self.name, self._skip_checks,)
-        fourth_part = ", conn_pool: %s, cursor_cache: %s>" % (
-            self._connection_pool(), self._cursor_pool(),)
+        fourth_part = ", conn_pool: %s>" % (
+            self._connection_pool().stats(),)
 
         return first_part + second_part + third_part + fourth_part
 
@@ -684,6 +801,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
         super(EntropySQLiteRepository, self).close(safe=safe)
 
         self._cleanup_all(_cleanup_main_thread=not safe)
+        self._restoreJournalMode()
         if self._temporary and (not self._is_memory()) and \
             os.path.isfile(self._db):
             try:
@@ -712,6 +830,12 @@ class EntropySQLiteRepository(EntropySQLRepository):
         """
         my = self.Schema()
         self.dropAllIndexes()
+        # views (and their triggers) of the interned content layout
+        cur = self._cursor().execute("""
+        SELECT name FROM SQLITE_MASTER WHERE type = "view"
+        """)
+        for view in self._cur2tuple(cur):
+            self._cursor().execute("DROP VIEW %s" % (view,))
         for table in self._listAllTables():
             try:
                 self._cursor().execute("DROP TABLE %s" % (table,))
@@ -820,6 +944,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
         Reimplemented from EntropySQLRepository.
         We must handle _baseinfo_extrainfo_2010 and live cache.
         """
+        self._generation_dirty = True
         if self._isBaseinfoExtrainfo2010():
             self._cursor().execute("""
             UPDATE baseinfo SET category = (?) WHERE idpackage = (?)
@@ -1187,6 +1312,26 @@ class EntropySQLiteRepository(EntropySQLRepository):
         cur = self._cursor().execute(sql, (package_id,))
         return cur.fetchone()
 
+    def getPackageDataMany(self, package_ids, get_content = True,
+            content_insert_formatted = False, get_changelog = True,
+            get_content_safety = True):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle backward compatibility.
+        """
+        if self._isBaseinfoExtrainfo2010():
+            return super(EntropySQLiteRepository, self).getPackageDataMany(
+                package_ids, get_content = get_content,
+                content_insert_formatted = content_insert_formatted,
+                get_changelog = get_changelog,
+                get_content_safety = get_content_safety)
+
+        return EntropyRepositoryBase.getPackageDataMany(
+            self, package_ids, get_content = get_content,
+            content_insert_formatted = content_insert_formatted,
+            get_changelog = get_changelog,
+            get_content_safety = get_content_safety)
+
     def retrieveDigest(self, package_id):
         """
         Reimplemented from EntropySQLRepository.
@@ -1514,6 +1659,126 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 raise
             return iter([])
 
+    def isFileAvailable(self, path, get_id = False):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_interned.
+        """
+        if not self._isContentInterned():
+            return super(EntropySQLiteRepository,
+                         self).isFileAvailable(path, get_id = get_id)
+
+        cur = self._cursor().execute("""
+        SELECT content_interned.idpackage
+        FROM content_dirs, content_names, content_interned
+        WHERE content_dirs.dir = ? AND content_names.name = ?
+        AND content_interned.idname = content_names.idname
+        AND content_interned.iddir = content_dirs.iddir
+        """, self._splitContentPath(path))
+        result = self._cur2frozenset(cur)
+        if get_id:
+            return result
+        elif result:
+            return True
+        return False
+
+    # lower-case base name of content.file, computed with deterministic
+    # built-in functions so that it can be indexed, see
+    # _createContentIndex().
+    _CONTENT_BASENAME_SQL = """\
+lower(substr(file, length(rtrim(file, replace(file, '/', ''))) + 1))"""
+
+    @staticmethod
+    def _likeContentBasename(pattern):
+        """
+        Return the base name every path matching the given LIKE pattern
+        has (case insensitively), if its last path component is free of
+        wildcards, None otherwise.
+        """
+        basename = pattern[pattern.rfind("/") + 1:]
+        if not basename or "%" in basename or "_" in basename:
+            return None
+        return basename
+
+    def searchBelongs(self, bfile, like = False):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_interned.
+        LIKE patterns ending with a plain base name (like "%/libfoo.so.1")
+        are served by the base name index instead of a full scan.
+        """
+        if like:
+            basename = self._likeContentBasename(bfile)
+            if basename is None:
+                return super(EntropySQLiteRepository,
+                             self).searchBelongs(bfile, like = like)
+
+            if self._isContentInterned():
+                cur = self._cursor().execute("""
+                SELECT content_interned.idpackage
+                FROM content_names, content_interned, content_dirs, baseinfo
+                WHERE lower(content_names.name) = lower(?)
+                AND content_interned.idname = content_names.idname
+                AND content_dirs.iddir = content_interned.iddir
+                AND content_dirs.dir || content_names.name LIKE ?
+                AND content_interned.idpackage = baseinfo.idpackage
+                """, (basename, bfile))
+            else:
+                cur = self._cursor().execute("""
+                SELECT content.idpackage FROM content, baseinfo
+                WHERE %s = lower(?) AND file LIKE ?
+                AND content.idpackage = baseinfo.idpackage
+                """ % (self._CONTENT_BASENAME_SQL,), (basename, bfile))
+            return self._cur2frozenset(cur)
+
+        if not self._isContentInterned():
+            return super(EntropySQLiteRepository,
+                         self).searchBelongs(bfile, like = like)
+
+        cur = self._cursor().execute("""
+        SELECT content_interned.idpackage
+        FROM content_dirs, content_names, content_interned, baseinfo
+        WHERE content_dirs.dir = ? AND content_names.name = ?
+        AND content_interned.idname = content_names.idname
+        AND content_interned.iddir = content_dirs.iddir
+        AND content_interned.idpackage = baseinfo.idpackage
+        """, self._splitContentPath(bfile))
+        return self._cur2frozenset(cur)
+
+    def searchBelongsMany(self, paths):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_interned.
+        """
+        if not self._isContentInterned():
+            return super(EntropySQLiteRepository,
+                         self).searchBelongsMany(paths)
+
+        # content is a view here, path lookups through the (idname, iddir)
+        # index are as fast one at a time as batched.
+        return EntropyRepositoryBase.searchBelongsMany(self, paths)
+
+    def searchContentSafety(self, sfile):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_interned.
+        """
+        if not self._isContentInterned():
+            return super(EntropySQLiteRepository,
+                         self).searchContentSafety(sfile)
+
+        cur = self._cursor().execute("""
+        SELECT contentsafety_interned.idpackage,
+            content_dirs.dir || content_names.name,
+            contentsafety_interned.sha256, contentsafety_interned.mtime
+        FROM content_dirs, content_names, contentsafety_interned
+        WHERE content_dirs.dir = ? AND content_names.name = ?
+        AND contentsafety_interned.idname = content_names.idname
+        AND contentsafety_interned.iddir = content_dirs.iddir
+        """, self._splitContentPath(sfile))
+        return tuple(({'package_id': x, 'path': y, 'sha256': z, 'mtime': m}
+                      for x, y, z, m in cur))
+
     def retrieveChangelog(self, package_id):
         """
         Reimplemented from EntropySQLRepository.
@@ -1833,6 +2098,39 @@ class EntropySQLiteRepository(EntropySQLRepository):
             return frozenset((y for x, y in data))
         return data
 
+    def searchPackagesRanked(self, keyword, limit = None):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        We must handle the packagesearch full-text index.
+        """
+        if not self._isSearchIndexed():
+            return super(EntropySQLiteRepository, self).searchPackagesRanked(
+                keyword, limit = limit)
+
+        words = self._searchWords(keyword)
+        if not words:
+            return ()
+
+        # every word is a prefix query, quoted so that FTS5 operators
+        # and punctuation are handled as plain text.
+        query = " AND ".join(
+            '"%s"*' % (x.replace('"', '""'),) for x in words)
+        cur = self._cursor().execute("""
+        SELECT rowid, name, category, description,
+            bm25(packagesearch, 8.0, 2.0, 1.0)
+        FROM packagesearch WHERE packagesearch MATCH ?
+        """, (query,))
+
+        ranked = []
+        for package_id, name, category, description, rank in cur:
+            relevance = self._searchRelevance(
+                words, name, category, description)
+            # bm25() is negative, the lower the better: map it to [0, 1)
+            # and use it to order packages of equal relevance.
+            relevance += -rank / (1.0 - rank)
+            ranked.append((relevance, name, package_id))
+        return self._sortRankedSearch(ranked, limit)
+
     def listPackageIdsInCategory(self, category, order_by = None):
         """
         Reimplemented from EntropySQLRepository.
@@ -1924,6 +2222,8 @@ class EntropySQLiteRepository(EntropySQLRepository):
 
             if current_schema_rev == EntropySQLiteRepository._SCHEMA_REVISION \
                     and not os.getenv("ETP_REPO_SCHEMA_UPDATE"):
+                if self.CONTENT_INTERNING and not self._isContentInterned():
+                    return True
                 return False
             return True
 
@@ -1945,6 +2245,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
         Internal version of _databaseSchemaUpdates. This method assumes that
         the Repository lock is acquired in exclusive mode.
         """
+        self._generation_dirty = True
         old_readonly = self._readonly
         self._readonly = False
 
@@ -1989,7 +2290,8 @@ class EntropySQLiteRepository(EntropySQLRepository):
             self._createSettingsTable()
 
         # added on Aug, 2010
-        if not self._doesTableExist("contentsafety"):
+        if not self._doesTableExist("contentsafety") and \
+                not self._isContentInterned():
             self._createContentSafetyTable()
         if not self._doesTableExist('provided_libs'):
             self._createProvidedLibs()
@@ -2012,6 +2314,10 @@ class EntropySQLiteRepository(EntropySQLRepository):
 
         self._foreignKeySupport()
 
+        # added on Oct. 2026, optional
+        if self.CONTENT_INTERNING:
+            self._migrateContentInterned()
+
         self._readonly = old_readonly
         self._connection().commit()
 
@@ -2039,27 +2345,167 @@ class EntropySQLiteRepository(EntropySQLRepository):
     def importRepository(dumpfile, db, data = None):
         """
         Reimplemented from EntropyRepositoryBase.
-        @todo: remove /usr/bin/sqlite3 dependency
+        The dump is executed in-process, in blocks of complete statements
+        (see _IMPORT_BLOCK_SIZE), so a compressed dump can be imported
+        while it is decompressed, passing a bz2.BZ2File or
+        gzip.GzipFile object. The repository is built in a temporary
+        file without journal and syncs (see _IMPORT_PRAGMAS) and then
+        renamed into place. Indexes are created after the bulk insert,
+        since exportRepository() dumps them after the tables data.
+        An existing repository in WAL journal mode at db can only be
+        replaced when no connection holds it open anymore.
         """
         dbfile = os.path.realpath(db)
-        tmp_dbfile = dbfile + ".import_repository"
-        dumpfile = os.path.realpath(dumpfile)
         if not entropy.tools.is_valid_path_string(dbfile):
             raise AttributeError("dbfile value is invalid")
+        if hasattr(dumpfile, "read"):
+            return EntropySQLiteRepository._importRepositoryDump(
+                dumpfile, dbfile)
+
+        dumpfile = os.path.realpath(dumpfile)
         if not entropy.tools.is_valid_path_string(dumpfile):
             raise AttributeError("dumpfile value is invalid")
         with open(dumpfile, "rb") as in_f:
+            return EntropySQLiteRepository._importRepositoryDump(
+                in_f, dbfile)
+
+    @staticmethod
+    def _importRepositoryDump(dump_f, dbfile):
+        """
+        Create the repository at dbfile executing the SQL dump read from
+        the given file object. See importRepository().
+
+        @param dump_f: file object to read the dump from (binary mode)
+        @type dump_f: file object
+        @param dbfile: repository file path
+        @type dbfile: string
+        @return: import return code (0 = OK)
+        @rtype: int
+        """
+        sqlite = EntropySQLiteRepository.SQLiteProxy.get()
+        tmp_dbfile = dbfile + ".import_repository"
+        try:
+            os.remove(tmp_dbfile)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+
+        rc = 0
+        conn = sqlite.connect(tmp_dbfile, isolation_level = None)
+        try:
+            for pragma, value in EntropySQLiteRepository._IMPORT_PRAGMAS:
+                conn.execute(
+                    "PRAGMA %s = %s" % (pragma, value)).fetchall()
+
+            pending = b""
+            while True:
+                data = dump_f.read(EntropySQLiteRepository._IMPORT_BLOCK_SIZE)
+                if not data:
+                    break
+                pending += data
+                idx = pending.rfind(b";\n")
+                if idx == -1:
+                    continue
+                sql = pending[:idx + 2]
+                if const_is_python3():
+                    sql = sql.decode("utf-8")
+                if not sqlite.complete_statement(sql):
+                    # split inside a string literal
+                    continue
+                pending = pending[idx + 2:]
+                conn.executescript(
+                    EntropySQLiteRepository._importTransaction(sql))
+
+            if pending.strip():
+                const_debug_write(__name__,
+                    "importRepository: truncated dump")
+                rc = 1
+
+        except (sqlite.Error, ValueError, EOFError,
+                IOError, OSError) as err:
+            const_debug_write(__name__,
+                "importRepository: cannot import dump: %s" % (err,))
+            rc = 1
+        finally:
+            conn.close()
+
+        if rc != 0:
             try:
-                proc = subprocess.Popen(("/usr/bin/sqlite3", tmp_dbfile,),
-                    bufsize = -1, stdin = in_f)
+                os.remove(tmp_dbfile)
             except OSError:
-                # ouch ! wtf!
-                return 1
-            rc = proc.wait()
-            if rc == 0:
-                os.rename(tmp_dbfile, dbfile)
+                pass
+            return rc
+
+        # the WAL file of the old repository would be applied to
+        # the new one
+        if not EntropySQLiteRepository._leaveWalJournal(dbfile):
+            const_debug_write(__name__,
+                "importRepository: %s is in use" % (dbfile,))
+            try:
+                os.remove(tmp_dbfile)
+            except OSError:
+                pass
+            return 1
+        os.rename(tmp_dbfile, dbfile)
         return rc
 
+    @staticmethod
+    def _leaveWalJournal(dbfile):
+        """
+        Checkpoint the WAL file of the repository at dbfile, if any, and
+        switch it back to the rollback journal, letting SQLite remove the
+        -wal and -shm files. This needs exclusive access to the
+        repository and fails if other connections, from this or other
+        processes, still hold it open: the files are never removed
+        behind their back.
+
+        @param dbfile: repository file path
+        @type dbfile: string
+        @return: True, if no WAL file is left next to the repository
+        @rtype: bool
+        """
+        wal_file = dbfile + "-wal"
+        if not os.path.lexists(wal_file):
+            return True
+
+        sqlite = EntropySQLiteRepository.SQLiteProxy.get()
+        try:
+            conn = sqlite.connect(dbfile, timeout=1.0)
+        except sqlite.Error:
+            return False
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            conn.execute("PRAGMA journal_mode = DELETE").fetchall()
+        except sqlite.Error as err:
+            const_debug_write(__name__,
+                "_leaveWalJournal: %s: %s" % (dbfile, err,))
+        finally:
+            conn.close()
+        return not os.path.lexists(wal_file)
+
+    @staticmethod
+    def _importTransaction(sql):
+        """
+        Wrap a block of SQL dump statements into a transaction, dropping
+        the transaction begin and end statements of the dump itself,
+        found at the beginning of its first block and at the end of its
+        last one.
+
+        @param sql: complete SQL statements
+        @type sql: string
+        @return: the SQL script to execute
+        @rtype: string
+        """
+        head, _sep, body = sql.partition("\n")
+        if head.strip().upper() in ("BEGIN;", "BEGIN TRANSACTION;"):
+            sql = body
+        body, _sep, tail = sql.rstrip().rpartition("\n")
+        if tail.strip().upper() in ("COMMIT;", "END;",
+                                    "COMMIT TRANSACTION;",
+                                    "END TRANSACTION;"):
+            sql = body
+        return "BEGIN;\n%s\nCOMMIT;\n" % (sql,)
+
     def exportRepository(self, dumpfile):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -2086,6 +2532,9 @@ class EntropySQLiteRepository(EntropySQLRepository):
             )
             if name.startswith("sqlite_"):
                 continue
+            if name.startswith("packagesearch"):
+                # full-text index, recreated by createAllIndexes()
+                continue
 
             t_cmd = "CREATE TABLE"
             if sql.startswith(t_cmd) and gentle_with_tables:
@@ -2110,6 +2559,8 @@ class EntropySQLiteRepository(EntropySQLRepository):
         WHERE sql NOT NULL AND type!='table' AND type!='meta'
         """)
         for name, x, sql in cur4.fetchall():
+            if name.startswith("packagesearch"):
+                continue
             dumpfile.write(toraw("%s;\n" % sql))
 
         dumpfile.write(toraw("COMMIT;\n"))
@@ -2145,7 +2596,13 @@ class EntropySQLiteRepository(EntropySQLRepository):
             return 0.0
         if self._is_memory():
             return 0.0
-        return os.path.getmtime(self._db)
+        mtime = os.path.getmtime(self._db)
+        # with WAL journaling, commits only touch the -wal file
+        # until the next checkpoint
+        try:
+            return max(mtime, os.path.getmtime(self._db + "-wal"))
+        except OSError:
+            return mtime
 
     def checksum(self, do_order = False, strict = True,
                  include_signatures = False, include_dependencies = False):
@@ -2381,11 +2838,35 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 raise
             return {}
 
+    def clean(self):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_interned.
+        """
+        super(EntropySQLiteRepository, self).clean()
+        if self._isContentInterned():
+            self._cleanupContentInterned()
+
+    def dropContent(self):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_interned.
+        """
+        if not self._isContentInterned():
+            return super(EntropySQLiteRepository, self).dropContent()
+
+        self._cursor().execute("DELETE FROM content_interned")
+        self.dropContentSafety()
+        self._cleanupContentInterned()
+
     def dropContentSafety(self):
         """
         Reimplemented from EntropySQLRepository.
-        We must handle backward compatibility.
+        We must handle backward compatibility and _content_interned.
         """
+        if self._isContentInterned():
+            self._cursor().execute("DELETE FROM contentsafety_interned")
+            return
         try:
             return super(EntropySQLiteRepository,
                          self).dropContentSafety()
@@ -2407,6 +2888,7 @@ class EntropySQLiteRepository(EntropySQLRepository):
                 self._cursor().execute('DROP INDEX IF EXISTS %s' % (index,))
             except OperationalError:
                 continue
+        self._dropSearchIndex()
 
     def createAllIndexes(self):
         """
@@ -2418,6 +2900,120 @@ class EntropySQLiteRepository(EntropySQLRepository):
             self.__createLicensesIndex()
             self.__createCategoriesIndex()
             self.__createCompileFlagsIndex()
+        elif self._indexing:
+            self._createSearchIndex()
+
+    def _isSearchIndexed(self):
+        """
+        Return whether the packagesearch full-text index is available,
+        see _createSearchIndex().
+        """
+        return self._doesTableExist("packagesearch")
+
+    def _createSearchIndex(self):
+        """
+        Create the packagesearch FTS5 table used by searchPackagesRanked(),
+        indexing package name, category and description. Triggers keep it
+        in sync with baseinfo and extrainfo, so that addPackage(),
+        removePackage() and the baseinfo setters need no special care.
+        Like the other indexes, it is dropped by dropAllIndexes() (and thus
+        not shipped with server-side repositories). Nothing is done if
+        SQLite lacks FTS5 support.
+        """
+        if self._isSearchIndexed():
+            return
+        try:
+            self._cursor().executescript("""
+            CREATE VIRTUAL TABLE packagesearch USING fts5 (
+                name, category, description, prefix = '2 3' );
+
+            INSERT INTO packagesearch (rowid, name, category, description)
+                SELECT baseinfo.idpackage, baseinfo.name,
+                    baseinfo.category, extrainfo.description
+                FROM baseinfo, extrainfo
+                WHERE baseinfo.idpackage = extrainfo.idpackage;
+
+            CREATE TRIGGER packagesearch_insert AFTER INSERT ON extrainfo
+            BEGIN
+                INSERT OR REPLACE INTO packagesearch
+                    (rowid, name, category, description)
+                    SELECT idpackage, name, category, NEW.description
+                    FROM baseinfo WHERE idpackage = NEW.idpackage;
+            END;
+
+            CREATE TRIGGER packagesearch_update
+                AFTER UPDATE OF name, category ON baseinfo
+            BEGIN
+                UPDATE packagesearch SET name = NEW.name,
+                    category = NEW.category
+                WHERE rowid = NEW.idpackage;
+            END;
+
+            CREATE TRIGGER packagesearch_delete AFTER DELETE ON baseinfo
+            BEGIN
+                DELETE FROM packagesearch WHERE rowid = OLD.idpackage;
+            END;
+            """)
+        except OperationalError:
+            # no FTS5 support
+            return
+        finally:
+            self._clearLiveCache("_doesTableExist")
+
+    def _dropSearchIndex(self):
+        """
+        Drop the packagesearch full-text index, see _createSearchIndex().
+        """
+        if not self._isSearchIndexed():
+            return
+        self._cursor().executescript("""
+        DROP TRIGGER IF EXISTS packagesearch_insert;
+        DROP TRIGGER IF EXISTS packagesearch_update;
+        DROP TRIGGER IF EXISTS packagesearch_delete;
+        DROP TABLE IF EXISTS packagesearch;
+        """)
+        self._clearLiveCache("_doesTableExist")
+
+    def _createContentIndex(self):
+        """
+        Reimplemented from EntropySQLRepository.
+        We must handle _content_interned.
+        """
+        if not self._isContentInterned():
+            super(EntropySQLiteRepository, self)._createContentIndex()
+            try:
+                self._cursor().execute("""
+                CREATE INDEX IF NOT EXISTS contentindex_basename
+                    ON content ( %s )
+                """ % (self._CONTENT_BASENAME_SQL,))
+            except OperationalError:
+                pass
+            return
+
+        try:
+            self._cursor().execute("""
+            CREATE INDEX IF NOT EXISTS content_names_lower
+                ON content_names ( lower(name) )
+            """)
+        except OperationalError:
+            pass
+
+        # content_interned rows are usually read by package and are
+        # small, cover them with the index.
+        for table, columns in (
+                ("content_interned", "idpackage, iddir, idname, type"),
+                ("contentsafety_interned", "idpackage")):
+            try:
+                self._cursor().execute("""
+                CREATE INDEX IF NOT EXISTS %s_idpackage
+                    ON %s ( %s )
+                """ % (table, table, columns))
+                self._cursor().execute("""
+                CREATE INDEX IF NOT EXISTS %s_path
+                    ON %s ( idname, iddir )
+                """ % (table, table))
+            except OperationalError:
+                pass
 
     def __createCompileFlagsIndex(self):
         try:
@@ -2598,6 +3194,213 @@ class EntropySQLiteRepository(EntropySQLRepository):
         self._setSetting("_baseinfo_extrainfo_2010", "1")
         self._connection().commit()
 
+    def _isContentInterned(self):
+        """
+        Return whether content and contentsafety paths are interned,
+        see _migrateContentInterned().
+        """
+        try:
+            self.getSetting("_content_interned")
+        except KeyError:
+            return False
+        return self._doesTableExist("content_interned")
+
+    @staticmethod
+    def _splitContentPath(path):
+        """
+        Split path into the (directory, base name) pair used by the
+        interned content layout. The directory keeps its trailing
+        slash, so that path == directory + base name.
+        """
+        idx = path.rfind("/") + 1
+        return path[:idx], path[idx:]
+
+    def _migrateContentInterned(self):
+        """
+        Migrate content and contentsafety to the interned paths layout:
+        directories and base names are stored once, in content_dirs and
+        content_names, and referenced by id from content_interned and
+        contentsafety_interned. content and contentsafety become views
+        with INSTEAD OF triggers, so that they can still be queried and
+        updated as before.
+        """
+        if self._isContentInterned():
+            return
+        if not self._doesTableExist("content"):
+            return
+        if not self._doesTableExist("contentsafety"):
+            return
+
+        mytxt = "%s: [%s] %s" % (
+            bold(_("ATTENTION")),
+            purple(self.name),
+            red(_("updating repository metadata layout, please wait!")),
+        )
+        self.output(
+            mytxt,
+            importance = 1,
+            level = "warning")
+
+        # the same split as _splitContentPath(), in SQL
+        dir_sql = "rtrim(%(f)s, replace(%(f)s, '/', ''))"
+        name_sql = "substr(%(f)s, length(" + dir_sql + ") + 1)"
+        dir_id_sql = "(SELECT iddir FROM content_dirs WHERE dir = " + \
+            dir_sql + ")"
+        name_id_sql = "(SELECT idname FROM content_names WHERE name = " + \
+            name_sql + ")"
+
+        def _sql(query, col):
+            return query % {'f': col}
+
+        self._cursor().executescript("""
+            BEGIN TRANSACTION;
+
+            DROP TABLE IF EXISTS content_dirs;
+            CREATE TABLE content_dirs (
+                iddir INTEGER PRIMARY KEY,
+                dir VARCHAR UNIQUE
+            );
+            DROP TABLE IF EXISTS content_names;
+            CREATE TABLE content_names (
+                idname INTEGER PRIMARY KEY,
+                name VARCHAR UNIQUE
+            );
+            DROP TABLE IF EXISTS content_interned;
+            CREATE TABLE content_interned (
+                idpackage INTEGER,
+                iddir INTEGER,
+                idname INTEGER,
+                type VARCHAR,
+                FOREIGN KEY(idpackage)
+                    REFERENCES baseinfo(idpackage) ON DELETE CASCADE
+            );
+            DROP TABLE IF EXISTS contentsafety_interned;
+            CREATE TABLE contentsafety_interned (
+                idpackage INTEGER,
+                iddir INTEGER,
+                idname INTEGER,
+                mtime FLOAT,
+                sha256 VARCHAR,
+                FOREIGN KEY(idpackage)
+                    REFERENCES baseinfo(idpackage) ON DELETE CASCADE
+            );
+
+            INSERT INTO content_dirs (dir)
+                SELECT %(content_dir)s FROM content
+                UNION SELECT %(safety_dir)s FROM contentsafety;
+            INSERT INTO content_names (name)
+                SELECT %(content_name)s FROM content
+                UNION SELECT %(safety_name)s FROM contentsafety;
+
+            INSERT INTO content_interned
+                SELECT content.idpackage, content_dirs.iddir,
+                    content_names.idname, content.type
+                FROM content, content_dirs, content_names
+                WHERE content_dirs.dir = %(content_dir)s
+                AND content_names.name = %(content_name)s
+                ORDER BY content.rowid;
+            INSERT INTO contentsafety_interned
+                SELECT contentsafety.idpackage, content_dirs.iddir,
+                    content_names.idname, contentsafety.mtime,
+                    contentsafety.sha256
+                FROM contentsafety, content_dirs, content_names
+                WHERE content_dirs.dir = %(safety_dir)s
+                AND content_names.name = %(safety_name)s
+                ORDER BY contentsafety.rowid;
+
+            DROP TABLE content;
+            DROP TABLE contentsafety;
+
+            CREATE VIEW content AS
+                SELECT content_interned.idpackage AS idpackage,
+                    content_dirs.dir || content_names.name AS file,
+                    content_interned.type AS type
+                FROM content_interned
+                CROSS JOIN content_dirs ON
+                    content_dirs.iddir = content_interned.iddir
+                CROSS JOIN content_names ON
+                    content_names.idname = content_interned.idname;
+            CREATE TRIGGER content_insert INSTEAD OF INSERT ON content
+            BEGIN
+                INSERT OR IGNORE INTO content_dirs (dir)
+                    VALUES (%(new_dir)s);
+                INSERT OR IGNORE INTO content_names (name)
+                    VALUES (%(new_name)s);
+                INSERT INTO content_interned VALUES (NEW.idpackage,
+                    %(new_dir_id)s, %(new_name_id)s, NEW.type);
+            END;
+            CREATE TRIGGER content_delete INSTEAD OF DELETE ON content
+            BEGIN
+                DELETE FROM content_interned
+                WHERE idpackage = OLD.idpackage
+                AND iddir = %(old_dir_id)s AND idname = %(old_name_id)s;
+            END;
+
+            CREATE VIEW contentsafety AS
+                SELECT contentsafety_interned.idpackage AS idpackage,
+                    content_dirs.dir || content_names.name AS file,
+                    contentsafety_interned.mtime AS mtime,
+                    contentsafety_interned.sha256 AS sha256
+                FROM contentsafety_interned
+                CROSS JOIN content_dirs ON
+                    content_dirs.iddir = contentsafety_interned.iddir
+                CROSS JOIN content_names ON
+                    content_names.idname = contentsafety_interned.idname;
+            CREATE TRIGGER contentsafety_insert
+                INSTEAD OF INSERT ON contentsafety
+            BEGIN
+                INSERT OR IGNORE INTO content_dirs (dir)
+                    VALUES (%(new_dir)s);
+                INSERT OR IGNORE INTO content_names (name)
+                    VALUES (%(new_name)s);
+                INSERT INTO contentsafety_interned VALUES (NEW.idpackage,
+                    %(new_dir_id)s, %(new_name_id)s, NEW.mtime, NEW.sha256);
+            END;
+            CREATE TRIGGER contentsafety_delete
+                INSTEAD OF DELETE ON contentsafety
+            BEGIN
+                DELETE FROM contentsafety_interned
+                WHERE idpackage = OLD.idpackage
+                AND iddir = %(old_dir_id)s AND idname = %(old_name_id)s;
+            END;
+
+            COMMIT;
+        """ % {
+                'content_dir': _sql(dir_sql, "content.file"),
+                'content_name': _sql(name_sql, "content.file"),
+                'safety_dir': _sql(dir_sql, "contentsafety.file"),
+                'safety_name': _sql(name_sql, "contentsafety.file"),
+                'new_dir': _sql(dir_sql, "NEW.file"),
+                'new_name': _sql(name_sql, "NEW.file"),
+                'new_dir_id': _sql(dir_id_sql, "NEW.file"),
+                'new_name_id': _sql(name_id_sql, "NEW.file"),
+                'old_dir_id': _sql(dir_id_sql, "OLD.file"),
+                'old_name_id': _sql(name_id_sql, "OLD.file"),
+                })
+
+        self._clearLiveCache("_doesTableExist")
+        self._clearLiveCache("_doesColumnInTableExist")
+        self._setSetting("_content_interned", "1")
+        self._connection().commit()
+        if self._indexing:
+            self._createContentIndex()
+
+    def _cleanupContentInterned(self):
+        """
+        Cleanup directories and base names no longer referenced by the
+        interned content layout.
+        """
+        self._cursor().execute("""
+        DELETE FROM content_dirs WHERE iddir NOT IN (
+            SELECT iddir FROM content_interned
+            UNION SELECT iddir FROM contentsafety_interned)
+        """)
+        self._cursor().execute("""
+        DELETE FROM content_names WHERE idname NOT IN (
+            SELECT idname FROM content_interned
+            UNION SELECT idname FROM contentsafety_interned)
+        """)
+
     def _foreignKeySupport(self):
 
         # entropy.qa uses this name, must skip migration
@@ -25,10 +25,15 @@
 
 import sys
 import os
+import errno
+import fcntl
+import struct
+import threading
 import time
+import zlib
 
 from entropy.const import etpConst, const_setup_file, const_is_python3, \
-    const_mkstemp
+    const_mkstemp, const_convert_to_rawstring, const_convert_to_unicode
 # Always use MAX pickle protocol to <=2, to allow Python 2 and 3 support
 COMPAT_PICKLE_PROTOCOL = 0
 
@@ -50,6 +55,80 @@ if E_GID == None:
     E_GID = 0
 
 
+class DumpBlob(object):
+
+    """
+    Immutable, already serialized (see serialize_string()) object.
+    Cache stores write its data to disk as-is, without pickling it again.
+    """
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data):
+        """
+        DumpBlob constructor.
+
+        @param data: serialized object, as returned by serialize_string()
+        @type data: bytes
+        """
+        self._data = data
+
+    @classmethod
+    def from_object(cls, my_object):
+        """
+        Serialize the given object into a new DumpBlob.
+
+        @param my_object: object to serialize
+        @type my_object: any Python picklable object
+        @return: a new DumpBlob
+        @rtype: DumpBlob
+        @raise pickle.PicklingError: when object cannot be serialized
+        """
+        return cls(serialize_string(my_object))
+
+    def data(self):
+        """
+        Return the serialized object.
+
+        @rtype: bytes
+        """
+        return self._data
+
+    def load(self):
+        """
+        Rebuild a new copy of the serialized object.
+
+        @return: the object
+        @rtype: any Python pickable object
+        @raise pickle.UnpicklingError: when object cannot be recreated
+        """
+        return unserialize_string(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+def _setup_dump_dir(dump_dir):
+    """
+    Create the given dump directory (and its missing parents) setting
+    the proper permissions on each created directory.
+    """
+    my_dump_dir = dump_dir
+    d_paths = []
+    while not os.path.isdir(my_dump_dir):
+        d_paths.append(my_dump_dir)
+        my_dump_dir = os.path.dirname(my_dump_dir)
+    if d_paths:
+        d_paths = sorted(d_paths)
+        for d_path in d_paths:
+            try:
+                os.mkdir(d_path)
+            except OSError as err:
+                # another process may have created it meanwhile
+                if err.errno != errno.EEXIST:
+                    raise
+                continue
+            const_setup_file(d_path, E_GID, 0o775)
+
 def dumpobj(name, my_object, complete_path = False, ignore_exceptions = True,
     dump_dir = None, custom_permissions = None):
     """
@@ -57,8 +136,8 @@ def dumpobj(name, my_object, complete_path = False, ignore_exceptions = True,
 
     @param name: name of the object
     @type name: string
-    @param my_object: object to dump
-    @type my_object: any Python "pickable" object
+    @param my_object: object to dump, DumpBlob objects are written as-is
+    @type my_object: any Python "pickable" object or DumpBlob
     @keyword complete_path: consider "name" argument as
         a complete path (this overrides the default dump
         path given by etpConst['dumpstoragedir'])
@@ -95,16 +174,7 @@ def dumpobj(name, my_object, complete_path = False, ignore_exceptions = True,
                 dmpfile = _dmp_path+D_EXT
                 c_dump_dir = os.path.dirname(_dmp_path)
 
-            my_dump_dir = c_dump_dir
-            d_paths = []
-            while not os.path.isdir(my_dump_dir):
-                d_paths.append(my_dump_dir)
-                my_dump_dir = os.path.dirname(my_dump_dir)
-            if d_paths:
-                d_paths = sorted(d_paths)
-                for d_path in d_paths:
-                    os.mkdir(d_path)
-                    const_setup_file(d_path, E_GID, 0o775)
+            _setup_dump_dir(c_dump_dir)
 
             dmp_name = os.path.basename(dmpfile)
             tmp_fd, tmp_dmpfile = const_mkstemp(
@@ -114,7 +184,9 @@ def dumpobj(name, my_object, complete_path = False, ignore_exceptions = True,
             # is causing EBADF. There is probably a race
             # condition down in the stack.
             with open(tmp_dmpfile, "wb") as dmp_f:
-                if const_is_python3():
+                if isinstance(my_object, DumpBlob):
+                    dmp_f.write(my_object.data())
+                elif const_is_python3():
                     pickle.dump(my_object, dmp_f,
                         protocol = COMPAT_PICKLE_PROTOCOL, fix_imports = True)
                 else:
@@ -219,7 +291,7 @@ def serialize_string(myobj):
     """
     if const_is_python3():
         return pickle.dumps(myobj, protocol = COMPAT_PICKLE_PROTOCOL,
-            fix_imports = True, encoding = etpConst['conf_raw_encoding'])
+            fix_imports = True)
     else:
         return pickle.dumps(myobj)
 
@@ -328,3 +400,673 @@ def removeobj(name, dump_dir = None):
         if err.errno not in (errno.ENOENT, errno.ENOTDIR):
             raise
         return False
+
+
+class FileDumpStore(object):
+
+    """
+    Cache store backend writing every object to its own pickle file
+    through dumpobj() and loadobj(). This is the historical on-disk
+    layout of the Entropy cache.
+    """
+
+    ID = "file"
+
+    def store(self, name, my_object, dump_dir = None,
+              ignore_exceptions = True):
+        """
+        Store a pickable object.
+
+        @param name: name of the object
+        @type name: string
+        @param my_object: object to store, DumpBlob objects are stored as-is
+        @type my_object: any Python "pickable" object or DumpBlob
+        @keyword dump_dir: alternative dump directory
+        @type dump_dir: string
+        @keyword ignore_exceptions: ignore any possible exception
+            (EOFError, IOError, OSError,)
+        @type ignore_exceptions: bool
+        """
+        dumpobj(name, my_object, dump_dir = dump_dir,
+                ignore_exceptions = ignore_exceptions)
+
+    def store_many(self, objects, dump_dir = None):
+        """
+        Store a batch of pickable objects, ignoring any error.
+
+        @param objects: list of (name, object) tuples
+        @type objects: list
+        @keyword dump_dir: alternative dump directory
+        @type dump_dir: string
+        """
+        for name, my_object in objects:
+            dumpobj(name, my_object, dump_dir = dump_dir)
+
+    def load(self, name, dump_dir = None, aging_days = None):
+        """
+        Load a stored object.
+
+        @param name: name of the object to load
+        @type name: string
+        @keyword dump_dir: alternative dump directory
+        @type dump_dir: string
+        @keyword aging_days: if int, consider the cached object invalid
+            if older than aging_days.
+        @type aging_days: int
+        @return: object or None
+        @rtype: any Python pickable object or None
+        """
+        return loadobj(name, dump_dir = dump_dir, aging_days = aging_days)
+
+    def remove(self, name, dump_dir = None):
+        """
+        Remove a stored object.
+
+        @param name: object name
+        @type name: string
+        @keyword dump_dir: alternative dump directory
+        @type dump_dir: string
+        @return: True, if the object has been removed
+        @rtype: bool
+        """
+        return removeobj(name, dump_dir = dump_dir)
+
+    def clear(self, name, dump_dir = None):
+        """
+        Remove all the objects living in the same namespace (directory)
+        of the given object name, including sub-namespaces.
+
+        @param name: object name
+        @type name: string
+        @keyword dump_dir: alternative dump directory
+        @type dump_dir: string
+        """
+        if dump_dir is None:
+            dump_dir = D_DIR
+        self._clear_files(
+            os.path.dirname(os.path.join(dump_dir, name)), (D_EXT,))
+
+    def _clear_files(self, clear_dir, extensions):
+        """
+        Remove all the files ending with one of the given extensions
+        found inside clear_dir, dropping empty directories.
+        """
+        for currentdir, subdirs, files in os.walk(clear_dir):
+            path = os.path.join(clear_dir, currentdir)
+            for item in files:
+                if item.endswith(extensions):
+                    item = os.path.join(path, item)
+                    try:
+                        os.remove(item)
+                    except (OSError, IOError,):
+                        pass
+            try:
+                if not os.listdir(path):
+                    os.rmdir(path)
+            except (OSError, IOError,):
+                pass
+
+    def sync(self):
+        """
+        Make sure that all the stored objects hit the disk.
+        """
+
+    def close(self):
+        """
+        Release any resource held by the store.
+        """
+
+
+class _DumpLog(object):
+
+    """
+    Append-only log file holding all the objects of a single
+    IndexedDumpStore namespace, together with its in-memory index.
+    This class is not thread-safe, IndexedDumpStore serializes access.
+
+    Log layout: a magic string followed by a sequence of records made of
+    a fixed size header (key length, data length, mtime, data crc32),
+    the utf-8 encoded key and the pickled data. Removed keys are recorded
+    as tombstones (data length set to _TOMBSTONE).
+    """
+
+    _MAGIC = b"ETPDLOG1"
+    _HEADER = struct.Struct(">IIdI")
+    _TOMBSTONE = 0xFFFFFFFF
+    _CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, path):
+        self._path = path
+        self._fd = None
+        self._ino = None
+        self._index = {}
+        self._end = 0
+        self._live = 0
+
+    def path(self):
+        """
+        Return the log file path.
+        """
+        return self._path
+
+    def size(self):
+        """
+        Return the size of the parsed log.
+        """
+        return self._end
+
+    def live_size(self):
+        """
+        Return the amount of bytes in the log still referenced by the index.
+        """
+        return self._live
+
+    def close(self):
+        """
+        Close the log file and drop the in-memory index.
+        """
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+        self._fd = None
+        self._ino = None
+        self._index.clear()
+        self._end = 0
+        self._live = 0
+
+    def _open(self, create):
+        """
+        Open the log file, eventually creating it. Return False if the
+        file does not exist and create is False.
+        """
+        self.close()
+        flags = os.O_RDWR
+        if create:
+            _setup_dump_dir(os.path.dirname(self._path))
+            flags |= os.O_CREAT
+        try:
+            self._fd = os.open(self._path, flags, 0o664)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+            return False
+        st = os.fstat(self._fd)
+        self._ino = st.st_ino
+        if create and st.st_size == 0:
+            try:
+                const_setup_file(self._path, E_GID, 0o664)
+            except OSError:
+                pass
+        return True
+
+    def refresh(self, create = False):
+        """
+        Synchronize the in-memory index with the on-disk log, which
+        may have been modified (appended, compacted, removed) by other
+        processes. Return False if the log is not available.
+        """
+        try:
+            st = os.stat(self._path)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+            if not create:
+                self.close()
+                return False
+            st = None
+
+        if st is None or st.st_ino != self._ino:
+            if not self._open(create):
+                return False
+            st = os.fstat(self._fd)
+
+        if st.st_size < self._end:
+            # truncated by somebody else, reparse everything
+            self._index.clear()
+            self._end = 0
+            self._live = 0
+        if st.st_size > self._end:
+            self._parse(st.st_size)
+        return True
+
+    def _read_at(self, offset, length):
+        """
+        Read up to length bytes of the log starting at offset.
+        """
+        os.lseek(self._fd, offset, os.SEEK_SET)
+        return os.read(self._fd, length)
+
+    def _parse(self, size):
+        """
+        Parse the log from the last known position up to size, updating
+        the in-memory index. Truncated or corrupted tails are ignored.
+        Record data is skipped over, only headers and keys are read.
+        """
+        if size < len(self._MAGIC):
+            return
+        offset = self._end
+        if offset == 0:
+            if self._read_at(0, len(self._MAGIC)) != self._MAGIC:
+                return
+            offset = len(self._MAGIC)
+
+        header_size = self._HEADER.size
+        chunk = b""
+        chunk_start = offset
+        while offset + header_size <= size:
+            rel = offset - chunk_start
+            if rel < 0 or rel + header_size > len(chunk):
+                chunk_start, rel = offset, 0
+                chunk = self._read_at(
+                    offset, min(self._CHUNK_SIZE, size - offset))
+                if len(chunk) < header_size:
+                    break
+            key_len, data_len, mtime, crc = self._HEADER.unpack_from(
+                chunk, rel)
+
+            key_offset = offset + header_size
+            data_offset = key_offset + key_len
+            if data_len == self._TOMBSTONE:
+                rec_end = data_offset
+            else:
+                rec_end = data_offset + data_len
+            if rec_end > size:
+                break
+
+            rel = key_offset - chunk_start
+            if rel + key_len > len(chunk):
+                chunk_start, rel = key_offset, 0
+                chunk = self._read_at(key_offset, max(
+                    key_len, min(self._CHUNK_SIZE, size - key_offset)))
+                if len(chunk) < key_len:
+                    break
+            key = const_convert_to_unicode(chunk[rel:rel + key_len], "utf-8")
+
+            old = self._index.pop(key, None)
+            if old is not None:
+                self._live -= old[1]
+            if data_len != self._TOMBSTONE:
+                self._index[key] = (data_offset, data_len, mtime, crc)
+                self._live += data_len
+            offset = rec_end
+
+        self._end = offset
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def get(self, key, aging_days = None):
+        """
+        Return the raw (pickled) data bound to key or None.
+        """
+        meta = self._index.get(key)
+        if meta is None:
+            return None
+        data_offset, data_len, mtime, crc = meta
+        if aging_days is not None:
+            if abs(time.time() - mtime) > (aging_days * 86400):
+                return None
+        os.lseek(self._fd, data_offset, os.SEEK_SET)
+        data = os.read(self._fd, data_len)
+        if len(data) != data_len or (zlib.crc32(data) & 0xFFFFFFFF) != crc:
+            return None
+        return data
+
+    def sync(self):
+        """
+        fsync() the log file, if open.
+        """
+        if self._fd is not None:
+            os.fsync(self._fd)
+
+    def _lock_for_append(self):
+        """
+        Acquire the exclusive (inter-process) log lock, making sure
+        that the locked file is still the one on disk.
+        """
+        while True:
+            self.refresh(create = True)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                st = os.stat(self._path)
+                if st.st_ino == self._ino:
+                    # parse what other writers appended meanwhile
+                    self.refresh()
+                    return
+            except OSError as err:
+                if err.errno != errno.ENOENT:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                    raise
+            # log got replaced while waiting, try again
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def append(self, records, fsync):
+        """
+        Append a list of (key, raw_data) records to the log in a single
+        write. raw_data set to None means removal.
+        """
+        self._lock_for_append()
+        try:
+            file_size = os.fstat(self._fd).st_size
+            if self._end == 0 or file_size != self._end:
+                # empty, corrupted or partially written log, recover
+                if self._end < len(self._MAGIC):
+                    os.ftruncate(self._fd, 0)
+                    os.lseek(self._fd, 0, os.SEEK_SET)
+                    os.write(self._fd, self._MAGIC)
+                    self._index.clear()
+                    self._live = 0
+                    self._end = len(self._MAGIC)
+                else:
+                    os.ftruncate(self._fd, self._end)
+
+            chunks = []
+            offset = self._end
+            mtime = time.time()
+            new_entries = []
+            for key, data in records:
+                raw_key = const_convert_to_rawstring(key, "utf-8")
+                if data is None:
+                    if key not in self._index:
+                        continue
+                    header = self._HEADER.pack(
+                        len(raw_key), self._TOMBSTONE, mtime, 0)
+                    meta = None
+                else:
+                    crc = zlib.crc32(data) & 0xFFFFFFFF
+                    header = self._HEADER.pack(
+                        len(raw_key), len(data), mtime, crc)
+                    meta = (offset + len(header) + len(raw_key),
+                            len(data), mtime, crc)
+                chunks.append(header)
+                chunks.append(raw_key)
+                offset += len(header) + len(raw_key)
+                if data is not None:
+                    chunks.append(data)
+                    offset += len(data)
+                new_entries.append((key, meta))
+
+            if not chunks:
+                return
+            buf = b"".join(chunks)
+            os.lseek(self._fd, self._end, os.SEEK_SET)
+            written = 0
+            while written < len(buf):
+                written += os.write(self._fd, buf[written:])
+            if fsync:
+                os.fsync(self._fd)
+
+            for key, meta in new_entries:
+                old = self._index.pop(key, None)
+                if old is not None:
+                    self._live -= old[1]
+                if meta is not None:
+                    self._index[key] = meta
+                    self._live += meta[1]
+            self._end = offset
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def compact(self, max_live_size, fsync):
+        """
+        Rewrite the log keeping only the indexed records. If the live data
+        is bigger than max_live_size, the oldest records are dropped.
+        """
+        self._lock_for_append()
+        try:
+            entries = sorted(self._index.items(),
+                             key = lambda x: x[1][2], reverse = True)
+            live = 0
+            kept = []
+            for key, meta in entries:
+                if live + meta[1] > max_live_size:
+                    break
+                live += meta[1]
+                kept.append((key, meta))
+            # preserve the original append order
+            kept.sort(key = lambda x: x[1][0])
+
+            tmp_fd, tmp_path = const_mkstemp(
+                dir = os.path.dirname(self._path),
+                prefix = os.path.basename(self._path))
+            try:
+                with os.fdopen(tmp_fd, "wb") as tmp_f:
+                    tmp_fd = None
+                    tmp_f.write(self._MAGIC)
+                    for key, (data_offset, data_len, mtime, crc) in kept:
+                        os.lseek(self._fd, data_offset, os.SEEK_SET)
+                        data = os.read(self._fd, data_len)
+                        raw_key = const_convert_to_rawstring(key, "utf-8")
+                        tmp_f.write(self._HEADER.pack(
+                            len(raw_key), data_len, mtime, crc))
+                        tmp_f.write(raw_key)
+                        tmp_f.write(data)
+                    tmp_f.flush()
+                    if fsync:
+                        os.fsync(tmp_f.fileno())
+                const_setup_file(tmp_path, E_GID, 0o664)
+                os.rename(tmp_path, self._path)
+                tmp_path = None
+            finally:
+                if tmp_fd is not None:
+                    os.close(tmp_fd)
+                if tmp_path is not None:
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        # load the new log
+        self.refresh()
+
+
+class IndexedDumpStore(FileDumpStore):
+
+    """
+    Cache store backend keeping all the objects of a namespace (the
+    directory part of the object name) inside a single append-only log
+    file, indexed in memory. Compared to FileDumpStore, this avoids
+    creating, stat()ing and renaming one file per cached object.
+    Logs are compacted once they are mostly made of stale records or
+    when they grow past MAX_SIZE.
+    """
+
+    ID = "indexed"
+
+    LOG_NAME = "__store__.dlog"
+    # do not bother compacting logs smaller than this
+    COMPACT_MIN_SIZE = 4 * 1024 * 1024
+    # maximum size of a namespace log, the oldest objects are
+    # dropped when compaction cannot shrink the log otherwise
+    MAX_SIZE = 64 * 1024 * 1024
+    # fsync() the log after every batch of writes
+    FSYNC = True
+
+    def __init__(self):
+        FileDumpStore.__init__(self)
+        self._logs = {}
+        self._lock = threading.RLock()
+
+    def _split(self, name, dump_dir):
+        """
+        Split an object name into its (log path, key) tuple.
+        """
+        if dump_dir is None:
+            dump_dir = D_DIR
+        namespace, key = os.path.split(name)
+        return os.path.join(dump_dir, namespace, self.LOG_NAME), key
+
+    def _get_log(self, path):
+        """
+        Return the _DumpLog object for the given log path.
+        """
+        log = self._logs.get(path)
+        if log is None:
+            log = _DumpLog(path)
+            self._logs[path] = log
+        return log
+
+    def _maybe_compact(self, log):
+        """
+        Compact the given log if it is worth it.
+        """
+        size = log.size()
+        if size > self.MAX_SIZE:
+            log.compact(self.MAX_SIZE // 2, self.FSYNC)
+        elif size > self.COMPACT_MIN_SIZE and log.live_size() < size // 2:
+            log.compact(self.MAX_SIZE // 2, self.FSYNC)
+
+    def _serialize(self, my_object):
+        """
+        Return the serialized form of my_object.
+        """
+        if isinstance(my_object, DumpBlob):
+            return my_object.data()
+        return serialize_string(my_object)
+
+    def _write(self, records, dump_dir):
+        """
+        Group (name, raw_data) records by namespace and append them.
+        """
+        by_log = {}
+        for name, data in records:
+            path, key = self._split(name, dump_dir)
+            by_log.setdefault(path, []).append((key, data))
+
+        with self._lock:
+            for path, log_records in by_log.items():
+                log = self._get_log(path)
+                log.append(log_records, self.FSYNC)
+                self._maybe_compact(log)
+
+    def store(self, name, my_object, dump_dir = None,
+              ignore_exceptions = True):
+        """
+        Reimplemented from FileDumpStore.
+        """
+        try:
+            self._write([(name, self._serialize(my_object))], dump_dir)
+        except (EOFError, IOError, OSError):
+            if not ignore_exceptions:
+                raise
+        except (pickle.PicklingError, RuntimeError, TypeError):
+            if not ignore_exceptions:
+                raise IOError("cannot serialize %s" % (name,))
+
+    def store_many(self, objects, dump_dir = None):
+        """
+        Reimplemented from FileDumpStore.
+        """
+        records = []
+        for name, my_object in objects:
+            try:
+                records.append((name, self._serialize(my_object)))
+            except (pickle.PicklingError, RuntimeError, TypeError):
+                continue
+        try:
+            self._write(records, dump_dir)
+        except (EOFError, IOError, OSError):
+            pass
+
+    def load(self, name, dump_dir = None, aging_days = None):
+        """
+        Reimplemented from FileDumpStore.
+        """
+        path, key = self._split(name, dump_dir)
+        with self._lock:
+            log = self._get_log(path)
+            try:
+                if not log.refresh():
+                    return None
+                data = log.get(key, aging_days = aging_days)
+            except (IOError, OSError, ValueError):
+                return None
+        if data is None:
+            return None
+        try:
+            return unserialize_string(data)
+        except (ValueError, EOFError, IOError, OSError,
+                pickle.UnpicklingError, TypeError, AttributeError,
+                ImportError, SystemError, KeyError, IndexError):
+            return None
+
+    def remove(self, name, dump_dir = None):
+        """
+        Reimplemented from FileDumpStore.
+        """
+        path, key = self._split(name, dump_dir)
+        with self._lock:
+            log = self._get_log(path)
+            if not log.refresh():
+                return False
+            if key not in log:
+                return False
+            log.append([(key, None)], self.FSYNC)
+        return True
+
+    def clear(self, name, dump_dir = None):
+        """
+        Reimplemented from FileDumpStore.
+        """
+        if dump_dir is None:
+            dump_dir = D_DIR
+        clear_dir = os.path.dirname(os.path.join(dump_dir, name))
+        clear_prefix = os.path.join(clear_dir, "")
+        with self._lock:
+            for path in list(self._logs.keys()):
+                if path.startswith(clear_prefix):
+                    self._logs.pop(path).close()
+            self._clear_files(
+                clear_dir, (D_EXT, os.path.splitext(self.LOG_NAME)[1]))
+
+    def sync(self):
+        """
+        Reimplemented from FileDumpStore.
+        """
+        with self._lock:
+            for log in self._logs.values():
+                try:
+                    log.sync()
+                except OSError:
+                    pass
+
+    def close(self):
+        """
+        Reimplemented from FileDumpStore.
+        """
+        with self._lock:
+            for log in self._logs.values():
+                log.close()
+            self._logs.clear()
+
+
+DUMP_STORES = {
+    FileDumpStore.ID: FileDumpStore,
+    IndexedDumpStore.ID: IndexedDumpStore,
+}
+
+_DUMP_STORES_CACHE = {}
+_DUMP_STORES_LOCK = threading.Lock()
+
+def get_dump_store(store_id = None):
+    """
+    Return the shared cache store backend instance for the given
+    backend identifier (see DUMP_STORES). If store_id is None or
+    unknown, FileDumpStore is returned.
+
+    @keyword store_id: cache store backend identifier
+    @type store_id: string
+    @return: the cache store backend instance
+    @rtype: FileDumpStore
+    """
+    if store_id not in DUMP_STORES:
+        store_id = FileDumpStore.ID
+    with _DUMP_STORES_LOCK:
+        store = _DUMP_STORES_CACHE.get(store_id)
+        if store is None:
+            store = DUMP_STORES[store_id]()
+            _DUMP_STORES_CACHE[store_id] = store
+    return store
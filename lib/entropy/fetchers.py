@@ -18,7 +18,6 @@ try:
 except ImportError:
     # python 3.x
     import http.client as httplib
-import hashlib
 import socket
 import pty
 import subprocess
@@ -39,13 +38,14 @@ else:
 from entropy.exceptions import InterruptError
 from entropy.tools import print_traceback, \
     convert_seconds_to_fancy_output, bytes_into_human, spliturl, \
-    add_proxy_opener, md5sum
+    add_proxy_opener, md5sum, store_file_digests, \
+    remove_file_digests
 from entropy.const import etpConst, const_isfileobj, const_debug_write
 from entropy.output import TextInterface, darkblue, darkred, purple, blue, \
     brown, darkgreen, red
 
 from entropy.i18n import _, ngettext
-from entropy.misc import ParallelTask
+from entropy.misc import ParallelTask, MultiHasher
 from entropy.core.settings.base import SystemSettings
 
 
@@ -81,7 +81,7 @@ class UrlFetcher(TextInterface):
                  timeout = None, download_context_func = None,
                  pre_download_hook = None, post_download_hook = None,
                  http_basic_user = None, http_basic_pwd = None,
-                 https_validate_cert = True):
+                 https_validate_cert = True, store_digests = False):
         """
         Entropy URL downloader constructor.
 
@@ -128,6 +128,11 @@ class UrlFetcher(TextInterface):
             The function takes a path (the download path) and the download
             status and the download id as arguments.
         @type post_download_hook: callable
+        @keyword store_digests: compute the MultiHasher.DIGESTS digests of
+            the data while it is being downloaded and store them next to
+            the downloaded file (see entropy.tools.store_file_digests()),
+            so that it can be verified without being read back.
+        @type store_digests: bool
         """
         self.__supported_uris = {
             'file': self._urllib_download,
@@ -175,6 +180,7 @@ class UrlFetcher(TextInterface):
         self.__http_basic_pwd = http_basic_pwd
         # SSL Context options
         self.__https_validate_cert = https_validate_cert
+        self.__store_digests = store_digests
 
         self._init_vars()
         self.__init_urllib()
@@ -189,7 +195,7 @@ class UrlFetcher(TextInterface):
 
     def _init_vars(self):
         self.__use_md5_checksum = False
-        self.__md5_checksum = hashlib.new("md5")
+        self.__hasher = self.__new_hasher()
         self.__resumed = False
         self.__buffersize = 8192
         self.__status = None
@@ -213,6 +219,11 @@ class UrlFetcher(TextInterface):
         if os.path.lexists(self.__path_to_save):
             self.__existed_before = True
 
+    def __new_hasher(self):
+        if self.__store_digests:
+            return MultiHasher()
+        return MultiHasher(("md5",))
+
     def __setup_urllib_resume_support(self):
 
         # resume support
@@ -236,8 +247,12 @@ class UrlFetcher(TextInterface):
             except (IOError, OSError,):
                 pass
         self.__localfile = open(self.__path_to_save, mode)
+        self.__hasher = self.__new_hasher()
         if mode.startswith("a"):
             self.__resumed = True
+            if self.__checksum or self.__store_digests:
+                # digests must cover the data already on disk as well
+                self.__hasher.update_from_file(self.__path_to_save)
         else:
             self.__resumed = False
 
@@ -251,9 +266,12 @@ class UrlFetcher(TextInterface):
         return url
 
     def __prepare_return(self):
+        if self.__use_md5_checksum and self.__store_digests:
+            store_file_digests(
+                self.__path_to_save, self.__hasher.hexdigests())
         if self.__checksum:
             if self.__use_md5_checksum:
-                self.__status = self.__md5_checksum.hexdigest()
+                self.__status = self.__hasher.hexdigests()["md5"]
             else:
                 # for rsync, we don't have control on the data flow, so
                 # we cannot calculate the md5 on the way
@@ -553,6 +571,7 @@ class UrlFetcher(TextInterface):
                 os.remove(self.__path_to_save)
             except OSError:
                 pass
+            remove_file_digests(self.__path_to_save)
 
     def _setup_urllib_proxy(self):
         """
@@ -817,7 +836,7 @@ class UrlFetcher(TextInterface):
     def __urllib_commit(self, mybuffer):
         # writing file buffer
         self.__localfile.write(mybuffer)
-        self.__md5_checksum.update(mybuffer)
+        self.__hasher.update(mybuffer)
         # update progress info
         self.__downloadedsize = self.__localfile.tell()
         kbytecount = float(self.__downloadedsize)/1000
@@ -846,6 +865,7 @@ class UrlFetcher(TextInterface):
                 os.remove(self.__path_to_save)
             except OSError:
                 pass
+            remove_file_digests(self.__path_to_save)
 
         if self.__remotefile is not None:
             try:
@@ -1013,7 +1033,7 @@ class MultipleUrlFetcher(TextInterface):
                  download_context_func = None,
                  pre_download_hook = None, post_download_hook = None,
                  http_basic_user = None, http_basic_pwd = None,
-                 https_validate_cert = True):
+                 https_validate_cert = True, store_digests = False):
         """
         @param url_path_list: list of tuples composed by url and
             path to save, for eg. [(url,path_to_save,),...]
@@ -1057,6 +1077,8 @@ class MultipleUrlFetcher(TextInterface):
             The function takes a path (the download path) and the download
             status and the download id as arguments.
         @type post_download_hook: callable
+        @keyword store_digests: see UrlFetcher
+        @type store_digests: bool
         """
         self._progress_data = {}
         self._url_path_list = url_path_list
@@ -1087,6 +1109,7 @@ class MultipleUrlFetcher(TextInterface):
         self.__http_basic_pwd = http_basic_pwd
         # SSL Context options
         self.__https_validate_cert = https_validate_cert
+        self.__store_digests = store_digests
 
     def __handle_threads_stop(self):
         if self.__stop_threads:
@@ -1174,7 +1197,8 @@ class MultipleUrlFetcher(TextInterface):
                 post_download_hook = self.__post_download_hook,
                 http_basic_user = self.__http_basic_user,
                 http_basic_pwd = self.__http_basic_pwd,
-                https_validate_cert = self.__https_validate_cert
+                https_validate_cert = self.__https_validate_cert,
+                store_digests = self.__store_digests
             )
             downloader.set_id(th_id)
 
@@ -12,8 +12,13 @@
     This module implements a Graph object and a topological sorting algorithm
     based on Tarjan's.
 
+    Items are mapped to integer identifiers and arches are stored in flat
+    arrays, compiled into a compressed sparse row (CSR) adjacency when the
+    graph is solved. GraphNode and GraphArchSet objects are only built
+    on demand, for the callers walking the graph through them.
+
 """
-from entropy.misc import Lifo
+from array import array
 
 class GraphNode(object):
 
@@ -215,6 +220,162 @@ class GraphArchSet(object):
         return frozenset(self.__endpoints)
 
 
+def _compile_adjacency(nodes_count, edge_src, edge_dst):
+    """
+    Compile the given arches, stored in the edge_src and edge_dst
+    parallel arrays of node identifiers, into a CSR adjacency: the
+    successors of node N are targets[offsets[N]:offsets[N + 1]], in
+    insertion order.
+
+    @return: (offsets, targets) tuple of arrays
+    @rtype: tuple
+    """
+    offsets = array('l', [0]) * (nodes_count + 1)
+    for src in edge_src:
+        offsets[src + 1] += 1
+    for node in range(nodes_count):
+        offsets[node + 1] += offsets[node]
+
+    targets = array('l', [0]) * len(edge_dst)
+    position = offsets[:-1]
+    for idx, src in enumerate(edge_src):
+        targets[position[src]] = edge_dst[idx]
+        position[src] += 1
+    return offsets, targets
+
+def _strongly_connected_components(offsets, targets):
+    """
+    Find the strongly connected components of a CSR adjacency using an
+    iterative version of Tarjan's algorithm, deep graphs do not hit
+    the recursion limit.
+
+    @return: (components, component_map) tuple, components is a list of
+        node identifier tuples, in reverse topological order, component_map
+        an array mapping every node identifier to its component index
+    @rtype: tuple
+    """
+    nodes_count = len(offsets) - 1
+    index = array('l', [-1]) * nodes_count
+    low = array('l', [0]) * nodes_count
+    on_stack = bytearray(nodes_count)
+    component_map = array('l', [-1]) * nodes_count
+    stack = []
+    components = []
+    counter = 0
+
+    for root in range(nodes_count):
+        if index[root] != -1:
+            continue
+
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = 1
+        # nodes being visited and their next arch to follow
+        work = [[root, offsets[root]]]
+
+        while work:
+            frame = work[-1]
+            node = frame[0]
+            end = offsets[node + 1]
+            descended = False
+
+            while frame[1] < end:
+                successor = targets[frame[1]]
+                frame[1] += 1
+                if index[successor] == -1:
+                    index[successor] = low[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack[successor] = 1
+                    work.append([successor, offsets[successor]])
+                    descended = True
+                    break
+                if on_stack[successor] and index[successor] < low[node]:
+                    low[node] = index[successor]
+
+            if descended:
+                continue
+
+            work.pop()
+            if low[node] == index[node]:
+                stack_pos = len(stack) - 1
+                while stack[stack_pos] != node:
+                    stack_pos -= 1
+                # same ordering of the recursive implementation
+                component = tuple(reversed(stack[stack_pos:]))
+                del stack[stack_pos:]
+                component_idx = len(components)
+                for item in component:
+                    on_stack[item] = 0
+                    component_map[item] = component_idx
+                components.append(component)
+
+            if work:
+                parent = work[-1][0]
+                if low[node] < low[parent]:
+                    low[parent] = low[node]
+
+    return components, component_map
+
+def _topological_sort(offsets, targets):
+    """
+    Sort the strongly connected components of the given CSR adjacency
+    using Kahn's algorithm on the condensed graph. Components are
+    considered in the order of their first node.
+
+    @return: dict mapping dependency levels (starting from 1) to node
+        identifier tuples (components)
+    @rtype: dict
+    """
+    components, component_map = _strongly_connected_components(
+        offsets, targets)
+    components_count = len(components)
+
+    # order components by their first node, like the dict based
+    # implementation did
+    order = array('l', [-1]) * components_count
+    ordered = []
+    for node in range(len(offsets) - 1):
+        component_idx = component_map[node]
+        if order[component_idx] == -1:
+            order[component_idx] = len(ordered)
+            ordered.append(component_idx)
+
+    # condensed graph, CSR again
+    edge_src = array('l')
+    edge_dst = array('l')
+    for node in range(len(offsets) - 1):
+        node_c = order[component_map[node]]
+        for edge in range(offsets[node], offsets[node + 1]):
+            successor_c = order[component_map[targets[edge]]]
+            if node_c != successor_c:
+                edge_src.append(node_c)
+                edge_dst.append(successor_c)
+    c_offsets, c_targets = _compile_adjacency(
+        components_count, edge_src, edge_dst)
+
+    count = array('l', [0]) * components_count
+    for successor_c in c_targets:
+        count[successor_c] += 1
+    ready_stack = [x for x in range(components_count) if count[x] == 0]
+
+    dep_level = 1
+    result = {}
+    while ready_stack:
+        node_c = ready_stack.pop()
+        result[dep_level] = components[ordered[node_c]]
+        dep_level += 1
+
+        for edge in range(c_offsets[node_c], c_offsets[node_c + 1]):
+            successor_c = c_targets[edge]
+            count[successor_c] -= 1
+            if count[successor_c] == 0:
+                ready_stack.append(successor_c)
+
+    return result
+
+
 class TopologicalSorter(object):
 
     """
@@ -231,80 +392,6 @@ class TopologicalSorter(object):
         """
         object.__init__(self)
         self.__adjacency_map = adjacency_map
-        self.__stack = Lifo()
-
-    def __topological_sort_visit_node(self, node, low, result):
-        """
-        Internal method, visits a node ad push to stack.
-        """
-        if node in low:
-            return
-
-        num = len(low)
-        low[node] = num
-        stack_pos = len(self.__stack)
-        self.__stack.push(node)
-
-        for successor in self.__adjacency_map[node]:
-            self.__topological_sort_visit_node(successor, low, result)
-            low[node] = min(low[node], low[successor])
-
-        if num == low[node]:
-            component = tuple()
-            while len(self.__stack) > stack_pos:
-                component += (self.__stack.pop(),)
-            result.append(component)
-            for item in component:
-                low[item] = len(self.__adjacency_map)
-
-    def __strongly_connected_nodes(self):
-        """
-        Find the strongly connected nodes in a adjacency_map using
-        Tarjan's algorithm.
-
-        adjacency_map should be a dictionary mapping node names to
-        lists of successor nodes.
-        """
-        result = []
-        low = {}
-
-        for node in self.__adjacency_map:
-            self.__topological_sort_visit_node(node, low, result)
-
-        return result
-
-
-    def __topological_sort(self, graph):
-        """
-        Effectively executes topological sorting on given graph.
-        """
-
-        # initialize count map
-        count = dict((node, 0) for node in graph)
-
-        for node in graph:
-            for successor in graph[node]:
-                count[successor] += 1
-
-        ready_stack = Lifo()
-        for node in graph:
-            if count[node] == 0:
-                ready_stack.push(node)
-
-        dep_level = 1
-        result = {}
-        while ready_stack.is_filled():
-
-            node = ready_stack.pop()
-            result[dep_level] = node
-            dep_level += 1
-
-            for successor in graph[node]:
-                count[successor] -= 1
-                if count[successor] == 0:
-                    ready_stack.push(successor)
-
-        return result
 
     def get_stored_adjacency_map(self):
         """
@@ -323,26 +410,20 @@ class TopologicalSorter(object):
         @return: sorted graph representation
         @rtype: dict
         """
-        # clear stack
-        self.__stack.clear()
+        nodes = list(self.__adjacency_map)
+        node_ids = dict((node, idx) for idx, node in enumerate(nodes))
+        edge_src = array('l')
+        edge_dst = array('l')
+        for node, successors in self.__adjacency_map.items():
+            node_id = node_ids[node]
+            for successor in successors:
+                edge_src.append(node_id)
+                edge_dst.append(node_ids[successor])
 
-        components = self.__strongly_connected_nodes()
-
-        node_component = {}
-        for component in components:
-            for node in component:
-                node_component[node] = component
-
-        component_graph = {}
-        for node in self.__adjacency_map:
-            node_c = node_component[node]
-            obj = component_graph.setdefault(node_c, [])
-            for successor in self.__adjacency_map[node]:
-                successor_c = node_component[successor]
-                if node_c != successor_c:
-                    obj.append(successor_c)
-
-        return self.__topological_sort(component_graph)
+        offsets, targets = _compile_adjacency(len(nodes), edge_src, edge_dst)
+        sorted_data = _topological_sort(offsets, targets)
+        return dict((x, tuple(nodes[k] for k in y)) \
+            for x, y in sorted_data.items())
 
 
 class Graph(object):
@@ -359,40 +440,84 @@ class Graph(object):
         Graph representation constructor.
         """
         object.__init__(self)
-        self.__graph = {}
-        self.__archs_map = {}
-        self.__graph_map_cache = None
+        # item -> node identifier and vice versa
+        self.__ids = {}
+        self.__items = []
+        # nodes whose arch has been set through add(), the others are
+        # just dependencies
+        self.__added = bytearray()
+        # arches, as parallel arrays of node identifiers
+        self.__edge_src = array('l')
+        self.__edge_dst = array('l')
+        self.__csr_cache = None
+        self.__nodes_cache = None
 
     def destroy(self):
         """
         Cleanup any reference.
         """
-        try:
-            for obj in self.__graph.values():
-                obj._clear()
-            self.__graph.clear()
-        except (NameError, AttributeError):
-            pass
-        try:
-            for obj in self.__archs_map.values():
-                obj._clear()
-            self.__archs_map.clear()
-        except (NameError, AttributeError):
-            pass
-        try:
-            if self.__graph_map_cache is not None:
-                for obj in self.__graph_map_cache.values():
-                    obj._clear()
-                self.__graph_map_cache.clear()
-                self.__graph_map_cache = None
-        except (NameError, AttributeError):
-            pass
+        if self.__nodes_cache is not None:
+            for node in self.__nodes_cache:
+                for arch in node.arches():
+                    arch._clear()
+                node._clear()
+        self.__invalidate_cache()
+        self.__ids.clear()
+        del self.__items[:]
+        self.__added = bytearray()
+        self.__edge_src = array('l')
+        self.__edge_dst = array('l')
 
     def __invalidate_cache(self):
         """
         Private method, stay away from here.
         """
-        self.__graph_map_cache = None
+        self.__csr_cache = None
+        self.__nodes_cache = None
+
+    def __node_id(self, item):
+        """
+        Return the identifier of the given item, adding it if needed.
+        """
+        node_id = self.__ids.get(item)
+        if node_id is None:
+            node_id = len(self.__items)
+            self.__ids[item] = node_id
+            self.__items.append(item)
+            self.__added.append(0)
+        return node_id
+
+    def __csr(self):
+        """
+        Return the (offsets, targets) CSR adjacency of the graph.
+        """
+        if self.__csr_cache is None:
+            self.__csr_cache = _compile_adjacency(
+                len(self.__items), self.__edge_src, self.__edge_dst)
+        return self.__csr_cache
+
+    def __nodes(self):
+        """
+        Return the list of GraphNode objects, indexed by node identifier,
+        building them if needed.
+        """
+        if self.__nodes_cache is not None:
+            return self.__nodes_cache
+
+        offsets, targets = self.__csr()
+        nodes = [GraphNode(x) for x in self.__items]
+        for node_id, graph_node in enumerate(nodes):
+            if not self.__added[node_id]:
+                continue
+            arch = GraphArchSet(graph_node)
+            graph_node.add_arch(arch)
+            for edge in range(offsets[node_id], offsets[node_id + 1]):
+                graph_node_dep = nodes[targets[edge]]
+                arch.add_endpoint(graph_node_dep)
+                graph_node_dep.add_arch(arch)
+
+        self.__nodes_cache = nodes
+        return nodes
 
     def get_node(self, item):
         """
@@ -404,7 +529,7 @@ class Graph(object):
         @rtype: entropy.graph.GraphNode
         @raise KeyError: if item is not in Graph
         """
-        return self.__graph[item]
+        return self.__nodes()[self.__ids[item]]
 
     def add(self, item, dependency_items):
         """
@@ -418,15 +543,14 @@ class Graph(object):
         """
         self.__invalidate_cache()
 
-        graph_node = self.__graph.setdefault(item, GraphNode(item))
-        arch = self.__archs_map.setdefault(graph_node, GraphArchSet(graph_node))
-        graph_node.add_arch(arch)
+        node_id = self.__node_id(item)
+        self.__added[node_id] = 1
 
+        edge_src = self.__edge_src
+        edge_dst = self.__edge_dst
         for dep_item in dependency_items:
-            graph_node_dep = self.__graph.setdefault(dep_item,
-                GraphNode(dep_item))
-            arch.add_endpoint(graph_node_dep)
-            graph_node_dep.add_arch(arch)
+            edge_src.append(node_id)
+            edge_dst.append(self.__node_id(dep_item))
 
     def get_adjacency_map(self):
         """
@@ -435,21 +559,28 @@ class Graph(object):
         @return: adjacency map
         @rtype: dict
         """
-        if self.__graph_map_cache is not None:
-            return self.__graph_map_cache.copy()
-
+        offsets, targets = self.__csr()
+        nodes = self.__nodes()
         graph_map = {}
-        for node_item in self.__graph.values():
-
-            my_graph_map = set()
-            for arch in node_item.arches():
-                if node_item.is_arch_outgoing(arch):
-                    my_graph_map |= arch.endpoints()
+        for node_id, graph_node in enumerate(nodes):
+            graph_map[graph_node] = set(nodes[targets[x]] for x in \
+                range(offsets[node_id], offsets[node_id + 1]))
+        return graph_map
 
-            graph_map[node_item] = my_graph_map
+    def get_item_adjacency_map(self):
+        """
+        Return an adjacency map given the current items in Graph, like
+        get_adjacency_map(), but mapping items to the set of their
+        dependency items, without building GraphNode objects.
 
-        self.__graph_map_cache = graph_map.copy()
-        return graph_map
+        @return: adjacency map
+        @rtype: dict
+        """
+        offsets, targets = self.__csr()
+        items = self.__items
+        return dict((item, set(items[targets[x]] for x in \
+            range(offsets[node_id], offsets[node_id + 1]))) \
+                for node_id, item in enumerate(items))
 
     def solve_nodes(self):
         """
@@ -460,9 +591,11 @@ class Graph(object):
         @return: sorted graph representation (returning GraphNode objects)
         @rtype: dict
         """
-        adj_map = self.get_adjacency_map()
-        sorter = TopologicalSorter(adj_map)
-        return sorter.sort()
+        nodes = self.__nodes()
+        offsets, targets = self.__csr()
+        sorted_data = _topological_sort(offsets, targets)
+        return dict((x, tuple(nodes[k] for k in y)) \
+            for x, y in sorted_data.items())
 
     def solve(self):
         """
@@ -474,11 +607,11 @@ class Graph(object):
         @return: sorted graph representation
         @rtype: dict
         """
-        def trans_vals(node_list):
-            return tuple([x.item() for x in node_list])
-
-        sorted_data = self.solve_nodes()
-        return dict((x, trans_vals(y),) for x, y in sorted_data.items())
+        items = self.__items
+        offsets, targets = self.__csr()
+        sorted_data = _topological_sort(offsets, targets)
+        return dict((x, tuple(items[k] for k in y)) \
+            for x, y in sorted_data.items())
 
     def raw(self):
         """
@@ -488,14 +621,14 @@ class Graph(object):
         @return: list of items added to Graph
         @rtype: list
         """
-        return [x.item() for x in self.__graph.values()]
+        return list(self.__items)
 
     def _graph_debug(self):
         """
         This method is used by entropy.debug module and it's not meant for
         general consumption.
         """
-        return self.__graph
+        return dict(zip(self.__items, self.__nodes()))
 
 
 __all__ = ["Graph"]
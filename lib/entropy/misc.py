@@ -19,6 +19,7 @@ import fcntl
 import signal
 import errno
 import codecs
+import hashlib
 import contextlib
 
 from entropy.const import const_is_python3
@@ -417,6 +418,86 @@ class DirectoryMonitor:
             os.close(fd)
 
 
+class MultiHasher(object):
+
+    """
+    Compute several digests (md5, sha1, sha256, sha512, or any other
+    algorithm supported by hashlib) of the same stream of data in a
+    single pass. Data can be fed incrementally, for instance while it is
+    being downloaded, or read from a file.
+
+        >>> from entropy.misc import MultiHasher
+        >>> hasher = MultiHasher(("md5", "sha256"))
+        >>> hasher.update(b"hello world")
+        >>> hasher.hexdigests()["md5"]
+        '5eb63bbbe01eeed093cb22bb8f5acdc3'
+
+    """
+
+    # all the digests Entropy uses to verify package files
+    DIGESTS = ("md5", "sha1", "sha256", "sha512")
+
+    _READ_SIZE = 1024000
+
+    def __init__(self, hash_types = None):
+        """
+        MultiHasher constructor.
+
+        @keyword hash_types: list of hash names (as accepted by hashlib.new()),
+            if None, MultiHasher.DIGESTS is used
+        @type hash_types: iterable
+        """
+        if hash_types is None:
+            hash_types = MultiHasher.DIGESTS
+        self._hashers = []
+        for hash_type in hash_types:
+            self._hashers.append((hash_type, hashlib.new(hash_type)))
+
+    def hash_types(self):
+        """
+        Return the list of hash names computed by this object.
+
+        @return: list of hash names
+        @rtype: list
+        """
+        return [x for x, _m in self._hashers]
+
+    def update(self, data):
+        """
+        Feed all the hashers with the given data.
+
+        @param data: raw data
+        @type data: bytes
+        """
+        for _hash_type, hasher in self._hashers:
+            hasher.update(data)
+
+    def update_from_file(self, filepath):
+        """
+        Feed all the hashers with the content of the given file, which is
+        read only once.
+
+        @param filepath: path to file
+        @type filepath: string
+        @raise IOError: if the file cannot be read
+        @raise OSError: if the file cannot be read
+        """
+        with open(filepath, "rb") as readfile:
+            block = readfile.read(self._READ_SIZE)
+            while block:
+                self.update(block)
+                block = readfile.read(self._READ_SIZE)
+
+    def hexdigests(self):
+        """
+        Return the hex digests of the data fed so far.
+
+        @return: dict composed by hash name as key and hex digest as value
+        @rtype: dict
+        """
+        return dict((x, m.hexdigest()) for x, m in self._hashers)
+
+
 class ParallelTask(threading.Thread):
 
     """
@@ -20,17 +20,20 @@
 """
 import collections
 import errno
+import multiprocessing
 import os
+import signal
 import sys
 import subprocess
 import stat
 import codecs
+import time
 
 from entropy.output import TextInterface
 from entropy.misc import Lifo
 from entropy.const import etpConst, etpSys, const_debug_write, const_mkdtemp, \
     const_mkstemp, const_debug_write, const_convert_to_rawstring, \
-    const_is_python3
+    const_is_python3, const_get_cpus
 from entropy.output import blue, darkgreen, red, darkred, bold, purple, brown, \
     teal
 from entropy.exceptions import PermissionDenied, SystemDatabaseError, \
@@ -40,8 +43,63 @@ from entropy.core import EntropyPluginStore
 from entropy.core.settings.base import SystemSettings
 from entropy.db.skel import EntropyRepositoryPlugin, EntropyRepositoryBase
 
+import entropy.dump
 import entropy.tools
 
+def _libtest_worker_init():
+    """
+    test_shared_objects() process pool worker initializer, SIGINT is
+    handled by the parent process.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _libtest_walk(directory):
+    """
+    Walk directory (test_shared_objects() walk phase) and return
+    a (directory, files) tuple, where files is a list of (path, key)
+    tuples of the regular executable files found outside the
+    split debug directories, and key is (mtime, size, inode).
+    """
+    files = []
+    debug_dirs = etpConst['splitdebug_dirs']
+    for currentdir, subdirs, names in os.walk(directory):
+
+        # is it a debug directory? skip it.
+        t_path = currentdir
+        is_debug = False
+        while t_path and t_path != os.path.sep:
+            if t_path in debug_dirs:
+                is_debug = True
+                break
+            t_path = os.path.dirname(t_path)
+        if is_debug:
+            continue
+
+        for name in names:
+            path = os.path.join(currentdir, name)
+            try:
+                st = os.stat(path)
+            except (OSError, IOError):
+                continue
+            # shared libraries must be always executable
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            if not (stat.S_IMODE(st.st_mode) & stat.S_IXUSR):
+                continue
+            files.append((path, (st.st_mtime, st.st_size, st.st_ino)))
+
+    return directory, files
+
+def _libtest_inspect(paths):
+    """
+    Read the ELF metadata (test_shared_objects() inspect phase) of paths
+    and return a list of (path, metadata) tuples, see
+    entropy.tools.read_elf_metadata_many().
+    """
+    metadata = entropy.tools.read_elf_metadata_many(paths)
+    return [(x, metadata[x]) for x in paths]
+
+
 class QAEntropyRepositoryPlugin(EntropyRepositoryPlugin):
 
     def __init__(self, qa_interface, metadata = None):
@@ -123,6 +181,23 @@ class QAInterface(TextInterface, EntropyPluginStore):
 
     """
 
+    # Number of processes used by test_shared_objects() to walk the
+    # linker paths and read the ELF objects, 0 means one per CPU and
+    # 1 disables the process pool.
+    LIBTEST_JOBS = entropy.tools.setting_to_int(
+        os.getenv("ETP_LIBTEST_JOBS", ""), 0, None) or 0
+
+    # If True, test_shared_objects() keeps an on-disk index of the ELF
+    # metadata, keyed by (path, mtime, size, inode), so that only
+    # changed files are read again on the next run.
+    LIBTEST_INDEX = os.getenv("ETP_LIBTEST_NO_INDEX") is None
+
+    # Minimum number of files to read with the process pool, less
+    # than that are read in-process.
+    _LIBTEST_POOL_MIN_FILES = 256
+    _LIBTEST_CHUNK_SIZE = 64
+    _LIBTEST_INDEX_NAME = "libtest/elf_index_v1"
+
     def __init__(self):
         """
         QAInterface constructor.
@@ -517,6 +592,121 @@ class QAInterface(TextInterface, EntropyPluginStore):
 
         return missing_sonames
 
+    def _scan_shared_objects(self, ldpaths, timings,
+                             task_bombing_func = None, silent = False):
+        """
+        Walk the given linker paths and read the metadata of the ELF
+        executables and libraries found, for test_shared_objects().
+        The walk and the ELF reading are spread across a process pool,
+        files that did not change since the last run (see LIBTEST_INDEX)
+        are not read again.
+
+        @param ldpaths: list of linker paths
+        @type ldpaths: list
+        @param timings: list to which (phase name, seconds) tuples are
+            appended
+        @type timings: list
+        @keyword task_bombing_func: see test_shared_objects()
+        @type task_bombing_func: callable
+        @keyword silent: do not print anything to stdout
+        @type silent: bool
+        @return: dict mapping ELF objects paths (without the system root
+            prefix) to their metadata, in entropy.tools.read_elf_metadata()
+            format
+        @rtype: dict
+        """
+        sys_root = etpConst['systemroot']
+        sys_root_len = len(sys_root)
+        directories = [sys_root + x for x in sorted(ldpaths)]
+
+        jobs = self.LIBTEST_JOBS or const_get_cpus()
+        pool = None
+        if jobs > 1:
+            try:
+                pool = multiprocessing.Pool(
+                    jobs, initializer = _libtest_worker_init)
+            except (OSError, ImportError) as err:
+                const_debug_write(__name__,
+                    "_scan_shared_objects: no process pool: %s" % (err,))
+
+        def _map(func, items):
+            if pool is None:
+                return map(func, items)
+            return pool.imap_unordered(func, items)
+
+        try:
+            t0 = time.time()
+            files = {}
+            total = len(directories)
+            count = 0
+            for directory, dir_files in _map(_libtest_walk, directories):
+                if hasattr(task_bombing_func, '__call__'):
+                    task_bombing_func()
+                count += 1
+                if not silent:
+                    self.output(
+                        blue("Tree: ") + red(directory),
+                        importance = 0,
+                        level = "info",
+                        count = (count, total),
+                        back = True,
+                        percent = True,
+                        header = "  "
+                    )
+                files.update(dir_files)
+            timings.append(("walk", time.time() - t0))
+
+            t0 = time.time()
+            index = None
+            if self.LIBTEST_INDEX:
+                index = entropy.dump.loadobj(self._LIBTEST_INDEX_NAME)
+            if not isinstance(index, dict):
+                index = {}
+
+            metadata = {}
+            to_inspect = []
+            for path, key in files.items():
+                cached = index.get(path)
+                if cached is not None and cached[0] == key:
+                    metadata[path] = cached[1]
+                else:
+                    to_inspect.append(path)
+
+            chunks = entropy.tools.split_indexable_into_chunks(
+                sorted(to_inspect), self._LIBTEST_CHUNK_SIZE)
+            if len(to_inspect) < self._LIBTEST_POOL_MIN_FILES:
+                inspected = map(_libtest_inspect, chunks)
+            else:
+                inspected = _map(_libtest_inspect, chunks)
+            for chunk_metadata in inspected:
+                if hasattr(task_bombing_func, '__call__'):
+                    task_bombing_func()
+                metadata.update(chunk_metadata)
+            timings.append(("inspect", time.time() - t0))
+
+        except:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+                pool = None
+            raise
+
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        const_debug_write(__name__,
+            "_scan_shared_objects: %d files, %d read" % (
+                len(files), len(to_inspect)))
+
+        if self.LIBTEST_INDEX and to_inspect:
+            entropy.dump.dumpobj(self._LIBTEST_INDEX_NAME,
+                dict((x, (files[x], metadata[x])) for x in files))
+
+        return dict((x[sys_root_len:], y) for x, y in metadata.items()
+                    if y is not None)
+
     def test_shared_objects(self, entropy_repository, broken_symbols = False,
         task_bombing_func = None, self_dir_check = True,
         dump_results_to_file = False, silent = False):
@@ -652,40 +842,10 @@ class QAInterface(TextInterface, EntropyPluginStore):
                         )
                     break
 
-        executables = set()
-        total = len(ldpaths)
-        count = 0
-        sys_root_len = len(etpConst['systemroot'])
-
-        def _are_elfs(dt):
-            currentdir, subdirs, files = dt
-
-            def _is_elf(item):
-                filepath = os.path.join(currentdir, item)
-                if self._is_elf_executable_or_library(filepath):
-                    return filepath[sys_root_len:]
-
-            return (x for x in map(_is_elf, files) if x is not None)
-
-        for ldpath in sorted(ldpaths):
-
-            if hasattr(task_bombing_func, '__call__'):
-                task_bombing_func()
-            count += 1
-            if not silent:
-                self.output(
-                    blue("Tree: ")+red(etpConst['systemroot'] + ldpath),
-                    importance = 0,
-                    level = "info",
-                    count = (count, total),
-                    back = True,
-                    percent = True,
-                    header = "  "
-                )
-            mywalk_iter = os.walk(etpConst['systemroot'] + ldpath)
-
-            for x in map(_are_elfs, mywalk_iter):
-                executables.update(x)
+        timings = []
+        executables = self._scan_shared_objects(
+            ldpaths, timings, task_bombing_func = task_bombing_func,
+            silent = silent)
 
         if not silent:
             self.output(
@@ -713,11 +873,15 @@ class QAInterface(TextInterface, EntropyPluginStore):
         if files_list_path:
             files_list_f = codecs.open(files_list_path, "w", encoding=enc)
 
+        t0 = time.time()
         plain_brokenexecs = set()
         total = len(executables)
         count = 0
         scan_txt = blue("%s ..." % (_("Scanning libraries"),))
-        for executable in executables:
+        # resolve_dynamic_library() outcome only depends on the library
+        # name and on the ELF class and linker paths of the executable
+        resolved_libs = {}
+        for executable in sorted(executables):
 
             # task bombing hook
             if hasattr(task_bombing_func, '__call__'):
@@ -749,13 +913,21 @@ class QAInterface(TextInterface, EntropyPluginStore):
 
             real_exec_path = etpConst['systemroot'] + executable
 
-            myelfs = entropy.tools.read_elf_dynamic_libraries(
-                real_exec_path)
+            elf_meta = executables[executable]
+            myelfs = elf_meta['needed']
+            origin_dir = None
+            if "ORIGIN" in elf_meta['runpath']:
+                origin_dir = os.path.dirname(executable)
 
             mylibs = set()
             for mylib in myelfs:
-                lib_path = entropy.tools.resolve_dynamic_library(mylib,
-                    executable)
+                resolve_key = (mylib, elf_meta['class'],
+                               elf_meta['runpath'], origin_dir)
+                lib_path = resolved_libs.get(resolve_key)
+                if resolve_key not in resolved_libs:
+                    lib_path = entropy.tools.resolve_dynamic_library(mylib,
+                        executable)
+                    resolved_libs[resolve_key] = lib_path
                 if not lib_path:
                     mylibs.add(mylib)
 
@@ -855,6 +1027,9 @@ class QAInterface(TextInterface, EntropyPluginStore):
             files_list_f.close()
 
         del executables
+        timings.append(("resolve", time.time() - t0))
+
+        t0 = time.time()
         pkgs_matched = {}
 
         if not etpSys['serverside']:
@@ -875,15 +1050,20 @@ class QAInterface(TextInterface, EntropyPluginStore):
                     header = red(" @@ ")
                 )
             matched = set()
+            # test with /usr/lib
+            owners = entropy_repository.searchBelongsMany(plain_brokenexecs)
+            # try with realpath
+            # on multilib systems this resolves to /usr/lib64
+            # which makes searchBelongs() happy
+            real_paths = dict((x, os.path.realpath(x)) for x, y in
+                              owners.items() if not y)
+            real_owners = entropy_repository.searchBelongsMany(
+                set(real_paths.values()))
+            for brokenlib, real_path in real_paths.items():
+                owners[brokenlib] = real_owners[real_path]
+
             for brokenlib in plain_brokenexecs:
-                # test with /usr/lib
-                idpackages = entropy_repository.searchBelongs(brokenlib)
-                if not idpackages:
-                    # try with realpath
-                    # on multilib systems this resolves to /usr/lib64
-                    # which makes searchBelongs() happy
-                    idpackages = entropy_repository.searchBelongs(
-                        os.path.realpath(brokenlib))
+                idpackages = owners[brokenlib]
 
                 for idpackage in idpackages:
 
@@ -900,6 +1080,19 @@ class QAInterface(TextInterface, EntropyPluginStore):
 
             plain_brokenexecs -= matched
 
+        timings.append(("match", time.time() - t0))
+        timings_txt = ", ".join(
+            "%s %.2fs" % (phase, secs) for phase, secs in timings)
+        const_debug_write(__name__,
+            "test_shared_objects timings: %s" % (timings_txt,))
+        if not silent:
+            self.output(
+                "%s: %s" % (blue(_("Timings")), timings_txt,),
+                importance = 0,
+                level = "info",
+                header = darkgreen(" @@ ")
+            )
+
         return pkgs_matched, plain_brokenexecs, 0
 
     def _content_test(self, mycontent):
@@ -920,13 +1113,19 @@ class QAInterface(TextInterface, EntropyPluginStore):
                     return True
             return False
 
-        mylibs = {}
+        elf_files = []
         for myfile in mycontent:
             myfile = const_convert_to_rawstring(myfile)
             if not self._is_elf_executable_or_library(myfile):
                 continue
-            mylibs[myfile] = entropy.tools.read_elf_dynamic_libraries(
-                myfile)
+            elf_files.append(myfile)
+
+        mylibs = {}
+        elf_metadata = entropy.tools.read_elf_metadata_many(elf_files)
+        for myfile, meta in elf_metadata.items():
+            mylibs[myfile] = set()
+            if meta is not None:
+                mylibs[myfile] = meta['needed']
 
         broken_libs = {}
         for mylib in mylibs:
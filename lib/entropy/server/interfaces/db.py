@@ -307,34 +307,23 @@ class ServerPackagesRepository(CachedRepository):
         """
         self._readonly = bool(readonly)
 
-    _CONNECTION_POOL = {}
-    _CONNECTION_POOL_MUTEX = threading.RLock()
-    _CURSOR_POOL = {}
-    _CURSOR_POOL_MUTEX = threading.RLock()
+    _CONNECTION_POOLS = {}
+    _CONNECTION_POOLS_MUTEX = threading.Lock()
 
     def _connection_pool(self):
         """
         Overridden from EntropyRepository.
+        Connections are shared among instances of the same repository.
         """
-        return ServerPackagesRepository._CONNECTION_POOL
-
-    def _connection_pool_mutex(self):
-        """
-        Overridden from EntropyRepository.
-        """
-        return ServerPackagesRepository._CONNECTION_POOL_MUTEX
-
-    def _cursor_pool(self):
-        """
-        Overridden from EntropyRepository.
-        """
-        return ServerPackagesRepository._CURSOR_POOL
-
-    def _cursor_pool_mutex(self):
-        """
-        Overridden from EntropyRepository.
-        """
-        return ServerPackagesRepository._CURSOR_POOL_MUTEX
+        pools = ServerPackagesRepository._CONNECTION_POOLS
+        pool = pools.get(self._db)
+        if pool is None:
+            with ServerPackagesRepository._CONNECTION_POOLS_MUTEX:
+                pool = pools.get(self._db)
+                if pool is None:
+                    pool = self._newConnectionPool()
+                    pools[self._db] = pool
+        return pool
 
 
 class ServerPackagesRepositoryUpdater(object):
@@ -612,6 +601,16 @@ class ServerPackagesRepositoryUpdater(object):
             data['~~something_new_web'] = something_new_webinstall
             critical.append(data['~~something_new_web'])
 
+            if 4 not in disabled_eapis:
+
+                # changeset files are added by _create_repository_changeset()
+                data['changesets_path'] = os.path.join(
+                    self._entropy._get_local_repository_dir(
+                        self._repository_id),
+                    etpConst['etpdatabasechangesetsfile'])
+                critical.append(data['changesets_path'])
+                gpg_signed_files.append(data['changesets_path'])
+
             if 2 not in disabled_eapis:
 
                 data['dump_path_light'] = os.path.join(
@@ -1360,6 +1359,149 @@ Name:    %s
             header = brown("    # ")
         )
 
+    def _show_eapi4_upload_messages(self, crippled_uri, database_path,
+        upload_data, cmethod):
+
+        self._entropy.output(
+            "[repo:%s|%s|%s:%s] %s" % (
+                brown(self._repository_id),
+                darkgreen(crippled_uri),
+                red("EAPI"),
+                bold("4"),
+                blue(_("creating repository changeset")),
+            ),
+            importance = 0,
+            level = "info",
+            header = darkgreen(" * ")
+        )
+        self._entropy.output(
+            "%s: %s" % (_("repository path"), blue(database_path),),
+            importance = 0,
+            level = "info",
+            header = brown("    # ")
+        )
+        self._entropy.output(
+            "%s: %s" % (
+                _("changesets index"),
+                blue(upload_data['changesets_path']),
+            ),
+            importance = 0,
+            level = "info",
+            header = brown("    # ")
+        )
+        self._entropy.output(
+            "%s: %s" % (_("opener"), blue(str(cmethod[0])),),
+            importance = 0,
+            level = "info",
+            header = brown("    # ")
+        )
+
+    def _read_changesets_index(self, index_path):
+        """
+        Read the changesets index file, return a list of
+        (from revision, to revision, file name, size, sha256) tuples.
+        """
+        entries = []
+        enc = etpConst['conf_encoding']
+        try:
+            with codecs.open(index_path, "r", encoding=enc) as index_f:
+                for line in index_f.readlines():
+                    try:
+                        from_rev, to_rev, name, size, digest = line.split()
+                        entries.append((int(from_rev), int(to_rev), name,
+                                        int(size), digest))
+                    except ValueError:
+                        continue
+        except (OSError, IOError) as err:
+            if err.errno != errno.ENOENT:
+                raise
+        return entries
+
+    def _create_repository_changeset(self, entropy_repository, upload_data,
+        critical, db_format, opener):
+        """
+        Create the changeset bringing the repository from the revision
+        published by the previous upload to the current one, update
+        the changesets index, dropping the oldest entries, and add the
+        listed changesets to upload_data.
+        """
+        plg_id = self._entropy.SYSTEM_SETTINGS_PLG_ID
+        srv_set = self._settings[plg_id]['server']
+        repo_dir = self._entropy._get_local_repository_dir(
+            self._repository_id)
+        index_path = upload_data['changesets_path']
+        state_path = os.path.join(
+            repo_dir, etpConst['etpdatabasechangesetsstatefile'])
+        revision = self._entropy.local_repository_revision(
+            self._repository_id)
+        enc = etpConst['conf_encoding']
+
+        # revision and package identifiers published by the previous upload
+        state_revision = None
+        state_ids = set()
+        try:
+            with codecs.open(state_path, "r", encoding=enc) as state_f:
+                state_revision = int(state_f.readline().strip())
+                state_ids = set(int(x) for x in state_f.read().split())
+        except (OSError, IOError) as err:
+            if err.errno != errno.ENOENT:
+                raise
+        except ValueError:
+            state_revision = None
+
+        entries = self._read_changesets_index(index_path)
+        package_ids = entropy_repository.listAllPackageIds()
+
+        if state_revision is not None and state_revision < revision:
+            name = etpConst['etpdatabasechangesetfile'] % (
+                state_revision, revision, db_format)
+            changeset_path = os.path.join(repo_dir, name)
+            f_out = opener(changeset_path, "wb")
+            try:
+                entropy_repository.exportChangeset(
+                    f_out, package_ids - state_ids, state_ids - package_ids,
+                    metadata = {'from': state_revision, 'to': revision})
+            finally:
+                f_out.close()
+            entries = [x for x in entries if x[2] != name]
+            entries.append((state_revision, revision, name,
+                            os.path.getsize(changeset_path),
+                            entropy.tools.sha256(changeset_path)))
+
+        if state_revision != revision:
+            tmp_state_path = state_path + ".tmp"
+            with codecs.open(tmp_state_path, "w", encoding=enc) as state_f:
+                state_f.write("%d\n" % (revision,))
+                for package_id in sorted(package_ids):
+                    state_f.write("%d\n" % (package_id,))
+            os.rename(tmp_state_path, state_path)
+
+        max_changesets = srv_set['changesets']
+        for entry in entries[:-max_changesets]:
+            try:
+                os.remove(os.path.join(repo_dir, entry[2]))
+            except (OSError, IOError) as err:
+                if err.errno != errno.ENOENT:
+                    raise
+        entries = entries[-max_changesets:]
+
+        tmp_index_path = index_path + ".tmp"
+        with codecs.open(tmp_index_path, "w", encoding=enc) as index_f:
+            for entry in entries:
+                index_f.write("%d %d %s %d %s\n" % entry)
+        os.rename(tmp_index_path, index_path)
+
+        # every mirror gets the whole chain, to fix the ones that
+        # missed an upload
+        for entry in entries:
+            changeset_path = os.path.join(repo_dir, entry[2])
+            if not os.path.isfile(changeset_path):
+                continue
+            # sorted before "changesets_path", index is uploaded last
+            item_id = "changeset_%s" % (entry[2],)
+            upload_data[item_id] = changeset_path
+            critical.append(changeset_path)
+
     def _create_file_checksum(self, file_path, checksum_path):
         """
         Similar to entropy.tools.create_md5_file.
@@ -1508,6 +1650,13 @@ Name:    %s
         self._show_package_sets_messages()
 
         dbconn.commit()
+
+        if 4 not in disabled_eapis:
+            self._show_eapi4_upload_messages("~all~", database_path,
+                upload_data, cmethod)
+            self._create_repository_changeset(dbconn, upload_data,
+                critical, db_format, cmethod[0])
+
         # now we can safely copy it
 
         # backup current database to avoid re-indexing
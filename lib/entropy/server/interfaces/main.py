@@ -1165,6 +1165,7 @@ class ServerSystemSettingsPlugin(SystemSettingsPlugin):
             'database_file_format': const_convert_to_unicode(
                 etpConst['etpdatabasefileformat']),
             'disabled_eapis': set(),
+            'changesets': 32,
             'broken_revdeps_qa_check': True,
             'exp_based_scope': etpConst['expiration_based_scope'],
             # disabled by default for now
@@ -1225,12 +1226,21 @@ class ServerSystemSettingsPlugin(SystemSettingsPlugin):
             mydis = setting.strip().split(",")
             try:
                 mydis = [int(x) for x in mydis]
-                mydis = set([x for x in mydis if x in (1, 2, 3,)])
+                mydis = set([x for x in mydis if x in (1, 2, 3, 4,)])
             except ValueError:
                 return
-            if (len(mydis) < 3) and mydis:
+            # EAPI4 is not standalone, clients fall back to the others
+            if (len(mydis - set([4])) < 3) and mydis:
                 data['disabled_eapis'] = mydis
 
+        def _changesets(line, setting):
+            try:
+                changesets = int(setting)
+            except ValueError:
+                return
+            if changesets > 0:
+                data['changesets'] = changesets
+
         def _server_basic_lang(line, setting):
             data['qa_langs'] = setting.strip().split()
 
@@ -1337,6 +1347,7 @@ class ServerSystemSettingsPlugin(SystemSettingsPlugin):
             'expiration-based-scope': _exp_based_scope,
             'nonfree-packages-directory-support': _nf_packages_dir_sup,
             'disabled-eapis': _disabled_eapis,
+            'changesets': _changesets,
             'broken-reverse-deps': _broken_revdeps_qa,
             'server-basic-languages': _server_basic_lang,
             'repository': _repository_func,
@@ -2973,7 +2984,8 @@ class Server(Client):
             to_repository_id, ask = ask, pull_deps = pull_dependencies,
             do_copy = True)
 
-    def _move_package(self, package_match, todbconn, new_tag, do_copy):
+    def _move_package(self, package_match, todbconn, new_tag, do_copy,
+                      package_data = None):
         """
         Move a single package from a repository to another.
 
@@ -2985,6 +2997,9 @@ class Server(Client):
         @type new_tag: string or None
         @param do_copy: execute copy instead of move
         @type do_copy: bool
+        @keyword package_data: the package metadata, as returned by
+            getPackageData(), if already fetched from the source repository
+        @type package_data: dict or None
         @return: the new package id inside the destination repository or None.
         @rtype: int or None
         """
@@ -3140,7 +3155,9 @@ class Server(Client):
             back = True
         )
         # install package into destination db
-        data = dbconn.getPackageData(package_id)
+        data = package_data
+        if data is None:
+            data = dbconn.getPackageData(package_id)
         if new_tag != None:
             data['versiontag'] = new_tag
 
@@ -3392,11 +3409,27 @@ class Server(Client):
             if rc_question == _("No"):
                 return switched
 
+        # fetch the package metadata in batches, one iterator per source
+        # repository. Not for the destination repository (re-tagging),
+        # since it is modified while iterating.
+        data_iters = {}
+        for s_repository_id in set(x for _x, x in my_matches):
+            if s_repository_id == to_repository_id:
+                continue
+            s_dbconn = self.open_server_repository(
+                s_repository_id, read_only = False, no_upload = True)
+            data_iters[s_repository_id] = s_dbconn.getPackageDataMany(
+                [x for x, y in my_matches if y == s_repository_id])
+
         package_ids_added = set()
         for s_package_id, s_repository_id in my_matches:
+            package_data = None
+            data_iter = data_iters.get(s_repository_id)
+            if data_iter is not None:
+                package_data = next(data_iter)
             new_package_id = self._move_package(
                 (s_package_id, s_repository_id), todbconn,
-                new_tag, do_copy)
+                new_tag, do_copy, package_data = package_data)
             if new_package_id is not None:
                 switched.add(s_package_id)
                 package_ids_added.add(new_package_id)
@@ -3473,17 +3506,21 @@ class Server(Client):
             if orig_fd is not None:
                 os.close(orig_fd)
 
+        injection_data = list(injection_data)
+        data_iter = dbconn.getPackageDataMany(
+            [x for x, _y in injection_data])
+
         try:
             for package_id, package_path in injection_data:
 
+                data = next(data_iter)
                 tmp_repo_file = None
                 tmp_fd = None
                 try:
                     tmp_fd, tmp_repo_file = const_mkstemp(
                         prefix="entropy.server._inject_for")
-                    with os.fdopen(tmp_fd, "wb") as tmp_f:
-                        with open(tmp_repo_orig_path, "rb") as empty_f:
-                            shutil.copyfileobj(empty_f, tmp_f)
+                    # reflinked when the filesystem supports it
+                    entropy.tools.copy_file_to_fd(tmp_repo_orig_path, tmp_fd)
 
                     self.output(
                         "[%s|%s] %s: %s" % (
@@ -3497,7 +3534,6 @@ class Server(Client):
                         header = blue(" @@ "),
                         back = True
                     )
-                    data = dbconn.getPackageData(package_id)
                     self._inject_entropy_database_into_package(
                         package_path, data,
                         treeupdates_actions = treeupdates_actions,
@@ -4481,29 +4517,49 @@ class Server(Client):
 
         deps_not_satisfied = set()
         txt = _("scanning dependencies")
+        chunk_size = 150
 
         for repository_id in repository_ids:
             repo = self.open_repository(repository_id)
             dependencies = repo.listAllDependencies()
 
             total = len(dependencies)
-            for count, (dep_id, dep) in enumerate(dependencies, 1):
+            for offset in range(0, total, chunk_size):
+                chunk = dependencies[offset:offset + chunk_size]
 
-                if (count % 150 == 0) or (count == total) or (count == 1):
-                    self.output(
-                        "[%s] %s" % (
-                            purple(repository_id),
-                            darkgreen(txt),),
-                        importance = 0,
-                        level = "info",
-                        back = True,
-                        count = (count, total),
-                        header = darkred(" @@ ")
-                    )
+                self.output(
+                    "[%s] %s" % (
+                        purple(repository_id),
+                        darkgreen(txt),),
+                    importance = 0,
+                    level = "info",
+                    back = True,
+                    count = (offset + len(chunk), total),
+                    header = darkred(" @@ ")
+                )
 
-                pkg_id, _pkg_repo = self.atom_match(
-                    dep, match_repo = match_repo)
-                if pkg_id == -1:
+                # a dependency is satisfied if any of the match_repo
+                # repositories provides it, match the whole chunk
+                # at once against each of them.
+                deps = [dep for _dep_id, dep in chunk]
+                satisfied = set()
+                for match_repository_id in match_repo:
+                    try:
+                        match_repo_db = self.open_repository(
+                            match_repository_id)
+                    except (RepositoryError, SystemDatabaseError):
+                        continue
+                    pending = [x for x in deps if x not in satisfied]
+                    if not pending:
+                        break
+                    matches = match_repo_db.atomMatchMany(pending)
+                    for dep, (pkg_id, _pkg_rc) in zip(pending, matches):
+                        if pkg_id != -1:
+                            satisfied.add(dep)
+
+                for dep_id, dep in chunk:
+                    if dep in satisfied:
+                        continue
                     # only if the dependency string is still valid
                     if repo.searchPackageIdFromDependencyId(dep_id):
                         deps_not_satisfied.add(dep)
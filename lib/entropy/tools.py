@@ -14,6 +14,7 @@
 """
 import stat
 import collections
+import copy
 import errno
 import fcntl
 import re
@@ -23,6 +24,7 @@ import time
 import shutil
 import tarfile
 import subprocess
+import threading
 import grp
 import pwd
 import hashlib
@@ -30,6 +32,11 @@ import random
 import traceback
 import gzip
 import bz2
+try:
+    import lzma
+except ImportError:
+    # Python 2.x
+    lzma = None
 import mmap
 import codecs
 import struct
@@ -38,7 +45,7 @@ from entropy.output import print_generic
 from entropy.const import etpConst, const_kill_threads, const_islive, \
     const_isunicode, const_convert_to_unicode, const_convert_to_rawstring, \
     const_israwstring, const_secure_config_file, const_is_python3, \
-    const_mkstemp, const_file_readable
+    const_mkstemp, const_file_readable, const_get_cpus
 from entropy.exceptions import FileNotFound, InvalidAtom, DirectoryNotFound
 
 
@@ -1259,16 +1266,51 @@ def _delta_extract_gzip(gzip_path, new_path_fd):
             chunk = file_gz.read(_READ_SIZE)
         file_gz.close()
 
+def _delta_extract_xz(xz_path, new_path_fd):
+    with os.fdopen(new_path_fd, "wb") as item:
+        file_xz = lzma.LZMAFile(xz_path, "rb")
+        chunk = file_xz.read(_READ_SIZE)
+        while chunk:
+            item.write(chunk)
+            chunk = file_xz.read(_READ_SIZE)
+        file_xz.close()
+
+def _delta_extract_zstd(zstd_path, new_path_fd):
+    # no zstd module in the standard library
+    argv = _tarball_decompressor("zstd")
+    if argv is None:
+        raise IOError("zstd executable not found")
+    with os.fdopen(new_path_fd, "wb") as item:
+        with open(zstd_path, "rb") as file_zstd:
+            proc = subprocess.Popen(argv, stdin = file_zstd,
+                stdout = subprocess.PIPE, close_fds = True)
+            try:
+                chunk = proc.stdout.read(_READ_SIZE)
+                while chunk:
+                    item.write(chunk)
+                    chunk = proc.stdout.read(_READ_SIZE)
+            finally:
+                proc.stdout.close()
+                proc.wait()
+
+def _lzma_file(file_path, mode, compresslevel = 9):
+    return lzma.LZMAFile(file_path, mode, preset = compresslevel)
+
 _BSDIFF_EXEC = "/usr/bin/bsdiff"
 _BSPATCH_EXEC = "/usr/bin/bspatch"
 _DELTA_DECOMPRESSION_MAP = {
     "bz2": _delta_extract_bz2,
     "gz": _delta_extract_gzip,
+    "zstd": _delta_extract_zstd,
 }
 _DELTA_COMPRESSION_MAP = {
     "bz2": "bz2.BZ2File",
+    "gz": "gzip.GzipFile",
     "gzip": "gzip.GzipFile",
 }
+if lzma is not None:
+    _DELTA_DECOMPRESSION_MAP["xz"] = _delta_extract_xz
+    _DELTA_COMPRESSION_MAP["xz"] = "_lzma_file"
 _DEFAULT_PKG_COMPRESSION = "bz2"
 
 def is_entropy_delta_available():
@@ -1298,8 +1340,9 @@ def generate_entropy_delta(pkg_path_a, pkg_path_b, hash_tag,
     @type pkg_path_a: string
     @param hash_tag: hash tag to append to Entropy package delta file name
     @type hash_tag: string
-    @keyword pkg_compression: default package compression, can be "bz2" or "gz".
-        if None, "bz2" is selected.
+    @keyword pkg_compression: default package compression, can be "bz2",
+        "gz", "xz" or "zstd". If None, it is detected from pkg_path_a,
+        falling back to "bz2".
     @type: string
     @return: path to newly created delta file, return None if error
     @rtype: string or None
@@ -1310,9 +1353,9 @@ def generate_entropy_delta(pkg_path_a, pkg_path_b, hash_tag,
     from entropy.spm.plugins.factory import get_default_class as get_spm_class
 
     if pkg_compression is None:
-        _delta_extractor = _DELTA_DECOMPRESSION_MAP[_DEFAULT_PKG_COMPRESSION]
-    else:
-        _delta_extractor = _DELTA_DECOMPRESSION_MAP[pkg_compression]
+        pkg_compression = _tarball_compression(pkg_path_a) or \
+            _DEFAULT_PKG_COMPRESSION
+    _delta_extractor = _DELTA_DECOMPRESSION_MAP[pkg_compression]
 
     close_fds = []
     remove_paths = []
@@ -1368,9 +1411,10 @@ def generate_entropy_delta(pkg_path_a, pkg_path_b, hash_tag,
         get_spm_class().dump_package_metadata(pkg_path_b, tmp_path_spm)
         get_spm_class().aggregate_package_metadata(delta_file, tmp_path_spm)
 
-        # append Entropy metadata
+        # append Entropy metadata, keeping the package B layout
         dump_entropy_metadata(pkg_path_b, tmp_path)
-        aggregate_entropy_metadata(delta_file, tmp_path)
+        aggregate_entropy_metadata(delta_file, tmp_path,
+            offset_trailer = _is_edb_trailer_available(pkg_path_b))
 
     finally:
         for fd in close_fds:
@@ -1401,19 +1445,24 @@ def apply_entropy_delta(pkg_path_a, delta_path, new_pkg_path_b,
     @type delta_path: string
     @param new_pkg_path_b: path where to store newly created package B
     @type new_pkg_path_b: string
-    @keyword pkg_compression: default package compression, can be "bz2" or "gz".
-        if None, "bz2" is selected.
+    @keyword pkg_compression: default package compression, can be "bz2",
+        "gz" or "xz". If None, it is detected from pkg_path_a, falling
+        back to "bz2".
     @type: string
-    @raise IOError: if delta cannot be generated.
+    @raise IOError: if delta cannot be generated (also if pkg_compression
+        is unsupported).
     """
     from entropy.spm.plugins.factory import get_default_class as get_spm_class
 
     if pkg_compression is None:
-        _pkg_extractor = _DELTA_DECOMPRESSION_MAP[_DEFAULT_PKG_COMPRESSION]
-        used_compression = _DELTA_COMPRESSION_MAP[_DEFAULT_PKG_COMPRESSION]
-    else:
+        pkg_compression = _tarball_compression(pkg_path_a) or \
+            _DEFAULT_PKG_COMPRESSION
+    try:
         _pkg_extractor = _DELTA_DECOMPRESSION_MAP[pkg_compression]
         used_compression = _DELTA_COMPRESSION_MAP[pkg_compression]
+    except KeyError:
+        raise IOError("unsupported package compression: %s" % (
+            pkg_compression,))
 
     close_fds = []
     remove_paths = []
@@ -1479,9 +1528,11 @@ def apply_entropy_delta(pkg_path_a, delta_path, new_pkg_path_b,
         # add spm metadata
         get_spm_class().aggregate_package_metadata(
             new_pkg_path_b_tmp_compressed, tmp_spm_path)
-        # add entropy metadata
+        # add entropy metadata, package B has the offset trailer only
+        # if the delta has it
         aggregate_entropy_metadata(new_pkg_path_b_tmp_compressed,
-            tmp_metadata_path)
+            tmp_metadata_path,
+            offset_trailer = _is_edb_trailer_available(delta_path))
         os.rename(new_pkg_path_b_tmp_compressed, new_pkg_path_b)
 
     finally:
@@ -1499,7 +1550,107 @@ def apply_entropy_delta(pkg_path_a, delta_path, new_pkg_path_b,
                 pass
 
 
-def aggregate_entropy_metadata(entropy_package_file, entropy_metadata_file):
+# Linux FICLONE ioctl request, clone (reflink) a whole file on
+# copy-on-write filesystems (btrfs, xfs)
+_FICLONE = 0x40049409
+# errors meaning that a zero-copy method cannot be used for the given
+# file descriptors, the next method is tried
+_ZERO_COPY_ERRNOS = frozenset([errno.ENOSYS, errno.EXDEV, errno.EINVAL,
+    errno.EBADF, errno.EOPNOTSUPP, errno.ETXTBSY, errno.EPERM])
+
+def _zero_copy_methods():
+    """
+    Return the kernel space copy functions available, in order of
+    preference, none if the ETP_NO_ZERO_COPY environment variable is set.
+    """
+    if os.getenv("ETP_NO_ZERO_COPY") is not None:
+        return []
+    methods = []
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is not None:
+        # reflinks on copy-on-write filesystems, in kernel copy elsewhere
+        methods.append(
+            lambda src, dst, off, count: copy_file_range(
+                src, dst, count, off))
+    sendfile = getattr(os, "sendfile", None)
+    if sendfile is not None:
+        methods.append(
+            lambda src, dst, off, count: sendfile(dst, src, off, count))
+    return methods
+
+def _copy_fd_range(src_fd, dst_fd, offset, count):
+    """
+    Copy count bytes of src_fd, starting at offset, to the current
+    position of dst_fd, which is advanced. Data is copied in kernel
+    space using copy_file_range() or sendfile() if possible, falling
+    back to a buffered copy (which moves the src_fd position).
+
+    @param src_fd: source file descriptor
+    @type src_fd: int
+    @param dst_fd: destination file descriptor, not opened in append mode
+    @type dst_fd: int
+    @param offset: source file offset
+    @type offset: int
+    @param count: number of bytes to copy
+    @type count: int
+    @return: the number of bytes copied, less than count if the source
+        file is shorter than offset + count
+    @rtype: int
+    """
+    copied = 0
+    for method in _zero_copy_methods():
+        while copied < count:
+            try:
+                written = method(src_fd, dst_fd, offset + copied,
+                                 min(count - copied, 0x40000000))
+            except OSError as err:
+                if err.errno not in _ZERO_COPY_ERRNOS:
+                    raise
+                break
+            if not written:
+                # end of file
+                return copied
+            copied += written
+        else:
+            return copied
+
+    os.lseek(src_fd, offset + copied, os.SEEK_SET)
+    while copied < count:
+        data = os.read(src_fd, min(_READ_SIZE, count - copied))
+        if not data:
+            break
+        view = memoryview(data)
+        while view:
+            view = view[os.write(dst_fd, view):]
+        copied += len(data)
+    return copied
+
+def copy_file_to_fd(source, dst_fd):
+    """
+    Copy the content of the source file to the empty dst_fd file
+    descriptor, cloning it (reflink) if the filesystem supports it,
+    otherwise copying in kernel space whenever possible.
+
+    @param source: path to the file to copy
+    @type source: string
+    @param dst_fd: empty file descriptor, opened for writing
+    @type dst_fd: int
+    """
+    with open(source, "rb") as src:
+        if os.getenv("ETP_NO_ZERO_COPY") is None:
+            try:
+                fcntl.ioctl(dst_fd, _FICLONE, src.fileno())
+                os.lseek(dst_fd, 0, os.SEEK_END)
+                return
+            except (IOError, OSError) as err:
+                if err.errno not in _ZERO_COPY_ERRNOS and \
+                        err.errno != errno.ENOTTY:
+                    raise
+        _copy_fd_range(src.fileno(), dst_fd, 0,
+                       os.fstat(src.fileno()).st_size)
+
+def aggregate_entropy_metadata(entropy_package_file, entropy_metadata_file,
+                               offset_trailer = True):
     """
     Add Entropy metadata dump file to given Entropy package file.
 
@@ -1507,33 +1658,25 @@ def aggregate_entropy_metadata(entropy_package_file, entropy_metadata_file):
     @type entropy_package_file: string
     @param entropy_metadata_file: path to Entropy metadata file
     @type entropy_metadata_file: string
-    """
-    mmap_size_th = 4096000 # 4mb threshold
-    with open(entropy_package_file, "ab") as f:
-        f.write(const_convert_to_rawstring(etpConst['databasestarttag']))
+    @keyword offset_trailer: append the fixed size trailer recording the
+        Entropy metadata offset, making its lookup O(1)
+    @type offset_trailer: bool
+    """
+    # not in append mode, kernel space copies do not support it
+    fd = os.open(entropy_package_file, os.O_WRONLY | os.O_CREAT, 0o666)
+    with os.fdopen(fd, "wb") as f:
+        f.seek(0, os.SEEK_END)
+        db_tag = const_convert_to_rawstring(etpConst['databasestarttag'])
+        offset = f.tell() + len(db_tag)
+        f.write(db_tag)
+        f.flush()
         with open(entropy_metadata_file, "rb") as g:
-            f_size = os.lstat(entropy_metadata_file).st_size
-            mmap_f = None
-            try:
-                if f_size > mmap_size_th:
-                    try:
-                        mmap_f = mmap.mmap(g.fileno(), f_size,
-                            flags = mmap.MAP_PRIVATE,
-                            prot = mmap.PROT_READ)
-                    except MemoryError:
-                        mmap_f = None
+            _copy_fd_range(g.fileno(), f.fileno(), 0,
+                os.fstat(g.fileno()).st_size)
+        f.seek(0, os.SEEK_END)
 
-                while True:
-                    if mmap_f is not None:
-                        chunk = mmap_f.read(_READ_SIZE)
-                    else:
-                        chunk = g.read(_READ_SIZE)
-                    if not chunk:
-                        break
-                    f.write(chunk)
-            finally:
-                if mmap_f is not None:
-                    mmap_f.close()
+        if offset_trailer:
+            f.write(_edb_trailer(offset))
 
 def dump_entropy_metadata(entropy_package_file, entropy_metadata_file):
     """
@@ -1561,7 +1704,7 @@ def dump_entropy_metadata(entropy_package_file, entropy_metadata_file):
                 return False
             # avoid security flaw caused by file size growing race condition
             # we conside the file size static
-            start_position = None
+            start_position, end_position = None, None
             if f_size < mmap_size_th:
                 # use mmap
                 try:
@@ -1571,66 +1714,128 @@ def dump_entropy_metadata(entropy_package_file, entropy_metadata_file):
                 except MemoryError:
                     old_mmap = None
                 if old_mmap is not None:
-                    start_position = _locate_edb(old_mmap)
+                    start_position, end_position = _locate_edb_boundaries(
+                        old_mmap)
 
             if old_mmap is None:
-                start_position = _locate_edb(old)
+                start_position, end_position = _locate_edb_boundaries(old)
             if start_position is None:
                 return False
 
             with open(entropy_metadata_file, "wb") as db:
-                while True:
-                    if old_mmap is None:
-                        data = old.read(_READ_SIZE)
-                    else:
-                        data = old_mmap.read(_READ_SIZE)
-                    if not data:
-                        break
-                    db.write(data)
+                _copy_fd_range(old.fileno(), db.fileno(), start_position,
+                    end_position - start_position)
         finally:
             if old_mmap is not None:
                 old_mmap.close()
 
     return True
 
-def _locate_edb(fileobj):
+def _edb_trailer(offset):
+    """
+    Return the fixed size trailer recording the Entropy metadata offset,
+    appended to Entropy package files after the metadata itself.
+    """
+    return const_convert_to_rawstring(
+        "%s%016x|" % (etpConst['databaseoffsettag'], offset))
+
+def _read_edb_trailer(fileobj, f_size):
+    """
+    Return the Entropy metadata offset recorded in the trailer of the
+    given package file object (whose size is f_size), or None if
+    the trailer is not available or not valid.
+    """
+    trailer_len = len(_edb_trailer(0))
+    if f_size < trailer_len:
+        return None
+
+    fileobj.seek(f_size - trailer_len)
+    trailer = fileobj.read(trailer_len)
+    offset_tag = const_convert_to_rawstring(etpConst['databaseoffsettag'])
+    if not trailer.startswith(offset_tag):
+        return None
+    if not trailer.endswith(const_convert_to_rawstring("|")):
+        return None
+    try:
+        offset = int(trailer[len(offset_tag):-1], 16)
+    except ValueError:
+        return None
+
+    # the offset must point right after the metadata start tag
+    db_tag = const_convert_to_rawstring(etpConst['databasestarttag'])
+    if offset < len(db_tag) or offset > f_size - trailer_len:
+        return None
+    fileobj.seek(offset - len(db_tag))
+    if fileobj.read(len(db_tag)) != db_tag:
+        return None
+    return offset
+
+def _is_edb_trailer_available(entropy_package_file):
+    """
+    Return whether the given Entropy package file carries the
+    Entropy metadata offset trailer.
+    """
+    with open(entropy_package_file, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        return _read_edb_trailer(f, f.tell()) is not None
 
-    # position old to the end
+def _locate_edb_boundaries(fileobj):
+    """
+    Locate the Entropy metadata inside the given package file object.
+    Return the (start, end) offsets of the metadata, or (None, None)
+    if not found. On success, fileobj is positioned at the start offset.
+    """
     fileobj.seek(0, os.SEEK_END)
-    # read backward until we find
-    xbytes = fileobj.tell()
-    counter = xbytes - 1
+    f_size = fileobj.tell()
+
+    start_position = _read_edb_trailer(fileobj, f_size)
+    if start_position is not None:
+        end_position = f_size - len(_edb_trailer(0))
+    else:
+        # package not written by Entropy (or too old), scan it backwards
+        start_position = _scan_edb(fileobj, f_size)
+        end_position = f_size
+    if start_position is None:
+        return None, None
 
-    db_tag = etpConst['databasestarttag']
-    # for Python 3.x
-    raw_db_tag = const_convert_to_rawstring(db_tag)
+    fileobj.seek(start_position)
+    return start_position, end_position
+
+def _scan_edb(fileobj, f_size):
+    """
+    Search the Entropy metadata start tag backwards, reading the package
+    file object in _READ_SIZE blocks. Return the offset right after the
+    tag, or None if not found.
+    """
+    db_tag = const_convert_to_rawstring(etpConst['databasestarttag'])
     db_tag_len = len(db_tag)
     # NOTE: it was 30Mb, but app-doc/php-docs db size was 31MB
     # xonotic-data wants more, raise to 500Mb and forget
     give_up_threshold = 1024000 * 500 # 500Mb
-    # cannot index a bytes object in Python3, it returns int !
-    entry_point = const_convert_to_rawstring(db_tag[::-1][0])
-    max_read_len = 8
-    start_position = None
-
-    while counter >= 0:
-        cur_threshold = abs((counter-xbytes))
-        if cur_threshold >= give_up_threshold:
-            start_position = None
-            break
-        fileobj.seek(counter-xbytes, os.SEEK_END)
-        read_bytes = fileobj.read(max_read_len)
-        read_len = len(read_bytes)
-        entry_idx = read_bytes.rfind(entry_point)
+
+    end = f_size
+    # the beginning of the previously read block, a tag could span across
+    # two blocks
+    tail = const_convert_to_rawstring("")
+    while end > 0 and f_size - end < give_up_threshold:
+        start = max(0, end - _READ_SIZE)
+        fileobj.seek(start)
+        block = fileobj.read(end - start) + tail
+        entry_idx = block.rfind(db_tag)
         if entry_idx != -1:
-            rollback = (read_len - entry_idx) * -1
-            fileobj.seek(rollback, os.SEEK_CUR)
-            chunk = fileobj.read(db_tag_len)
-            if chunk == raw_db_tag:
-                start_position = fileobj.tell()
-                break
-        counter -= read_len
+            return start + entry_idx + db_tag_len
+        tail = block[:db_tag_len - 1]
+        end = start
 
+    return None
+
+def _locate_edb(fileobj):
+    """
+    Locate the Entropy metadata inside the given package file object.
+    Return the metadata start offset, or None if not found. On success,
+    fileobj is positioned at the start offset.
+    """
+    start_position, _end_position = _locate_edb_boundaries(fileobj)
     return start_position
 
 def remove_entropy_metadata(entropy_package_file, save_path):
@@ -1654,21 +1859,9 @@ def remove_entropy_metadata(entropy_package_file, save_path):
             return False
 
         with open(save_path, "wb") as new:
-            old.seek(0)
-            counter = 0
-            max_read_len = 1024
             db_tag = const_convert_to_rawstring(etpConst['databasestarttag'])
-            db_tag_len = len(db_tag)
-            start_position -= db_tag_len
-
-            while counter < start_position:
-                delta = start_position - counter
-                if delta < max_read_len:
-                    max_read_len = delta
-                xbytes = old.read(max_read_len)
-                read_bytes = len(xbytes)
-                new.write(xbytes)
-                counter += read_bytes
+            _copy_fd_range(old.fileno(), new.fileno(), 0,
+                start_position - len(db_tag))
 
     return True
 
@@ -1842,6 +2035,89 @@ def compare_sha1(filepath, checksum):
         return True
     return False
 
+def _file_digests_stamp(filepath):
+    """
+    Return the string identifying the current state of the file at path
+    (mtime and size), used to tell whether a digests file is stale.
+    """
+    st = os.stat(filepath)
+    return "%r %d" % (st.st_mtime, st.st_size)
+
+def store_file_digests(filepath, digests):
+    """
+    Store the given digests of the file at path into its digests file
+    (filepath + etpConst['packagedigestsfileext']), so that they can be
+    retrieved by read_file_digests() for as long as the file is not
+    modified. This is a best effort operation, I/O errors are ignored.
+
+    @param filepath: path to file the digests belong to
+    @type filepath: string
+    @param digests: dict composed by hash name as key and hex digest
+        as value (see entropy.misc.MultiHasher.hexdigests())
+    @type digests: dict
+    """
+    digests_path = filepath + etpConst['packagedigestsfileext']
+    tmp_path = digests_path + ".tmp"
+    enc = etpConst['conf_encoding']
+    try:
+        stamp = _file_digests_stamp(filepath)
+        with codecs.open(tmp_path, "w", encoding=enc) as dig_f:
+            dig_f.write("%s\n" % (stamp,))
+            for hash_type in sorted(digests):
+                dig_f.write("%s %s\n" % (hash_type, digests[hash_type]))
+        os.rename(tmp_path, digests_path)
+    except (OSError, IOError):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+def remove_file_digests(filepath):
+    """
+    Remove the digests file of the file at path (see store_file_digests()),
+    if any. Digests files must be removed together with the files they
+    belong to. This is a best effort operation, I/O errors are ignored.
+
+    @param filepath: path to file the digests belong to
+    @type filepath: string
+    """
+    try:
+        os.remove(filepath + etpConst['packagedigestsfileext'])
+    except OSError:
+        pass
+
+def read_file_digests(filepath):
+    """
+    Return the digests of the file at path stored by store_file_digests(),
+    if the file has not been modified since then.
+
+    @param filepath: path to file the digests belong to
+    @type filepath: string
+    @return: dict composed by hash name as key and hex digest as value,
+        or None, if digests are not available or stale
+    @rtype: dict or None
+    """
+    digests_path = filepath + etpConst['packagedigestsfileext']
+    enc = etpConst['conf_encoding']
+    try:
+        with codecs.open(digests_path, "r", encoding=enc) as dig_f:
+            lines = dig_f.read().splitlines()
+        stamp = _file_digests_stamp(filepath)
+    except (OSError, IOError):
+        return None
+
+    if not lines or lines[0] != stamp:
+        return None
+
+    digests = {}
+    for line in lines[1:]:
+        try:
+            hash_type, digest = line.split()
+        except ValueError:
+            return None
+        digests[str(hash_type)] = str(digest)
+    return digests
+
 def md5string(string):
     """
     Return md5 hex digest of given string
@@ -2059,9 +2335,10 @@ def apply_tarball_ownership(filepath, prefix_path):
     """
 
     tar = None
+    decoder = None
     try:
         try:
-            tar = tarfile.open(filepath, "r")
+            tar, decoder = _open_tarball(filepath)
         except tarfile.ReadError:
             return
         except EOFError:
@@ -2096,12 +2373,283 @@ def apply_tarball_ownership(filepath, prefix_path):
         if tar is not None:
             del tar.members[:]
             tar.close()
+        if decoder is not None:
+            decoder.close()
+
+
+# tarball compression formats, detected by their magic bytes
+_TARBALL_MAGIC = (
+    (b"BZh", "bz2"),
+    (b"\x1f\x8b", "gz"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+)
+# external decompressors, in order of preference. lbzip2 and pbzip2
+# decode bz2 blocks in parallel, xz and zstd use multiple threads.
+# Entropy packages carry metadata after the compressed stream, which
+# some of these consider an error, so exit statuses are not trusted:
+# truncated or corrupted tar data is caught by tarfile and package
+# digests are verified before unpacking anyway.
+_TARBALL_DECOMPRESSORS = {
+    "bz2": (("lbzip2", "-dc"), ("pbzip2", "-dc"), ("bzip2", "-dc")),
+    "gz": (("pigz", "-dc"), ("gzip", "-dc")),
+    "xz": (("xz", "-dc", "-T0", "--single-stream"),),
+    "zstd": (("zstd", "-dcq"),),
+}
+_TARBALL_DECOMPRESSOR_CACHE = {}
+
 
+def _tarball_compression(filepath):
+    """
+    Return the compression format of the tarball at filepath ("bz2",
+    "gz", "xz" or "zstd") or None if not compressed (or unknown).
+    """
+    with open(filepath, "rb") as tar_f:
+        header = tar_f.read(6)
+    for magic, compression in _TARBALL_MAGIC:
+        if header.startswith(magic):
+            return compression
+    return None
+
+def _tarball_decompressor(compression):
+    """
+    Return the argv of the preferred external decompressor available for
+    the given compression format, or None.
+    """
+    if compression in _TARBALL_DECOMPRESSOR_CACHE:
+        return _TARBALL_DECOMPRESSOR_CACHE[compression]
+
+    argv = None
+    paths = collect_paths()
+    for args in _TARBALL_DECOMPRESSORS.get(compression, ()):
+        for path in paths:
+            exec_path = os.path.join(path, args[0])
+            if path and os.access(exec_path, os.X_OK):
+                argv = (exec_path,) + args[1:]
+                break
+        if argv is not None:
+            break
+
+    _TARBALL_DECOMPRESSOR_CACHE[compression] = argv
+    return argv
 
-def uncompress_tarball(filepath, extract_path = None, catch_empty = False):
+def _tarball_opener(compression):
+    """
+    Return the in-process file opener for the given compression format,
+    or None.
+    """
+    if compression == "bz2":
+        return bz2.BZ2File
+    if compression == "gz":
+        return gzip.GzipFile
+    if compression == "xz" and lzma is not None:
+        return lzma.LZMAFile
+    return None
+
+
+class _TarballDecoder(object):
+    """
+    Decompress a tarball concurrently with its extraction, writing the
+    uncompressed data to a pipe that tarfile reads in stream mode.
+    An external (possibly multithreaded) decompressor is preferred,
+    otherwise data is decompressed by a thread, which runs in parallel
+    with extraction because the compression modules release the GIL.
+    """
+
+    def __init__(self, filepath, compression):
+        self._filepath = filepath
+        self._compression = compression
+        self._proc = None
+        self._thread = None
+        self._fileobj = None
+
+    @staticmethod
+    def available(compression):
+        """
+        Return whether tarballs compressed using the given format can
+        be decoded in parallel.
+        """
+        if _tarball_decompressor(compression) is not None:
+            return True
+        return _tarball_opener(compression) is not None
+
+    def start(self):
+        """
+        Start decompressing and return the file object to read the
+        uncompressed data from.
+        """
+        argv = _tarball_decompressor(self._compression)
+        if argv is not None:
+            try:
+                with open(self._filepath, "rb") as tar_f:
+                    with open(os.devnull, "wb") as null_f:
+                        self._proc = subprocess.Popen(
+                            argv, stdin = tar_f, stdout = subprocess.PIPE,
+                            stderr = null_f, close_fds = True)
+            except OSError:
+                self._proc = None
+            else:
+                self._fileobj = self._proc.stdout
+                return self._fileobj
+
+        read_fd, write_fd = os.pipe()
+        self._fileobj = os.fdopen(read_fd, "rb")
+        self._thread = threading.Thread(
+            target = self._decode, args = (write_fd,))
+        self._thread.daemon = True
+        self._thread.start()
+        return self._fileobj
+
+    def _decode(self, write_fd):
+        """
+        Decompression thread body.
+        """
+        opener = _tarball_opener(self._compression)
+        try:
+            with os.fdopen(write_fd, "wb") as out_f:
+                comp_f = opener(self._filepath, "rb")
+                try:
+                    chunk = comp_f.read(_READ_SIZE)
+                    while chunk:
+                        out_f.write(chunk)
+                        chunk = comp_f.read(_READ_SIZE)
+                finally:
+                    comp_f.close()
+        except (IOError, OSError, EOFError, ValueError):
+            # reader went away or trailing data, the reader side
+            # detects truncated archives.
+            pass
+
+    def close(self):
+        """
+        Stop decompressing and release resources.
+        """
+        if self._fileobj is not None:
+            self._fileobj.close()
+            self._fileobj = None
+        if self._proc is not None:
+            if self._proc.poll() is None:
+                try:
+                    self._proc.kill()
+                except OSError:
+                    pass
+            self._proc.wait()
+            self._proc = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def _open_tarball(filepath, parallel = None):
+    """
+    Open the tarball at filepath for sequential reading, decompressing it
+    concurrently with extraction if possible (see _TarballDecoder).
+    Parallel decompression is used by default when more than one CPU
+    is available and the ETP_NO_PARALLEL_UNPACK environment variable
+    is not set, and always for formats that tarfile does not support
+    (zstd). Return a (tarfile.TarFile, decoder) tuple, decoder is
+    None when not decompressing in parallel and must be closed after
+    the tarfile object otherwise.
+
+    @raise tarfile.ReadError: if the tarball is empty or invalid
+    @raise tarfile.CompressionError: if the tarball is compressed using a
+        format that cannot be decoded (no external decompressor available
+        and not supported by tarfile)
+    """
+    if parallel is None:
+        parallel = os.getenv("ETP_NO_PARALLEL_UNPACK") is None \
+            and const_get_cpus() > 1
+
+    compression = _tarball_compression(filepath)
+    if compression is None:
+        return tarfile.open(filepath, "r"), None
+    if not _TarballDecoder.available(compression):
+        # tarfile would not even recognize the data as a tarball
+        raise tarfile.CompressionError(
+            "no %s decompressor available" % (compression,))
+    if not parallel and _tarball_opener(compression) is not None:
+        return tarfile.open(filepath, "r"), None
+
+    decoder = _TarballDecoder(filepath, compression)
+    try:
+        tar = tarfile.open(fileobj = decoder.start(), mode = "r|")
+    except:
+        decoder.close()
+        raise
+    return tar, decoder
+
+def _tarinfo_owner(tarinfo, owner_cache):
+    """
+    Return the (uid, gid) pair that files belonging to tarinfo should
+    be owned by: users and groups are resolved by name, falling back to
+    the numeric ids stored in the tarball when running as root. Return
+    None if ownership cannot be changed. Name lookups are expensive
+    and done once per owner, through the owner_cache dict.
+    """
+    key = (tarinfo.uname, tarinfo.gname, tarinfo.uid, tarinfo.gid)
+    try:
+        return owner_cache[key]
+    except KeyError:
+        pass
+
+    uid, gid = -1, -1
+    if tarinfo.uname:
+        uid = get_uid_from_user(tarinfo.uname)
+    if tarinfo.gname:
+        gid = get_gid_from_group(tarinfo.gname)
+    if is_root():
+        if uid == -1:
+            uid = tarinfo.uid
+        if gid == -1:
+            gid = tarinfo.gid
+
+    owner = (uid, gid)
+    if owner == (-1, -1):
+        owner = None
+    owner_cache[key] = owner
+    return owner
+
+def _apply_tarinfo_metadata(tarinfo, epath, owner_cache, set_mtime,
+                            check_link = True):
+    """
+    Apply ownership, permissions and (if set_mtime is True) mtime stored
+    in tarinfo to the extracted file at epath. This replaces the
+    tarfile chown(), chmod() and utime() calls with one system call
+    each, without resolving users and groups every time.
+    If check_link is True, epath is checked for being a symlink (which
+    must not be chmod'ed) instead of trusting tarinfo.
+    """
+    owner = _tarinfo_owner(tarinfo, owner_cache)
+    if owner is not None:
+        try:
+            if tarinfo.issym():
+                os.lchown(epath, owner[0], owner[1])
+            else:
+                os.chown(epath, owner[0], owner[1])
+        except OSError:
+            pass
+
+    # xorg-server /usr/bin/X symlink of /usr/bin/Xorg
+    # which is setuid. Symlinks don't need chmod. PERIOD!
+    if tarinfo.issym():
+        return
+    if check_link and os.path.islink(epath):
+        return
+    try:
+        os.chmod(epath, tarinfo.mode)
+        if set_mtime:
+            os.utime(epath, (tarinfo.mtime, tarinfo.mtime))
+    except OSError:
+        pass
+
+def uncompress_tarball(filepath, extract_path = None, catch_empty = False,
+                       parallel = None):
     """
     Unpack tarball file (supported compression algorithm is given by tarfile
-    module) respecting directory structure, mtime and permissions.
+    module or by the available external decompressors, see
+    _TARBALL_DECOMPRESSORS) respecting directory structure, mtime and
+    permissions. Unless disabled, the tarball is decompressed in parallel
+    with its extraction.
 
     @param filepath: path to tarball file
     @type filepath: string
@@ -2110,45 +2658,45 @@ def uncompress_tarball(filepath, extract_path = None, catch_empty = False):
     @keyword catch_empty: do not raise exceptions when trying to unpack empty
         file
     @type catch_empty: bool
+    @keyword parallel: decompress in parallel, if None (default), decide
+        automatically (see _open_tarball())
+    @type parallel: bool
     @return: exit status
     @rtype: int
+    @raise tarfile.CompressionError: if no decompressor is available for
+        the tarball compression format, even if catch_empty is True
     """
     if extract_path is None:
         extract_path = os.path.dirname(filepath)
     if not os.path.isfile(filepath):
         raise FileNotFound('FileNotFound: archive does not exist')
 
-    def _setup_file_metadata(tarinfo, epath):
-        try:
-            _tarfile_chown(tar, tarinfo, epath)
-            _fix_uid_gid(tarinfo, epath)
-
-            # no longer touch utime using Tarinfo, behaviour seems
-            # buggy and introduces an unwanted delay on some conditions.
-            # match /bin/tar behaviour to not fuck touch mtime/atime at all
-            # I wonder who are the idiots who didn't even test how
-            # tar.utime behaves. Or perhaps it's just me that I've found
-            # a new bug. Issue is, packages are prepared on PC A, and
-            # mtime is checked on PC B.
-            # tar.utime(tarinfo, epath)
-
-            # mode = tarinfo.mode
-            # xorg-server /usr/bin/X symlink of /usr/bin/Xorg
-            # which is setuid. Symlinks don't need chmod. PERIOD!
-            if not os.path.islink(epath):
-                tar.chmod(tarinfo, epath)
-
-        except tarfile.ExtractError:
-            if tar.errorlevel > 1:
-                raise
-
     is_python_3 = const_is_python3()
+    owner_cache = {}
+
+    def _setup_file_metadata(tarinfo, epath, check_link = True):
+        # no longer touch utime using Tarinfo, behaviour seems
+        # buggy and introduces an unwanted delay on some conditions.
+        # match /bin/tar behaviour to not fuck touch mtime/atime at all
+        # I wonder who are the idiots who didn't even test how
+        # tar.utime behaves. Or perhaps it's just me that I've found
+        # a new bug. Issue is, packages are prepared on PC A, and
+        # mtime is checked on PC B.
+        # tar.utime(tarinfo, epath)
+        # NOTE: mtime of non-directories is still applied when
+        # tar.extract() is not told to, see below.
+        _apply_tarinfo_metadata(
+            tarinfo, epath, owner_cache,
+            is_python_3 and not tarinfo.isdir(),
+            check_link = check_link)
+
     tar = None
+    decoder = None
     extracted_something = False
     try:
 
         try:
-            tar = tarfile.open(filepath, "r")
+            tar, decoder = _open_tarball(filepath, parallel = parallel)
         except tarfile.ReadError:
             if catch_empty:
                 return 0
@@ -2174,15 +2722,15 @@ def uncompress_tarball(filepath, extract_path = None, catch_empty = False):
                     pass
 
             if is_python_3:
-                tar.extract(tarinfo, encoded_path,
-                    set_attrs=not tarinfo.isdir())
+                # metadata is applied by _setup_file_metadata()
+                tar.extract(tarinfo, encoded_path, set_attrs=False)
             else:
                 tar.extract(tarinfo, encoded_path)
 
             if tarinfo.isreg():
                 # apply metadata to files instantly
                 # not wasting RAM growing entries.
-                _setup_file_metadata(tarinfo, epath)
+                _setup_file_metadata(tarinfo, epath, check_link = False)
             else:
                 # delay file metadata setup for dirs
                 # or syms that might be dirs or other
@@ -2214,10 +2762,17 @@ def uncompress_tarball(filepath, extract_path = None, catch_empty = False):
 
     except EOFError:
         return -1
+    except tarfile.ReadError:
+        if decoder is None:
+            raise
+        # truncated data, this is EOFError when not in stream mode
+        return -1
     finally:
         if tar is not None:
             tar.close()
             del tar.members[:]
+        if decoder is not None:
+            decoder.close()
 
     if extracted_something:
         return 0
@@ -2225,6 +2780,180 @@ def uncompress_tarball(filepath, extract_path = None, catch_empty = False):
         return 0
     return -1
 
+def _tarball_is_empty(filepath):
+    """
+    Return whether the tarball at filepath has no members, tarfile refuses
+    to open these. Tarballs that cannot be decompressed are not empty.
+    """
+    compression = _tarball_compression(filepath)
+    if compression is None:
+        with open(filepath, "rb") as tar_f:
+            data = tar_f.read(tarfile.BLOCKSIZE)
+    elif _TarballDecoder.available(compression):
+        decoder = _TarballDecoder(filepath, compression)
+        try:
+            data = decoder.start().read(tarfile.BLOCKSIZE)
+        finally:
+            decoder.close()
+    else:
+        return False
+    # an empty archive is made of zero filled end of archive blocks,
+    # failing decompressors output nothing at all
+    return len(data) == tarfile.BLOCKSIZE and not data.strip(b"\0")
+
+
+class _TarballStreamMembers(dict):
+    """
+    link_targets dict yielded by iter_tarball_members() for tarballs read
+    in stream mode: the data of the members already read cannot be
+    extracted again, hard link targets are extracted from another pass
+    over the tarball at filepath instead.
+    """
+
+    def __init__(self, filepath):
+        dict.__init__(self)
+        self.filepath = filepath
+
+
+def iter_tarball_members(filepath, parallel = None):
+    """
+    Iterate over the members of the tarball file at filepath, in archive
+    order, without unpacking it. Yield (tar, tarinfo, link_targets)
+    tuples, the tar object can be used with extract_tarball_member() while
+    iterating. link_targets maps the names of the regular file members
+    yielded so far to their TarInfo objects and is meant to be passed to
+    extract_tarball_member(), the tar object member list is not kept
+    around on Python 2 and cannot be used to resolve hard links.
+    Like uncompress_tarball(), the tarball is decompressed in parallel
+    with the iteration unless disabled (see _open_tarball()), this is
+    also the only way to read tarballs that tarfile does not support.
+    Tarballs without members (packages without files) yield nothing.
+
+    @param filepath: path to tarball file
+    @type filepath: string
+    @keyword parallel: decompress in parallel, if None (default), decide
+        automatically (see _open_tarball())
+    @type parallel: bool
+    @raise FileNotFound: if filepath does not exist
+    @raise EOFError: if the tarball is truncated
+    @raise tarfile.ExtractError: if the tarball cannot be read
+    """
+    if not os.path.isfile(filepath):
+        raise FileNotFound('FileNotFound: archive does not exist')
+
+    is_python_3 = const_is_python3()
+    tar = None
+    decoder = None
+    try:
+        try:
+            tar, decoder = _open_tarball(filepath, parallel = parallel)
+        except tarfile.ReadError as err:
+            if _tarball_is_empty(filepath):
+                return
+            raise tarfile.ExtractError(
+                "unable to read archive: %s" % (err,))
+        except tarfile.CompressionError as err:
+            raise tarfile.ExtractError(
+                "unable to read archive: %s" % (err,))
+
+        if decoder is None:
+            link_targets = {}
+        else:
+            link_targets = _TarballStreamMembers(filepath)
+        deleter_counter = 3
+        try:
+            for tarinfo in tar:
+                if tarinfo.isreg():
+                    link_targets[os.path.normpath(tarinfo.name)] = tarinfo
+                yield tar, tarinfo, link_targets
+
+                if not is_python_3:
+                    # see uncompress_tarball()
+                    deleter_counter -= 1
+                    if deleter_counter == 0:
+                        del tar.members[:]
+                        deleter_counter = 3
+        except tarfile.ReadError as err:
+            if decoder is not None:
+                # truncated data, this is EOFError when not in stream mode
+                raise EOFError(err)
+            raise tarfile.ExtractError(
+                "unable to read archive: %s" % (err,))
+
+    finally:
+        if tar is not None:
+            tar.close()
+            del tar.members[:]
+        if decoder is not None:
+            decoder.close()
+
+def _extract_tarball_stream_link(filepath, link_name, dest_path):
+    """
+    Extract a hard link to the link_name member of the tarball at
+    filepath, read in stream mode, to dest_path by reading the member
+    data again from the beginning of the tarball.
+    """
+    members = iter_tarball_members(filepath, parallel = False)
+    try:
+        for tar, member, _link_targets in members:
+            if os.path.normpath(member.name) == link_name:
+                extract_tarball_member(tar, member, dest_path)
+                return
+    finally:
+        members.close()
+    raise tarfile.ExtractError("unable to resolve link inside archive")
+
+def extract_tarball_member(tar, tarinfo, dest_path, link_targets = None):
+    """
+    Extract a single tarball member (as yielded by iter_tarball_members())
+    to the given path, which can differ from the member name, applying
+    ownership and permissions the same way uncompress_tarball() does.
+    Hard links are extracted as copies of the linked member data.
+
+    @param tar: tarfile object
+    @type tar: tarfile.TarFile
+    @param tarinfo: tarball member
+    @type tarinfo: tarfile.TarInfo
+    @param dest_path: extraction path
+    @type dest_path: string
+    @keyword link_targets: regular file members by name, used to resolve
+        hard links (as yielded by iter_tarball_members()), if None, the
+        tar object member list is used
+    @type link_targets: dict
+    @raise tarfile.ExtractError: if the member cannot be extracted
+    """
+    if tarinfo.islnk():
+        try:
+            if link_targets is None:
+                tarinfo = tar.getmember(tarinfo.linkname)
+            else:
+                tarinfo = link_targets[os.path.normpath(tarinfo.linkname)]
+        except KeyError:
+            raise tarfile.ExtractError(
+                "unable to resolve link inside archive")
+        if isinstance(link_targets, _TarballStreamMembers):
+            _extract_tarball_stream_link(
+                link_targets.filepath, os.path.normpath(tarinfo.name),
+                dest_path)
+            return
+
+    member = copy.copy(tarinfo)
+    member.name = os.path.basename(dest_path)
+    dest_dir = os.path.dirname(dest_path)
+    if const_is_python3():
+        tar.extract(member, dest_dir, set_attrs=not member.isdir())
+    else:
+        tar.extract(member, dest_dir)
+
+    try:
+        _tarfile_chown(tar, member, dest_path)
+        _fix_uid_gid(member, dest_path)
+        if not os.path.islink(dest_path):
+            tar.chmod(member, dest_path)
+    except tarfile.ExtractError:
+        if tar.errorlevel > 1:
+            raise
+
 def bytes_into_human(xbytes):
     """
     Convert byte size into human readable format.
@@ -2630,6 +3359,184 @@ def elf_class_strtoint(elf_class_str):
     else:
         raise ValueError('unsupported %s' % (elf_class_str,))
 
+# ELF constants, see elf(5)
+_ELF_MAGIC = const_convert_to_rawstring("\x7fELF")
+_ELF_CLASS_32 = 1
+_ELF_CLASS_64 = 2
+_ELF_DATA_MSB = 2
+_ELF_PT_LOAD = 1
+_ELF_PT_DYNAMIC = 2
+_ELF_DT_NULL = 0
+_ELF_DT_NEEDED = 1
+_ELF_DT_STRTAB = 5
+_ELF_DT_STRSZ = 10
+_ELF_DT_SONAME = 14
+_ELF_DT_RPATH = 15
+_ELF_DT_RUNPATH = 29
+# (program header table offset, entry size, entry count) formats and
+# offsets, program header (type, offset, vaddr, filesz) format and
+# dynamic entry (tag, value) format, by ELF class
+_ELF_LAYOUT = {
+    _ELF_CLASS_32: ("I", 28, "H", 42, "IIIxxxxI", "iI"),
+    _ELF_CLASS_64: ("Q", 32, "H", 54, "IxxxxQQxxxxxxxxQ", "qQ"),
+}
+_ELF_NUL = const_convert_to_rawstring("\0")
+
+def _read_elf_dynamic_section(elf_map, elf_class, endian):
+    """
+    Parse the dynamic section of the ELF object mapped at elf_map, without
+    copying it. Return a dict with the "soname", "needed", "rpath" and
+    "runpath" raw values, or None if the ELF object is not dynamic.
+    """
+    off_fmt, off_pos, num_fmt, num_pos, phdr_fmt, dyn_fmt = _ELF_LAYOUT[
+        elf_class]
+    phoff, = struct.unpack_from(endian + off_fmt, elf_map, off_pos)
+    phentsize, phnum = struct.unpack_from(
+        endian + num_fmt + num_fmt, elf_map, num_pos)
+    phdr_fmt = endian + phdr_fmt
+    dyn_fmt = endian + dyn_fmt
+    dyn_size = struct.calcsize(dyn_fmt)
+    map_size = len(elf_map)
+
+    loads = []
+    dynamic = None
+    for idx in range(phnum):
+        p_type, p_offset, p_vaddr, p_filesz = struct.unpack_from(
+            phdr_fmt, elf_map, phoff + idx * phentsize)
+        if p_type == _ELF_PT_LOAD:
+            loads.append((p_vaddr, p_offset, p_filesz))
+        elif p_type == _ELF_PT_DYNAMIC:
+            dynamic = (p_offset, p_filesz)
+    if dynamic is None:
+        return None
+
+    entries = []
+    strtab = None
+    strsz = map_size
+    dyn_offset, dyn_filesz = dynamic
+    dyn_end = min(dyn_offset + dyn_filesz, map_size)
+    while dyn_offset + dyn_size <= dyn_end:
+        d_tag, d_val = struct.unpack_from(dyn_fmt, elf_map, dyn_offset)
+        dyn_offset += dyn_size
+        if d_tag == _ELF_DT_NULL:
+            break
+        elif d_tag == _ELF_DT_STRTAB:
+            strtab = d_val
+        elif d_tag == _ELF_DT_STRSZ:
+            strsz = d_val
+        elif d_tag in (_ELF_DT_NEEDED, _ELF_DT_SONAME, _ELF_DT_RPATH,
+                       _ELF_DT_RUNPATH):
+            entries.append((d_tag, d_val))
+    if strtab is None:
+        return None
+
+    # DT_STRTAB is a virtual address, map it to a file offset
+    strtab_offset = None
+    for p_vaddr, p_offset, p_filesz in loads:
+        if p_vaddr <= strtab < p_vaddr + p_filesz:
+            strtab_offset = strtab - p_vaddr + p_offset
+            break
+    if strtab_offset is None:
+        return None
+    strtab_end = min(strtab_offset + strsz, map_size)
+
+    def _string(offset):
+        start = strtab_offset + offset
+        end = elf_map.find(_ELF_NUL, start, strtab_end)
+        if end == -1:
+            end = strtab_end
+        data = elf_map[start:end]
+        if const_is_python3():
+            data = const_convert_to_unicode(data)
+        return data
+
+    metadata = {
+        'soname': "",
+        'needed': [],
+        'rpath': "",
+        'runpath': "",
+    }
+    for d_tag, d_val in entries:
+        if d_tag == _ELF_DT_NEEDED:
+            metadata['needed'].append(_string(d_val))
+        elif d_tag == _ELF_DT_SONAME:
+            metadata['soname'] = _string(d_val)
+        elif d_tag == _ELF_DT_RPATH:
+            metadata['rpath'] = _string(d_val)
+        elif d_tag == _ELF_DT_RUNPATH:
+            metadata['runpath'] = _string(d_val)
+    return metadata
+
+def _read_elf(elf_file):
+    """
+    Read the ELF object at path in-process. Return a dict with "class",
+    "soname", "needed" (list, ordered), "rpath" and "runpath" keys, or
+    None if the file is not an ELF object. Metadata of non dynamic ELF
+    objects is empty.
+
+    @raise IOError: if the file cannot be read
+    @raise OSError: if the file cannot be read
+    """
+    with open(elf_file, "rb") as f:
+        ident = f.read(6)
+        if len(ident) < 6 or ident[:4] != _ELF_MAGIC:
+            return None
+        elf_class, elf_data = struct.unpack("BB", ident[4:6])
+        if elf_class not in _ELF_LAYOUT:
+            return None
+        endian = "<"
+        if elf_data == _ELF_DATA_MSB:
+            endian = ">"
+
+        metadata = None
+        try:
+            elf_map = mmap.mmap(f.fileno(), 0, prot = mmap.PROT_READ)
+        except (ValueError, mmap.error):
+            # not mappable (special file, empty, etc)
+            elf_map = None
+        if elf_map is not None:
+            try:
+                metadata = _read_elf_dynamic_section(
+                    elf_map, elf_class, endian)
+            except struct.error:
+                # truncated or corrupted ELF object
+                metadata = None
+            finally:
+                elf_map.close()
+
+    if metadata is None:
+        metadata = {
+            'soname': "",
+            'needed': [],
+            'rpath': "",
+            'runpath': "",
+        }
+    metadata['class'] = elf_class
+    return metadata
+
+def _elf_linker_paths(elf_data):
+    """
+    Return the list of RPATH and RUNPATH values (like scanelf, the same
+    value is reported once) of the data returned by _read_elf().
+    """
+    paths = []
+    for path in (elf_data['rpath'], elf_data['runpath']):
+        if path and path not in paths:
+            paths.append(path)
+    return paths
+
+def _elf_metadata(elf_data):
+    """
+    Convert the data returned by _read_elf() into the read_elf_metadata()
+    format.
+    """
+    return {
+        'soname': elf_data['soname'],
+        'class': elf_data['class'],
+        'runpath': ",".join(_elf_linker_paths(elf_data)),
+        'needed': set(elf_data['needed']),
+    }
+
 def read_elf_class(elf_file):
     """
     Read ELF class metadatum from ELF file.
@@ -2715,14 +3622,33 @@ def resolve_dynamic_library(library, requiring_executable):
 
     return found_path
 
-def read_elf_dynamic_libraries(elf_file):
+def read_elf_dynamic_libraries(elf_file, external = False):
     """
     Extract NEEDED metadatum from ELF file at path.
 
     @param elf_file: path to ELF file
     @type elf_file: string
+    @keyword external: use the external scanelf tool instead of the
+        built-in ELF reader
+    @type external: bool
     @return: list (set) of strings in NEEDED metadatum
     @rtype: set
+    @raise FileNotFound: if the file (or scanelf) cannot be read
+    """
+    if external:
+        return _read_elf_dynamic_libraries_scanelf(elf_file)
+
+    try:
+        elf_data = _read_elf(elf_file)
+    except (IOError, OSError) as err:
+        raise FileNotFound("cannot read %s: %s" % (elf_file, err))
+    if elf_data is None:
+        return set()
+    return set(elf_data['needed'])
+
+def _read_elf_dynamic_libraries_scanelf(elf_file):
+    """
+    read_elf_dynamic_libraries() implementation based on scanelf.
     """
     proc = None
     args = ("/usr/bin/scanelf", "-qF", "%n", elf_file)
@@ -2757,15 +3683,115 @@ def read_elf_dynamic_libraries(elf_file):
                 outcome.update(libs)
     return outcome
 
-def read_elf_metadata(elf_file):
+def read_elf_metadata(elf_file, external = False):
     """
     Extract soname, elf class, runpath and NEEDED metadata from ELF file.
 
     @param elf_file: path to ELF file
     @type elf_file: string
+    @keyword external: use the external scanelf tool instead of the
+        built-in ELF reader
+    @type external: bool
     @return: dict with "soname", "class", "runpath" and "needed" keys. None if
         no metadata is found.
     @rtype: dict or None
+    @raise FileNotFound: if the file (or scanelf) cannot be read
+    """
+    if external:
+        return _read_elf_metadata_scanelf(elf_file)
+
+    try:
+        elf_data = _read_elf(elf_file)
+    except (IOError, OSError) as err:
+        raise FileNotFound("cannot read %s: %s" % (elf_file, err))
+    if elf_data is None:
+        return None
+    return _elf_metadata(elf_data)
+
+def read_elf_metadata_many(elf_files, external = False):
+    """
+    Extract soname, elf class, runpath and NEEDED metadata from a batch of
+    ELF files, see read_elf_metadata(). When using the external scanelf
+    tool, a single process is spawned for the whole batch.
+
+    @param elf_files: list of paths to ELF files
+    @type elf_files: list
+    @keyword external: use the external scanelf tool instead of the
+        built-in ELF reader
+    @type external: bool
+    @return: dict mapping ELF file paths to their metadata (in the
+        read_elf_metadata() format), or to None, if the file is not an ELF
+        object or cannot be read.
+    @rtype: dict
+    @raise FileNotFound: if scanelf is not available
+    """
+    if external:
+        return _read_elf_metadata_many_scanelf(elf_files)
+
+    outcome = {}
+    for elf_file in elf_files:
+        try:
+            elf_data = _read_elf(elf_file)
+        except (IOError, OSError):
+            elf_data = None
+        if elf_data is not None:
+            elf_data = _elf_metadata(elf_data)
+        outcome[elf_file] = elf_data
+    return outcome
+
+def _read_elf_metadata_many_scanelf(elf_files):
+    """
+    read_elf_metadata_many() implementation based on scanelf.
+    """
+    elf_files = list(elf_files)
+    outcome = dict((x, None) for x in elf_files)
+    if not elf_files:
+        return outcome
+
+    proc = None
+    args = ["/usr/bin/scanelf", "-qF", "%M;%S;%r;%n;%F"] + elf_files
+    out = None
+    try:
+        proc = subprocess.Popen(args, stdout = subprocess.PIPE)
+        out = proc.stdout.read()
+        proc.wait()
+
+    except (OSError, IOError) as err:
+        if err.errno != errno.ENOENT:
+            raise
+        raise FileNotFound("/usr/bin/scanelf not found")
+
+    finally:
+        if proc is not None:
+            try:
+                proc.stdout.close()
+            except (OSError, IOError):
+                pass
+
+    if const_is_python3():
+        out = const_convert_to_unicode(out)
+    for line in out.split("\n"):
+        if not line:
+            continue
+        try:
+            elfclass_str, soname, runpath, libs, elf_file = line.split(";", 4)
+        except ValueError as err:
+            raise ValueError(
+                "Unexpected amount of sections from scanelf output: %s, "
+                "error: %s" % (line, err))
+        if elf_file not in outcome:
+            continue
+        outcome[elf_file] = {
+            'soname': soname,
+            'class': elf_class_strtoint(elfclass_str),
+            'runpath': runpath,
+            'needed': set([x for x in libs.strip().split(",") if x]),
+        }
+    return outcome
+
+def _read_elf_metadata_scanelf(elf_file):
+    """
+    read_elf_metadata() implementation based on scanelf.
     """
     proc = None
     args = ("/usr/bin/scanelf", "-qF", "%M;%S;%r;%n", elf_file)
@@ -2937,14 +3963,42 @@ def read_elf_broken_symbols(elf_file):
 
     return outcome
 
-def read_elf_linker_paths(elf_file):
+def read_elf_linker_paths(elf_file, external = False):
     """
     Extract built-in linker paths (RUNPATH and RPATH) from ELF file.
 
     @param elf_file: path to ELF file
     @type elf_file: string
+    @keyword external: use the external scanelf tool instead of the
+        built-in ELF reader
+    @type external: bool
     @return: list of extracted built-in linker paths.
     @rtype: list
+    @raise FileNotFound: if the file (or scanelf) cannot be read
+    """
+    if external:
+        return _read_elf_linker_paths_scanelf(elf_file)
+
+    try:
+        elf_data = _read_elf(elf_file)
+    except (IOError, OSError) as err:
+        raise FileNotFound("cannot read %s: %s" % (elf_file, err))
+    if elf_data is None:
+        return []
+
+    outcome = []
+    elf_dir = os.path.dirname(elf_file)
+    for paths in _elf_linker_paths(elf_data):
+        for path in paths.split(":"):
+            if path:
+                path = path.replace("$ORIGIN", elf_dir)
+                path = path.replace("${ORIGIN}", elf_dir)
+                outcome.append(path)
+    return outcome
+
+def _read_elf_linker_paths_scanelf(elf_file):
+    """
+    read_elf_linker_paths() implementation based on scanelf.
     """
     proc = None
     args = ("/usr/bin/scanelf", "-qF", "%r", elf_file)
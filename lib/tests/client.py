@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import sys
 import unittest
+import bz2
 import os
 import shutil
 import signal
@@ -13,14 +14,17 @@ import entropy_path_loader
 del osp
 
 from entropy.client.interfaces import Client
-from entropy.client.interfaces.db import InstalledPackagesRepository
+from entropy.client.interfaces.db import InstalledPackagesRepository, \
+    AvailablePackagesRepositoryUpdater
 from entropy.client.interfaces.package.actions._triggers import Trigger
-from entropy.cache import EntropyCacher
+from entropy.cache import EntropyCacher, EntropyCacheLRU
 from entropy.const import etpConst, const_mkdtemp
 from entropy.output import set_mute
 from entropy.core.settings.base import SystemSettings
 from entropy.db import EntropyRepository
 from entropy.exceptions import RepositoryError, EntropyPackageException
+import entropy.dep
+import entropy.dump
 import entropy.tools
 import tests._misc as _misc
 
@@ -144,6 +148,123 @@ class EntropyClientTest(unittest.TestCase):
         finally:
             shutil.rmtree(tmp_dir, True)
 
+    def test_cacher_lru(self):
+        cacher = self.Client._cacher
+        tmp_dir = const_mkdtemp()
+        cacher.start()
+        try:
+            cacher.push("ns/bar", [1, 2], async_mode = False,
+                        cache_dir = tmp_dir)
+            obj = cacher.pop("ns/bar", cache_dir = tmp_dir)
+            self.assertEqual(obj, [1, 2])
+            # served from RAM, callers get their own copy
+            obj.append(3)
+            lru_obj = cacher.pop("ns/bar", cache_dir = tmp_dir)
+            self.assertEqual(lru_obj, [1, 2])
+            self.assertFalse(lru_obj is obj)
+            stats = cacher.lru_stats()['namespaces']['ns']
+            self.assertTrue(stats['hits'] >= 1)
+
+            EntropyCacher.clear_cache_item("ns/bar", cache_dir = tmp_dir)
+            self.assertEqual(cacher.pop("ns/bar", cache_dir = tmp_dir), None)
+
+            lru = EntropyCacheLRU(1024, 2)
+            for idx in range(3):
+                lru.set("ns/%d" % (idx,), tmp_dir, idx)
+            self.assertEqual(lru.get("ns/0", tmp_dir), None)
+            self.assertEqual(lru.get("ns/2", tmp_dir), 2)
+            self.assertEqual(lru.stats()['namespaces']['ns']['evictions'], 1)
+        finally:
+            cacher.stop()
+            shutil.rmtree(tmp_dir, True)
+
+    def test_cacher_lru_async_push(self):
+        cacher = self.Client._cacher
+        tmp_dir = const_mkdtemp()
+        cacher.start()
+        st_val = EntropyCacher.STASHING_CACHE
+        sn_val = EntropyCacher.SNAPSHOT_PUSH
+        try:
+            for stashing, snapshot in ((True, False), (True, True),
+                                       (False, False), (False, True)):
+                EntropyCacher.STASHING_CACHE = stashing
+                EntropyCacher.SNAPSHOT_PUSH = snapshot
+                cacher.push("ns/bar", [1, 2], async_mode = False,
+                            cache_dir = tmp_dir)
+                # now in the LRU
+                self.assertEqual(
+                    cacher.pop("ns/bar", cache_dir = tmp_dir), [1, 2])
+                cacher.push("ns/bar", [3], cache_dir = tmp_dir)
+                cacher.sync()
+                self.assertEqual(
+                    cacher.pop("ns/bar", cache_dir = tmp_dir), [3])
+        finally:
+            EntropyCacher.STASHING_CACHE = st_val
+            EntropyCacher.SNAPSHOT_PUSH = sn_val
+            cacher.stop()
+            shutil.rmtree(tmp_dir, True)
+
+    def test_cacher_lru_push_during_write(self):
+        cacher = self.Client._cacher
+        tmp_dir = const_mkdtemp()
+        st_val = EntropyCacher.STASHING_CACHE
+        wb_val = EntropyCacher.WRITEBACK_TIMEOUT
+        store = EntropyCacher._store()
+
+        def _store_many(objects, dump_dir = None):
+            # the object is pushed again while the writer is storing
+            # the previous one
+            del store.store_many
+            cacher.push("ns/bar", [3], cache_dir = tmp_dir)
+            return store.store_many(objects, dump_dir = dump_dir)
+
+        # only sync() writes
+        EntropyCacher.WRITEBACK_TIMEOUT = 3600
+        cacher.start()
+        try:
+            EntropyCacher.STASHING_CACHE = True
+            cacher.push("ns/bar", [2], cache_dir = tmp_dir)
+            store.store_many = _store_many
+            cacher.sync()
+            self.assertEqual(
+                cacher.pop("ns/bar", cache_dir = tmp_dir), [3])
+        finally:
+            try:
+                del store.store_many
+            except AttributeError:
+                pass
+            EntropyCacher.STASHING_CACHE = st_val
+            EntropyCacher.WRITEBACK_TIMEOUT = wb_val
+            cacher.stop()
+            shutil.rmtree(tmp_dir, True)
+
+    def test_cacher_indexed_backend(self):
+        cacher = self.Client._cacher
+        tmp_dir = const_mkdtemp()
+        backend = EntropyCacher.BACKEND
+        cacher.start()
+        try:
+            EntropyCacher.BACKEND = "indexed"
+            cacher.push("ns/bar", "foo", cache_dir = tmp_dir)
+            cacher.push("ns/baz", [1, 2], async_mode = False,
+                        cache_dir = tmp_dir)
+            cacher.sync()
+            self.assertEqual(cacher.pop("ns/bar", cache_dir = tmp_dir), "foo")
+            self.assertEqual(cacher.pop("ns/baz", cache_dir = tmp_dir), [1, 2])
+            self.assertEqual(cacher.pop("ns/baz", cache_dir = tmp_dir,
+                                        aging_days = 0), None)
+            # one log file per namespace
+            self.assertEqual(os.listdir(os.path.join(tmp_dir, "ns")),
+                             [entropy.dump.IndexedDumpStore.LOG_NAME])
+
+            EntropyCacher.clear_cache_item("ns/bar", cache_dir = tmp_dir)
+            self.assertEqual(cacher.pop("ns/bar", cache_dir = tmp_dir), None)
+            self.assertEqual(cacher.pop("ns/baz", cache_dir = tmp_dir), None)
+        finally:
+            EntropyCacher.BACKEND = backend
+            cacher.stop()
+            shutil.rmtree(tmp_dir, True)
+
     def test_clear_cache(self):
         current_dir = self.Client._cacher.current_directory()
         test_file = os.path.join(current_dir, "asdasd")
@@ -152,6 +273,55 @@ class EntropyClientTest(unittest.TestCase):
         self.Client.clear_cache()
         self.assertEqual(os.listdir(current_dir), [])
 
+    def test_solver_cache_unsat(self):
+        inst_repo = self.Client.installed_repository()
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        package_id = inst_repo.addPackage(data)
+        inst_repo.commit()
+        key = entropy.dep.dep_getkey(inst_repo.retrieveAtom(package_id))
+        dependency = ">=%s-9999" % (key,)
+
+        def _unsat():
+            return self.Client._get_unsatisfied_dependencies([dependency])
+
+        # the cacher is not started: the outcomes of the first calls
+        # are not kept by the repository state keyed caches, only by
+        # the incremental solver cache, in RAM
+        self.assertFalse(self.Client._cacher.is_started())
+        xcache = self.Client.xcache
+        self.Client.xcache = True
+        try:
+            self.assertEqual(_unsat(), set([dependency]))
+            inc_keys = [x for x in self.Client._solver_cache
+                        if x.startswith("solver/unsat_")]
+            self.assertEqual(len(inc_keys), 1)
+            inc_cache = self.Client._solver_cache[inc_keys[0]]
+            pkg_key, digest, final_dependency, is_unsat = \
+                inc_cache[dependency]
+            self.assertEqual((pkg_key, is_unsat), (key, True))
+
+            # the cached outcome is used while the candidates are the same
+            inc_cache[dependency] = (pkg_key, digest, final_dependency, False)
+            self.assertEqual(_unsat(), set())
+
+            # and dropped when their digest changes
+            inst_repo.setDigest(package_id, "0" * 32)
+            inst_repo.commit()
+            self.assertEqual(_unsat(), set([dependency]))
+            self.assertNotEqual(inc_cache[dependency][1], digest)
+
+            # or their version
+            inst_repo.removePackage(package_id)
+            data['version'] = "9999"
+            data['atom'] = "%s-9999" % (key,)
+            package_id = inst_repo.addPackage(data)
+            inst_repo.commit()
+            self.assertEqual(_unsat(), set())
+            self.assertEqual(inc_cache[dependency][3], False)
+        finally:
+            self.Client.xcache = xcache
+
     def test_contentsafety(self):
         dbconn = self.Client._init_generic_temp_repository(
             self.mem_repoid, self.mem_repo_desc, temp_file = ":memory:")
@@ -174,6 +344,21 @@ class EntropyClientTest(unittest.TestCase):
             self.assertEqual(os.path.getmtime(real_path), cs_info['mtime'])
         shutil.rmtree(tmp_dir)
 
+    def test_mask_filter_cache(self):
+        dbconn = self.Client._init_generic_temp_repository(
+            self.mem_repoid, self.mem_repo_desc, temp_file = ":memory:")
+        # stored even if the cacher is not started
+        self.assertFalse(self.Client._cacher.is_started())
+        caching = dbconn._caching
+        dbconn._caching = True
+        try:
+            self.assertEqual(dbconn._mask_filter_fetch_cache(1), None)
+            dbconn._mask_filter_store_cache(1, (1, 0))
+            self.assertEqual(dbconn._mask_filter_fetch_cache(1), (1, 0))
+        finally:
+            dbconn._caching = caching
+            EntropyCacher.clear_cache_item("MaskableRepositoryFilter")
+
     def test_memory_repository(self):
         dbconn = self.Client._init_generic_temp_repository(
             self.mem_repoid, self.mem_repo_desc, temp_file = ":memory:")
@@ -212,6 +397,131 @@ class EntropyClientTest(unittest.TestCase):
                 self.assertNotEqual(None, dbconn.getPackageData(idpackage))
                 self.assertNotEqual(None, dbconn.retrieveAtom(idpackage))
 
+    def test_repository_update_changesets(self):
+        # a plain mirror (no webservice) is updated through changesets
+        repository_id = "changesets_repo"
+        tmp_dir = const_mkdtemp()
+        mirror_dir = os.path.join(tmp_dir, "mirror")
+        db_dir = os.path.join(tmp_dir, "db")
+        os.mkdir(mirror_dir)
+        os.mkdir(db_dir)
+        avail_data = self._settings['repositories']['available']
+        avail_data[repository_id] = {
+            'description': "changesets test repository",
+            'databases': [{'uri': "file://" + mirror_dir,
+                           'dbcformat': "bz2"}],
+            'plain_packages': [],
+            'dbpath': db_dir,
+            'notice_board': "file://%s/%s" % (
+                mirror_dir, etpConst['rss-notice-board']),
+        }
+        dbfile = os.path.join(db_dir, etpConst['etpdatabasefile'])
+        server_db = None
+        client_db = None
+        try:
+            server_db = self.Client.open_generic_repository(
+                os.path.join(tmp_dir, "server.db"))
+            server_db.initializeRepository()
+            data = self.Spm.extract_package_metadata(
+                _misc.get_test_package())
+            old_package_id = server_db.addPackage(data)
+            server_db.commit()
+
+            # local repository at revision 1
+            client_db = self.Client.open_generic_repository(dbfile)
+            client_db.initializeRepository()
+            old_data = server_db.getPackageData(old_package_id,
+                get_content = False, content_insert_formatted = True,
+                get_changelog = False)
+            client_db.addPackage(old_data, revision = old_data['revision'],
+                package_id = old_package_id, formatted_content = True)
+            client_db.commit()
+            client_db.close()
+            client_db = None
+            with open(os.path.join(db_dir,
+                    etpConst['etpdatabaserevisionfile']), "w") as rev_f:
+                rev_f.write("1\n")
+
+            # mirror at revision 2, publishing the 1 -> 2 changeset
+            server_db.removePackage(old_package_id)
+            data = self.Spm.extract_package_metadata(
+                _misc.get_test_package2())
+            package_id = server_db.addPackage(data)
+            server_db.commit()
+            name = etpConst['etpdatabasechangesetfile'] % (1, 2, "bz2")
+            path = os.path.join(mirror_dir, name)
+            changeset_f = bz2.BZ2File(path, "wb")
+            try:
+                server_db.exportChangeset(changeset_f, [package_id],
+                    [old_package_id], metadata = {'from': 1, 'to': 2})
+            finally:
+                changeset_f.close()
+            with open(os.path.join(mirror_dir,
+                    etpConst['etpdatabasechangesetsfile']), "w") as index_f:
+                index_f.write("1 2 %s %d %s\n" % (
+                        name, os.path.getsize(path),
+                        entropy.tools.sha256(path)))
+            with open(os.path.join(mirror_dir,
+                    etpConst['etpdatabaserevisionfile']), "w") as rev_f:
+                rev_f.write("2\n")
+
+            updater = AvailablePackagesRepositoryUpdater(
+                self.Client, repository_id, False, False)
+            set_mute(True)
+            try:
+                selected = updater._select_database_mirror()
+                # no webservice, changesets must not be given up
+                self.assertEqual(updater._repo_eapi, 4)
+                self.assertNotEqual(selected, None)
+                revision, uri, _cformat = selected
+                self.assertEqual(revision, 2)
+
+                # with the repository key installed, the changesets
+                # index must carry a valid signature
+                class FakeSecurity(object):
+                    verified = []
+                    def is_pubkey_available(self, repository_id):
+                        return True
+                    def verify_file(self, repository_id, path, sig_path):
+                        self.verified.append(path)
+                        return False, "bad signature"
+                gpg_updater = AvailablePackagesRepositoryUpdater(
+                    self.Client, repository_id, False, True)
+                old_repo_sec = self.Client.RepositorySecurity
+                self.Client.RepositorySecurity = FakeSecurity
+                try:
+                    # no signature on the mirror
+                    self.assertFalse(
+                        gpg_updater._changesets_database_sync(uri, revision))
+                    sig_path = os.path.join(mirror_dir,
+                        etpConst['etpdatabasechangesetsfile'] + \
+                            etpConst['etpgpgextension'])
+                    with open(sig_path, "w") as sig_f:
+                        sig_f.write("signature\n")
+                    self.assertFalse(
+                        gpg_updater._changesets_database_sync(uri, revision))
+                    self.assertEqual(len(FakeSecurity.verified), 1)
+                finally:
+                    self.Client.RepositorySecurity = old_repo_sec
+                self.assertFalse(os.path.lexists(os.path.join(db_dir,
+                    os.path.basename(sig_path))))
+
+                self.assertTrue(
+                    updater._changesets_database_sync(uri, revision))
+            finally:
+                set_mute(False)
+
+            client_db = self.Client.open_generic_repository(dbfile)
+            self.assertEqual(client_db.listAllPackageIds(),
+                             server_db.listAllPackageIds())
+        finally:
+            avail_data.pop(repository_id, None)
+            if client_db is not None:
+                client_db.close()
+            if server_db is not None:
+                server_db.close()
+            shutil.rmtree(tmp_dir, True)
+
     def test_package_installation_new_api(self):
         for pkg_path, pkg_atom in self.test_pkgs:
             self._do_pkg_test_new_api(pkg_path, pkg_atom)
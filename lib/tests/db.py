@@ -3,7 +3,9 @@ import sys
 sys.path.insert(0, '.')
 sys.path.insert(0, '../')
 import unittest
+import bz2
 import os
+import sqlite3
 import time
 import threading
 
@@ -14,6 +16,8 @@ from entropy.output import set_mute
 from entropy.core.settings.base import SystemSettings
 from entropy.misc import ParallelTask
 from entropy.db import EntropyRepository
+from entropy.db.skel import EntropyRepositoryBase
+from entropy.db.exceptions import OperationalError
 import tests._misc as _misc
 
 import entropy.dep
@@ -62,6 +66,69 @@ class EntropyRepositoryTest(unittest.TestCase):
     def test_db_clearcache(self):
         self.test_db.clearCache()
 
+    def test_db_generation(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        package_id = self.test_db.addPackage(data)
+        self.test_db.commit()
+        generation = self.test_db.generation()
+
+        # cache clearing (done at every lock release) is not a change
+        self.test_db.clearCache()
+        self.test_db.commit()
+        self.assertEqual(generation, self.test_db.generation())
+
+        self.test_db.setSlot(package_id, "2")
+        self.test_db.commit()
+        new_generation = self.test_db.generation()
+        self.assertNotEqual(generation, new_generation)
+
+        self.test_db.commit()
+        self.assertEqual(new_generation, self.test_db.generation())
+
+    def test_db_package_key_digests(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        package_id = self.test_db.addPackage(data)
+        test_pkg2 = _misc.get_test_package2()
+        data2 = self.Spm.extract_package_metadata(test_pkg2)
+        package_id2 = self.test_db.addPackage(data2)
+        self.test_db.commit()
+        key = entropy.dep.dep_getkey(self.test_db.retrieveAtom(package_id))
+        key2 = entropy.dep.dep_getkey(self.test_db.retrieveAtom(package_id2))
+
+        def _check_digests():
+            # the SQL implementation matches the generic one
+            digests = self.test_db.packageKeyDigests()
+            self.assertEqual(digests,
+                EntropyRepositoryBase.packageKeyDigests(self.test_db))
+            return digests
+
+        digests = _check_digests()
+        self.assertEqual(sorted(digests.keys()), sorted([key, key2]))
+
+        # only the digest of the modified package key changes
+        self.test_db.setDigest(package_id, "0" * 32)
+        self.test_db.commit()
+        new_digests = _check_digests()
+        self.assertNotEqual(new_digests[key], digests[key])
+        self.assertEqual(new_digests[key2], digests[key2])
+
+        digests = new_digests
+        self.test_db.removePackage(package_id)
+        data['version'] = "9999"
+        package_id = self.test_db.addPackage(data)
+        self.test_db.commit()
+        new_digests = _check_digests()
+        self.assertNotEqual(new_digests[key], digests[key])
+        self.assertEqual(new_digests[key2], digests[key2])
+
+        digests = new_digests
+        self.test_db.removePackage(package_id2)
+        self.test_db.commit()
+        new_digests = _check_digests()
+        self.assertEqual(new_digests, {key: digests[key]})
+
     def test_treeupdates_config_files_update(self):
         files = _misc.get_config_files_updates_test_files()
         actions = [
@@ -607,6 +674,50 @@ class EntropyRepositoryTest(unittest.TestCase):
             self.assertEqual(f_match, self.test_db.atomMatch(atom))
             self.assertEqual(f_match, self.test_db.atomMatch("~"+atom))
 
+    def test_db_atom_match_many(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        self.test_db.addPackage(data)
+        test_pkg = _misc.get_test_entropy_package_tag()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        self.test_db.addPackage(data)
+
+        pkg_atom = _misc.get_test_package_atom()
+        pkg_name = _misc.get_test_package_name()
+        atoms = ["slib", pkg_name, pkg_atom, "", "~" + pkg_atom,
+                 pkg_name, "slib;%s?" % (pkg_name,)]
+        for atom, pkg_id, branch in self.test_db.listAllPackages():
+            atoms.append(atom)
+            atoms.append(entropy.dep.dep_getkey(atom))
+
+        for multi_match in (False, True):
+            for extended in (False, True):
+                expected = [self.test_db.atomMatch(x,
+                        multiMatch = multi_match,
+                        extendedResults = extended) for x in atoms]
+                self.assertEqual(expected, self.test_db.atomMatchMany(
+                        atoms, multiMatch = multi_match,
+                        extendedResults = extended))
+
+    def test_db_package_data_many(self):
+        package_ids = []
+        for test_pkg in (_misc.get_test_package(),
+                         _misc.get_test_package2(),
+                         _misc.get_test_entropy_package_provide()):
+            data = self.Spm.extract_package_metadata(test_pkg)
+            package_ids.append(self.test_db.addPackage(data))
+        package_ids.append(max(package_ids) + 1000) # not available
+        package_ids.append(package_ids[0])
+
+        for insert_formatted in (False, True):
+            expected = [self.test_db.getPackageData(x,
+                    content_insert_formatted = insert_formatted)
+                        for x in package_ids]
+            self.assertEqual(expected, list(
+                    self.test_db.getPackageDataMany(package_ids,
+                        content_insert_formatted = insert_formatted)))
+        self.assertEqual([], list(self.test_db.getPackageDataMany([])))
+
     def test_db_multithread(self):
 
         # insert/compare
@@ -635,11 +746,101 @@ class EntropyRepositoryTest(unittest.TestCase):
         t3.join()
         t4.join()
 
-        cur_cache = self.test_db._cursor_pool().keys()
-        self.assertTrue(len(cur_cache) > 0)
+        stats = self.test_db.connectionPoolStats()
+        self.assertTrue(stats['open'] > 0)
         self.test_db._cleanup_all()
-        cur_cache = self.test_db._cursor_pool().keys()
-        self.assertEqual(len(cur_cache), 0)
+        stats = self.test_db.connectionPoolStats()
+        self.assertEqual(stats['open'], 0)
+
+    def test_db_connection_pool(self):
+
+        class PooledRepository(EntropyRepository):
+            CONNECTION_POOL_SIZE = 2
+            CONNECTION_POOL_CHECKOUT_TIMEOUT = 2.0
+
+        fd, db_file = const_mkstemp()
+        os.close(fd)
+        test_db = PooledRepository(readOnly = False, dbFile = db_file,
+            name = self.test_db_name, skipChecks = True)
+        pool = test_db._connection_pool()
+
+        try:
+            test_db.initializeRepository()
+            test_pkg = _misc.get_test_package()
+            data = self.Spm.extract_package_metadata(test_pkg)
+            idpackage = test_db.addPackage(data)
+            test_db.commit()
+
+            # connections checked in are handed over to other threads
+            def query():
+                self.assertEqual(test_db.listAllPackageIds(),
+                             frozenset([idpackage]))
+                test_db.releaseConnection()
+            for x in range(4):
+                t = ParallelTask(query)
+                t.start()
+                t.join()
+            stats = test_db.connectionPoolStats()
+            self.assertEqual(stats['created'], 2)
+            self.assertEqual(stats['reused'], 3)
+            self.assertEqual(stats['idle'], 1)
+
+            # the pool is full, the third thread waits for a connection
+            release = threading.Event()
+            held = threading.Event()
+            def hold():
+                test_db.listAllPackageIds()
+                held.set()
+                release.wait()
+                test_db.releaseConnection()
+            holder = ParallelTask(hold)
+            holder.start()
+            waiter = ParallelTask(query)
+            waiter.start()
+            time.sleep(0.5)
+            self.assertEqual(test_db.connectionPoolStats()['waits'], 1)
+            release.set()
+            holder.join()
+            waiter.join()
+
+            # and gives up once the checkout timeout expires
+            release.clear()
+            held.clear()
+            errors = []
+            def timed_out():
+                try:
+                    test_db.listAllPackageIds()
+                except OperationalError as err:
+                    errors.append(err)
+            holder = ParallelTask(hold)
+            holder.start()
+            held.wait()
+            waiter = ParallelTask(timed_out)
+            waiter.start()
+            waiter.join()
+            release.set()
+            holder.join()
+            self.assertEqual(len(errors), 1)
+            self.assertEqual(test_db.connectionPoolStats()['timeouts'], 1)
+
+            # connections of terminated threads are reclaimed and
+            # uncommitted changes rolled back
+            t = ParallelTask(test_db.addPackage, data)
+            t.start()
+            t.join()
+            pool.reap()
+            stats = test_db.connectionPoolStats()
+            self.assertEqual(stats['reaped'], 1)
+            self.assertEqual(stats['in_use'], 1) # just MainThread
+            self.assertEqual(test_db.listAllPackageIds(),
+                             frozenset([idpackage]))
+
+            test_db.close()
+            self.assertEqual(test_db.connectionPoolStats()['open'], 0)
+
+        finally:
+            test_db.close()
+            os.remove(db_file)
 
     def test_db_close_all(self):
         """
@@ -702,14 +903,12 @@ class EntropyRepositoryTest(unittest.TestCase):
             t2.join()
 
             _tmp_data['db']._cleanup_all(_cleanup_main_thread=False)
-            with _tmp_data['db']._cursor_pool_mutex():
-                cur_cache = _tmp_data['db']._cursor_pool().keys()
-            self.assertEqual(len(cur_cache), 1) # just MainThread
+            stats = _tmp_data['db'].connectionPoolStats()
+            self.assertEqual(stats['open'], 1) # just MainThread
 
             _tmp_data['db'].close()
-            with _tmp_data['db']._cursor_pool_mutex():
-                cur_cache = _tmp_data['db']._cursor_pool().keys()
-            self.assertEqual(len(cur_cache), 0) # nothing left
+            stats = _tmp_data['db'].connectionPoolStats()
+            self.assertEqual(stats['open'], 0) # nothing left
             _tmp_data['T3'] = True
 
         t1 = ParallelTask(handle_pkg, _tmp_data, data)
@@ -734,9 +933,8 @@ class EntropyRepositoryTest(unittest.TestCase):
         self.assertTrue(1 in pkg_ids)
         self.assertTrue(len(pkg_ids) == 1)
         _tmp_data['db'].close()
-        with _tmp_data['db']._cursor_pool_mutex():
-            cur_cache = _tmp_data['db']._cursor_pool().keys()
-        self.assertEqual(len(cur_cache), 0) # nothing left
+        stats = _tmp_data['db'].connectionPoolStats()
+        self.assertEqual(stats['open'], 0) # nothing left
         os.remove(_tmp_data['path'])
 
     def test_db_reverse_deps(self):
@@ -778,6 +976,45 @@ class EntropyRepositoryTest(unittest.TestCase):
         pkg_data = self.test_db.retrieveUnusedPackageIds()
         self.assertEqual(pkg_data, tuple())
 
+    def test_db_reverse_deps_update(self):
+
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        test_pkg2 = _misc.get_test_package2()
+        data2 = self.Spm.extract_package_metadata(test_pkg2)
+        data['pkg_dependencies'] += ((
+                _misc.get_test_package_atom2(),
+                etpConst['dependency_type_ids']['rdepend_id']),)
+        data2['pkg_dependencies'] += ((
+                _misc.get_test_package_atom(),
+                etpConst['dependency_type_ids']['rdepend_id']),)
+
+        idpackage = self.test_db.addPackage(data)
+        # generate the reverse dependencies metadata, updated below by
+        # addPackage() and removePackage()
+        self.assertEqual(
+            self.test_db.retrieveReverseDependencies(idpackage), frozenset())
+        self.assertEqual(
+            self.test_db.retrieveUnusedPackageIds(), (idpackage,))
+
+        idpackage2 = self.test_db.addPackage(data2)
+        rev_deps = self.test_db.retrieveReverseDependencies(idpackage)
+        rev_deps2 = self.test_db.retrieveReverseDependencies(idpackage2)
+        self.assertEqual(rev_deps, frozenset([idpackage2]))
+        self.assertEqual(rev_deps2, frozenset([idpackage]))
+
+        self.test_db.clearCache()
+        self.assertEqual(
+            self.test_db.retrieveReverseDependencies(idpackage), rev_deps)
+        self.assertEqual(
+            self.test_db.retrieveReverseDependencies(idpackage2), rev_deps2)
+
+        self.test_db.removePackage(idpackage2)
+        self.assertEqual(
+            self.test_db.retrieveReverseDependencies(idpackage), frozenset())
+        self.assertEqual(
+            self.test_db.retrieveUnusedPackageIds(), (idpackage,))
+
     def test_similar(self):
         test_pkg = _misc.get_test_package()
         data = self.Spm.extract_package_metadata(test_pkg)
@@ -875,6 +1112,54 @@ class EntropyRepositoryTest(unittest.TestCase):
         out = self.test_db.searchName(_misc.get_test_package_name())
         self.assertEqual(out, frozenset([('sys-libs/zlib-1.2.3-r1', 1)]))
 
+    def test_search_packages_ranked(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        idpackage = self.test_db.addPackage(data)
+        test_pkg2 = _misc.get_test_package2()
+        data2 = self.Spm.extract_package_metadata(test_pkg2)
+        idpackage2 = self.test_db.addPackage(data2)
+        name = _misc.get_test_package_name()
+
+        def _ids(keyword, **kwargs):
+            return [x for x, y in self.test_db.searchPackagesRanked(
+                    keyword, **kwargs)]
+
+        # LIKE based implementation
+        self.assertFalse(self.test_db._isSearchIndexed())
+        self.assertEqual(_ids(name), [idpackage])
+        self.assertEqual(_ids(name[:-1].upper()), [idpackage])
+        self.assertEqual(_ids("sys-libs " + name), [idpackage])
+        self.assertEqual(_ids("   "), [])
+        self.assertEqual(_ids("%s foobarbaz" % (name,)), [])
+        fallback = self.test_db.searchPackagesRanked(name)
+
+        # full-text index
+        self.test_db._createSearchIndex()
+        self.assertTrue(self.test_db._isSearchIndexed())
+        self.assertEqual(_ids(name), [idpackage])
+        self.assertEqual(_ids(name[:-1].upper()), [idpackage])
+        self.assertEqual(_ids("sys-libs " + name), [idpackage])
+        self.assertEqual(_ids('"%s*' % (name,)), [idpackage])
+        self.assertEqual(_ids("%s foobarbaz" % (name,)), [])
+        out = self.test_db.searchPackagesRanked(name)
+        self.assertEqual(int(out[0][1]), fallback[0][1])
+
+        all_ids = _ids(data2['category'].split("-")[0])
+        self.assertTrue(idpackage2 in all_ids)
+        self.assertEqual(_ids(data2['category'].split("-")[0], limit = 1),
+            all_ids[:1])
+
+        # kept in sync with package metadata
+        self.test_db.setName(idpackage, "foobarbaz")
+        self.assertEqual(_ids(name), [])
+        self.assertEqual(_ids("foobar"), [idpackage])
+        self.test_db.removePackage(idpackage)
+        self.assertEqual(_ids("foobar"), [])
+
+        self.test_db.dropAllIndexes()
+        self.assertFalse(self.test_db._isSearchIndexed())
+
     def test_db_indexes(self):
         self.test_db.createAllIndexes()
 
@@ -925,6 +1210,147 @@ class EntropyRepositoryTest(unittest.TestCase):
         os.remove(buf_file)
         os.remove(new_db_path)
 
+    def test_db_import_export_compressed(self):
+
+        test_pkg = _misc.get_test_package2()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        idpackage = self.test_db.addPackage(data)
+        db_data = self.test_db.getPackageData(idpackage)
+        _misc.clean_pkg_metadata(db_data)
+        self.test_db.commit()
+
+        set_mute(True)
+
+        # export, compressed
+        fd, buf_file = const_mkstemp()
+        os.close(fd)
+        buf = bz2.BZ2File(buf_file, "wb")
+        self.test_db.exportRepository(buf)
+        buf.close()
+
+        # import, reading while decompressing
+        fd, new_db_path = const_mkstemp()
+        os.close(fd)
+        buf = bz2.BZ2File(buf_file, "rb")
+        rc = self.test_db.importRepository(buf, new_db_path)
+        buf.close()
+        self.assertEqual(rc, 0)
+        new_db = self.Client.open_generic_repository(new_db_path)
+        new_db_data = new_db.getPackageData(idpackage)
+        _misc.clean_pkg_metadata(new_db_data)
+        new_db.close()
+        self.assertEqual(new_db_data, db_data)
+
+        # truncated dumps are rejected, leaving the repository alone
+        with open(buf_file, "rb") as buf:
+            compressed = buf.read()
+        with open(buf_file, "wb") as buf:
+            buf.write(compressed[:len(compressed) // 2])
+        buf = bz2.BZ2File(buf_file, "rb")
+        rc = self.test_db.importRepository(buf, new_db_path)
+        buf.close()
+        set_mute(False)
+        self.assertNotEqual(rc, 0)
+        new_db = self.Client.open_generic_repository(new_db_path)
+        self.assertTrue(idpackage in new_db.listAllPackageIds())
+        new_db.close()
+
+        os.remove(buf_file)
+        os.remove(new_db_path)
+
+    def test_db_import_wal(self):
+
+        test_pkg = _misc.get_test_package2()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        idpackage = self.test_db.addPackage(data)
+        self.test_db.commit()
+
+        set_mute(True)
+        fd, dump_path = const_mkstemp()
+        os.close(fd)
+        with open(dump_path, "wb") as dump_f:
+            self.test_db.exportRepository(dump_f)
+
+        # a live repository in WAL journal mode
+        fd, db_path = const_mkstemp()
+        os.close(fd)
+        os.remove(db_path)
+        live_conn = sqlite3.connect(db_path)
+        live_conn.execute("PRAGMA journal_mode = WAL").fetchall()
+        live_conn.execute("CREATE TABLE live (x INTEGER)")
+        live_conn.execute("INSERT INTO live VALUES (1)")
+        live_conn.commit()
+
+        try:
+            # still in use, the WAL file must not be removed
+            rc = self.test_db.importRepository(dump_path, db_path)
+            self.assertNotEqual(rc, 0)
+            self.assertTrue(os.path.isfile(db_path + "-wal"))
+            self.assertEqual(
+                live_conn.execute("SELECT x FROM live").fetchall(), [(1,)])
+        finally:
+            live_conn.close()
+
+        rc = self.test_db.importRepository(dump_path, db_path)
+        set_mute(False)
+        os.remove(dump_path)
+        self.assertEqual(rc, 0)
+        self.assertFalse(os.path.lexists(db_path + "-wal"))
+        new_db = self.Client.open_generic_repository(db_path)
+        self.assertTrue(idpackage in new_db.listAllPackageIds())
+        new_db.close()
+        os.remove(db_path)
+
+    def test_db_changesets(self):
+
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        old_package_id = self.test_db.addPackage(data)
+        old_data = self.test_db.getPackageData(old_package_id,
+            get_content = False, content_insert_formatted = True,
+            get_changelog = False)
+        self.test_db2.addPackage(old_data, revision = old_data['revision'],
+            package_id = old_package_id, formatted_content = True)
+        self.test_db2.commit()
+
+        # server side
+        self.test_db.removePackage(old_package_id)
+        test_pkg2 = _misc.get_test_package2()
+        data2 = self.Spm.extract_package_metadata(test_pkg2)
+        data2['trigger'] = const_convert_to_rawstring("#!/bin/sh\n\xff")
+        package_id = self.test_db.addPackage(data2)
+        pkgsets = {'my_test_set': set(["app-foo/foo", "app-pling/plong"])}
+        self.test_db.insertPackageSets(pkgsets)
+        self.test_db.commit()
+
+        set_mute(True)
+        fd, changeset_file = const_mkstemp()
+        os.close(fd)
+        with open(changeset_file, "wb") as changeset_f:
+            self.test_db.exportChangeset(changeset_f, [package_id],
+                [old_package_id], metadata = {'from': 1, 'to': 2})
+        with open(changeset_file, "rb") as changeset_f:
+            changeset = EntropyRepository.loadChangeset(changeset_f)
+        os.remove(changeset_file)
+        self.assertEqual(changeset['from'], 1)
+        self.assertEqual(changeset['to'], 2)
+
+        # client side
+        added, removed = self.test_db2.importChangesets([changeset])
+        self.test_db2.commit()
+        set_mute(False)
+        self.assertEqual(added, [package_id])
+        self.assertEqual(removed, [old_package_id])
+        self.assertEqual(self.test_db2.listAllPackageIds(),
+                         self.test_db.listAllPackageIds())
+        self.assertEqual(self.test_db2.retrievePackageSets(), pkgsets)
+        self.assertEqual(
+            self.test_db2.checksum(do_order = True, strict = False,
+                include_signatures = True), changeset['checksum'])
+        kwargs = dict(get_content = False, get_changelog = False)
+        self.assertEqual(self.test_db2.getPackageData(package_id, **kwargs),
+                         self.test_db.getPackageData(package_id, **kwargs))
+
     def test_use_defaults(self):
         test_pkg = _misc.get_test_package()
         data = self.Spm.extract_package_metadata(test_pkg)
@@ -997,6 +1423,78 @@ class EntropyRepositoryTest(unittest.TestCase):
 
         test_db.close()
 
+    def test_search_belongs(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        idpackage = self.test_db.addPackage(data)
+        paths = sorted(data['content'])
+        expected = dict((x, frozenset([idpackage])) for x in paths)
+        expected["/usr/include/foobarbaz.h"] = frozenset()
+
+        for interned in (False, True):
+            if interned:
+                self.test_db._migrateContentInterned()
+            self.test_db._createContentIndex()
+
+            self.assertEqual(self.test_db.searchBelongsMany(
+                    list(expected.keys())), expected)
+            self.assertEqual(self.test_db.searchBelongsMany([]), {})
+            for pattern, outcome in (
+                    ("%/zlib.h", [idpackage]),
+                    ("%/ZLIB.H", [idpackage]),
+                    ("/usr/%/zlib.h", [idpackage]),
+                    ("%/lib64/zlib.h", []),
+                    ("%/zlib", []),
+                    ("%/zlib%", [idpackage])):
+                self.assertEqual(
+                    self.test_db.searchBelongs(pattern, like = True),
+                    frozenset(outcome))
+
+    def test_content_interned_schema(self):
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        idpackage = self.test_db.addPackage(data)
+        old_data = self.test_db.getPackageData(idpackage)
+        paths = sorted(data['content'])
+
+        self.assertFalse(self.test_db._isContentInterned())
+        self.test_db._migrateContentInterned()
+        self.assertTrue(self.test_db._isContentInterned())
+        self.assertEqual(old_data, self.test_db.getPackageData(idpackage))
+
+        # packages added after the migration
+        test_pkg2 = _misc.get_test_package2()
+        data2 = self.Spm.extract_package_metadata(test_pkg2)
+        idpackage2 = self.test_db.addPackage(data2)
+        idpackage2_ref = self.test_db2.addPackage(data2)
+        self.assertEqual(
+            self.test_db.getPackageData(idpackage2),
+            self.test_db2.getPackageData(idpackage2_ref))
+
+        for path in paths:
+            self.assertEqual(self.test_db.searchBelongs(path),
+                frozenset([idpackage]))
+            self.assertTrue(self.test_db.isFileAvailable(path))
+        self.assertEqual(self.test_db.searchBelongs("/usr/include/%",
+            like = True), frozenset([idpackage]))
+        self.assertFalse(self.test_db.isFileAvailable("/usr/include"))
+
+        path = "/usr/include/zconf.h"
+        self.assertEqual(self.test_db.searchContentSafety(path), (
+            {'package_id': idpackage,
+             'sha256': data['content_safety'][path]['sha256'],
+             'path': path,
+             'mtime': data['content_safety'][path]['mtime']},)
+        )
+
+        self.test_db.removePackage(idpackage)
+        self.assertEqual(self.test_db.searchBelongs(path), frozenset())
+        self.assertEqual(self.test_db.retrieveContentSafety(idpackage), {})
+        self.test_db.clean()
+        self.assertEqual(
+            self.test_db.getPackageData(idpackage2),
+            self.test_db2.getPackageData(idpackage2_ref))
+
     def test_preserved_libs(self):
         data = self.test_db.listAllPreservedLibraries()
         self.assertEqual(data, tuple())
@@ -1117,6 +1615,47 @@ class EntropyRepositoryTest(unittest.TestCase):
                 test_db.close()
             os.remove(db_file)
 
+    def test_performance_profile(self):
+
+        class WalRepository(EntropyRepository):
+            PERFORMANCE_PROFILE = "installed"
+
+        fd, db_file = const_mkstemp()
+        os.close(fd)
+        test_db = None
+
+        try:
+            test_db = WalRepository(readOnly = False, dbFile = db_file,
+                name = self.test_db_name, skipChecks = True)
+            test_db.initializeRepository()
+            cur = test_db._cursor().execute("PRAGMA journal_mode")
+            self.assertEqual(cur.fetchone()[0].lower(), "wal")
+
+            test_pkg = _misc.get_test_package()
+            data = self.Spm.extract_package_metadata(test_pkg)
+            idpackage = test_db.addPackage(data)
+            test_db.commit()
+            # commits only touch the WAL file until the next checkpoint
+            self.assert_(
+                test_db.mtime() >= os.path.getmtime(db_file + "-wal"))
+
+            self._test_repository_locking(test_db)
+            test_db.close()
+            test_db = None
+            # back to the rollback journal once closed
+            self.assertFalse(os.path.exists(db_file + "-wal"))
+
+            test_db = self.Client.open_generic_repository(db_file)
+            cur = test_db._cursor().execute("PRAGMA journal_mode")
+            self.assertEqual(cur.fetchone()[0].lower(), "delete")
+            self.assertEqual(test_db.listAllPackageIds(),
+                             frozenset([idpackage]))
+
+        finally:
+            if test_db is not None:
+                test_db.close()
+            os.remove(db_file)
+
     def test_locking_memory(self):
         self.assert_(self.test_db._is_memory())
         return self._test_repository_locking(self.test_db)
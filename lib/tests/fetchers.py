@@ -47,6 +47,54 @@ class FetchersTest(unittest.TestCase):
         self.assertEqual(rc.pop(1), ck_sum)
         os.remove(path_to_save)
 
+    def test_urlfetcher_store_digests(self):
+
+        file_path = "file://" + os.path.realpath(self._random_file)
+        path_to_save = os.path.join(os.path.dirname(self._random_file),
+            "test_urlfetcher_digests")
+        expected = {
+            'md5': entropy.tools.md5sum(self._random_file),
+            'sha1': entropy.tools.sha1(self._random_file),
+            'sha256': entropy.tools.sha256(self._random_file),
+            'sha512': entropy.tools.sha512(self._random_file),
+        }
+
+        # resume an already complete download, digests must cover the
+        # data already on disk
+        with open(self._random_file, "rb") as src_f:
+            data = src_f.read()
+        with open(path_to_save, "wb") as dst_f:
+            dst_f.write(data)
+
+        try:
+            fetcher = UrlFetcher(file_path, path_to_save,
+                show_speed = False, resume = True, store_digests = True)
+            rc = fetcher.download()
+            self.assertTrue(fetcher.is_resumed())
+            self.assertEqual(rc, expected['md5'])
+            self.assertEqual(
+                entropy.tools.read_file_digests(path_to_save), expected)
+
+            # digests are discarded once the file changes
+            with open(path_to_save, "ab") as dst_f:
+                dst_f.write(b"x")
+            self.assertEqual(
+                entropy.tools.read_file_digests(path_to_save), None)
+
+            digests_path = path_to_save + \
+                entropy.tools.etpConst['packagedigestsfileext']
+            self.assertTrue(os.path.isfile(digests_path))
+            entropy.tools.remove_file_digests(path_to_save)
+            self.assertFalse(os.path.lexists(digests_path))
+            # already gone
+            entropy.tools.remove_file_digests(path_to_save)
+        finally:
+            os.remove(path_to_save)
+            digests_path = path_to_save + \
+                entropy.tools.etpConst['packagedigestsfileext']
+            if os.path.isfile(digests_path):
+                os.remove(digests_path)
+
 if __name__ == '__main__':
     unittest.main()
     raise SystemExit(0)
@@ -8,7 +8,8 @@ import tempfile
 import json
 from entropy.const import const_convert_to_unicode, const_mkstemp
 from entropy.misc import Lifo, TimeScheduled, ParallelTask, EmailSender, \
-    FastRSS, FlockFile
+    FastRSS, FlockFile, MultiHasher
+from entropy.graph import Graph
 
 class MiscTest(unittest.TestCase):
 
@@ -92,6 +93,32 @@ class MiscTest(unittest.TestCase):
         t.join()
         self.assertTrue(self.t_sched_run)
 
+    def test_multi_hasher(self):
+        import hashlib
+
+        data = b"entropy" * 100000
+        hasher = MultiHasher()
+        for x in range(0, len(data), 4096):
+            hasher.update(data[x:x + 4096])
+        digests = hasher.hexdigests()
+        self.assertEqual(sorted(digests), sorted(MultiHasher.DIGESTS))
+        for hash_type in MultiHasher.DIGESTS:
+            self.assertEqual(digests[hash_type],
+                hashlib.new(hash_type, data).hexdigest())
+
+        tmp_fd, tmp_path = const_mkstemp(prefix="test_multi_hasher")
+        try:
+            with os.fdopen(tmp_fd, "wb") as tmp_f:
+                tmp_f.write(data)
+            hasher = MultiHasher(("md5", "sha256"))
+            hasher.update_from_file(tmp_path)
+            self.assertEqual(hasher.hexdigests(), {
+                'md5': hashlib.md5(data).hexdigest(),
+                'sha256': hashlib.sha256(data).hexdigest(),
+            })
+        finally:
+            os.remove(tmp_path)
+
     def test_flock_file(self):
         tmp_fd, tmp_path = None, None
         try:
@@ -255,6 +282,57 @@ class MiscTest(unittest.TestCase):
 
         os.remove(tmp_path)
 
+    def test_graph_solve(self):
+        graph = Graph()
+        graph.add("app", set(["lib", "tool"]))
+        graph.add("tool", set(["lib", "libc"]))
+        graph.add("lib", set(["libc"]))
+        # cycle
+        graph.add("a", set(["b"]))
+        graph.add("b", set(["a", "libc"]))
+
+        self.assertEqual(graph.get_item_adjacency_map(), {
+                "app": set(["lib", "tool"]),
+                "tool": set(["lib", "libc"]),
+                "lib": set(["libc"]),
+                "libc": set(),
+                "a": set(["b"]),
+                "b": set(["a", "libc"]),
+                })
+
+        deptree = graph.solve()
+        self.assertEqual(sorted(deptree), list(range(1, len(deptree) + 1)))
+        levels = {}
+        for level, items in deptree.items():
+            for item in items:
+                levels[item] = level
+        self.assertEqual(sorted(levels), sorted(graph.raw()))
+        self.assertEqual(levels["a"], levels["b"])
+        for item, deps in graph.get_item_adjacency_map().items():
+            for dep in deps:
+                self.assertTrue(levels[item] <= levels[dep])
+
+        node = graph.get_node("libc")
+        self.assertEqual(
+            sorted(x.origin().item() for x in node.arches() if \
+                not node.is_arch_outgoing(x)),
+            ["b", "lib", "tool"])
+        self.assertEqual(
+            dict((x.item(), set(k.item() for k in y)) for x, y in \
+                graph.get_adjacency_map().items()),
+            graph.get_item_adjacency_map())
+        graph.destroy()
+
+    def test_graph_solve_deep(self):
+        graph = Graph()
+        depth = 20000
+        for idx in range(depth):
+            graph.add(idx, set([idx + 1]))
+        deptree = graph.solve()
+        self.assertEqual([deptree[x] for x in sorted(deptree)],
+            [(x,) for x in range(depth + 1)])
+        graph.destroy()
+
 
 if __name__ == '__main__':
     unittest.main()
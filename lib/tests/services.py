@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+sys.path.insert(0, 'client')
+sys.path.insert(0, '../../client')
+sys.path.insert(0, '.')
+sys.path.insert(0, '../')
+import types
+import unittest
+
+_SERVICES_DIR = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "..", "..", "services")
+
+def _load_service(name):
+    # services are scripts, not modules
+    path = os.path.join(_SERVICES_DIR, name)
+    module = types.ModuleType(name.replace("-", "_"))
+    module.__file__ = path
+    with open(path, "r") as service_f:
+        code = compile(service_f.read(), path, "exec")
+    exec(code, module.__dict__)
+    return module
+
+class ServicesTest(unittest.TestCase):
+
+    def test_pkgdelta_expected_ratio(self):
+        generator = _load_service("entropy-pkgdelta-generator")
+        expected_delta_ratio = generator.expected_delta_ratio
+
+        # the added data must be carried by the delta
+        self.assertEqual(expected_delta_ratio(800, 1000), 0.2)
+        self.assertEqual(expected_delta_ratio(1000, 1000), 0.0)
+        # packages that shrunk give no lower bound
+        self.assertEqual(expected_delta_ratio(1000, 800), 0.0)
+        self.assertTrue(
+            expected_delta_ratio(5000, 1000) <= generator.MAX_DELTA_RATIO)
+        self.assertEqual(expected_delta_ratio(1000, 0), 1.0)
+        # measured ratios win
+        self.assertEqual(expected_delta_ratio(1000, 800, 0.9), 0.9)
+        self.assertEqual(expected_delta_ratio(800, 1000, 0.1), 0.1)
+
+if __name__ == '__main__':
+    unittest.main()
+    raise SystemExit(0)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Measure atomMatch() throughput with a warm on-disk cache, comparing the
+cost of the cache key components: the repository generation stamp
+(current) and the non-strict repository checksum (previously used),
+which must be recalculated every time the in-memory cache is discarded,
+for instance in a new process or after a repository file change.
+
+Usage: bench_atom_match.py [<number of packages>]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+from benchrepo import create_repository, package_key
+
+
+def _time(func, rounds):
+    t0 = time.time()
+    for x in range(rounds):
+        func()
+    return (time.time() - t0) / rounds
+
+def main():
+    count = 5000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+
+    tmp_dir = tempfile.mkdtemp(prefix = "bench_atom_match")
+    try:
+        repo = create_repository(
+            os.path.join(tmp_dir, "repo.db"), count, files = 5,
+            xcache = True)
+        atoms = [package_key(idx) for idx in range(0, count, 7)]
+
+        def _cold_checksum():
+            repo._discardLiveCache()
+            repo.checksum(strict = False)
+
+        checksum_t = _time(_cold_checksum, 10)
+        generation_t = _time(repo.generation, 1000)
+        sys.stdout.write(
+            "%d packages, cache key: checksum(strict=False) %.3fms, "
+            "generation() %.4fms\n" % (
+                count, checksum_t * 1000, generation_t * 1000))
+
+        # populate the cache
+        for atom in atoms:
+            repo.atomMatch(atom)
+
+        def _matches():
+            for atom in atoms:
+                repo.atomMatch(atom)
+
+        warm_t = _time(_matches, 3)
+        sys.stdout.write(
+            "warm atomMatch(), %d atoms: %.2f ms/match, "
+            "%d matches/s\n" % (
+                len(atoms), warm_t * 1000 / len(atoms),
+                len(atoms) / warm_t))
+        sys.stdout.write(
+            "same workload keyed on checksum, once per process: "
+            "+%.1fms on first match\n" % (checksum_t * 1000,))
+
+        repo.close()
+    finally:
+        shutil.rmtree(tmp_dir, True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Compare atomMatch() called in a loop against atomMatchMany() when
+matching every dependency string stored in a repository, which is what
+the dependencies test (QA) and the dependency solver do.
+
+Usage: bench_atom_match_many.py [<number of packages>]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+from benchrepo import create_repository
+
+
+def main():
+    count = 10000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+
+    tmp_dir = tempfile.mkdtemp(prefix = "bench_atom_match_many")
+    try:
+        repo = create_repository(
+            os.path.join(tmp_dir, "repo.db"), count, files = 2)
+        deps = [dep for _dep_id, dep in repo.listAllDependencies()]
+        # also add the package keys, with and without USE deps
+        keys = ["%s/%s" % repo.retrieveKeySplit(x)
+                for x in repo.listAllPackageIds()]
+        deps += keys + [x + "[ssl]" for x in keys[::5]]
+
+        t0 = time.time()
+        single = [repo.atomMatch(x, useCache = False) for x in deps]
+        single_t = time.time() - t0
+
+        t0 = time.time()
+        many = repo.atomMatchMany(deps, useCache = False)
+        many_t = time.time() - t0
+
+        if single != many:
+            sys.stderr.write("atomMatchMany() results differ!\n")
+            raise SystemExit(1)
+
+        sys.stdout.write(
+            "%d packages, %d dependencies\n"
+            "atomMatch() loop: %.2fs (%.3f ms/dep)\n"
+            "atomMatchMany():  %.2fs (%.3f ms/dep), %.1fx\n" % (
+                count, len(deps),
+                single_t, single_t * 1000 / len(deps),
+                many_t, many_t * 1000 / len(deps),
+                single_t / many_t))
+
+        repo.close()
+    finally:
+        shutil.rmtree(tmp_dir, True)
+
+if __name__ == "__main__":
+    main()
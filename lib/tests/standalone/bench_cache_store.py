@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the entropy.dump cache store backends (one file per key versus
+one indexed log per namespace) on a key mix resembling the one produced
+by Entropy Client: atomMatch results, repository match cache, dependency
+trees and mask filter results.
+
+Usage: bench_cache_store.py [<number of keys>]
+"""
+import hashlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+import entropy.dump
+from entropy.const import const_convert_to_rawstring
+
+
+def _sha(value):
+    return hashlib.sha1(const_convert_to_rawstring(repr(value))).hexdigest()
+
+def _make_objects(count):
+    """
+    Generate (key, object) pairs mimicking the Entropy cache contents.
+    """
+    rnd = random.Random(0)
+    objects = []
+    for idx in range(count):
+        kind = rnd.random()
+        if kind < 0.45:
+            key = "atom_match/atom_match_%s" % (_sha(idx),)
+            obj = ((rnd.randint(1, 30000), "sabayonlinux.org"), 0)
+        elif kind < 0.75:
+            key = "match/db/sabayonlinux.org/%s_%s" % (_sha(-idx), _sha(idx))
+            obj = (rnd.randint(1, 30000), 0)
+        elif kind < 0.95:
+            key = "MaskableRepositoryFilter/sabayonlinux.org_x/%d" % (idx,)
+            obj = (rnd.randint(1, 30000), rnd.randint(0, 12))
+        else:
+            key = "deptree/dep_tree_%s" % (_sha(idx),)
+            obj = dict((level, [(rnd.randint(1, 30000), "sabayonlinux.org")
+                                for x in range(rnd.randint(1, 40))])
+                       for level in range(rnd.randint(1, 30)))
+        objects.append((key, obj))
+    return objects
+
+def _bench(store, objects, batch_size):
+    dump_dir = tempfile.mkdtemp(prefix = "bench_cache_store")
+    try:
+        t0 = time.time()
+        for idx in range(0, len(objects), batch_size):
+            store.store_many(objects[idx:idx + batch_size],
+                             dump_dir = dump_dir)
+        store.sync()
+        t1 = time.time()
+
+        keys = [key for key, obj in objects]
+        random.Random(1).shuffle(keys)
+        # cold: a new process would start from an empty index
+        store.close()
+        t2 = time.time()
+        for key in keys:
+            store.load(key, dump_dir = dump_dir)
+        t3 = time.time()
+        for key in keys:
+            store.load(key, dump_dir = dump_dir)
+        t4 = time.time()
+
+        files = 0
+        size = 0
+        for currentdir, subdirs, dir_files in os.walk(dump_dir):
+            for item in dir_files:
+                files += 1
+                size += os.path.getsize(os.path.join(currentdir, item))
+
+        store.clear("atom_match/atom_match_", dump_dir = dump_dir)
+        t5 = time.time()
+        return (t1 - t0, t3 - t2, t4 - t3, t5 - t4, files, size)
+    finally:
+        store.close()
+        shutil.rmtree(dump_dir, True)
+
+def main():
+    count = 20000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    objects = _make_objects(count)
+    batch_size = 250 # EntropyCacher._OBJS_WRITTEN_AT_ONCE
+
+    sys.stdout.write("%d objects, batches of %d\n" % (count, batch_size))
+    sys.stdout.write("%-10s %10s %10s %10s %10s %8s %10s\n" % (
+        "backend", "write(s)", "cold(s)", "warm(s)", "clear(s)",
+        "files", "bytes"))
+    for store_id in sorted(entropy.dump.DUMP_STORES):
+        store = entropy.dump.DUMP_STORES[store_id]()
+        result = _bench(store, objects, batch_size)
+        sys.stdout.write(
+            "%-10s %10.3f %10.3f %10.3f %10.3f %8d %10d\n" % (
+                (store_id,) + result))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Measure EntropyCacher.push() main thread latency and peak memory with
+deep-copied objects versus DumpBlob snapshots (SNAPSHOT_PUSH), using
+objects shaped like calculate_updates() and _get_required_packages()
+results.
+
+Usage: bench_cacher_push.py [<number of packages>]
+"""
+import random
+import shutil
+import sys
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from entropy.cache import EntropyCacher
+from entropy.const import const_mkdtemp
+
+
+def _updates_outcome(count):
+    rnd = random.Random(0)
+    repo = "sabayonlinux.org"
+    return {
+        'update': [(rnd.randint(1, 60000), repo) for x in range(count // 4)],
+        'remove': [rnd.randint(1, 3000) for x in range(count // 50)],
+        'fine': [rnd.randint(1, 60000) for x in range(count)],
+        'spm_fine': [(rnd.randint(1, 60000), repo) for x in range(20)],
+        'critical_found': False,
+    }
+
+def _deptree(count):
+    rnd = random.Random(1)
+    repo = "sabayonlinux.org"
+    deptree = {}
+    for level in range(1, 60):
+        deptree[level] = frozenset((rnd.randint(1, 60000), repo)
+                                   for x in range(count // 60))
+    return (deptree, 0)
+
+def _bench(cacher, name, obj, rounds, cache_dir):
+    if tracemalloc is not None:
+        tracemalloc.start()
+    t0 = time.time()
+    for idx in range(rounds):
+        cacher.push("bench/%s_%d" % (name, idx), obj, cache_dir = cache_dir)
+    t1 = time.time()
+    peak = None
+    if tracemalloc is not None:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    # objects are still in the write-back stash
+    t2 = time.time()
+    for idx in range(rounds):
+        cacher.pop("bench/%s_%d" % (name, idx), cache_dir = cache_dir)
+    t3 = time.time()
+    cacher.sync()
+    t4 = time.time()
+    cacher.discard()
+    return ((t1 - t0) * 1000 / rounds, peak, (t3 - t2) * 1000 / rounds,
+            (t4 - t3) * 1000 / rounds)
+
+def main():
+    count = 20000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    rounds = 20
+    objects = [
+        ("calculate_updates", _updates_outcome(count)),
+        ("required_packages", _deptree(count)),
+    ]
+
+    cacher = EntropyCacher()
+    # do not let the writer thread flush while measuring
+    EntropyCacher.WRITEBACK_TIMEOUT = 3600
+    EntropyCacher.LRU_MAX_BYTES = 0
+    cacher.start()
+    cache_dir = const_mkdtemp(prefix = "bench_cacher_push")
+    snapshot = EntropyCacher.SNAPSHOT_PUSH
+    try:
+        sys.stdout.write("%d packages, %d pushes per object\n" % (
+            count, rounds))
+        sys.stdout.write("%-18s %-9s %10s %12s %10s %10s\n" % (
+            "object", "mode", "push(ms)", "peak(KiB)", "pop(ms)",
+            "flush(ms)"))
+        for name, obj in objects:
+            for mode in (False, True):
+                EntropyCacher.SNAPSHOT_PUSH = mode
+                push_t, peak, pop_t, flush_t = _bench(
+                    cacher, name, obj, rounds, cache_dir)
+                if peak is None:
+                    peak_s = "n/a"
+                else:
+                    peak_s = "%d" % (peak // 1024,)
+                sys.stdout.write("%-18s %-9s %10.2f %12s %10.2f %10.2f\n" % (
+                    name, mode and "snapshot" or "deepcopy", push_t, peak_s,
+                    pop_t, flush_t))
+    finally:
+        EntropyCacher.SNAPSHOT_PUSH = snapshot
+        cacher.stop()
+        shutil.rmtree(cache_dir, True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Measure the repository update cost of EAPI4 changesets against the full
+repository downloads of EAPI1 (compressed repository) and EAPI2
+(compressed light SQL dump, imported while decompressing it): a
+repository receives a number of uploads, each one replacing some
+packages, and clients that are 1, 4 or 16 uploads behind update it.
+Reported: bytes to download and time to apply them (decompression,
+import or changesets application plus checksum verification). The
+indexes creation following EAPI1 and EAPI2 updates is not included,
+changesets are applied to an already indexed repository.
+
+Usage: bench_changesets.py [<packages> [<updated packages per upload>]]
+"""
+import bz2
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+# repository progress output
+os.environ["ETP_MUTE"] = "1"
+
+from benchrepo import make_package_data
+from entropy.db import EntropyRepository
+
+
+CHAINS = (1, 4, 16)
+
+def open_repo(path, indexing = False):
+    return EntropyRepository(readOnly = False, dbFile = path,
+        name = "bench", xcache = False, indexing = indexing,
+        skipChecks = True)
+
+def compress(src, dst):
+    with open(src, "rb") as f_in:
+        f_out = bz2.BZ2File(dst, "wb")
+        try:
+            shutil.copyfileobj(f_in, f_out)
+        finally:
+            f_out.close()
+
+def decompress(src, dst):
+    f_in = bz2.BZ2File(src, "rb")
+    try:
+        with open(dst, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+    finally:
+        f_in.close()
+
+def upload(repo, count, updates, next_idx):
+    """
+    Replace the oldest packages with new ones, like version bumps do.
+    """
+    for package_id in sorted(repo.listAllPackageIds())[:updates]:
+        repo.removePackage(package_id)
+    for idx in range(updates):
+        data = make_package_data(next_idx + idx, files = 0)
+        repo.addPackage(data)
+    repo.commit()
+    return next_idx + updates
+
+def main():
+    count = 5000
+    updates = 50
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        updates = int(sys.argv[2])
+
+    tmp_dir = tempfile.mkdtemp(prefix = "bench_changesets",
+                               dir = os.getenv("TMPDIR", "/var/tmp"))
+    try:
+        path = os.path.join(tmp_dir, "repo.db")
+        repo = open_repo(path)
+        repo.initializeRepository()
+        for idx in range(count):
+            repo.addPackage(make_package_data(idx, files = 0))
+        repo.commit()
+
+        # server side: one snapshot and one changeset for every upload
+        revisions = max(CHAINS)
+        snapshot = lambda rev: os.path.join(tmp_dir, "repo.%d.db" % (rev,))
+        changeset = lambda rev: os.path.join(
+            tmp_dir, "changeset.%d-%d.bz2" % (rev - 1, rev))
+        shutil.copy2(path, snapshot(0))
+        package_ids = repo.listAllPackageIds()
+        next_idx = count
+        export_t = 0.0
+        for rev in range(1, revisions + 1):
+            next_idx = upload(repo, count, updates, next_idx)
+            new_package_ids = repo.listAllPackageIds()
+            t0 = time.time()
+            f_out = bz2.BZ2File(changeset(rev), "wb")
+            try:
+                repo.exportChangeset(f_out, new_package_ids - package_ids,
+                    package_ids - new_package_ids,
+                    metadata = {'from': rev - 1, 'to': rev})
+            finally:
+                f_out.close()
+            export_t += time.time() - t0
+            package_ids = new_package_ids
+            shutil.copy2(path, snapshot(rev))
+        checksum = repo.checksum(do_order = True, strict = False,
+            include_signatures = True)
+
+        dump_path = os.path.join(tmp_dir, "dump.bz2")
+        f_out = bz2.BZ2File(dump_path, "wb")
+        try:
+            repo.exportRepository(f_out)
+        finally:
+            f_out.close()
+        repo.close()
+        db_path = os.path.join(tmp_dir, "repo.db.bz2")
+        compress(path, db_path)
+
+        sys.stdout.write("%d packages, %d updated per upload, "
+                         "changeset export: %.3fs per upload\n" % (
+                count, updates, export_t / revisions))
+        sys.stdout.write("%-22s %12s %10s\n" % ("", "download", "apply"))
+
+        # EAPI1: download the compressed repository
+        client_path = os.path.join(tmp_dir, "client.db")
+        t0 = time.time()
+        decompress(db_path, client_path)
+        eapi1_t = time.time() - t0
+        sys.stdout.write("%-22s %10.1fkB %9.3fs\n" % (
+                "EAPI1, repository", os.path.getsize(db_path) / 1024.0,
+                eapi1_t))
+
+        # EAPI2: download the compressed dump, import it
+        os.remove(client_path)
+        t0 = time.time()
+        f_in = bz2.BZ2File(dump_path, "rb")
+        try:
+            rc = EntropyRepository.importRepository(f_in, client_path)
+        finally:
+            f_in.close()
+        eapi2_t = time.time() - t0
+        if rc != 0:
+            sys.stderr.write("dump import failed!\n")
+            raise SystemExit(1)
+        sys.stdout.write("%-22s %10.1fkB %9.3fs\n" % (
+                "EAPI2, SQL dump", os.path.getsize(dump_path) / 1024.0,
+                eapi2_t))
+
+        # EAPI4: apply the chain of changesets
+        for chain in CHAINS:
+            start = revisions - chain
+            shutil.copy2(snapshot(start), client_path)
+            client = open_repo(client_path, indexing = True)
+            client.createAllIndexes()
+            client.commit()
+            client.close()
+            paths = [changeset(x) for x in range(start + 1, revisions + 1)]
+            t0 = time.time()
+            changesets = []
+            for changeset_path in paths:
+                f_in = bz2.BZ2File(changeset_path, "rb")
+                try:
+                    changesets.append(EntropyRepository.loadChangeset(f_in))
+                finally:
+                    f_in.close()
+            client = open_repo(client_path, indexing = True)
+            client.importChangesets(changesets)
+            client_checksum = client.checksum(do_order = True,
+                strict = False, include_signatures = True)
+            if client_checksum != changesets[-1]['checksum']:
+                client.rollback()
+            else:
+                client.commit()
+            client.close()
+            eapi4_t = time.time() - t0
+            if client_checksum != checksum:
+                sys.stderr.write("changesets checksum mismatch!\n")
+                raise SystemExit(1)
+            sys.stdout.write("%-22s %10.1fkB %9.3fs\n" % (
+                    "EAPI4, %d changeset%s" % (chain, "s"[chain == 1:]),
+                    sum(os.path.getsize(x) for x in paths) / 1024.0,
+                    eapi4_t))
+    finally:
+        shutil.rmtree(tmp_dir, True)
+
+if __name__ == "__main__":
+    main()
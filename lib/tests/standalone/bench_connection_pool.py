@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Measure the repository connection handling of multithreaded code:
+short-lived threads and a pool of worker threads running short jobs,
+each querying several repositories. Reported: wall time, connections
+opened, peak number of threads alive (connection cleanup threads
+included) and, where available, the connection pool statistics.
+
+Usage: bench_connection_pool.py [<repositories> [<jobs> [<workers>]]]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+try:
+    from multiprocessing.pool import ThreadPool
+except ImportError:
+    ThreadPool = None
+
+from benchrepo import make_package_data
+from entropy.db import EntropyRepository
+from entropy.db.sqlite import SQLiteConnectionWrapper
+
+
+class Counters(object):
+
+    def __init__(self):
+        self.connections = 0
+        self.peak_threads = 0
+        self.lock = threading.Lock()
+
+    def sample(self):
+        count = threading.active_count()
+        with self.lock:
+            self.peak_threads = max(self.peak_threads, count)
+
+
+def count_connections(counters):
+    """
+    Count the connections opened through SQLiteConnectionWrapper.
+    """
+    connect = SQLiteConnectionWrapper.connect
+
+    def _connect(*args, **kwargs):
+        with counters.lock:
+            counters.connections += 1
+        return connect(*args, **kwargs)
+    SQLiteConnectionWrapper.connect = staticmethod(_connect)
+
+def job(repos, counters, release):
+    for repo in repos:
+        repo.retrieveAtom(1)
+        if release:
+            repo.releaseConnection()
+    counters.sample()
+
+def short_lived_threads(repos, jobs, workers, counters, release):
+    for start in range(0, jobs, workers):
+        threads = [threading.Thread(target = job, args = (
+                    repos, counters, release))
+                   for x in range(start, min(jobs, start + workers))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+def worker_pool(repos, jobs, workers, counters, release):
+    pool = ThreadPool(workers)
+    try:
+        pool.map(lambda x: job(repos, counters, release), range(jobs))
+    finally:
+        pool.close()
+        pool.join()
+
+def run(paths, scenario, jobs, workers, release):
+    repos = [EntropyRepository(readOnly = True, dbFile = x, name = "bench",
+                               xcache = False, skipChecks = True)
+             for x in paths]
+    counters = Counters()
+    count_connections(counters)
+    try:
+        t0 = time.time()
+        scenario(repos, jobs, workers, counters, release)
+        elapsed = time.time() - t0
+    finally:
+        # back to the inherited SQLConnectionWrapper.connect()
+        del SQLiteConnectionWrapper.connect
+    stats = None
+    if hasattr(repos[0], "connectionPoolStats"):
+        stats = repos[0].connectionPoolStats()
+    for repo in repos:
+        repo.close()
+    return elapsed, counters, stats
+
+def main():
+    count = 8
+    jobs = 2000
+    workers = 8
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        jobs = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        workers = int(sys.argv[3])
+
+    tmp_dir = tempfile.mkdtemp(prefix = "bench_connection_pool")
+    try:
+        paths = []
+        for idx in range(count):
+            path = os.path.join(tmp_dir, "repo%d.db" % (idx,))
+            repo = EntropyRepository(readOnly = False, dbFile = path,
+                name = "bench", xcache = False, skipChecks = True)
+            repo.initializeRepository()
+            repo.addPackage(make_package_data(idx, files = 0))
+            repo.commit()
+            repo.close()
+            paths.append(path)
+
+        sys.stdout.write("%d repositories, %d jobs, %d concurrent "
+                         "threads\n" % (count, jobs, workers))
+        scenarios = [("short-lived threads", short_lived_threads, False)]
+        if ThreadPool is not None:
+            scenarios.append(("worker pool", worker_pool, False))
+        if hasattr(EntropyRepository, "releaseConnection"):
+            scenarios.append(("short-lived, release", short_lived_threads,
+                              True))
+            if ThreadPool is not None:
+                scenarios.append(("worker pool, release", worker_pool,
+                                  True))
+        for label, scenario, release in scenarios:
+            elapsed, counters, stats = run(
+                paths, scenario, jobs, workers, release)
+            sys.stdout.write(
+                "  %-20s %7.2fs, %5d connections, peak threads %4d\n" % (
+                    label, elapsed, counters.connections,
+                    counters.peak_threads))
+            if stats is not None:
+                sys.stdout.write(
+                    "  %-20s reused %d, reaped %d, waits %d\n" % (
+                        "", stats['reused'], stats['reaped'],
+                        stats['waits']))
+            # let the connection cleanup threads terminate
+            time.sleep(1.0)
+    finally:
+        shutil.rmtree(tmp_dir, True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the plain content layout against the interned paths one
+(EntropySQLiteRepository.CONTENT_INTERNING): repository size and
+the time taken by content insertion, retrieveContent(),
+searchBelongs(), isFileAvailable() and contentDiff().
+
+Usage: bench_content_interning.py [<number of packages>]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+from benchrepo import make_package_data
+from entropy.db import EntropyRepository
+from entropy.db.sqlite import EntropySQLiteRepository
+
+
+LANGS = ("ar", "bg", "ca", "cs", "da", "de", "el", "en_GB", "eo", "es",
+         "et", "eu", "fi", "fr", "ga", "gl", "he", "hr", "hu", "id", "it",
+         "ja", "ko", "lt", "nb", "nl", "pl", "pt", "pt_BR", "ro", "ru",
+         "sk", "sl", "sr", "sv", "tr", "uk", "vi", "zh_CN", "zh_TW")
+HEADERS = ("config.h", "types.h", "util.h", "version.h", "api.h", "io.h",
+           "error.h", "list.h", "hash.h", "string.h")
+MODULES = ("__init__.py", "util.py", "core.py", "config.py", "errors.py",
+           "compat.py", "main.py", "version.py")
+
+def make_content(idx, version):
+    """
+    Return a realistic looking content dict for package idx, with
+    files spread over shared system directories.
+    """
+    rnd = random.Random(idx)
+    name = "pkg%05d" % (idx,)
+    content = {}
+    for x in range(rnd.randint(1, 3)):
+        content["/usr/bin/%s%d" % (name, x)] = "obj"
+    content["/usr/lib64/lib%s.so.1.0.0" % (name,)] = "obj"
+    content["/usr/lib64/lib%s.so.1" % (name,)] = "sym"
+    content["/usr/share/man/man1/%s.1.bz2" % (name,)] = "obj"
+    doc_dir = "/usr/share/doc/%s-%s" % (name, version)
+    for doc in ("README.bz2", "ChangeLog.bz2", "NEWS.bz2", "AUTHORS.bz2"):
+        content["%s/%s" % (doc_dir, doc)] = "obj"
+    if idx % 3 == 0:
+        for lang in LANGS:
+            content["/usr/share/locale/%s/LC_MESSAGES/%s.mo" % (
+                    lang, name)] = "obj"
+    if idx % 4 == 0:
+        for header in HEADERS:
+            content["/usr/include/%s/%s" % (name, header)] = "obj"
+    if idx % 5 == 0:
+        for module in MODULES:
+            content["/usr/lib64/python3.8/site-packages/%s/%s" % (
+                    name, module)] = "obj"
+    return content
+
+def create(path, count, interning):
+    EntropySQLiteRepository.CONTENT_INTERNING = interning
+    repo = EntropyRepository(readOnly = False, dbFile = path,
+        name = "bench", xcache = False, skipChecks = True)
+    repo.initializeRepository()
+    repo.createAllIndexes()
+    elapsed = 0.0
+    for idx in range(count):
+        data = make_package_data(idx, files = 0)
+        data['content'] = make_content(idx, data['version'])
+        t0 = time.time()
+        repo.addPackage(data)
+        elapsed += time.time() - t0
+    repo.commit()
+    repo.vacuum()
+    return repo, elapsed
+
+def _time(func, rounds = 1):
+    t0 = time.time()
+    for x in range(rounds):
+        func()
+    return (time.time() - t0) / rounds
+
+def run(tmp_dir, count, interning):
+    path = os.path.join(tmp_dir, "%s.db" % (interning,))
+    repo, insert_t = create(path, count, interning)
+    other = EntropyRepository(readOnly = True, dbFile = path,
+        name = "other", xcache = False, skipChecks = True)
+    try:
+        package_ids = sorted(repo.listAllPackageIds())
+        files = sorted(repo.listAllFiles(clean = True))
+        sample = files[::max(1, len(files) // 2000)]
+
+        def _retrieve():
+            for package_id in package_ids:
+                repo.retrieveContent(package_id, extended = True)
+
+        def _belongs():
+            for path in sample:
+                repo.searchBelongs(path)
+
+        def _available():
+            for path in sample:
+                repo.isFileAvailable(path)
+
+        def _diff():
+            for package_id in package_ids[:200]:
+                repo.contentDiff(package_id, other, package_id + 1)
+
+        # warm up
+        _retrieve()
+        return {
+            'files': len(files),
+            'size': os.path.getsize(path),
+            'insert': insert_t,
+            'retrieve': _time(_retrieve, 3),
+            'belongs': _time(_belongs, 3) / len(sample),
+            'available': _time(_available, 3) / len(sample),
+            'diff': _time(_diff) / min(200, len(package_ids)),
+        }
+    finally:
+        other.close()
+        repo.close()
+
+def main():
+    count = 5000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+
+    tmp_dir = tempfile.mkdtemp(prefix = "bench_content_interning")
+    try:
+        plain = run(tmp_dir, count, False)
+        interned = run(tmp_dir, count, True)
+        if plain['files'] != interned['files']:
+            sys.stderr.write("content differs!\n")
+            raise SystemExit(1)
+
+        sys.stdout.write("%d packages, %d files\n" % (
+                count, plain['files']))
+        sys.stdout.write("%-26s %12s %12s\n" % ("", "plain", "interned"))
+        sys.stdout.write("%-26s %11.1fM %11.1fM\n" % (
+                "repository size",
+                plain['size'] / 1048576.0, interned['size'] / 1048576.0))
+        for key, label, factor, unit in (
+            ('insert', "addPackage() total", 1, "s"),
+            ('retrieve', "retrieveContent() all", 1, "s"),
+            ('belongs', "searchBelongs()", 1000000, "us"),
+            ('available', "isFileAvailable()", 1000000, "us"),
+            ('diff', "contentDiff()", 1000, "ms")):
+            sys.stdout.write("%-26s %10.2f%-2s %10.2f%-2s\n" % (
+                    label, plain[key] * factor, unit,
+                    interned[key] * factor, unit))
+    finally:
+        shutil.rmtree(tmp_dir, True)
+
+if __name__ == "__main__":
+    main()
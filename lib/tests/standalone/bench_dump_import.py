@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Measure the EAPI2 repository dump import: the former path, unpacking the
+compressed dump to disk and feeding it to /usr/bin/sqlite3, against
+EntropyRepository.importRepository() reading the compressed dump while
+decompressing it. The dump is created like the server does, without
+content, changelogs and indexes.
+Reported: best and median wall time over a few runs and the peak disk
+space used next to the compressed dump (sampled by a thread of this
+process). Check that the sqlite3 Python module and /usr/bin/sqlite3 use
+the same SQLite version, statements execution speed differs a lot
+across SQLite releases.
+
+Usage: bench_dump_import.py [<packages> [<runs>]]
+"""
+import bz2
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+# repository progress output
+os.environ["ETP_MUTE"] = "1"
+
+from benchrepo import make_package_data
+from entropy.db import EntropyRepository
+
+
+class DiskSampler(threading.Thread):
+    """
+    Sample the size of the files in a directory, keeping the peak.
+    """
+
+    def __init__(self, directory, exclude):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.peak = 0
+        self._directory = directory
+        self._exclude = exclude
+        self._stop_ev = threading.Event()
+
+    def _sample(self):
+        size = 0
+        for name in os.listdir(self._directory):
+            if name in self._exclude:
+                continue
+            try:
+                size += os.path.getsize(os.path.join(self._directory, name))
+            except OSError:
+                continue
+        self.peak = max(self.peak, size)
+
+    def run(self):
+        while not self._stop_ev.is_set():
+            self._sample()
+            self._stop_ev.wait(0.01)
+        self._sample()
+
+    def stop(self):
+        self._stop_ev.set()
+        self.join()
+
+
+def unpack_and_sqlite3(dump_path, db_path):
+    plain_path = os.path.join(os.path.dirname(db_path), "dump")
+    f_in = bz2.BZ2File(dump_path, "rb")
+    try:
+        with open(plain_path, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+    finally:
+        f_in.close()
+    try:
+        with open(plain_path, "rb") as f_in:
+            rc = subprocess.call(("/usr/bin/sqlite3", db_path), stdin = f_in)
+    finally:
+        os.remove(plain_path)
+    return rc
+
+def streaming_import(dump_path, db_path):
+    f_in = bz2.BZ2File(dump_path, "rb")
+    try:
+        return EntropyRepository.importRepository(f_in, db_path)
+    finally:
+        f_in.close()
+
+def run(import_func, work_dir, dump_path, runs):
+    timings = []
+    peak = 0
+    db_path = os.path.join(work_dir, "repo.db")
+    for x in range(runs):
+        sampler = DiskSampler(work_dir, (os.path.basename(dump_path),))
+        sampler.start()
+        t0 = time.time()
+        rc = import_func(dump_path, db_path)
+        timings.append(time.time() - t0)
+        sampler.stop()
+        if rc != 0:
+            sys.stderr.write("dump import failed!\n")
+            raise SystemExit(1)
+        peak = max(peak, sampler.peak)
+        db_size = os.path.getsize(db_path)
+        os.remove(db_path)
+    timings.sort()
+    return timings[0], timings[len(timings) // 2], peak, db_size
+
+def main():
+    count = 15000
+    runs = 3
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        runs = int(sys.argv[2])
+
+    tmp_dir = tempfile.mkdtemp(prefix = "bench_dump_import",
+                               dir = os.getenv("TMPDIR", "/var/tmp"))
+    try:
+        path = os.path.join(tmp_dir, "server.db")
+        repo = EntropyRepository(readOnly = False, dbFile = path,
+            name = "bench", xcache = False, indexing = False,
+            skipChecks = True)
+        repo.initializeRepository()
+        for idx in range(count):
+            repo.addPackage(make_package_data(idx, files = 0))
+        repo.dropContent()
+        repo.dropChangelog()
+        repo.dropAllIndexes()
+        repo.commit()
+
+        work_dir = os.path.join(tmp_dir, "client")
+        os.mkdir(work_dir)
+        dump_path = os.path.join(work_dir, "dump.bz2")
+        f_out = bz2.BZ2File(dump_path, "wb")
+        try:
+            repo.exportRepository(f_out)
+        finally:
+            f_out.close()
+        repo.close()
+        os.remove(path)
+
+        sys.stdout.write("%d packages, compressed dump %.1fkB, %d runs\n" % (
+                count, os.path.getsize(dump_path) / 1024.0, runs))
+        sys.stdout.write("%-22s %9s %9s %12s %12s\n" % (
+                "", "best", "median", "peak disk", "repository"))
+        paths = []
+        if os.path.lexists("/usr/bin/sqlite3"):
+            paths.append(("unpack + sqlite3", unpack_and_sqlite3))
+        else:
+            sys.stdout.write("%-22s n/a (no /usr/bin/sqlite3)\n" % (
+                    "unpack + sqlite3",))
+        paths.append(("streaming import", streaming_import))
+        for label, import_func in paths:
+            best, median, peak, db_size = run(
+                import_func, work_dir, dump_path, runs)
+            sys.stdout.write("%-22s %8.3fs %8.3fs %10.1fMB %10.1fMB\n" % (
+                    label, best, median, peak / 1048576.0,
+                    db_size / 1048576.0))
+    finally:
+        shutil.rmtree(tmp_dir, True)
+
+if __name__ == "__main__":
+    main()
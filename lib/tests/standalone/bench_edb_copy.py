@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Measure the Entropy metadata handling of package files, as done by
+"eit inject" and "eit push": aggregate_entropy_metadata(),
+dump_entropy_metadata() and remove_entropy_metadata(), plus the copy
+of the empty repository template done for every injected package.
+Wall clock and CPU time are reported with kernel space copies enabled
+and with the ETP_NO_ZERO_COPY buffered fallback.
+
+Usage: bench_edb_copy.py [<number of packages> [<package size in MiB>]]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+import entropy.tools
+from entropy.const import etpConst
+
+
+def cpu_time():
+    times = os.times()
+    return times[0] + times[1] + times[2] + times[3]
+
+def copy_template(template, dst_fd):
+    copy_file_to_fd = getattr(entropy.tools, "copy_file_to_fd", None)
+    if copy_file_to_fd is not None:
+        copy_file_to_fd(template, dst_fd)
+        return
+    with os.fdopen(os.dup(dst_fd), "wb") as tmp_f:
+        with open(template, "rb") as empty_f:
+            shutil.copyfileobj(empty_f, tmp_f)
+
+def run(tmp_dir, count, template, bodies):
+    timings = {}
+
+    def _measure(name, func):
+        os.system("sync")
+        t0, c0 = time.time(), cpu_time()
+        for idx in range(count):
+            func(idx)
+        timings[name] = (time.time() - t0, cpu_time() - c0)
+
+    pkg = lambda idx: os.path.join(tmp_dir, "pkg%d.tbz2" % (idx,))
+    meta = lambda idx: os.path.join(tmp_dir, "meta%d.db" % (idx,))
+
+    def _prepare(idx):
+        shutil.copyfile(bodies[idx % len(bodies)], pkg(idx))
+    for idx in range(count):
+        _prepare(idx)
+
+    def _inject(idx):
+        fd, path = tempfile.mkstemp(dir = tmp_dir)
+        try:
+            copy_template(template, fd)
+        finally:
+            os.close(fd)
+        os.rename(path, meta(idx))
+        entropy.tools.aggregate_entropy_metadata(pkg(idx), meta(idx))
+    _measure("inject", _inject)
+
+    _measure("dump", lambda idx: entropy.tools.dump_entropy_metadata(
+            pkg(idx), meta(idx)))
+    _measure("remove", lambda idx: entropy.tools.remove_entropy_metadata(
+            pkg(idx), pkg(idx) + ".body"))
+
+    for idx in range(count):
+        with open(pkg(idx) + ".body", "rb") as f:
+            with open(bodies[idx % len(bodies)], "rb") as g:
+                if f.read() != g.read():
+                    sys.stderr.write("package body mismatch!\n")
+                    raise SystemExit(1)
+        with open(meta(idx), "rb") as f:
+            with open(template, "rb") as g:
+                if f.read() != g.read():
+                    sys.stderr.write("metadata mismatch!\n")
+                    raise SystemExit(1)
+        os.remove(pkg(idx))
+        os.remove(pkg(idx) + ".body")
+        os.remove(meta(idx))
+    return timings
+
+def main():
+    count = 200
+    size = 8
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        size = int(sys.argv[2])
+
+    tmp_dir = tempfile.mkdtemp(prefix = "bench_edb_copy",
+                               dir = os.getenv("TMPDIR", "/var/tmp"))
+    try:
+        template = os.path.join(tmp_dir, "template.db")
+        with open(template, "wb") as f:
+            f.write(os.urandom(2 * 1024 * 1024))
+        bodies = []
+        for idx in range(4):
+            path = os.path.join(tmp_dir, "body%d" % (idx,))
+            with open(path, "wb") as f:
+                f.write(os.urandom(size * 1024 * 1024))
+            bodies.append(path)
+
+        results = []
+        for label, no_zero_copy in (("buffered", True),
+                                    ("zero-copy", False)):
+            if no_zero_copy:
+                os.environ["ETP_NO_ZERO_COPY"] = "1"
+            else:
+                os.environ.pop("ETP_NO_ZERO_COPY", None)
+            results.append((label, run(tmp_dir, count, template, bodies)))
+
+        sys.stdout.write("%d packages, %d MiB bodies, 2 MiB metadata\n" % (
+                count, size))
+        sys.stdout.write("%-10s %-8s %10s %10s\n" % ("", "", "wall", "cpu"))
+        for label, timings in results:
+            for name in ("inject", "dump", "remove"):
+                wall, cpu = timings[name]
+                sys.stdout.write("%-10s %-8s %9.2fs %9.2fs\n" % (
+                        label, name, wall, cpu))
+    finally:
+        shutil.rmtree(tmp_dir, True)
+
+if __name__ == "__main__":
+    main()
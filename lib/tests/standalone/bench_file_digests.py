@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the package file verification strategies: one read per digest
+(md5, sha1, sha256, sha512, as previously done by the fetch action), a
+single read feeding all the digests at once (MultiHasher) and the
+digests file stored at download time (zero reads).
+
+Usage: bench_file_digests.py [<file size in MiB>]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+from entropy.misc import MultiHasher
+import entropy.tools
+
+
+def main():
+    size = 256
+    if len(sys.argv) > 1:
+        size = int(sys.argv[1])
+
+    tmp_dir = tempfile.mkdtemp(prefix = "bench_file_digests")
+    try:
+        path = os.path.join(tmp_dir, "package.tbz2")
+        block = os.urandom(1024 * 1024)
+        with open(path, "wb") as f:
+            for x in range(size):
+                f.write(block)
+
+        # warm up the page cache
+        entropy.tools.md5sum(path)
+
+        t0 = time.time()
+        separate = {
+            'md5': entropy.tools.md5sum(path),
+            'sha1': entropy.tools.sha1(path),
+            'sha256': entropy.tools.sha256(path),
+            'sha512': entropy.tools.sha512(path),
+        }
+        separate_t = time.time() - t0
+
+        t0 = time.time()
+        hasher = MultiHasher()
+        hasher.update_from_file(path)
+        single = hasher.hexdigests()
+        single_t = time.time() - t0
+
+        entropy.tools.store_file_digests(path, single)
+        t0 = time.time()
+        stored = entropy.tools.read_file_digests(path)
+        stored_t = time.time() - t0
+
+        if not (separate == single == stored):
+            sys.stderr.write("digests differ!\n")
+            raise SystemExit(1)
+
+        sys.stdout.write(
+            "%d MiB file, md5+sha1+sha256+sha512\n"
+            "one read per digest: %.2fs (%d bytes read)\n"
+            "single pass:         %.2fs (%d bytes read), %.1fx\n"
+            "digests file:        %.4fs (0 bytes read)\n" % (
+                size, separate_t, 4 * size * 1024 * 1024,
+                single_t, size * 1024 * 1024, separate_t / single_t,
+                stored_t))
+    finally:
+        shutil.rmtree(tmp_dir, True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Measure entropy.graph.Graph the way Client.get_install_queue() uses it:
+add() every package match with its dependencies, get the item adjacency
+map and solve() the graph. Synthetic dependency graphs shaped like a
+distribution (dependencies mostly point to lower layers, a few cycles)
+and a deep dependency chain are used. Time and peak memory
+(tracemalloc, in a separate run) are reported.
+
+Usage: bench_graph.py [<number of packages>]
+"""
+import random
+import sys
+import threading
+import time
+import tracemalloc
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+from entropy.graph import Graph
+
+
+def distribution(count, rnd):
+    """
+    Package matches depending on 1-12 packages, mostly of lower
+    indexes, plus some reverse (cyclic) dependencies.
+    """
+    for idx in range(count):
+        deps = set()
+        for x in range(rnd.randint(1, 12)):
+            if idx and rnd.random() < 0.97:
+                dep = rnd.randint(max(0, idx - 2000), idx - 1)
+            else:
+                dep = rnd.randrange(count)
+            deps.add((dep, "sabayonlinux.org"))
+        yield (idx, "sabayonlinux.org"), deps
+
+def chain(count, rnd):
+    for idx in range(count):
+        yield (idx, "sabayonlinux.org"), set([(idx + 1, "sabayonlinux.org")])
+
+def item_adjacency_map(graph):
+    func = getattr(graph, "get_item_adjacency_map", None)
+    if func is not None:
+        return func()
+    return dict((x.item(), set(k.item() for k in y)) \
+        for x, y in graph.get_adjacency_map().items())
+
+def run(generator, count, trace):
+    arches = list(generator(count, random.Random(0)))
+    if trace:
+        tracemalloc.start()
+    t0 = time.time()
+    graph = Graph()
+    for item, deps in arches:
+        graph.add(item, deps)
+    t_add = time.time() - t0
+
+    t0 = time.time()
+    adj_map = item_adjacency_map(graph)
+    t_adj = time.time() - t0
+
+    t0 = time.time()
+    try:
+        deptree = graph.solve()
+    except RuntimeError as err:
+        # recursion limit
+        deptree = None
+    t_solve = time.time() - t0
+    peak = 0
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    graph.destroy()
+    levels = deptree is not None and len(deptree) or -1
+    return (sum(len(y) for x, y in arches), len(adj_map), levels,
+            t_add, t_adj, t_solve, peak)
+
+def bench():
+    count = 30000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+
+    sys.stdout.write("%-14s %8s %8s %8s %9s %9s %9s %9s\n" % (
+            "", "nodes", "arches", "levels", "add", "adjmap", "solve",
+            "peak"))
+    for name, generator, size in (
+            ("distribution", distribution, count),
+            ("chain", chain, 5000)):
+        # tracemalloc slows everything down, measure memory apart
+        arches, nodes, levels, t_add, t_adj, t_solve, _peak = run(
+            generator, size, False)
+        peak = run(generator, size, True)[-1]
+        sys.stdout.write(
+            "%-14s %8d %8d %8s %8.3fs %8.3fs %8.3fs %7.1fMB\n" % (
+                name, nodes, arches,
+                levels >= 0 and str(levels) or "error",
+                t_add, t_adj, t_solve, peak / 1048576.0))
+
+def main():
+    # let a recursive Tarjan implementation complete on deep graphs
+    sys.setrecursionlimit(1000000)
+    threading.stack_size(512 * 1024 * 1024)
+    thread = threading.Thread(target = bench)
+    thread.start()
+    thread.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Measure the system scan phases of QAInterface.test_shared_objects()
+(equo libtest) on this system: walking the linker paths and reading the
+ELF objects found, in-process and with the process pool, then with the
+persistent ELF metadata index, cold and warm.
+
+Usage: bench_libtest_scan.py
+"""
+import shutil
+import sys
+import tempfile
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+import entropy.dump
+import entropy.tools
+from entropy.const import const_get_cpus
+from entropy.qa import QAInterface
+
+
+def _run(qa, ldpaths, title):
+    timings = []
+    executables = qa._scan_shared_objects(ldpaths, timings, silent = True)
+    sys.stdout.write("%-28s %d ELF objects, %s\n" % (
+            title + ":", len(executables),
+            ", ".join("%s %.2fs" % x for x in timings)))
+    return executables
+
+def main():
+    tmp_dir = tempfile.mkdtemp(prefix = "bench_libtest_scan")
+    entropy.dump.D_DIR = tmp_dir
+    try:
+        qa = QAInterface()
+        ldpaths = set(entropy.tools.collect_linker_paths())
+        ldpaths.update(entropy.tools.collect_paths())
+
+        QAInterface.LIBTEST_INDEX = False
+        # warm up the page cache, to not favour the later runs
+        QAInterface.LIBTEST_JOBS = 1
+        _run(qa, ldpaths, "warm up")
+        single = _run(qa, ldpaths, "in-process")
+        QAInterface.LIBTEST_JOBS = 0
+        pool = _run(qa, ldpaths, "pool (%d jobs)" % (const_get_cpus(),))
+
+        QAInterface.LIBTEST_INDEX = True
+        _run(qa, ldpaths, "pool, index cold")
+        indexed = _run(qa, ldpaths, "pool, index warm")
+
+        if not (single == pool == indexed):
+            sys.stderr.write("scan results differ!\n")
+            raise SystemExit(1)
+    finally:
+        shutil.rmtree(tmp_dir, True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Measure the Entropy metadata (edb) lookup inside a package file, on a
+synthetic package shaped like app-doc/php-docs (big payload, ~31MB edb),
+comparing the previous 8 bytes backward scan, the current block based
+backward scan (packages without the offset trailer) and the offset
+trailer lookup.
+
+Usage: bench_locate_edb.py [<edb size in MB>]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+from entropy.const import etpConst, const_convert_to_rawstring
+import entropy.tools
+
+
+def _legacy_locate_edb(fileobj):
+    # the previous entropy.tools._locate_edb() implementation
+    fileobj.seek(0, os.SEEK_END)
+    xbytes = fileobj.tell()
+    counter = xbytes - 1
+
+    db_tag = etpConst['databasestarttag']
+    raw_db_tag = const_convert_to_rawstring(db_tag)
+    db_tag_len = len(db_tag)
+    give_up_threshold = 1024000 * 500 # 500Mb
+    entry_point = const_convert_to_rawstring(db_tag[::-1][0])
+    max_read_len = 8
+    start_position = None
+
+    while counter >= 0:
+        cur_threshold = abs((counter-xbytes))
+        if cur_threshold >= give_up_threshold:
+            start_position = None
+            break
+        fileobj.seek(counter-xbytes, os.SEEK_END)
+        read_bytes = fileobj.read(max_read_len)
+        read_len = len(read_bytes)
+        entry_idx = read_bytes.rfind(entry_point)
+        if entry_idx != -1:
+            rollback = (read_len - entry_idx) * -1
+            fileobj.seek(rollback, os.SEEK_CUR)
+            chunk = fileobj.read(db_tag_len)
+            if chunk == raw_db_tag:
+                start_position = fileobj.tell()
+                break
+        counter -= read_len
+
+    return start_position
+
+def _write_random(path, size):
+    with open(path, "wb") as f:
+        block = os.urandom(1024 * 1024)
+        while size > 0:
+            f.write(block[:size])
+            size -= len(block)
+
+def _time(func, path):
+    t0 = time.time()
+    with open(path, "rb") as f:
+        position = func(f)
+    return time.time() - t0, position
+
+def main():
+    edb_size = 31
+    if len(sys.argv) > 1:
+        edb_size = int(sys.argv[1])
+
+    tmp_dir = tempfile.mkdtemp(prefix = "bench_locate_edb")
+    try:
+        payload_path = os.path.join(tmp_dir, "payload")
+        edb_path = os.path.join(tmp_dir, "edb")
+        _write_random(payload_path, 64 * 1024 * 1024)
+        _write_random(edb_path, edb_size * 1024 * 1024)
+
+        old_pkg = os.path.join(tmp_dir, "old.tbz2")
+        new_pkg = os.path.join(tmp_dir, "new.tbz2")
+        for path, trailer in ((old_pkg, False), (new_pkg, True)):
+            shutil.copy2(payload_path, path)
+            entropy.tools.aggregate_entropy_metadata(
+                path, edb_path, offset_trailer = trailer)
+
+        legacy_t, legacy_pos = _time(_legacy_locate_edb, old_pkg)
+        scan_t, scan_pos = _time(entropy.tools._locate_edb, old_pkg)
+        trailer_t, trailer_pos = _time(entropy.tools._locate_edb, new_pkg)
+        if not (legacy_pos == scan_pos == trailer_pos):
+            sys.stderr.write("edb offsets differ!\n")
+            raise SystemExit(1)
+
+        sys.stdout.write(
+            "64MB payload, %dMB edb\n"
+            "legacy 8 bytes scan: %.3fs\n"
+            "block scan:          %.3fs, %.0fx\n"
+            "offset trailer:      %.6fs, %.0fx\n" % (
+                edb_size, legacy_t,
+                scan_t, legacy_t / scan_t,
+                trailer_t, legacy_t / trailer_t))
+    finally:
+        shutil.rmtree(tmp_dir, True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Compare getPackageData() called in a loop against getPackageDataMany()
+when reading the whole metadata of every package in a repository, which
+is what the server does when moving packages, injecting metadata into
+package files and exporting the repository to XML.
+
+Usage: bench_package_data_many.py [<number of packages>]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+from benchrepo import create_repository
+
+
+def main():
+    count = 2000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+
+    tmp_dir = tempfile.mkdtemp(prefix = "bench_package_data_many")
+    try:
+        repo = create_repository(
+            os.path.join(tmp_dir, "repo.db"), count, files = 20)
+        package_ids = repo.listAllPackageIds(order_by = "atom")
+
+        t0 = time.time()
+        single = [repo.getPackageData(x) for x in package_ids]
+        single_t = time.time() - t0
+
+        t0 = time.time()
+        many = list(repo.getPackageDataMany(package_ids))
+        many_t = time.time() - t0
+
+        if single != many:
+            sys.stderr.write("getPackageDataMany() results differ!\n")
+            raise SystemExit(1)
+
+        sys.stdout.write(
+            "%d packages\n"
+            "getPackageData() loop: %.2fs (%.3f ms/pkg)\n"
+            "getPackageDataMany():  %.2fs (%.3f ms/pkg), %.1fx\n" % (
+                count,
+                single_t, single_t * 1000 / count,
+                many_t, many_t * 1000 / count,
+                single_t / many_t))
+
+        repo.close()
+    finally:
+        shutil.rmtree(tmp_dir, True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the built-in ELF reader against spawning an external tool for
+every file, reading the ELF metadata of all the objects in a directory
+(default: /usr/lib), like the QA library tests and the provided/needed
+libraries metadata generation do.
+
+The external tool is scanelf (the previous implementation) if available,
+otherwise readelf -d, which has a comparable per-file process spawn cost.
+
+Usage: bench_read_elf.py [<directory>]
+"""
+import os
+import subprocess
+import sys
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+import entropy.tools
+
+
+def _collect(directory):
+    elf_files = []
+    for currentdir, subdirs, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(currentdir, name)
+            if os.path.islink(path) or not os.path.isfile(path):
+                continue
+            try:
+                if entropy.tools.is_elf_file(path):
+                    elf_files.append(path)
+            except (IOError, OSError):
+                continue
+    return elf_files
+
+def main():
+    directory = "/usr/lib"
+    if len(sys.argv) > 1:
+        directory = sys.argv[1]
+
+    elf_files = _collect(directory)
+    if not elf_files:
+        sys.stderr.write("no ELF files found in %s\n" % (directory,))
+        raise SystemExit(1)
+
+    # warm up the page cache, to not favour the later runs
+    entropy.tools.read_elf_metadata_many(elf_files)
+
+    t0 = time.time()
+    for elf_file in elf_files:
+        entropy.tools.read_elf_metadata(elf_file)
+    builtin_t = time.time() - t0
+
+    t0 = time.time()
+    entropy.tools.read_elf_metadata_many(elf_files)
+    many_t = time.time() - t0
+
+    if os.path.isfile("/usr/bin/scanelf"):
+        tool = "scanelf"
+        def _external(elf_file):
+            entropy.tools.read_elf_metadata(elf_file, external = True)
+    else:
+        tool = "readelf -d"
+        def _external(elf_file):
+            with open(os.devnull, "w") as null:
+                subprocess.call(("readelf", "-d", elf_file), stdout = null,
+                                stderr = null)
+
+    t0 = time.time()
+    for elf_file in elf_files:
+        _external(elf_file)
+    external_t = time.time() - t0
+
+    count = len(elf_files)
+    sys.stdout.write(
+        "%d ELF files in %s\n"
+        "%s, one process per file: %.2fs (%.3f ms/file)\n"
+        "read_elf_metadata():        %.2fs (%.3f ms/file), %.0fx\n"
+        "read_elf_metadata_many():   %.2fs (%.3f ms/file), %.0fx\n" % (
+            count, directory,
+            tool, external_t, external_t * 1000 / count,
+            builtin_t, builtin_t * 1000 / count, external_t / builtin_t,
+            many_t, many_t * 1000 / count, external_t / many_t))
+
+if __name__ == "__main__":
+    main()
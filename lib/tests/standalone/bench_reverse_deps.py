@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Measure reverse dependency lookups, as done by get_removal_queue(),
+calculate_orphaned_packages() and the server side removed reverse
+dependencies test: reverse dependencies metadata generation, one
+retrieveReverseDependencies() call for every package, a recursive
+removal query starting from the most depended upon packages, the
+metadata update after addPackage() and its load from the on-disk cache.
+
+Usage: bench_reverse_deps.py [<number of packages>]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+import entropy.dump
+from benchrepo import make_package_data
+from entropy.db import EntropyRepository
+
+
+def open_repo(path, read_only = True):
+    return EntropyRepository(readOnly = read_only, dbFile = path,
+        name = "bench", xcache = False, indexing = not read_only,
+        skipChecks = True)
+
+def removal_query(repo, package_ids):
+    """
+    Return the packages that would be removed together with package_ids.
+    """
+    queue = list(package_ids)
+    removal = set(queue)
+    while queue:
+        package_id = queue.pop()
+        for rev_dep in repo.retrieveReverseDependencies(package_id):
+            if rev_dep not in removal:
+                removal.add(rev_dep)
+                queue.append(rev_dep)
+    return removal
+
+def main():
+    count = 10000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+
+    tmp_dir = tempfile.mkdtemp(prefix = "bench_reverse_deps")
+    # keep the on-disk cache away from the system one
+    entropy.dump.D_DIR = os.path.join(tmp_dir, "caches")
+    try:
+        path = os.path.join(tmp_dir, "repo.db")
+        repo = open_repo(path, read_only = False)
+        repo.initializeRepository()
+        for idx in range(count):
+            repo.addPackage(make_package_data(idx, files = 0))
+        repo.createAllIndexes()
+        repo.commit()
+        package_ids = sorted(repo.listAllPackageIds())
+
+        t0 = time.time()
+        repo.retrieveReverseDependencies(package_ids[0])
+        generate_t = time.time() - t0
+
+        t0 = time.time()
+        rev_deps = [repo.retrieveReverseDependencies(x) for x in package_ids]
+        all_t = time.time() - t0
+
+        t0 = time.time()
+        removal = removal_query(repo, package_ids[:10])
+        removal_t = time.time() - t0
+
+        updates = 20
+        t0 = time.time()
+        for idx in range(updates):
+            data = make_package_data(count - 1 - idx, files = 0)
+            data['version'] += ".1"
+            repo.addPackage(data)
+            repo.retrieveReverseDependencies(package_ids[0])
+        update_t = (time.time() - t0) / updates
+        repo.commit()
+        repo.close()
+
+        repo = open_repo(path)
+        t0 = time.time()
+        repo.retrieveReverseDependencies(package_ids[0])
+        load_t = time.time() - t0
+        repo.close()
+
+        sys.stdout.write("%d packages, %d reverse dependencies, "
+                         "removal query: %d packages\n" % (
+                count, sum(len(x) for x in rev_deps), len(removal)))
+        for label, value in (
+                ("metadata generation", generate_t),
+                ("retrieveReverseDependencies(), all packages", all_t),
+                ("removal query", removal_t),
+                ("addPackage() + lookup, per package", update_t),
+                ("metadata load from disk", load_t)):
+            sys.stdout.write("  %-44s %9.3fs\n" % (label, value))
+    finally:
+        shutil.rmtree(tmp_dir, True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Measure file ownership lookups on an installed packages like repository:
+searchBelongs() LIKE patterns ending with a base name ("%/libfoo.so.1"),
+as a full LIKE scan and through the content base name index, and exact
+lookups done one searchBelongs() call at a time against a single
+searchBelongsMany() call. Both the plain and the interned content
+layouts are covered.
+
+Usage: bench_search_belongs.py [<number of packages>]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+from benchrepo import make_package_data
+from bench_content_interning import make_content
+from entropy.db import EntropyRepository
+from entropy.db.sql import EntropySQLRepository
+
+
+def create(path, count, interning, basename_index):
+    repo = EntropyRepository(readOnly = False, dbFile = path,
+        name = "bench", xcache = False, skipChecks = True)
+    repo.initializeRepository()
+    if interning:
+        repo._migrateContentInterned()
+    repo.createAllIndexes()
+    if not basename_index:
+        repo._cursor().execute("DROP INDEX IF EXISTS contentindex_basename")
+        repo._cursor().execute("DROP INDEX IF EXISTS content_names_lower")
+    t0 = time.time()
+    for idx in range(count):
+        data = make_package_data(idx, files = 0)
+        data['content'] = make_content(idx, data['version'])
+        repo.addPackage(data)
+    repo.commit()
+    return repo, time.time() - t0
+
+def run(tmp_dir, count, interning, basename_index):
+    path = os.path.join(tmp_dir, "%s-%s.db" % (interning, basename_index))
+    repo, insert_t = create(path, count, interning, basename_index)
+    try:
+        files = sorted(repo.listAllFiles(clean = True))
+        rnd = random.Random(0)
+        sample = rnd.sample(files, min(2000, len(files)))
+        patterns = ["%%/%s" % (os.path.basename(x),) for x in sample[:100]]
+
+        # without the index, measure the previous implementation: a
+        # LIKE scan of the whole content table
+        search_like = repo.searchBelongs
+        if not basename_index:
+            search_like = lambda x, like: EntropySQLRepository.searchBelongs(
+                repo, x, like = like)
+        t0 = time.time()
+        like = [search_like(x, like = True) for x in patterns]
+        like_t = (time.time() - t0) / len(patterns)
+
+        t0 = time.time()
+        single = dict((x, repo.searchBelongs(x)) for x in sample)
+        single_t = time.time() - t0
+
+        t0 = time.time()
+        many = repo.searchBelongsMany(sample)
+        many_t = time.time() - t0
+
+        if single != many:
+            sys.stderr.write("searchBelongsMany() results differ!\n")
+            raise SystemExit(1)
+
+        return {
+            'files': len(files),
+            'insert': insert_t,
+            'like': like_t,
+            'like_result': like,
+            'single': single_t,
+            'many': many_t,
+            'sample': len(sample),
+        }
+    finally:
+        repo.close()
+
+def main():
+    count = 3000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+
+    tmp_dir = tempfile.mkdtemp(prefix = "bench_search_belongs")
+    try:
+        for interning in (False, True):
+            old = run(tmp_dir, count, interning, False)
+            new = run(tmp_dir, count, interning, True)
+            if old['like_result'] != new['like_result']:
+                sys.stderr.write("LIKE results differ!\n")
+                raise SystemExit(1)
+
+            sys.stdout.write("%s layout, %d packages, %d files\n" % (
+                    interning and "interned" or "plain",
+                    count, new['files']))
+            sys.stdout.write(
+                "  addPackage() total:       %.2fs -> %.2fs "
+                "(base name index)\n" % (old['insert'], new['insert']))
+            sys.stdout.write(
+                "  searchBelongs(like=True): %.2fms -> %.3fms, %.0fx\n" % (
+                    old['like'] * 1000, new['like'] * 1000,
+                    old['like'] / new['like']))
+            sys.stdout.write(
+                "  %d exact paths:         searchBelongs() loop %.3fs, "
+                "searchBelongsMany() %.3fs, %.1fx\n" % (
+                    new['sample'], new['single'], new['many'],
+                    new['single'] / new['many']))
+    finally:
+        shutil.rmtree(tmp_dir, True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the LIKE based package search done by Client.atom_search()
+(searchPackages() and searchDescription()) against searchPackagesRanked()
+on top of the packagesearch full-text index, for queries typed one
+keystroke at a time. Cold queries use a freshly opened repository,
+warm ones reuse it.
+
+Usage: bench_search_ranked.py [<number of packages>]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+from benchrepo import make_package_data
+from entropy.db import EntropyRepository
+
+
+SYLLABLES = ("ba", "ker", "lo", "fi", "re", "fox", "gno", "me", "qt",
+             "sh", "ell", "mo", "zil", "la", "py", "thon", "lib", "x",
+             "ar", "chi", "ve", "net", "work", "man", "ag", "er", "ko",
+             "de", "vi", "tor", "gi", "mp", "pul", "se", "au", "dio")
+WORDS = ("library", "browser", "desktop", "audio", "video", "network",
+         "manager", "tool", "tools", "utilities", "client", "server",
+         "daemon", "graphical", "interface", "for", "the", "and", "with",
+         "support", "plugin", "framework", "bindings", "python", "gtk",
+         "qt", "kde", "gnome", "xml", "parser", "image", "viewer",
+         "editor", "text", "terminal", "emulator", "mail", "web",
+         "system", "monitor", "fast", "small", "free", "open", "source")
+KEYWORDS = ("firefox", "gnome-shell", "python", "network manager",
+            "audio", "lib")
+
+def make_name(rnd):
+    return "".join(rnd.choice(SYLLABLES) for x in range(rnd.randint(2, 4)))
+
+def create(path, count):
+    repo = EntropyRepository(readOnly = False, dbFile = path,
+        name = "bench", xcache = False, skipChecks = True)
+    repo.initializeRepository()
+    rnd = random.Random(0)
+    for idx in range(count):
+        data = make_package_data(idx, files = 0)
+        data['name'] = make_name(rnd)
+        if rnd.random() < 0.2:
+            data['name'] += "-" + make_name(rnd)
+        data['description'] = " ".join(
+            rnd.choice(WORDS) for x in range(rnd.randint(3, 10)))
+        repo.addPackage(data)
+    # some well known packages
+    for name, description in (
+            ("firefox", "Firefox Web Browser"),
+            ("gnome-shell", "Provides core UI functions for the GNOME "
+             "desktop"),
+            ("networkmanager", "A network configuration and management "
+             "daemon")):
+        data = make_package_data(count, files = 0)
+        data['name'] = name
+        data['description'] = description
+        repo.addPackage(data)
+    repo.commit()
+    return repo
+
+def open_repo(path):
+    return EntropyRepository(readOnly = True, dbFile = path,
+        name = "bench", xcache = False, skipChecks = True)
+
+def like_search(repo, keyword):
+    pkg_ids = list(repo.searchPackages(keyword, just_id = True))
+    pkg_ids.extend(x for x in repo.searchDescription(keyword, just_id = True)
+                   if x not in pkg_ids)
+    return pkg_ids
+
+def ranked_search(repo, keyword):
+    return repo.searchPackagesRanked(keyword, limit = 50)
+
+def keystrokes():
+    for keyword in KEYWORDS:
+        for idx in range(1, len(keyword) + 1):
+            if keyword[idx - 1] != " ":
+                yield keyword[:idx]
+
+def measure(path, func):
+    queries = list(keystrokes())
+    cold = 0.0
+    for keyword in queries:
+        t0 = time.time()
+        repo = open_repo(path)
+        func(repo, keyword)
+        cold += time.time() - t0
+        repo.close()
+
+    repo = open_repo(path)
+    try:
+        for keyword in queries:
+            func(repo, keyword)
+        t0 = time.time()
+        for keyword in queries:
+            func(repo, keyword)
+        warm = time.time() - t0
+    finally:
+        repo.close()
+    return cold / len(queries), warm / len(queries)
+
+def main():
+    count = 20000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+
+    tmp_dir = tempfile.mkdtemp(prefix = "bench_search_ranked")
+    try:
+        path = os.path.join(tmp_dir, "repo.db")
+        repo = create(path, count)
+        repo.close()
+
+        like_t = measure(path, like_search)
+        fallback_t = measure(path, ranked_search)
+
+        repo = EntropyRepository(readOnly = False, dbFile = path,
+            name = "bench", xcache = False, indexing = True,
+            skipChecks = True)
+        repo.createAllIndexes()
+        repo.commit()
+        if not repo._isSearchIndexed():
+            sys.stderr.write("no FTS5 support in SQLite\n")
+            raise SystemExit(1)
+        for keyword in ("firefox", "gnome sh", "network manag"):
+            top = repo.searchPackagesRanked(keyword, limit = 3)
+            sys.stdout.write("%-16s -> %s\n" % (
+                    keyword,
+                    ", ".join(repo.retrieveName(x) for x, y in top)))
+        repo.close()
+        fts_t = measure(path, ranked_search)
+
+        sys.stdout.write("%d packages, %d keystroke queries\n" % (
+                count, len(list(keystrokes()))))
+        sys.stdout.write("%-36s %10s %10s\n" % ("", "cold", "warm"))
+        for label, (cold, warm) in (
+                ("LIKE (atom_search)", like_t),
+                ("searchPackagesRanked(), no index", fallback_t),
+                ("searchPackagesRanked(), FTS5", fts_t)):
+            sys.stdout.write("%-36s %8.2fms %8.2fms\n" % (
+                    label, cold * 1000, warm * 1000))
+    finally:
+        shutil.rmtree(tmp_dir, True)
+
+if __name__ == "__main__":
+    main()
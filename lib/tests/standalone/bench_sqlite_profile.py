@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Measure the SQLite performance profiles (see
+EntropySQLiteRepository.PERFORMANCE_PROFILES) on an installed packages
+like repository with N reader processes querying it while one writer
+process installs packages, one transaction per package, holding the
+repository exclusive lock like the install action does. Readers are in
+direct mode, like repository queries run by other processes.
+Reported: reader queries per second and latency, writer transactions
+per second and latency.
+
+Usage: bench_sqlite_profile.py [<readers> [<seconds> [<packages>]]]
+"""
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+from benchrepo import make_package_data
+from entropy.db import EntropyRepository
+
+
+def open_repo(path, profile, read_only):
+    class ProfiledRepository(EntropyRepository):
+        PERFORMANCE_PROFILE = profile
+    return ProfiledRepository(readOnly = read_only, dbFile = path,
+        name = "bench", xcache = False, skipChecks = True,
+        direct = read_only)
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+def reader(path, profile, atoms, start, stop, results, seed):
+    repo = open_repo(path, profile, True)
+    rnd = random.Random(seed)
+    latencies = []
+    start.wait()
+    while not stop.is_set():
+        atom = rnd.choice(atoms)
+        t0 = time.time()
+        package_id, _rc = repo.atomMatch(atom, useCache = False)
+        if package_id != -1:
+            repo.retrieveDependencies(package_id)
+            repo.retrieveContent(package_id)
+        latencies.append(time.time() - t0)
+    repo.close()
+    results.put(latencies)
+
+def writer(path, profile, count, start, stop, results):
+    repo = open_repo(path, profile, False)
+    latencies = []
+    idx = 0
+    start.wait()
+    while not stop.is_set():
+        data = make_package_data(idx % count, files = 20)
+        data['version'] += ".%d" % (idx,)
+        t0 = time.time()
+        with repo.exclusive():
+            repo.addPackage(data)
+            repo.commit()
+        latencies.append(time.time() - t0)
+        idx += 1
+    repo.close()
+    results.put(latencies)
+
+def run(tmp_dir, profile, readers, seconds, count):
+    path = os.path.join(tmp_dir, "%s.db" % (profile,))
+    repo = open_repo(path, profile, False)
+    repo.initializeRepository()
+    for idx in range(count):
+        repo.addPackage(make_package_data(idx, files = 20))
+    repo.createAllIndexes()
+    repo.commit()
+    atoms = [repo.retrieveKeySlot(x)[0] for x in repo.listAllPackageIds()]
+    repo.close()
+
+    start = multiprocessing.Event()
+    stop = multiprocessing.Event()
+    reader_results = multiprocessing.Queue()
+    writer_results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target = reader, args = (
+                path, profile, atoms, start, stop, reader_results, x))
+             for x in range(readers)]
+    procs.append(multiprocessing.Process(target = writer, args = (
+                path, profile, count, start, stop, writer_results)))
+    for proc in procs:
+        proc.start()
+    time.sleep(1.0)
+    start.set()
+    time.sleep(seconds)
+    stop.set()
+
+    read_lat = []
+    for x in range(readers):
+        read_lat.extend(reader_results.get())
+    write_lat = writer_results.get()
+    for proc in procs:
+        proc.join()
+    return read_lat, write_lat
+
+def main():
+    readers = 4
+    seconds = 10
+    count = 2000
+    if len(sys.argv) > 1:
+        readers = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        seconds = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        count = int(sys.argv[3])
+
+    tmp_dir = tempfile.mkdtemp(prefix = "bench_sqlite_profile",
+                               dir = os.getenv("TMPDIR", "/var/tmp"))
+    try:
+        sys.stdout.write("%d packages, %d readers, 1 writer, %ds\n" % (
+                count, readers, seconds))
+        sys.stdout.write("%-10s %10s %10s %10s %10s %10s %10s\n" % (
+                "profile", "reads/s", "read p50", "read p99",
+                "writes/s", "write p50", "write p99"))
+        for profile in ("default", "installed"):
+            read_lat, write_lat = run(
+                tmp_dir, profile, readers, seconds, count)
+            sys.stdout.write(
+                "%-10s %10.1f %8.2fms %8.2fms %10.1f %8.2fms %8.2fms\n" % (
+                    profile, len(read_lat) / float(seconds),
+                    percentile(read_lat, 50) * 1000,
+                    percentile(read_lat, 99) * 1000,
+                    len(write_lat) / float(seconds),
+                    percentile(write_lat, 50) * 1000,
+                    percentile(write_lat, 99) * 1000))
+    finally:
+        shutil.rmtree(tmp_dir, True)
+
+if __name__ == "__main__":
+    main()
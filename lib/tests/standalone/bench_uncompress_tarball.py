@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Compare uncompress_tarball() wall-clock time with in-process, serial
+decompression (the tarfile module, as done previously) against parallel
+decompression (external decompressor or decoding thread) for each of the
+supported package compression formats.
+
+Usage: bench_uncompress_tarball.py [<number of files>] [<file size in KiB>]
+"""
+import os
+import random
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+from entropy.const import const_get_cpus
+import entropy.tools as et
+
+
+def _make_tarball(tmp_dir, count, size):
+    rnd = random.Random(0)
+    words = [("%x" % (rnd.getrandbits(32),)).encode("ascii")
+             for x in range(4096)]
+    src_dir = os.path.join(tmp_dir, "src")
+    for idx in range(count):
+        sub_dir = os.path.join(src_dir, "usr", "share", "dir%03d" % (
+                idx % 100,))
+        if not os.path.isdir(sub_dir):
+            os.makedirs(sub_dir)
+        data = []
+        length = 0
+        while length < size:
+            word = rnd.choice(words)
+            data.append(word)
+            length += len(word) + 1
+        with open(os.path.join(sub_dir, "file%05d" % (idx,)), "wb") as f:
+            f.write(b" ".join(data))
+    tar_path = os.path.join(tmp_dir, "package.tar")
+    tar = tarfile.open(tar_path, "w")
+    try:
+        tar.add(src_dir, arcname = ".")
+    finally:
+        tar.close()
+    shutil.rmtree(src_dir)
+    return tar_path
+
+def _compress(tar_path, compression):
+    with open(tar_path, "rb") as f:
+        data = f.read()
+    if compression == "bz2":
+        import bz2
+        data = bz2.compress(data)
+    elif compression == "gz":
+        import gzip
+        import io
+        buf = io.BytesIO()
+        gz_f = gzip.GzipFile(fileobj = buf, mode = "wb")
+        gz_f.write(data)
+        gz_f.close()
+        data = buf.getvalue()
+    elif compression == "xz":
+        import lzma
+        data = lzma.compress(data)
+    elif compression == "zstd":
+        import subprocess
+        proc = subprocess.Popen(["zstd", "-qc"],
+            stdin = subprocess.PIPE, stdout = subprocess.PIPE)
+        data = proc.communicate(data)[0]
+    pkg_path = "%s.%s" % (tar_path, compression)
+    with open(pkg_path, "wb") as f:
+        # packages carry metadata after the compressed stream
+        f.write(data)
+        f.write(b"XPAKPACK" + b"\0" * 4096)
+    return pkg_path
+
+def _time(pkg_path, tmp_dir, parallel, rounds = 3):
+    best = None
+    for x in range(rounds):
+        dest = tempfile.mkdtemp(dir = tmp_dir)
+        t0 = time.time()
+        rc = et.uncompress_tarball(pkg_path, extract_path = dest,
+                                   parallel = parallel)
+        elapsed = time.time() - t0
+        shutil.rmtree(dest)
+        if rc != 0:
+            raise SystemExit("uncompress_tarball() failed: %s" % (rc,))
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    count = 500
+    size = 64
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        size = int(sys.argv[2])
+
+    tmp_dir = tempfile.mkdtemp(prefix = "bench_uncompress_tarball")
+    try:
+        tar_path = _make_tarball(tmp_dir, count, size * 1024)
+        sys.stdout.write("%d files, %d KiB each, %d CPUs\n" % (
+                count, size, const_get_cpus()))
+
+        for compression in ("bz2", "gz", "xz", "zstd"):
+            if not et._TarballDecoder.available(compression):
+                sys.stdout.write("%s: not supported here\n" % (
+                        compression,))
+                continue
+            pkg_path = _compress(tar_path, compression)
+            decoder = et._tarball_decompressor(compression)
+            if decoder is None:
+                decoder = "thread"
+            else:
+                decoder = os.path.basename(decoder[0])
+
+            serial_t = None
+            if et._tarball_opener(compression) is not None:
+                serial_t = _time(pkg_path, tmp_dir, False)
+            parallel_t = _time(pkg_path, tmp_dir, True)
+
+            if serial_t is None:
+                sys.stdout.write(
+                    "%-4s (%d KiB): serial n/a, parallel (%s) %.2fs\n" % (
+                        compression, os.path.getsize(pkg_path) // 1024,
+                        decoder, parallel_t))
+            else:
+                sys.stdout.write(
+                    "%-4s (%d KiB): serial %.2fs, parallel (%s) %.2fs, "
+                    "%.2fx\n" % (
+                        compression, os.path.getsize(pkg_path) // 1024,
+                        serial_t, decoder, parallel_t,
+                        serial_t / parallel_t))
+            os.remove(pkg_path)
+    finally:
+        shutil.rmtree(tmp_dir, True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic Entropy repository generator shared by the bench_*.py scripts.
+
+Packages are laid out in a deterministic way (same count, same data), with
+dependencies pointing to lower package indexes, so that the dependency
+graph is acyclic and resembles a real world one.
+"""
+import os
+import random
+import sys
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+
+from entropy.const import etpConst
+from entropy.db import EntropyRepository
+
+
+CATEGORIES = ("app-misc", "dev-libs", "dev-util", "media-libs", "net-misc",
+              "sys-apps", "sys-libs", "x11-libs", "x11-misc", "www-client")
+
+def package_name(idx):
+    """
+    Return the (category, name) pair of the synthetic package at idx.
+    """
+    return CATEGORIES[idx % len(CATEGORIES)], "pkg%05d" % (idx,)
+
+def package_key(idx):
+    """
+    Return the key (category/name) of the synthetic package at idx.
+    """
+    return "%s/%s" % package_name(idx)
+
+def make_package_data(idx, files = 20, rnd = None):
+    """
+    Return package metadata suitable for EntropyRepository.addPackage().
+
+    @param idx: synthetic package index
+    @type idx: int
+    @keyword files: number of files in package content
+    @type files: int
+    @keyword rnd: random number generator
+    @type rnd: random.Random
+    """
+    if rnd is None:
+        rnd = random.Random(idx)
+    category, name = package_name(idx)
+    version = "%d.%d.%d" % (rnd.randint(0, 9), rnd.randint(0, 20),
+                            rnd.randint(0, 9))
+
+    deps = []
+    if idx:
+        for dep_idx in set(rnd.randint(0, idx - 1)
+                           for x in range(min(idx, rnd.randint(0, 8)))):
+            deps.append((">=%s-0" % (package_key(dep_idx),),
+                         etpConst['dependency_type_ids']['rdepend_id']))
+
+    content = {}
+    for x in range(files):
+        path = "/usr/share/%s/%s/file%03d" % (category, name, x)
+        content[path] = "obj"
+    lib_path = "/usr/lib64/lib%s.so.1" % (name,)
+    content[lib_path] = "obj"
+    content["/usr/bin/%s" % (name,)] = "obj"
+
+    provided_libs = set([("lib%s.so.1" % (name,), lib_path, 2)])
+    needed_libs = set()
+    for dep, _dep_type in deps:
+        dep_name = dep.split("/")[1].rsplit("-", 1)[0]
+        needed_libs.add(("/usr/bin/%s" % (name,), "", "lib%s.so.1" % (
+                    dep_name,), 2, ""))
+
+    return {
+        'atom': "%s/%s-%s" % (category, name, version),
+        'category': category,
+        'name': name,
+        'version': version,
+        'versiontag': "",
+        'revision': 0,
+        'branch': etpConst['branch'],
+        'slot': "0",
+        'etpapi': etpConst['etpapi'],
+        'trigger': "",
+        'license': "GPL-2",
+        'licensedata': {},
+        'description': "synthetic package number %d" % (idx,),
+        'homepage': "http://www.sabayon.org",
+        'download': "packages/amd64/5/%s:%s-%s.tbz2" % (
+            category, name, version),
+        'size': str(rnd.randint(1024, 1024000)),
+        'digest': "%032x" % (rnd.getrandbits(128),),
+        'datecreation': "1300000000.0",
+        'chost': "x86_64-pc-linux-gnu",
+        'cflags': "-O2 -pipe",
+        'cxxflags': "-O2 -pipe",
+        'config_protect': "/etc",
+        'config_protect_mask': "",
+        'pkg_dependencies': tuple(deps),
+        'conflicts': set(),
+        'provide_extended': set(),
+        'sources': set(),
+        'useflags': set(["nls", "ssl"] if idx % 2 else ["-nls"]),
+        'keywords': set(["amd64"]),
+        'mirrorlinks': [],
+        'content': content,
+        'content_safety': {},
+        'provided_libs': provided_libs,
+        'needed_libs': needed_libs,
+        'counter': -1,
+        'injected': False,
+        'systempackage': False,
+        'disksize': rnd.randint(1024, 1024000),
+        'signatures': {
+            'sha1': "%040x" % (rnd.getrandbits(160),),
+            'sha256': "%064x" % (rnd.getrandbits(256),),
+            'sha512': "%0128x" % (rnd.getrandbits(512),),
+            'gpg': None,
+        },
+        'spm_phases': None,
+        'spm_repository': None,
+        'original_repository': None,
+        'changelog': None,
+        'extra_download': [],
+        'desktop_mime': [],
+        'provided_mime': [],
+    }
+
+def create_repository(path, count, files = 20, name = "bench",
+                      xcache = False):
+    """
+    Create (or reuse, if already containing count packages) a synthetic
+    repository at path and return it.
+
+    @param path: repository file path
+    @type path: string
+    @param count: number of packages
+    @type count: int
+    @keyword files: number of files per package
+    @type files: int
+    @keyword name: repository name
+    @type name: string
+    @keyword xcache: enable on-disk caching
+    @type xcache: bool
+    @return: the repository
+    @rtype: EntropyRepository
+    """
+    exists = os.path.isfile(path)
+    repo = EntropyRepository(readOnly = False, dbFile = path,
+        name = name, xcache = xcache, skipChecks = True)
+    if exists and len(repo.listAllPackageIds()) == count:
+        return repo
+
+    repo.initializeRepository()
+    for idx in range(count):
+        repo.addPackage(make_package_data(idx, files = files))
+    repo.commit()
+    return repo
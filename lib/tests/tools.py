@@ -4,7 +4,7 @@ import os
 sys.path.insert(0, '.')
 sys.path.insert(0, '../')
 import unittest
-from entropy.const import const_convert_to_rawstring, \
+from entropy.const import etpConst, const_convert_to_rawstring, \
     const_convert_to_unicode, const_mkstemp, const_mkdtemp
 import entropy.tools as et
 from entropy.client.interfaces import Client
@@ -13,6 +13,7 @@ import tests._misc as _misc
 import subprocess
 import shutil
 import stat
+import tarfile
 
 class ToolsTest(unittest.TestCase):
 
@@ -63,6 +64,84 @@ class ToolsTest(unittest.TestCase):
 
         os.remove(tmp_path)
 
+    def test_entropy_metadata_offset_trailer(self):
+
+        tmp_dir = const_mkdtemp()
+        try:
+            metadata_path = os.path.join(tmp_dir, "metadata")
+            pkg_path = os.path.join(tmp_dir, "pkg.tbz2")
+            dump_path = os.path.join(tmp_dir, "dump")
+
+            self.assertTrue(et.dump_entropy_metadata(
+                    self.test_pkg, metadata_path))
+            with open(metadata_path, "rb") as f:
+                metadata = f.read()
+
+            for offset_trailer in (True, False):
+                self.assertTrue(et.remove_entropy_metadata(
+                        self.test_pkg, pkg_path))
+                package_size = os.path.getsize(pkg_path)
+                et.aggregate_entropy_metadata(pkg_path, metadata_path,
+                    offset_trailer = offset_trailer)
+                self.assertEqual(offset_trailer,
+                    et._is_edb_trailer_available(pkg_path))
+
+                with open(pkg_path, "rb") as f:
+                    self.assertEqual(
+                        package_size + len(
+                            etpConst['databasestarttag']),
+                        et._locate_edb(f))
+                    self.assertEqual(metadata, f.read(len(metadata)))
+                self.assertTrue(et.dump_entropy_metadata(
+                        pkg_path, dump_path))
+                with open(dump_path, "rb") as f:
+                    self.assertEqual(metadata, f.read())
+                self.assertTrue(et.is_entropy_package_file(pkg_path))
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
+    def test_copy_fd_range(self):
+
+        tmp_dir = const_mkdtemp()
+        data = os.urandom(3 * 1024 * 1024 + 17)
+        src_path = os.path.join(tmp_dir, "src")
+        dst_path = os.path.join(tmp_dir, "dst")
+        with open(src_path, "wb") as f:
+            f.write(data)
+
+        zero_copy = os.environ.pop("ETP_NO_ZERO_COPY", None)
+        try:
+            for no_zero_copy in (False, True):
+                if no_zero_copy:
+                    os.environ["ETP_NO_ZERO_COPY"] = "1"
+
+                with open(src_path, "rb") as src:
+                    with open(dst_path, "wb") as dst:
+                        dst.write(const_convert_to_rawstring("head"))
+                        dst.flush()
+                        self.assertEqual(1024, et._copy_fd_range(
+                                src.fileno(), dst.fileno(), 10, 1024))
+                        # past the end of the source file
+                        self.assertEqual(len(data) - 2048, et._copy_fd_range(
+                                src.fileno(), dst.fileno(), 2048, len(data)))
+                with open(dst_path, "rb") as f:
+                    self.assertEqual(
+                        const_convert_to_rawstring("head") +
+                        data[10:1034] + data[2048:], f.read())
+
+                fd, tmp_path = const_mkstemp(dir = tmp_dir)
+                try:
+                    et.copy_file_to_fd(src_path, fd)
+                finally:
+                    os.close(fd)
+                with open(tmp_path, "rb") as f:
+                    self.assertEqual(data, f.read())
+        finally:
+            os.environ.pop("ETP_NO_ZERO_COPY", None)
+            if zero_copy is not None:
+                os.environ["ETP_NO_ZERO_COPY"] = zero_copy
+            shutil.rmtree(tmp_dir, True)
+
     def test_tb(self):
         # traceback test
         tb = None
@@ -462,6 +541,28 @@ class ToolsTest(unittest.TestCase):
         metadata = et.read_elf_dynamic_libraries(elf_obj)
         self.assertEqual(metadata, known_meta)
 
+    def test_read_elf_metadata(self):
+        elf_obj = _misc.get_dl_so_amd_2()
+        known_meta = {
+            'soname': 'libkdb5.so.4',
+            'class': 2,
+            'runpath': '/usr/lib64',
+            'needed': set(['libcom_err.so.2', 'libkrb5.so.3',
+                'libkrb5support.so.0', 'libgssrpc.so.4', 'libk5crypto.so.3',
+                'libc.so.6']),
+        }
+        self.assertEqual(et.read_elf_metadata(elf_obj), known_meta)
+        self.assertEqual(et.read_elf_metadata(__file__), None)
+
+        not_elf_obj = __file__
+        metadata = et.read_elf_metadata_many(
+            [elf_obj, not_elf_obj, elf_obj + ".not_found"])
+        self.assertEqual(metadata, {
+            elf_obj: known_meta,
+            not_elf_obj: None,
+            elf_obj + ".not_found": None,
+        })
+
     def test_read_elf_real_dynamic_libraries(self):
         elf_obj = _misc.get_dl_so_amd_2()
         known_meta = set(
@@ -638,6 +739,251 @@ class ToolsTest(unittest.TestCase):
 
         self.assertEqual(path_perms, new_path_perms)
 
+    def test_extract_tarball_member(self):
+
+        pkg_path = _misc.get_test_entropy_package6()
+        tmp_dir = const_mkdtemp()
+        try:
+            rc = et.uncompress_tarball(pkg_path, extract_path = tmp_dir)
+            self.assertTrue(not rc)
+
+            dest_dir = os.path.join(tmp_dir, "__members__")
+            os.mkdir(dest_dir)
+            count = 0
+            members = et.iter_tarball_members(pkg_path)
+            for tar, tarinfo, link_targets in members:
+                if not (tarinfo.isreg() or tarinfo.islnk()):
+                    continue
+                count += 1
+                src = os.path.join(tmp_dir, tarinfo.name)
+                dest = os.path.join(dest_dir, "member%d" % (count,))
+                et.extract_tarball_member(tar, tarinfo, dest,
+                    link_targets = link_targets)
+
+                src_st, dest_st = os.lstat(src), os.lstat(dest)
+                self.assertEqual(
+                    (stat.S_IMODE(src_st.st_mode), src_st.st_uid,
+                     src_st.st_gid, src_st.st_size),
+                    (stat.S_IMODE(dest_st.st_mode), dest_st.st_uid,
+                     dest_st.st_gid, dest_st.st_size))
+                self.assertEqual(et.md5sum(src), et.md5sum(dest))
+
+            self.assertTrue(count > 0)
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
+    def test_extract_tarball_member_hardlink(self):
+
+        # a hard link to a config protected file: the link target is
+        # not merged, the link is extracted from the target data, long
+        # after the member list has been pruned (on Python 2)
+        tmp_dir = const_mkdtemp()
+        try:
+            src_dir = os.path.join(tmp_dir, "image")
+            os.makedirs(os.path.join(src_dir, "etc"))
+            conf_path = os.path.join(src_dir, "etc", "foo.conf")
+            with open(conf_path, "w") as conf_f:
+                conf_f.write("protected\n")
+            os.chmod(conf_path, 0o640)
+            tar_path = os.path.join(tmp_dir, "package.tar.bz2")
+            tar = tarfile.open(tar_path, "w:bz2")
+            try:
+                tar.add(os.path.join(src_dir, "etc"), "etc", recursive = False)
+                tar.add(conf_path, "etc/foo.conf")
+                for idx in range(10):
+                    path = os.path.join(src_dir, "etc", "file%d" % (idx,))
+                    with open(path, "w") as f:
+                        f.write("%d\n" % (idx,))
+                    tar.add(path, "etc/file%d" % (idx,))
+                link_info = tar.gettarinfo(conf_path, "etc/foo-link.conf")
+                link_info.type = tarfile.LNKTYPE
+                link_info.linkname = "etc/foo.conf"
+                link_info.size = 0
+                tar.addfile(link_info)
+            finally:
+                tar.close()
+
+            # in stream mode (parallel decompression, zstd), the link
+            # target data has already been read
+            pkgs = [tar_path]
+            plain_fd, plain_path = const_mkstemp(dir = tmp_dir)
+            et._delta_extract_bz2(tar_path, plain_fd)
+            zstd_path = self._compress_tarball(plain_path, "zstd")
+            if zstd_path is not None:
+                pkgs.append(zstd_path)
+
+            for path in pkgs:
+                for parallel in (False, True):
+                    dest = os.path.join(tmp_dir, "foo-link.conf")
+                    found = False
+                    for tar, tarinfo, link_targets in et.iter_tarball_members(
+                            path, parallel = parallel):
+                        if not tarinfo.islnk():
+                            continue
+                        found = True
+                        et.extract_tarball_member(tar, tarinfo, dest,
+                            link_targets = link_targets)
+                    self.assertTrue(found)
+
+                    with open(dest, "r") as dest_f:
+                        self.assertEqual(dest_f.read(), "protected\n")
+                    self.assertEqual(
+                        stat.S_IMODE(os.lstat(dest).st_mode), 0o640)
+                    os.remove(dest)
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
+    def test_iter_tarball_members_unreadable(self):
+
+        # packages without files are fine, broken ones are not
+        tmp_dir = const_mkdtemp()
+        try:
+            empty_path = os.path.join(tmp_dir, "empty.tar.bz2")
+            tarfile.open(empty_path, "w:bz2").close()
+            broken_path = os.path.join(tmp_dir, "broken.tar.bz2")
+            with open(broken_path, "wb") as broken_f:
+                broken_f.write(b"BZh9 this is not a bzip2 stream")
+
+            for parallel in (False, True):
+                members = list(et.iter_tarball_members(
+                    empty_path, parallel = parallel))
+                self.assertEqual(members, [])
+                self.assertRaises(tarfile.ExtractError, list,
+                    et.iter_tarball_members(broken_path, parallel = parallel))
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
+    def test_uncompress_tarball_no_decompressor(self):
+
+        # without a zstd decompressor, zstd packages are not empty
+        tmp_dir = const_mkdtemp()
+        cache = et._TARBALL_DECOMPRESSOR_CACHE.copy()
+        try:
+            zstd_path = os.path.join(tmp_dir, "package.tar.zst")
+            with open(zstd_path, "wb") as zstd_f:
+                zstd_f.write(b"\x28\xb5\x2f\xfd zstd data")
+            et._TARBALL_DECOMPRESSOR_CACHE["zstd"] = None
+
+            self.assertRaises(tarfile.CompressionError,
+                et.uncompress_tarball, zstd_path,
+                extract_path = tmp_dir, catch_empty = True)
+            self.assertRaises(tarfile.ExtractError, list,
+                et.iter_tarball_members(zstd_path))
+        finally:
+            et._TARBALL_DECOMPRESSOR_CACHE.clear()
+            et._TARBALL_DECOMPRESSOR_CACHE.update(cache)
+            shutil.rmtree(tmp_dir, True)
+
+    def _compress_tarball(self, tar_path, compression):
+        # compress the plain tarball at tar_path using the external
+        # program, return the new path or None if not available
+        argv = et._tarball_decompressor(compression)
+        if argv is None:
+            return None
+        comp_path = "%s.%s" % (tar_path, compression)
+        with open(comp_path, "wb") as comp_f:
+            rc = subprocess.call([argv[0], "-qc", tar_path], stdout = comp_f)
+        self.assertEqual(rc, 0)
+        with open(comp_path, "ab") as comp_f:
+            comp_f.write(b"XPAKPACK trailing data")
+        self.assertEqual(et._tarball_compression(comp_path), compression)
+        return comp_path
+
+    def test_iter_tarball_members_compression(self):
+
+        # streaming merge of xz and zstd packages, tarfile cannot read
+        # zstd tarballs, nor xz ones on Python 2
+        pkg_path = _misc.get_test_entropy_package6()
+        tmp_dir = const_mkdtemp()
+        try:
+            ref_dir = os.path.join(tmp_dir, "image")
+            os.mkdir(ref_dir)
+            rc = et.uncompress_tarball(pkg_path, extract_path = ref_dir)
+            self.assertEqual(rc, 0)
+            files = set()
+            for currentdir, subdirs, xfiles in os.walk(ref_dir):
+                for xfile in xfiles:
+                    path = os.path.join(currentdir, xfile)
+                    if not os.path.islink(path):
+                        files.add(os.path.relpath(path, ref_dir))
+            self.assertTrue(files)
+
+            tar_fd, tar_path = const_mkstemp(dir = tmp_dir)
+            et._delta_extract_bz2(pkg_path, tar_fd)
+            pkgs = []
+            for compression in ("xz", "zstd"):
+                comp_path = self._compress_tarball(tar_path, compression)
+                if comp_path is not None:
+                    pkgs.append(comp_path)
+
+            dest = os.path.join(tmp_dir, "member")
+            for path in pkgs:
+                for parallel in (False, True):
+                    merged = set()
+                    for tar, tarinfo, link_targets in et.iter_tarball_members(
+                            path, parallel = parallel):
+                        if not tarinfo.isreg():
+                            continue
+                        et.extract_tarball_member(tar, tarinfo, dest,
+                            link_targets = link_targets)
+                        src = os.path.join(ref_dir, tarinfo.name)
+                        self.assertEqual(
+                            stat.S_IMODE(os.lstat(src).st_mode),
+                            stat.S_IMODE(os.lstat(dest).st_mode))
+                        self.assertEqual(et.md5sum(src), et.md5sum(dest))
+                        os.remove(dest)
+                        merged.add(os.path.normpath(tarinfo.name))
+                    self.assertEqual(merged, files)
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
+    def test_uncompress_tarball_parallel(self):
+
+        def _tree(path):
+            tree = {}
+            for currentdir, subdirs, files in os.walk(path):
+                for xfile in subdirs + files:
+                    xpath = os.path.join(currentdir, xfile)
+                    fstat = os.lstat(xpath)
+                    mtime = None
+                    if stat.S_ISREG(fstat.st_mode):
+                        mtime = int(fstat.st_mtime)
+                    tree[os.path.relpath(xpath, path)] = (
+                        fstat.st_mode, fstat.st_uid, fstat.st_gid,
+                        fstat.st_size, mtime)
+            return tree
+
+        pkg_path = _misc.get_test_entropy_package6()
+        tmp_dir = const_mkdtemp()
+        try:
+            pkgs = [pkg_path]
+            if et._tarball_opener("xz") is not None:
+                # same package, xz compressed
+                xz_path = os.path.join(tmp_dir, "package.txz")
+                tmp_fd, tmp_path = const_mkstemp(dir = tmp_dir)
+                et._delta_extract_bz2(pkg_path, tmp_fd)
+                et.compress_file(tmp_path, xz_path, et._lzma_file)
+                with open(xz_path, "ab") as xz_f:
+                    xz_f.write(b"XPAKPACK trailing data")
+                self.assertEqual(et._tarball_compression(xz_path), "xz")
+                pkgs.append(xz_path)
+
+            trees = []
+            for path in pkgs:
+                for parallel in (False, True):
+                    dest_dir = const_mkdtemp(dir = tmp_dir)
+                    rc = et.uncompress_tarball(path, extract_path = dest_dir,
+                        parallel = parallel)
+                    self.assertEqual(rc, 0)
+                    trees.append(_tree(dest_dir))
+
+            self.assertTrue(trees[0])
+            for tree in trees[1:]:
+                self.assertEqual(trees[0], tree)
+
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
 if __name__ == '__main__':
     unittest.main()
     raise SystemExit(0)
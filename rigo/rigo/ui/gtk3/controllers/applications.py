@@ -231,11 +231,10 @@ class ApplicationsViewController(GObject.Object):
                     multi_repo=True, mask_filter=False)
                 matches.extend(pkg_matches)
 
-                # atom searching (name and desc)
-                search_matches = self._entropy.atom_search(
+                # atom searching (name and desc), most relevant first
+                search_matches = self._entropy.atom_search_ranked(
                     text,
-                    repositories = self._entropy.repositories(),
-                    description = True)
+                    repositories = self._entropy.repositories())
 
                 matches.extend([x for x in search_matches \
                                     if x not in matches])
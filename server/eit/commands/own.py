@@ -110,12 +110,15 @@ please use *eit files*.
         results = {}
         flatresults = {}
         reverse_symlink_map = self._settings()['system_rev_symlinks']
+        owners = repo.searchBelongsMany(self._paths)
+        # try real path if possible
+        real_owners = repo.searchBelongsMany(
+            set(os.path.realpath(x) for x, y in owners.items() if not y))
         for xfile in self._paths:
             results[xfile] = set()
-            pkg_ids = repo.searchBelongs(xfile)
+            pkg_ids = owners[xfile]
             if not pkg_ids:
-                # try real path if possible
-                pkg_ids = repo.searchBelongs(os.path.realpath(xfile))
+                pkg_ids = real_owners[os.path.realpath(xfile)]
             if not pkg_ids:
                 # try using reverse symlink mapping
                 for sym_dir in reverse_symlink_map: